@@ -548,6 +548,37 @@ ATTACHMENTS_UNATTACHED_PRUNE_DELAY = env.int(
 """
 Delay in seconds before uploaded but unattached attachements are pruned from the system.
 """
+ATTACHMENTS_THUMBNAILS_PENDING_TIMEOUT = env.int(
+    "ATTACHMENTS_THUMBNAILS_PENDING_TIMEOUT", default=60 * 5
+)
+"""
+Maximum delay in seconds during which the original image is served instead of thumbnails
+that are being rendered. Thumbnail renders requested during that period
+for the same attachment are ignored.
+"""
+ATTACHMENTS_THUMBNAILS_QUEUE = env("ATTACHMENTS_THUMBNAILS_QUEUE", default=None)
+"""
+Name of a dedicated Celery queue for thumbnails rendering, e.g ``thumbnails``. When set,
+you need to start a worker consuming this queue, using ``celery worker -Q thumbnails``.
+Rendering tasks use the default queue otherwise.
+"""
+STORAGE_RECONCILE_BATCH_SIZE = env.int("STORAGE_RECONCILE_BATCH_SIZE", default=500)
+"""
+Number of media files checked against the database in a single query, when
+looking for orphaned files.
+"""
+STORAGE_RECONCILE_MIN_AGE = env.int("STORAGE_RECONCILE_MIN_AGE", default=3600 * 24)
+"""
+Delay in seconds before an orphaned media file can be deleted. Recent files are kept,
+since their upload or attachment may not be saved yet.
+"""
+STORAGE_RECONCILE_MAX_DURATION = env.int(
+    "STORAGE_RECONCILE_MAX_DURATION", default=60 * 30
+)
+"""
+Maximum duration of a storage reconciliation task, in seconds. The next run
+resumes where the previous one stopped.
+"""
 
 # URL Configuration
 # ------------------------------------------------------------------------------
@@ -714,6 +745,93 @@ CHANNEL_LAYERS = {
         "CONFIG": {"hosts": [CACHES["default"]["LOCATION"]]},
     }
 }
+PREFERENCES_SNAPSHOT_CHECK_INTERVAL = env.float(
+    "PREFERENCES_SNAPSHOT_CHECK_INTERVAL", default=2
+)
+"""
+Each process keeps a copy of global preferences in memory. This is how often, in seconds,
+a process checks if preferences were changed by another process.
+"""
+API_RESPONSE_CACHE_DURATION = env.int("API_RESPONSE_CACHE_DURATION", default=60 * 10)
+"""
+How long, in seconds, API responses to anonymous requests (artists, albums, tracks
+and channels lists and details) are cached. Cached responses are invalidated
+when the underlying objects change. Set this to 0 to disable the cache.
+"""
+FEDERATION_PURGE_BATCH_SIZE = env.int("FEDERATION_PURGE_BATCH_SIZE", default=500)
+"""
+Number of objects deleted, and committed, at once when purging accounts or domains.
+"""
+FEDERATION_PURGE_THROTTLE = env.float("FEDERATION_PURGE_THROTTLE", default=0.5)
+"""
+After deleting a batch of objects, purges pause for this ratio of the time
+spent deleting the batch, to leave room for other queries. Set this to 0 to disable
+throttling.
+"""
+FEDERATION_PURGE_MAX_DURATION = env.int(
+    "FEDERATION_PURGE_MAX_DURATION", default=60 * 10
+)
+"""
+Maximum duration of a purge task, in seconds. Longer purges are resumed
+by another task.
+"""
+FEDERATION_DELIVERY_RETENTION_DAYS = env.int(
+    "FEDERATION_DELIVERY_RETENTION_DAYS", default=30
+)
+"""
+Number of days after which deliveries of federation activities to remote inboxes
+are deleted. Set this to 0 to keep them forever.
+"""
+FEDERATION_INBOX_ITEM_RETENTION_DAYS = env.int(
+    "FEDERATION_INBOX_ITEM_RETENTION_DAYS", default=180
+)
+"""
+Number of days after which read notifications are deleted. Set this to 0 to keep
+them forever.
+"""
+FEDERATION_ACTIVITY_RETENTION_DAYS = env.int(
+    "FEDERATION_ACTIVITY_RETENTION_DAYS", default=180
+)
+"""
+Number of days after which federation activities are deleted, unless they are
+still referenced (e.g. by unread notifications, or by content created from them).
+Set this to 0 to keep them forever.
+"""
+ACTION_JOBS_THRESHOLD = env.int("ACTION_JOBS_THRESHOLD", default=100)
+"""
+Admin bulk actions (e.g. deleting uploads or purging domains) applying to more objects
+than this are run by a background job, whose progress can be followed
+and which can be cancelled.
+"""
+ACTION_JOBS_CHUNK_SIZE = env.int("ACTION_JOBS_CHUNK_SIZE", default=500)
+"""
+Number of objects processed, and committed, at once by admin bulk action jobs.
+"""
+AUTH_CACHE_DURATION = env.int("AUTH_CACHE_DURATION", default=60)
+"""
+How long, in seconds, authenticated users are cached, to avoid querying the database
+on every request authenticated with a JWT, OAuth or Subsonic token. Cached users
+are invalidated when they are changed. Set this to 0 to disable the cache.
+"""
+USERS_LAST_ACTIVITY_FLUSH_DELAY = env.float(
+    "USERS_LAST_ACTIVITY_FLUSH_DELAY", default=10
+)
+"""
+Users' last activity is saved in the background, in batches, at most every
+``USERS_LAST_ACTIVITY_FLUSH_DELAY`` seconds. Set this to 0 to save it during the request.
+"""
+CHANNELS_BROADCAST_DELAY = env.float("CHANNELS_BROADCAST_DELAY", default=0.5)
+"""
+Delay, in seconds, during which websocket events sent to the same group are buffered
+and sent as a single batch. Set this to 0 to send events immediately.
+"""
+CHANNELS_BROADCAST_MAX_BATCH_SIZE = env.int(
+    "CHANNELS_BROADCAST_MAX_BATCH_SIZE", default=200
+)
+"""
+Maximum number of websocket events buffered for a group before they are sent,
+regardless of :attr:`CHANNELS_BROADCAST_DELAY`.
+"""
 
 CACHES["default"]["OPTIONS"] = {
     "CLIENT_CLASS": "funkwhale_api.common.cache.RedisClient",
@@ -754,6 +872,13 @@ Exemple:
 # Your common stuff: Below this line define 3rd party library settings
 CELERY_TASK_DEFAULT_RATE_LIMIT = 1
 CELERY_TASK_TIME_LIMIT = 300
+CELERY_TASK_ROUTES = {}
+if ATTACHMENTS_THUMBNAILS_QUEUE:
+    for task_name in [
+        "common.warm_attachment_thumbnails",
+        "common.warm_attachments_thumbnails_batch",
+    ]:
+        CELERY_TASK_ROUTES[task_name] = {"queue": ATTACHMENTS_THUMBNAILS_QUEUE}
 CELERY_BEAT_SCHEDULE = {
     "audio.fetch_rss_feeds": {
         "task": "audio.fetch_rss_feeds",
@@ -775,6 +900,26 @@ CELERY_BEAT_SCHEDULE = {
         "schedule": crontab(minute="0", hour="*"),
         "options": {"expires": 60 * 2},
     },
+    "common.reconcile_counters": {
+        "task": "common.reconcile_counters",
+        "schedule": crontab(minute="30", hour="3"),
+        "options": {"expires": 60 * 60 * 2},
+    },
+    "common.reconcile_storage": {
+        "task": "common.reconcile_storage",
+        "schedule": crontab(minute="0", hour="1"),
+        "options": {"expires": 60 * 60 * 2},
+    },
+    "federation.prune_activities": {
+        "task": "federation.prune_activities",
+        "schedule": crontab(minute="30", hour="2"),
+        "options": {"expires": 60 * 60 * 2},
+    },
+    "moderation.precompute_stats": {
+        "task": "moderation.precompute_stats",
+        "schedule": crontab(minute="*/10"),
+        "options": {"expires": 60 * 10},
+    },
     "oauth.clear_expired_tokens": {
         "task": "oauth.clear_expired_tokens",
         "schedule": crontab(minute="0", hour="0"),
@@ -796,6 +941,7 @@ if env.bool("ADD_ALBUM_TAGS_FROM_TRACKS", default=True):
     CELERY_BEAT_SCHEDULE["music.albums_set_tags_from_tracks"] = {
         "task": "music.albums_set_tags_from_tracks",
         "schedule": crontab(minute="0", hour="4", day_of_week="4"),
+        "kwargs": {"incremental": True},
         "options": {"expires": 60 * 60 * 2},
     }
 
@@ -803,10 +949,61 @@ if env.bool("ADD_ARTIST_TAGS_FROM_TRACKS", default=True):
     CELERY_BEAT_SCHEDULE["music.artists_set_tags_from_tracks"] = {
         "task": "music.artists_set_tags_from_tracks",
         "schedule": crontab(minute="0", hour="4", day_of_week="4"),
+        "kwargs": {"incremental": True},
         "options": {"expires": 60 * 60 * 2},
     }
 
+if env.bool("SCHEDULE_MUSIC_PRUNE_LIBRARY", default=False):
+    CELERY_BEAT_SCHEDULE["music.prune_library"] = {
+        "task": "music.prune_library",
+        "schedule": crontab(minute="0", hour="5"),
+        "options": {"expires": 60 * 60 * 2},
+    }
+
+MUSIC_PRUNE_BATCH_SIZE = env.int("MUSIC_PRUNE_BATCH_SIZE", default=500)
+"""
+Number of tracks, albums or artists deleted in a single transaction when pruning
+the library.
+"""
+MUSIC_PRUNE_MAX_DURATION = env.int("MUSIC_PRUNE_MAX_DURATION", default=60 * 30)
+"""
+Maximum duration, in seconds, of the scheduled library pruning (enabled with
+``SCHEDULE_MUSIC_PRUNE_LIBRARY=true``). The next run resumes where the previous one stopped.
+"""
+
 NODEINFO_REFRESH_DELAY = env.int("NODEINFO_REFRESH_DELAY", default=3600 * 24)
+"""
+Delay, in seconds, before the nodeinfo of a known domain is refreshed.
+"""
+NODEINFO_REFRESH_MAX_BACKOFF = env.int(
+    "NODEINFO_REFRESH_MAX_BACKOFF", default=3600 * 24 * 30
+)
+"""
+When a domain fails to answer, the refresh delay doubles after each consecutive failure,
+up to this value, in seconds.
+"""
+NODEINFO_REFRESH_WORKERS = env.int("NODEINFO_REFRESH_WORKERS", default=10)
+"""
+Number of domains crawled concurrently during the periodic nodeinfo refresh.
+"""
+NODEINFO_REFRESH_CONCURRENCY_PER_HOST = env.int(
+    "NODEINFO_REFRESH_CONCURRENCY_PER_HOST", default=1
+)
+"""
+Maximum number of concurrent nodeinfo requests to a single host. Domains over this
+limit are refreshed on the next run.
+"""
+NODEINFO_REFRESH_TIMEOUT = env.int("NODEINFO_REFRESH_TIMEOUT", default=5)
+"""
+Timeout, in seconds, of nodeinfo requests.
+"""
+NODEINFO_REFRESH_MAX_DURATION = env.int(
+    "NODEINFO_REFRESH_MAX_DURATION", default=60 * 50
+)
+"""
+Maximum duration, in seconds, of the periodic nodeinfo refresh. The next run
+refreshes the remaining domains.
+"""
 
 
 def get_user_secret_key(user):
@@ -875,6 +1072,20 @@ REST_FRAMEWORK = {
     "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
     "NUM_PROXIES": env.int("NUM_PROXIES", default=1),
 }
+PAGINATION_EXACT_COUNT_THRESHOLD = env.int(
+    "PAGINATION_EXACT_COUNT_THRESHOLD", default=10000
+)
+"""
+When using cursor pagination on API list endpoints, run an exact count of results
+only if the database planner expects less rows than this value. For bigger result sets,
+the planner estimate is returned instead.
+"""
+PAGINATION_COUNT_CACHE_DURATION = env.int(
+    "PAGINATION_COUNT_CACHE_DURATION", default=60 * 5
+)
+"""
+How long, in seconds, exact counts computed for cursor pagination are cached.
+"""
 THROTTLING_ENABLED = env.bool("THROTTLING_ENABLED", default=True)
 """
 Wether to enable throttling (also known as rate-limiting). Leaving this enabled is recommended
@@ -1075,10 +1286,30 @@ Which path will be used to process the internal redirection to the reverse proxy
 You shouldn't have to tweak this.
 """
 
-MUSICBRAINZ_CACHE_DURATION = env.int("MUSICBRAINZ_CACHE_DURATION", default=300)
+MUSICBRAINZ_CACHE_DURATION = env.int(
+    "MUSICBRAINZ_CACHE_DURATION", default=60 * 60 * 24 * 7
+)
 """
 How long to cache MusicBrainz results, in seconds
 """
+MUSICBRAINZ_NEGATIVE_CACHE_DURATION = env.int(
+    "MUSICBRAINZ_NEGATIVE_CACHE_DURATION", default=60 * 60 * 24
+)
+"""
+How long to cache lookups of missing MusicBrainz resources, such as releases without
+a cover, in seconds
+"""
+MUSICBRAINZ_RATE_LIMIT = env.int("MUSICBRAINZ_RATE_LIMIT", default=1)
+"""
+Maximum number of requests per second sent to MusicBrainz and the Cover Art Archive,
+for the whole pod. You can increase it if you use a mirror. Use 0 to disable
+rate limiting.
+"""
+MUSICBRAINZ_RATE_LIMIT_TIMEOUT = env.int("MUSICBRAINZ_RATE_LIMIT_TIMEOUT", default=10)
+"""
+Maximum delay, in seconds, to wait for the rate limit before giving up on
+a MusicBrainz request.
+"""
 MUSICBRAINZ_HOSTNAME = env("MUSICBRAINZ_HOSTNAME", default="musicbrainz.org")
 """
 Use this setting to change the musicbrainz hostname, for instance to
@@ -1241,6 +1472,13 @@ MODERATION_EMAIL_NOTIFICATIONS_ENABLED = env.bool(
 """
 Whether to enable email notifications to moderators and pods admins.
 """
+MODERATION_STATS_CACHE_DURATION = env.int(
+    "MODERATION_STATS_CACHE_DURATION", default=60 * 15
+)
+"""
+How long, in seconds, to cache the statistics displayed to moderators about artists,
+albums, tracks, libraries, channels, accounts and domains. Use 0 to disable caching.
+"""
 FEDERATION_AUTHENTIFY_FETCHES = True
 FEDERATION_SYNCHRONOUS_FETCH = env.bool("FEDERATION_SYNCHRONOUS_FETCH", default=True)
 FEDERATION_DUPLICATE_FETCH_DELAY = env.int(
@@ -1249,6 +1487,35 @@ FEDERATION_DUPLICATE_FETCH_DELAY = env.int(
 """
 Delay, in seconds, between two manual fetch of the same remote object.
 """
+FEDERATION_COLLECTION_CACHE_DURATION = env.int(
+    "FEDERATION_COLLECTION_CACHE_DURATION", default=60 * 15
+)
+"""
+Delay, in seconds, during which pages of libraries and channels outboxes served
+to other pods are cached. Pages are refreshed sooner when the library is updated.
+"""
+FEDERATION_INBOX_ASYNC = env.bool("FEDERATION_INBOX_ASYNC", default=False)
+"""
+Whether to store activities received in inboxes and answer immediately with a 202,
+instead of processing them during the request. Stored activities are then processed
+in batches by Celery workers.
+"""
+FEDERATION_INBOX_BATCH_SIZE = env.int("FEDERATION_INBOX_BATCH_SIZE", default=200)
+"""
+Number of stored inbox activities processed in a single transaction.
+"""
+FEDERATION_INBOX_BATCH_DELAY = env.int("FEDERATION_INBOX_BATCH_DELAY", default=2)
+"""
+Delay, in seconds, to wait for other activities after an activity is received,
+before processing the batch.
+"""
+if FEDERATION_INBOX_ASYNC:
+    # in case a scheduled batch was lost
+    CELERY_BEAT_SCHEDULE["federation.process_incoming_activities"] = {
+        "task": "federation.process_incoming_activities",
+        "schedule": crontab(minute="*"),
+        "options": {"expires": 60},
+    }
 INSTANCE_SUPPORT_MESSAGE_DELAY = env.int("INSTANCE_SUPPORT_MESSAGE_DELAY", default=15)
 """
 Delay in days after signup before we show the "support your pod" message
@@ -1260,6 +1527,33 @@ Delay in days after signup before we show the "support Funkwhale" message
 # XXX Stable release: remove
 USE_FULL_TEXT_SEARCH = env.bool("USE_FULL_TEXT_SEARCH", default=True)
 
+MUSIC_USE_SEARCH_INDEX = env.bool("MUSIC_USE_SEARCH_INDEX", default=False)
+"""
+Whether to use the dedicated trigram search index for the global search endpoint,
+instead of querying artists, albums, tracks and tags separately. The index
+is maintained automatically, but needs to be populated once on existing pods, using
+``python manage.py rebuild_search_index``.
+"""
+MUSIC_SEARCH_POPULARITY_FACTOR = env.float(
+    "MUSIC_SEARCH_POPULARITY_FACTOR", default=0.05
+)
+"""
+How much popularity (number of tracks, listenings, favorites or tagged items)
+weighs against text similarity when ranking search results.
+"""
+if MUSIC_USE_SEARCH_INDEX:
+    CELERY_BEAT_SCHEDULE["music.update_search_index"] = {
+        "task": "music.update_search_index",
+        "schedule": crontab(minute="30", hour="*"),
+        "options": {"expires": 60 * 60},
+    }
+    CELERY_BEAT_SCHEDULE["music.refresh_search_index"] = {
+        "task": "music.update_search_index",
+        "schedule": crontab(minute="0", hour="3"),
+        "kwargs": {"missing_only": False},
+        "options": {"expires": 60 * 60 * 2},
+    }
+
 MIN_DELAY_BETWEEN_DOWNLOADS_COUNT = env.int(
     "MIN_DELAY_BETWEEN_DOWNLOADS_COUNT", default=60 * 60 * 6
 )
@@ -1283,6 +1577,26 @@ Wether to proxy attachment files hosted on third party pods and and servers. Kee
 this to true is recommended, to reduce leaking browsing information of your users, and
 reduce the bandwidth used on remote pods.
 """
+EXTERNAL_MEDIA_PROXY_FAILURE_CACHE_DURATION = env.int(
+    "EXTERNAL_MEDIA_PROXY_FAILURE_CACHE_DURATION", default=60 * 60
+)
+"""
+Delay in seconds during which a remote attachment that could not be downloaded
+isn't requested again.
+"""
+EXTERNAL_MEDIA_PROXY_MAX_CONCURRENCY_PER_DOMAIN = env.int(
+    "EXTERNAL_MEDIA_PROXY_MAX_CONCURRENCY_PER_DOMAIN", default=4
+)
+"""
+Maximum number of remote attachments downloaded at the same time from a single domain.
+"""
+EXTERNAL_MEDIA_PROXY_WAIT_TIMEOUT = env.int(
+    "EXTERNAL_MEDIA_PROXY_WAIT_TIMEOUT", default=5
+)
+"""
+Maximum delay in seconds during which a proxy request waits for an ongoing download
+of the same attachment before giving up.
+"""
 PODCASTS_THIRD_PARTY_VISIBILITY = env("PODCASTS_THIRD_PARTY_VISIBILITY", default="me")
 """
 By default, only people who subscribe to a podcast RSS will have access to their episodes.
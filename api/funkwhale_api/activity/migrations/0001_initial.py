@@ -0,0 +1,104 @@
+# Generated by Django 3.0.4 on 2020-04-06 10:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+# Number of recent listenings and favorites to copy in the timeline
+BACKFILL_SIZE = 1000
+
+SOURCES = [
+    ("history.Listening", "history_listening"),
+    ("favorites.TrackFavorite", "favorites_trackfavorite"),
+]
+
+
+def backfill_timeline(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for label, table in SOURCES:
+            cursor.execute(
+                """
+                INSERT INTO activity_timelineentry
+                    (creation_date, user_id, privacy_level, object_type, object_id)
+                SELECT o.creation_date, o.user_id, u.privacy_level, %s, o.id
+                FROM {table} o
+                INNER JOIN users_user u ON u.id = o.user_id
+                WHERE o.creation_date IS NOT NULL
+                ORDER BY o.creation_date DESC
+                LIMIT %s
+                ON CONFLICT DO NOTHING
+                """.format(
+                    table=table
+                ),
+                [label, BACKFILL_SIZE],
+            )
+
+
+def rewind(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("favorites", "0001_initial"),
+        ("history", "0002_auto_20180325_1433"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TimelineEntry",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "creation_date",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "privacy_level",
+                    models.CharField(
+                        choices=[
+                            ("me", "Only me"),
+                            ("followers", "Me and my followers"),
+                            ("instance", "Everyone on my instance, and my followers"),
+                            (
+                                "everyone",
+                                "Everyone, including people on other instances",
+                            ),
+                        ],
+                        default="instance",
+                        max_length=30,
+                    ),
+                ),
+                ("object_type", models.CharField(max_length=100)),
+                ("object_id", models.PositiveIntegerField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="timeline_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={"unique_together": {("object_type", "object_id")}},
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["-creation_date", "-id"], name="activity_timeline_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="timelineentry",
+            index=models.Index(
+                fields=["privacy_level", "-creation_date", "-id"],
+                name="activity_timeline_privacy_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_timeline, rewind),
+    ]
@@ -0,0 +1,74 @@
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from funkwhale_api.common import fields
+
+
+class TimelineEntryQuerySet(models.QuerySet):
+    def visible_by(self, user):
+        return self.filter(fields.privacy_level_query(user))
+
+
+class TimelineEntry(models.Model):
+    """
+    Append-only log of recorded activities (listenings, favorites…), so
+    that recent activity can be read with an indexed range scan instead of
+    merging the source tables on every request. The privacy level of the user
+    is copied on each entry, to filter entries without any join.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    creation_date = models.DateTimeField(default=timezone.now)
+    user = models.ForeignKey(
+        "users.User", related_name="timeline_entries", on_delete=models.CASCADE
+    )
+    privacy_level = fields.get_privacy_field()
+    # label of the recorded model, e.g history.Listening
+    object_type = models.CharField(max_length=100)
+    object_id = models.PositiveIntegerField()
+
+    objects = TimelineEntryQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ("object_type", "object_id")
+        indexes = [
+            models.Index(
+                fields=["-creation_date", "-id"], name="activity_timeline_date_idx"
+            ),
+            models.Index(
+                fields=["privacy_level", "-creation_date", "-id"],
+                name="activity_timeline_privacy_idx",
+            ),
+        ]
+
+    @classmethod
+    def append(cls, obj):
+        entry, _ = cls.objects.get_or_create(
+            object_type=obj._meta.label,
+            object_id=obj.pk,
+            defaults={
+                "user_id": obj.user_id,
+                "privacy_level": obj.user.privacy_level,
+                "creation_date": obj.creation_date or timezone.now(),
+            },
+        )
+        return entry
+
+
+@receiver(post_save, sender="users.User")
+def update_timeline_privacy_level(sender, instance, update_fields, **kwargs):
+    if update_fields is not None and "privacy_level" not in update_fields:
+        return
+    TimelineEntry.objects.filter(user=instance).exclude(
+        privacy_level=instance.privacy_level
+    ).update(privacy_level=instance.privacy_level)
+
+
+@receiver(post_delete, sender="history.Listening")
+@receiver(post_delete, sender="favorites.TrackFavorite")
+def delete_timeline_entry(sender, instance, **kwargs):
+    TimelineEntry.objects.filter(
+        object_type=sender._meta.label, object_id=instance.pk
+    ).delete()
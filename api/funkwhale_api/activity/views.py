@@ -1,19 +1,28 @@
-from rest_framework import viewsets
-from rest_framework.response import Response
+from rest_framework import pagination, viewsets
 
 from funkwhale_api.common.permissions import ConditionalAuthentication
-from funkwhale_api.favorites.models import TrackFavorite
 
-from . import serializers, utils
+from . import models, serializers, utils
+
+
+class TimelinePagination(pagination.CursorPagination):
+    ordering = ("-creation_date", "-id")
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 50
 
 
 class ActivityViewSet(viewsets.GenericViewSet):
 
     serializer_class = serializers.AutoSerializer
     permission_classes = [ConditionalAuthentication]
-    queryset = TrackFavorite.objects.none()
+    pagination_class = TimelinePagination
+    queryset = models.TimelineEntry.objects.all()
 
     def list(self, request, *args, **kwargs):
-        activity = utils.get_activity(user=request.user)
-        serializer = self.serializer_class(activity, many=True)
-        return Response({"results": serializer.data}, status=200)
+        queryset = self.get_queryset().visible_by(request.user)
+        entries = self.paginate_queryset(queryset)
+        serializer = self.serializer_class(
+            utils.load_timeline_objects(entries), many=True
+        )
+        return self.get_paginated_response(serializer.data)
@@ -7,9 +7,10 @@ from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.urls import reverse
 from django.utils import timezone
-from django.db.models.signals import post_delete
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from funkwhale_api.common import response_cache
 from funkwhale_api.federation import keys
 from funkwhale_api.federation import models as federation_models
 from funkwhale_api.federation import utils as federation_utils
@@ -121,3 +122,9 @@ def generate_actor(username, **kwargs):
 def delete_channel_related_objs(instance, **kwargs):
     instance.library.delete()
     instance.artist.delete()
+
+
+@receiver(post_save, sender=Channel)
+@receiver(post_delete, sender=Channel)
+def invalidate_response_cache(sender, instance, **kwargs):
+    response_cache.invalidate("audio")
@@ -13,6 +13,7 @@ from django.utils import timezone
 from funkwhale_api.common import locales
 from funkwhale_api.common import permissions
 from funkwhale_api.common import preferences
+from funkwhale_api.common import response_cache
 from funkwhale_api.common import utils as common_utils
 from funkwhale_api.common.mixins import MultipleLookupDetailMixin
 from funkwhale_api.federation import actors
@@ -41,6 +42,7 @@ class ChannelsMixin(object):
 
 
 class ChannelViewSet(
+    response_cache.ResponseCacheMixin,
     ChannelsMixin,
     MultipleLookupDetailMixin,
     mixins.CreateModelMixin,
@@ -85,6 +87,7 @@ class ChannelViewSet(
     owner_checks = ["write"]
     owner_field = "attributed_to.user"
     owner_exception = exceptions.PermissionDenied
+    response_cache_tags = ["music", "audio"]
 
     def get_serializer_class(self):
         if self.request.method.lower() in ["head", "get", "options"]:
@@ -1,5 +1,6 @@
 import click
 
+from funkwhale_api.common import orphan_files
 from funkwhale_api.music import tasks
 
 from . import base
@@ -22,6 +23,20 @@ def handler_add_tags_from_tracks(
         click.echo("  Relevant tags added to {} objects".format(len(result)))
 
 
+def handler_prune_orphaned_files(prefixes=(), dry_run=False):
+    for prefix in orphan_files.get_prefixes(prefixes):
+        click.echo("Checking {}…".format(prefix.path))
+        result = orphan_files.reconcile(prefix, dry_run=dry_run)
+        click.echo(
+            "  {} files checked, {} orphaned files ({} bytes){}".format(
+                result["checked"],
+                result["orphans"],
+                result["size"],
+                " can be deleted" if dry_run else " deleted",
+            )
+        )
+
+
 @base.cli.group()
 def albums():
     """Manage albums"""
@@ -48,3 +63,25 @@ def artists_add_tags_from_tracks():
     Associate tags to artists with no genre tags, assuming identical tags are found on the artist tracks
     """
     handler_add_tags_from_tracks(artists=True)
+
+
+@base.cli.group()
+def media():
+    """Manage media files"""
+    pass
+
+
+@media.command(name="prune-orphans")
+@click.option(
+    "--prefix",
+    "prefixes",
+    multiple=True,
+    type=click.Choice([prefix.path for prefix in orphan_files.PREFIXES]),
+    help="Only check files under this prefix (default to all prefixes)",
+)
+@click.option("--dry-run/--no-dry-run", default=False)
+def media_prune_orphans(prefixes, dry_run):
+    """
+    Delete media files that aren't referenced by any upload, transcoded version or attachment
+    """
+    handler_prune_orphaned_files(prefixes=prefixes, dry_run=dry_run)
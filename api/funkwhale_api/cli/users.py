@@ -3,6 +3,7 @@ import click
 from django.db import transaction
 
 from funkwhale_api.federation import models as federation_models
+from funkwhale_api.users import auth_cache
 from funkwhale_api.users import models
 from funkwhale_api.users import serializers
 from funkwhale_api.users import tasks
@@ -121,6 +122,8 @@ def handler_update_user(usernames, kwargs):
         models.User.objects.bulk_update(users, ["password"])
     if final_kwargs:
         users.update(**final_kwargs)
+    # bulk updates don't send signals
+    auth_cache.invalidate_on_commit(*users.values_list("pk", flat=True))
     click.echo("Done!")
 
 
@@ -1,6 +1,8 @@
 from django.apps import AppConfig, apps
+from django.db.models.signals import post_delete, post_save
 
 from . import mutations
+from . import preferences
 
 
 class CommonConfig(AppConfig):
@@ -11,3 +13,9 @@ class CommonConfig(AppConfig):
 
         app_names = [app.name for app in apps.app_configs.values()]
         mutations.registry.autodiscover(app_names)
+
+        preference_model = apps.get_model(
+            "dynamic_preferences", "GlobalPreferenceModel"
+        )
+        post_save.connect(preferences.clear_snapshot, sender=preference_model)
+        post_delete.connect(preferences.clear_snapshot, sender=preference_model)
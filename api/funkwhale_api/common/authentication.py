@@ -12,6 +12,8 @@ from rest_framework import exceptions
 from rest_framework_jwt import authentication
 from rest_framework_jwt.settings import api_settings
 
+from funkwhale_api.users import auth_cache
+
 
 def should_verify_email(user):
     if user.is_superuser:
@@ -68,7 +70,9 @@ class BaseJsonWebTokenAuth(object):
             raise exceptions.AuthenticationFailed(msg)
 
         try:
-            user = User.objects.get_by_natural_key(username)
+            user = auth_cache.get_user(
+                ["jwt", username], lambda: User.objects.get_by_natural_key(username)
+            )
         except User.DoesNotExist:
             msg = _("Invalid signature.")
             raise exceptions.AuthenticationFailed(msg)
@@ -1,8 +1,12 @@
+import atexit
+import collections
 import json
 import logging
+import threading
 
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 
 logger = logging.getLogger(__name__)
@@ -11,16 +15,89 @@ group_add = async_to_sync(channel_layer.group_add)
 group_discard = async_to_sync(channel_layer.group_discard)
 
 
-def group_send(group, event):
+class Broadcaster(object):
+    """
+    Buffer events sent to groups, and send them to the channel layer in batches,
+    at most once per group every ``delay`` seconds.
+
+    Events with the same key in the same group replace each other, so only the
+    most recent one is sent (e.g. successive status updates of the same upload).
+    """
+
+    def __init__(self, delay, max_batch_size):
+        self.delay = delay
+        self.max_batch_size = max_batch_size
+        self.lock = threading.Lock()
+        self.timer = None
+        # group -> {key -> event}, keys being unique when no key is provided
+        self.buffer = collections.OrderedDict()
+        self.counter = 0
+
+    def send(self, group, event, key=None):
+        if self.delay <= 0:
+            return send_batch(group, [event])
+
+        with self.lock:
+            events = self.buffer.setdefault(group, collections.OrderedDict())
+            if key is None:
+                self.counter += 1
+                key = self.counter
+            events[key] = event
+            full = len(events) >= self.max_batch_size
+            if full:
+                self.buffer.pop(group)
+            elif self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+        if full:
+            send_batch(group, list(events.values()))
+
+    def flush(self):
+        with self.lock:
+            buffer, self.buffer = self.buffer, collections.OrderedDict()
+            if self.timer:
+                self.timer.cancel()
+            self.timer = None
+
+        for group, events in buffer.items():
+            try:
+                send_batch(group, list(events.values()))
+            except Exception:
+                logger.exception("[channels] Error while dispatching to %s", group)
+
+
+def send_batch(group, events):
+    if len(events) == 1:
+        event = events[0]
+    else:
+        event = {"type": "event.send_batch", "events": events}
+    logger.debug(
+        "[channels] Dispatching %s event(s) to group %s: %s",
+        len(events),
+        group,
+        [{"type": e["data"]["type"]} for e in events],
+    )
+    async_to_sync(channel_layer.group_send)(group, event)
+
+
+broadcaster = Broadcaster(
+    delay=settings.CHANNELS_BROADCAST_DELAY,
+    max_batch_size=settings.CHANNELS_BROADCAST_MAX_BATCH_SIZE,
+)
+# ensure buffered events are sent before the process exits
+atexit.register(broadcaster.flush)
+
+
+def group_send(group, event, key=None):
+    """
+    Send the given event to the group. Events are buffered and sent in batches,
+    and an event replaces any buffered event with the same key in the same group.
+    """
     # we serialize the payload ourselves and deserialize it to ensure it
     # works with msgpack. This is dirty, but we'll find a better solution
     # later
     s = json.dumps(event, cls=DjangoJSONEncoder)
     event = json.loads(s)
-    logger.debug(
-        "[channels] Dispatching %s to group %s: %s",
-        event["type"],
-        group,
-        {"type": event["data"]["type"]},
-    )
-    async_to_sync(channel_layer.group_send)(group, event)
+    broadcaster.send(group, event, key=key)
@@ -18,6 +18,11 @@ class JsonAuthConsumer(JsonWebsocketConsumer):
         for group in groups:
             channels.group_add(group, self.channel_name)
 
+    def event_send_batch(self, message):
+        # cf common.channels.Broadcaster
+        for event in message["events"]:
+            self.dispatch(event)
+
     def disconnect(self, close_code):
         groups = self.scope["user"].get_channels_groups() + self.groups
         for group in groups:
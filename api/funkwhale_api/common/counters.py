@@ -0,0 +1,146 @@
+"""
+Denormalized counters (number of tracks in an album, size of the files uploaded
+by an actor…).
+
+Counters are kept up-to-date on writes, either by applying deltas or by
+refreshing the counters of the affected rows. Because some writes bypass
+signals (bulk updates, raw SQL…), counters are also reconciled periodically
+against their true value, and any drift is fixed and reported.
+"""
+import logging
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_USAGE_STATUSES = ["draft", "pending", "skipped", "errored", "finished"]
+
+RECONCILE_CHUNK_SIZE = 1000
+
+REFRESH_SQL = """
+    UPDATE {table} o SET {assignments} WHERE o.{pk} = ANY(%s)
+"""
+
+RECONCILE_SQL = """
+    WITH computed AS (
+        SELECT o.{pk} AS id, o.{column} AS old_value, ({value}) AS new_value
+        FROM {table} o
+        WHERE o.{pk} > %s
+        ORDER BY o.{pk}
+        LIMIT %s
+    ), updated AS (
+        UPDATE {table} o SET {column} = c.new_value
+        FROM computed c
+        WHERE o.{pk} = c.id AND o.{column} != c.new_value
+        RETURNING abs(c.new_value - c.old_value) AS drift
+    )
+    SELECT
+        (SELECT max(id) FROM computed),
+        (SELECT count(*) FROM updated),
+        (SELECT coalesce(sum(drift), 0) FROM updated)
+"""
+
+
+class Counter(object):
+    def __init__(self, table, column, value, pk="id"):
+        self.table = table
+        self.column = column
+        # a SQL expression returning the true value of the counter
+        # for the row aliased as "o"
+        self.value = value
+        self.pk = pk
+
+
+UPLOAD_USAGE_SQL = """
+    SELECT coalesce(sum(u.size), 0)
+    FROM music_upload u
+    INNER JOIN music_library l ON l.id = u.library_id
+    WHERE l.actor_id = o.actor_id
+    AND u.import_status = '{}'
+    AND u.audio_file IS NOT NULL
+    AND u.audio_file != ''
+"""
+
+COUNTERS = {
+    "music.Artist.albums_count": Counter(
+        "music_artist",
+        "albums_count",
+        "SELECT count(*) FROM music_album a WHERE a.artist_id = o.id",
+    ),
+    "music.Album.tracks_count": Counter(
+        "music_album",
+        "tracks_count",
+        "SELECT count(*) FROM music_track t WHERE t.album_id = o.id",
+    ),
+    "playlists.Playlist.tracks_count": Counter(
+        "playlists_playlist",
+        "tracks_count",
+        "SELECT count(*) FROM playlists_playlisttrack plt WHERE plt.playlist_id = o.id",
+    ),
+    "playlists.Playlist.tracks_duration": Counter(
+        "playlists_playlist",
+        "tracks_duration",
+        """
+        SELECT coalesce(sum(u.duration), 0)
+        FROM playlists_playlisttrack plt
+        INNER JOIN music_upload u ON u.track_id = plt.track_id
+        WHERE plt.playlist_id = o.id
+        """,
+    ),
+}
+for status in UPLOAD_USAGE_STATUSES:
+    COUNTERS["music.ActorUploadUsage.{}".format(status)] = Counter(
+        "music_actoruploadusage",
+        status,
+        UPLOAD_USAGE_SQL.format(status),
+        pk="actor_id",
+    )
+
+
+def refresh(names, ids):
+    """
+    Recompute the given counters, which must belong to the same table,
+    for the rows matching the given ids
+    """
+    counters = [COUNTERS[name] for name in names]
+    table, pk = counters[0].table, counters[0].pk
+    assert all([(c.table, c.pk) == (table, pk) for c in counters])
+    assignments = ", ".join(["{} = ({})".format(c.column, c.value) for c in counters])
+    with connection.cursor() as cursor:
+        cursor.execute(
+            REFRESH_SQL.format(table=table, assignments=assignments, pk=pk),
+            [list(ids)],
+        )
+
+
+def reconcile(name, chunk_size=RECONCILE_CHUNK_SIZE):
+    """
+    Compare the given counter with its true value, for all rows, fix it where
+    needed and return the number of drifted rows, and the total drift
+    """
+    counter = COUNTERS[name]
+    sql = RECONCILE_SQL.format(
+        table=counter.table, column=counter.column, value=counter.value, pk=counter.pk
+    )
+    last_id = 0
+    rows = drift = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [last_id, chunk_size])
+            last_id, chunk_rows, chunk_drift = cursor.fetchone()
+        if last_id is None:
+            break
+        rows += chunk_rows
+        drift += chunk_drift
+    if rows:
+        logger.warning(
+            "Fixed drift on counter %s: %s rows were off, by %s in total",
+            name,
+            rows,
+            drift,
+        )
+    return {"rows": rows, "drift": int(drift)}
+
+
+def reconcile_all(chunk_size=RECONCILE_CHUNK_SIZE):
+    return {name: reconcile(name, chunk_size=chunk_size) for name in COUNTERS}
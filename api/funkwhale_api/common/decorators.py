@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import transaction
 
 from rest_framework import decorators
@@ -14,12 +15,32 @@ from . import tasks
 from . import utils
 
 
-def action_route(serializer_class):
+def action_route(serializer_class, background=False):
+    """
+    Return a view applying the actions of the given ActionSerializer.
+
+    With background=True, actions on more than ``ACTION_JOBS_THRESHOLD`` objects
+    are applied by a background job, and the response includes the job,
+    whose progress is available under /api/v1/manage/jobs/.
+    """
+
     @decorators.action(methods=["post"], detail=False)
     def action(self, request, *args, **kwargs):
         queryset = self.get_queryset()
         serializer = serializer_class(request.data, queryset=queryset)
         serializer.is_valid(raise_exception=True)
+        if background and (
+            serializer.validated_data["count"] > settings.ACTION_JOBS_THRESHOLD
+        ):
+            job = serializer.create_job(created_by=request.user.actor)
+            utils.on_commit(tasks.run_action_job.delay, job_id=job.pk)
+            payload = {
+                "updated": serializer.validated_data["count"],
+                "action": serializer.validated_data["action"].name,
+                "result": None,
+                "job": serializers.ActionJobSerializer(job).data,
+            }
+            return response.Response(payload, status=202)
         result = serializer.save()
         return response.Response(result, status=200)
 
@@ -35,3 +35,14 @@ class CommonFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
 
     class Meta:
         model = "common.Content"
+
+
+@registry.register
+class ActionJobFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
+    created_by = factory.SubFactory(federation_factories.ActorFactory)
+    serializer = "funkwhale_api.manage.serializers.ManageTrackActionSerializer"
+    action = "delete"
+    model = "music.Track"
+
+    class Meta:
+        model = "common.ActionJob"
@@ -6,6 +6,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction
 
 
+from funkwhale_api.common import counters
 from funkwhale_api.federation import keys
 from funkwhale_api.federation import models as federation_models
 from funkwhale_api.music import models as music_models
@@ -253,6 +254,9 @@ class Command(BaseCommand):
         for row in CONFIG:
             self.create_batch(row, results, options, count=options.get(row["id"]))
 
+        # objects are bulk created, so counters need to be recomputed
+        counters.reconcile_all()
+
         self.stdout.write("\nFinal state of database:\n\n")
         for row in CONFIG:
             qs = row.get("queryset", row["model"].objects.all())
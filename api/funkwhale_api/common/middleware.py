@@ -8,6 +8,7 @@ import urllib.parse
 import xml.sax.saxutils
 
 from django import http
+from django.apps import apps
 from django.conf import settings
 from django.core.cache import caches
 from django import urls
@@ -16,6 +17,7 @@ from rest_framework import views
 from funkwhale_api.federation import utils as federation_utils
 
 from . import preferences
+from . import response_cache
 from . import session
 from . import throttling
 from . import utils
@@ -31,8 +33,44 @@ def should_fallback_to_spa(path):
     return not any([path.startswith(m) for m in EXCLUDED_PATHS])
 
 
-def serve_spa(request):
-    html = get_spa_html(settings.FUNKWHALE_SPA_HTML_ROOT)
+def is_spa_path(path):
+    """
+    Return True if the path should be served by the SPA without going through
+    our views, because no Django URL matches it
+    """
+    if not should_fallback_to_spa(path):
+        return False
+    candidates = [path] if path.endswith("/") else [path, path + "/"]
+    for candidate in candidates:
+        try:
+            urls.resolve(candidate)
+        except urls.exceptions.Resolver404:
+            continue
+        # the path matches a view, or will be redirected to one by CommonMiddleware
+        return False
+    return True
+
+
+def get_spa_shell(spa_url):
+    """
+    Return the head and tail of the SPA index.html, split around the closing
+    </head> tag, with the manifest URL rewritten.
+
+    The shell is kept in memory, until a local index.html is modified or
+    for FUNKWHALE_SPA_HTML_CACHE_DURATION seconds with a remote one.
+    """
+    if spa_url.startswith("/"):
+        path = os.path.join(os.path.dirname(spa_url), "index.html")
+        cache_key = "spa-shell:{}:{}".format(spa_url, os.stat(path).st_mtime_ns)
+        timeout = None
+    else:
+        cache_key = "spa-shell:{}".format(spa_url)
+        timeout = settings.FUNKWHALE_SPA_HTML_CACHE_DURATION
+    shell = caches["local"].get(cache_key)
+    if shell:
+        return shell
+
+    html = get_spa_html(spa_url)
     head, tail = html.split("</head>", 1)
     if settings.FUNKWHALE_SPA_REWRITE_MANIFEST:
         new_url = (
@@ -40,6 +78,13 @@ def serve_spa(request):
             or federation_utils.full_url(urls.reverse("api:v1:instance:spa-manifest"))
         )
         head = replace_manifest_url(head, new_url)
+    shell = (head, tail)
+    caches["local"].set(cache_key, shell, timeout)
+    return shell
+
+
+def serve_spa(request):
+    head, tail = get_spa_shell(settings.FUNKWHALE_SPA_HTML_ROOT)
 
     if not preferences.get("common__api_authentication_required"):
         try:
@@ -163,17 +208,62 @@ def render_tags(tags):
         )
 
 
-def get_request_head_tags(request):
+# SPA routes whose head tags are cached, with the tag used for invalidation
+# cf common.response_cache
+SPA_RESPONSE_CACHE_TAGS = {
+    "library_track": "music.track:{pk}",
+    "library_album": "music.album:{pk}",
+    "library_artist": "music.artist:{pk}",
+}
+
+# SPA routes whose head tags are cached along with the modification date
+# of the displayed object, as (model, lookup, date field)
+SPA_RESPONSE_CACHE_VERSIONS = {
+    "library_playlist": ("playlists.Playlist", "pk", "modification_date"),
+}
+
+
+def wants_html(request):
+    """
+    Return False if the client asks for an ActivityPub payload, in which case
+    SPA routes redirect to the matching API view
+    """
     accept_header = request.headers.get("Accept") or None
-    redirect_to_ap = (
-        False
-        if not accept_header
-        else not federation_utils.should_redirect_ap_to_html(accept_header)
-    )
+    if not accept_header:
+        return True
+    return federation_utils.should_redirect_ap_to_html(accept_header)
+
+
+def get_request_head_tags(request):
+    redirect_to_ap = not wants_html(request)
     match = urls.resolve(request.path, urlconf=settings.SPA_URLCONF)
-    return match.func(
-        request, *match.args, redirect_to_ap=redirect_to_ap, **match.kwargs
-    )
+
+    def get_tags():
+        return match.func(
+            request, *match.args, redirect_to_ap=redirect_to_ap, **match.kwargs
+        )
+
+    cache_tag = SPA_RESPONSE_CACHE_TAGS.get(match.url_name)
+    cache_version = SPA_RESPONSE_CACHE_VERSIONS.get(match.url_name)
+    if not (cache_tag or cache_version) or settings.API_RESPONSE_CACHE_DURATION <= 0:
+        return get_tags()
+
+    parts = ["spa", request.path, redirect_to_ap]
+    cache_tags = []
+    if cache_tag:
+        cache_tags.append(cache_tag.format(**match.kwargs))
+    if cache_version:
+        model, lookup, field = cache_version
+        parts.append(
+            str(
+                apps.get_model(model)
+                .objects.filter(**{lookup: match.kwargs[lookup]})
+                .values_list(field, flat=True)
+                .first()
+            )
+        )
+    tags, _ = response_cache.get_or_set(parts, cache_tags, get_tags)
+    return tags
 
 
 def get_custom_css():
@@ -214,6 +304,10 @@ class SPAFallbackMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
+        if is_spa_path(request.path) and wants_html(request):
+            # no need to run the view stack, we know it would return a 404
+            return serve_spa(request)
+
         response = self.get_response(request)
 
         if response.status_code == 404 and should_fallback_to_spa(request.path):
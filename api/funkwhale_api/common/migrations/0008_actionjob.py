@@ -0,0 +1,39 @@
+# Generated by Django 3.0.8 on 2026-10-19 10:00
+
+import django.contrib.postgres.fields.jsonb
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('federation', '0027_incomingactivity'),
+        ('common', '0007_auto_20200116_1610'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('uuid', models.UUIDField(db_index=True, default=uuid.uuid4, unique=True)),
+                ('creation_date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('start_date', models.DateTimeField(blank=True, null=True)),
+                ('finished_date', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('finished', 'Finished'), ('errored', 'Errored'), ('cancelled', 'Cancelled')], default='pending', max_length=30)),
+                ('serializer', models.CharField(max_length=255)),
+                ('action', models.CharField(max_length=100)),
+                ('model', models.CharField(max_length=100)),
+                ('object_ids', django.contrib.postgres.fields.jsonb.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('result', django.contrib.postgres.fields.jsonb.JSONField(default=None, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='action_jobs', to='federation.Actor')),
+            ],
+        ),
+    ]
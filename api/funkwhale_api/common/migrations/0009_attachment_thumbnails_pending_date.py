@@ -0,0 +1,18 @@
+# Generated by Django 3.0.8 on 2026-10-19 15:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("common", "0008_actionjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="attachment",
+            name="thumbnails_pending_date",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
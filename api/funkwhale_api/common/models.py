@@ -1,3 +1,4 @@
+import datetime
 import uuid
 import magic
 import mimetypes
@@ -90,6 +91,34 @@ class LocalFromFidQuerySet:
             return self.filter(~query)
 
 
+class DenormalizedCountersMixin:
+    """
+    Ensure stale in-memory values of denormalized counters aren't written back
+    to the database on save(): counters are only saved when explicitly listed
+    in update_fields (cf funkwhale_api.common.counters).
+    """
+
+    counter_fields = []
+
+    def save(self, *args, **kwargs):
+        # same positional arguments as models.Model.save()
+        kwargs.update(
+            zip(["force_insert", "force_update", "using", "update_fields"], args)
+        )
+        if (
+            not self._state.adding
+            and kwargs.get("update_fields") is None
+            and not kwargs.get("force_insert")
+        ):
+            excluded = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs["update_fields"] = [
+                f.name
+                for f in self._meta.concrete_fields
+                if not f.primary_key and f.attname not in excluded
+            ]
+        return super().save(**kwargs)
+
+
 class GenericTargetQuerySet(models.QuerySet):
     def get_for_target(self, target):
         content_type = ContentType.objects.get_for_model(target)
@@ -169,6 +198,59 @@ class Mutation(models.Model):
         return previous_state
 
 
+ACTION_JOB_STATUS_CHOICES = [
+    ("pending", "Pending"),
+    ("running", "Running"),
+    ("finished", "Finished"),
+    ("errored", "Errored"),
+    ("cancelled", "Cancelled"),
+]
+
+
+class ActionJob(models.Model):
+    """
+    A bulk action (e.g. deleting uploads) applied in the background, in chunks,
+    cf common.tasks.run_action_job
+    """
+
+    uuid = models.UUIDField(unique=True, db_index=True, default=uuid.uuid4)
+    created_by = models.ForeignKey(
+        "federation.Actor",
+        related_name="action_jobs",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
+    creation_date = models.DateTimeField(default=timezone.now, db_index=True)
+    start_date = models.DateTimeField(null=True, blank=True)
+    finished_date = models.DateTimeField(null=True, blank=True)
+    status = models.CharField(
+        max_length=30, choices=ACTION_JOB_STATUS_CHOICES, default="pending"
+    )
+
+    # path to the ActionSerializer subclass and name of the action to apply
+    serializer = models.CharField(max_length=255)
+    action = models.CharField(max_length=100)
+    # e.g music.Upload, and the ids of the objects to apply the action on
+    model = models.CharField(max_length=100)
+    object_ids = JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    result = JSONField(null=True, default=None, encoder=DjangoJSONEncoder)
+    error = models.TextField(null=True, blank=True)
+
+    def get_eta(self):
+        """
+        Estimated date of completion, based on the speed of the job so far
+        """
+        if self.status != "running" or not self.processed or not self.start_date:
+            return None
+        now = timezone.now()
+        remaining = (self.total - self.processed) / self.processed
+        return now + (now - self.start_date) * remaining
+
+
 def get_file_path(instance, filename):
     return utils.ChunkedPath("attachments")(instance, filename)
 
@@ -215,6 +297,8 @@ class Attachment(models.Model):
     # File size
     size = models.IntegerField(null=True, blank=True)
     mimetype = models.CharField(null=True, blank=True, max_length=200)
+    # Set when thumbnails rendering is scheduled, and cleared once it is done
+    thumbnails_pending_date = models.DateTimeField(null=True, blank=True)
 
     file = VersatileImageField(
         upload_to=get_file_path,
@@ -260,9 +344,21 @@ class Attachment(models.Model):
         proxy_url = reverse("api:v1:attachments-proxy", kwargs={"uuid": self.uuid})
         return federation_utils.full_url(proxy_url + "?next=original")
 
+    @property
+    def thumbnails_pending(self):
+        """
+        True when thumbnails rendering is scheduled or in progress for this attachment
+        """
+        if not settings.CREATE_IMAGE_THUMBNAILS or not self.thumbnails_pending_date:
+            return False
+        return self.thumbnails_pending_date > get_thumbnails_pending_limit()
+
     @property
     def download_url_medium_square_crop(self):
         if self.file:
+            if self.thumbnails_pending:
+                # the variant doesn't exist yet, we serve the original image instead
+                return utils.media_url(self.file.url)
             return utils.media_url(self.file.crop["200x200"].url)
         proxy_url = reverse("api:v1:attachments-proxy", kwargs={"uuid": self.uuid})
         return federation_utils.full_url(proxy_url + "?next=medium_square_crop")
@@ -316,16 +412,39 @@ class Content(models.Model):
         return truncated
 
 
+def get_thumbnails_pending_limit():
+    return timezone.now() - datetime.timedelta(
+        seconds=settings.ATTACHMENTS_THUMBNAILS_PENDING_TIMEOUT
+    )
+
+
+def warm_thumbnails(instance_or_queryset):
+    warmer = VersatileImageFieldWarmer(
+        instance_or_queryset=instance_or_queryset,
+        rendition_key_set="attachment_square",
+        image_attr="file",
+    )
+    return warmer.warm()
+
+
 @receiver(models.signals.post_save, sender=Attachment)
 def warm_attachment_thumbnails(sender, instance, **kwargs):
     if not instance.file or not settings.CREATE_IMAGE_THUMBNAILS:
         return
-    warmer = VersatileImageFieldWarmer(
-        instance_or_queryset=instance,
-        rendition_key_set="attachment_square",
-        image_attr="file",
+    from . import tasks
+
+    # rendering happens in a worker. If a render is already pending for this
+    # attachment, there is no need to schedule another one
+    now = timezone.now()
+    scheduled = (
+        Attachment.objects.filter(pk=instance.pk)
+        .exclude(thumbnails_pending_date__gt=get_thumbnails_pending_limit())
+        .update(thumbnails_pending_date=now)
     )
-    num_created, failed_to_create = warmer.warm()
+    if not scheduled:
+        return
+    instance.thumbnails_pending_date = now
+    utils.on_commit(tasks.warm_attachment_thumbnails.delay, attachment_id=instance.pk)
 
 
 @receiver(models.signals.post_save, sender=Mutation)
@@ -0,0 +1,164 @@
+"""
+Reconciliation of media storage with the database, to find and delete files
+that are not referenced by any upload, transcoded version or attachment anymore
+(e.g. because the row was deleted, or an import crashed midway).
+
+Each prefix is walked directory by directory, in a stable order, so it works
+the same with local and S3-compatible storages. Files are checked against the
+database in batches, and the last checked directory is stored in the cache:
+a walk interrupted by its deadline resumes where it stopped on the next run.
+
+Files that were modified recently are never deleted, since the matching row may not
+be committed yet.
+"""
+import datetime
+import logging
+import os
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CURSOR_CACHE_KEY = "common:orphan-files:cursor:{}"
+
+
+class Prefix(object):
+    def __init__(self, path, model, field):
+        self.path = path
+        self.model = model
+        self.field = field
+
+    def __repr__(self):
+        return "<Prefix {}>".format(self.path)
+
+    def get_queryset(self):
+        return apps.get_model(self.model)._base_manager.all()
+
+    def get_existing(self, names):
+        """
+        Return the subset of the given file names that are referenced in the database
+        """
+        return set(
+            self.get_queryset()
+            .filter(**{"{}__in".format(self.field): names})
+            .values_list(self.field, flat=True)
+        )
+
+
+PREFIXES = [
+    Prefix("tracks", "music.Upload", "audio_file"),
+    Prefix("federation_cache/tracks", "music.Upload", "audio_file"),
+    Prefix("transcoded", "music.UploadVersion", "audio_file"),
+    Prefix("attachments", "common.Attachment", "file"),
+]
+
+
+def get_prefixes(paths=None):
+    if not paths:
+        return PREFIXES
+    return [prefix for prefix in PREFIXES if prefix.path in paths]
+
+
+def walk(storage, path, cursor=None):
+    """
+    Yield (directory, file names) for each directory under path, including path
+    itself, in lexicographic order. Directories up to the given cursor (a directory
+    previously returned by walk()) are skipped.
+    """
+    parts = tuple(path.split("/"))
+    cursor = tuple(cursor.split("/")) if cursor else None
+    if cursor and parts < cursor and cursor[: len(parts)] != parts:
+        # the whole tree was already walked
+        return
+    try:
+        dirs, files = storage.listdir(path)
+    except FileNotFoundError:
+        return
+    if not cursor or parts > cursor:
+        yield path, [os.path.join(path, name) for name in sorted(files)]
+    for name in sorted(dirs):
+        yield from walk(storage, os.path.join(path, name), cursor)
+
+
+def is_recent(storage, name, limit):
+    try:
+        return storage.get_modified_time(name) > limit
+    except (FileNotFoundError, NotImplementedError):
+        return True
+
+
+def check_batch(storage, prefix, names, limit, dry_run):
+    existing = prefix.get_existing(names)
+    orphans = [
+        name
+        for name in names
+        if name not in existing and not is_recent(storage, name, limit)
+    ]
+    size = 0
+    for name in orphans:
+        size += storage.size(name)
+        if not dry_run:
+            storage.delete(name)
+    return len(orphans), size
+
+
+def reconcile(
+    prefix, storage=None, batch_size=None, min_age=None, deadline=None, dry_run=False,
+):
+    """
+    Check files under the given prefix against the database, and delete orphaned
+    ones, unless dry_run is True.
+
+    If a deadline (as returned by time.monotonic()) is reached, the walk
+    stops and is resumed on the next call with the same prefix. Dry runs don't
+    store their progress.
+
+    Returns a dict with the number of checked files, the number and size of
+    orphaned files, in bytes, and whether the whole prefix was walked.
+    """
+    storage = storage or default_storage
+    batch_size = batch_size or settings.STORAGE_RECONCILE_BATCH_SIZE
+    if min_age is None:
+        min_age = settings.STORAGE_RECONCILE_MIN_AGE
+    limit = timezone.now() - datetime.timedelta(seconds=min_age)
+    cursor_key = CURSOR_CACHE_KEY.format(prefix.path)
+    cursor = None if dry_run else cache.get(cursor_key)
+    result = {"checked": 0, "orphans": 0, "size": 0, "complete": False}
+
+    batch = []
+    for directory, names in walk(storage, prefix.path, cursor):
+        batch += names
+        if len(batch) < batch_size:
+            continue
+        count, size = check_batch(storage, prefix, batch, limit, dry_run)
+        result["checked"] += len(batch)
+        result["orphans"] += count
+        result["size"] += size
+        batch = []
+        if not dry_run:
+            cache.set(cursor_key, directory, timeout=None)
+        if deadline and time.monotonic() >= deadline:
+            logger.info("[Storage %s] Deadline reached, stopping", prefix.path)
+            return result
+
+    if batch:
+        count, size = check_batch(storage, prefix, batch, limit, dry_run)
+        result["checked"] += len(batch)
+        result["orphans"] += count
+        result["size"] += size
+    if not dry_run:
+        cache.delete(cursor_key)
+    result["complete"] = True
+    logger.info(
+        "[Storage %s] %s files checked, %s orphaned files (%s bytes)",
+        prefix.path,
+        result["checked"],
+        result["orphans"],
+        result["size"],
+    )
+    return result
@@ -1,4 +1,129 @@
-from rest_framework.pagination import PageNumberPagination, _positive_int
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from rest_framework import exceptions
+from rest_framework.pagination import (
+    CursorPagination,
+    PageNumberPagination,
+    _positive_int,
+)
+from rest_framework.response import Response
+
+COUNT_CACHE_KEY = "common:pagination:count:{}"
+
+
+def get_page_size(pagination, request, view):
+    max_page_size = (
+        getattr(view, "max_page_size", 0) or pagination.default_max_page_size
+    )
+    page_size = getattr(view, "default_page_size", 0) or max_page_size
+    if pagination.page_size_query_param:
+        try:
+            return _positive_int(
+                request.query_params[pagination.page_size_query_param],
+                strict=True,
+                cutoff=max_page_size,
+            )
+        except (KeyError, ValueError):
+            pass
+
+    return page_size
+
+
+def get_estimated_count(queryset):
+    """
+    Return the number of rows the planner expects the queryset to return,
+    without actually running it
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def get_count(queryset, allow_exact=True):
+    """
+    Return a (count, is_estimate) tuple for the given queryset.
+
+    Exact counts are cached for a few minutes. When no cached count is available,
+    we only run an exact count if the planner expects a small number of rows
+    and allow_exact is true, and return the planner estimate otherwise.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    key = COUNT_CACHE_KEY.format(
+        hashlib.sha1("{}{}".format(sql, params).encode()).hexdigest()
+    )
+    count = cache.get(key)
+    if count is not None:
+        return count, False
+
+    estimate = get_estimated_count(queryset)
+    if not allow_exact or estimate > settings.PAGINATION_EXACT_COUNT_THRESHOLD:
+        return estimate, True
+
+    count = queryset.count()
+    cache.set(key, count, timeout=settings.PAGINATION_COUNT_CACHE_DURATION)
+    return count, False
+
+
+class FunkwhaleCursorPagination(CursorPagination):
+    """
+    Keyset pagination, used by FunkwhalePagination when a client requests it.
+
+    Only orderings on the fields listed in the view's ``cursor_ordering_fields``
+    are supported, and the returned count is an estimate for big querysets.
+    """
+
+    page_size_query_param = "page_size"
+    default_max_page_size = 50
+
+    def get_page_size(self, request):
+        return get_page_size(self, request, self.view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if hasattr(backend, "get_ordering"):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        ordering = list(ordering or queryset.query.order_by or ["-id"])
+        allowed = set(view.cursor_ordering_fields) | {"id", "pk"}
+        if ordering[0].lstrip("-") not in allowed:
+            raise exceptions.ValidationError(
+                {"ordering": ["This ordering is not supported with cursor pagination"]}
+            )
+        if not {"id", "-id", "pk", "-pk"} & set(ordering):
+            # ensure a stable ordering
+            ordering.append("-id" if ordering[0].startswith("-") else "id")
+        return tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.view = view
+        self.count, self.count_is_estimate = get_count(
+            queryset,
+            # only the first page is allowed to count rows, subsequent pages
+            # reuse the cached count or the planner estimate
+            allow_exact=not request.query_params.get(self.cursor_query_param),
+        )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "count_is_estimate": self.count_is_estimate,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
 
 
 class FunkwhalePagination(PageNumberPagination):
@@ -6,24 +131,23 @@ class FunkwhalePagination(PageNumberPagination):
     default_max_page_size = 50
     default_page_size = None
     view = None
+    cursor_pagination = None
 
     def paginate_queryset(self, queryset, request, view=None):
         self.view = view
+        if (
+            getattr(view, "cursor_ordering_fields", None)
+            and FunkwhaleCursorPagination.cursor_query_param in request.query_params
+        ):
+            # clients opt-in to cursor pagination by sending an empty cursor
+            self.cursor_pagination = FunkwhaleCursorPagination()
+            return self.cursor_pagination.paginate_queryset(queryset, request, view)
         return super().paginate_queryset(queryset, request, view)
 
+    def get_paginated_response(self, data):
+        if self.cursor_pagination:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
     def get_page_size(self, request):
-        max_page_size = (
-            getattr(self.view, "max_page_size", 0) or self.default_max_page_size
-        )
-        page_size = getattr(self.view, "default_page_size", 0) or max_page_size
-        if self.page_size_query_param:
-            try:
-                return _positive_int(
-                    request.query_params[self.page_size_query_param],
-                    strict=True,
-                    cutoff=max_page_size,
-                )
-            except (KeyError, ValueError):
-                pass
-
-        return page_size
+        return get_page_size(self, request, self.view)
@@ -1,8 +1,14 @@
+import collections
 import json
+import time
+import types as python_types
+import uuid
 
 from django import forms
 from django.contrib.postgres.forms import JSONField
 from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
 from dynamic_preferences import serializers, types
 from dynamic_preferences.registries import global_preferences_registry
 
@@ -12,14 +18,71 @@ class DefaultFromSettingMixin(object):
         return getattr(settings, self.setting)
 
 
+SNAPSHOT_VERSION_CACHE_KEY = "common:preferences:version"
+
+Snapshot = collections.namedtuple("Snapshot", ["version", "values", "checked_at"])
+
+# process-local, read-only copy of all global preferences. It is reloaded
+# when the shared version stored in the cache changes, which is checked at most
+# every PREFERENCES_SNAPSHOT_CHECK_INTERVAL seconds
+_snapshot = None
+
+
+def get_version():
+    version = cache.get(SNAPSHOT_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(SNAPSHOT_VERSION_CACHE_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(SNAPSHOT_VERSION_CACHE_KEY)
+    return version
+
+
+def get_snapshot():
+    global _snapshot
+    snapshot = _snapshot
+    now = time.monotonic()
+    if (
+        snapshot
+        and now - snapshot.checked_at < settings.PREFERENCES_SNAPSHOT_CHECK_INTERVAL
+    ):
+        return snapshot.values
+
+    version = get_version()
+    if snapshot and snapshot.version == version:
+        values = snapshot.values
+    else:
+        manager = global_preferences_registry.manager()
+        values = python_types.MappingProxyType(dict(manager.all()))
+    _snapshot = Snapshot(version=version, values=values, checked_at=now)
+    return values
+
+
+def invalidate_snapshot():
+    global _snapshot
+    _snapshot = None
+    cache.delete(SNAPSHOT_VERSION_CACHE_KEY)
+
+
+def clear_snapshot(**kwargs):
+    """
+    Ensure preferences are reloaded on next access, in this process and others.
+
+    The snapshot is invalidated now, and once the current transaction is committed,
+    to discard snapshots loaded by concurrent processes from not yet committed data
+    """
+    invalidate_snapshot()
+    transaction.on_commit(invalidate_snapshot)
+
+
 def get(pref):
-    manager = global_preferences_registry.manager()
-    return manager[pref]
+    try:
+        return get_snapshot()[pref]
+    except KeyError:
+        manager = global_preferences_registry.manager()
+        return manager[pref]
 
 
 def all():
-    manager = global_preferences_registry.manager()
-    return manager.all()
+    return get_snapshot()
 
 
 def set(pref, value):
@@ -0,0 +1,184 @@
+"""
+Cache of serialized API responses for anonymous reads.
+
+Each cached response depends on tags, such as ``music.artist:42`` or ``music``.
+Each tag has a version stored in the cache, which is part of the response cache key.
+Invalidating a tag changes its version, making all responses depending on it
+unreachable (they expire on their own).
+"""
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.response import Response
+
+from . import utils as common_utils
+
+RESPONSE_CACHE_KEY = "common:response-cache:{}"
+TAG_VERSION_CACHE_KEY = "common:response-cache:tag:{}"
+STATS_CACHE_KEY = "common:response-cache:stats:{}"
+
+# all responses depend on this tag, e.g to invalidate everything when
+# moderation rules change
+GLOBAL_TAG = "all"
+
+# requests with these query parameters have side effects and are never cached
+BYPASS_PARAMS = ["refresh"]
+
+
+def get_tag_versions(tags):
+    keys = [TAG_VERSION_CACHE_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, uuid.uuid4().hex[:12], timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def delete_tag_versions(*tags):
+    cache.delete_many([TAG_VERSION_CACHE_KEY.format(tag) for tag in tags])
+
+
+def invalidate(*tags):
+    """
+    Invalidate the given tags now, and once the current transaction is committed,
+    to discard responses cached by concurrent requests from not yet committed data
+    """
+    delete_tag_versions(*tags)
+    common_utils.on_commit(delete_tag_versions, *tags)
+
+
+def record(name):
+    key = STATS_CACHE_KEY.format(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # key was evicted in the meantime
+        pass
+
+
+def get_stats():
+    return {
+        name: cache.get(STATS_CACHE_KEY.format(name)) or 0
+        for name in ["hits", "misses"]
+    }
+
+
+def is_cacheable(request):
+    if settings.API_RESPONSE_CACHE_DURATION <= 0:
+        return False
+    if request.method != "GET":
+        return False
+    if request.user.is_authenticated or getattr(request, "actor", None):
+        return False
+    return not any([p in request.query_params for p in BYPASS_PARAMS])
+
+
+def get_key(parts, tags):
+    parts = list(parts) + [get_tag_versions([GLOBAL_TAG] + list(tags))]
+    digest = hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+    return RESPONSE_CACHE_KEY.format(digest)
+
+
+def get_or_set(parts, tags, get_value):
+    """
+    Return a (value, hit) tuple, calling get_value() to compute and cache
+    the value if needed. Values are cached only if they are not None.
+    """
+    key = get_key(parts, tags)
+    value = cache.get(key)
+    if value is not None:
+        record("hits")
+        return value, True
+
+    record("misses")
+    value = get_value()
+    if value is not None:
+        cache.set(key, value, timeout=settings.API_RESPONSE_CACHE_DURATION)
+    return value, False
+
+
+def get_request_parts(request):
+    return [
+        request.path,
+        sorted(
+            [(k, sorted(request.query_params.getlist(k))) for k in request.query_params]
+        ),
+        getattr(request.accepted_renderer, "format", None),
+        # the visibility class of the response, cf is_cacheable()
+        "anonymous",
+    ]
+
+
+def get_etag(body):
+    return '"{}"'.format(hashlib.sha1(body.encode()).hexdigest())
+
+
+def get_response(request, tags, get_response):
+    """
+    Return a cached response for the request if any, or call get_response()
+    and cache its data. Responses carry an ETag, and a 304 is returned
+    if the client already has the current version.
+    """
+    if not is_cacheable(request):
+        return get_response()
+
+    responses = []
+
+    def get_value():
+        response = get_response()
+        responses.append(response)
+        if response.status_code != 200 or getattr(response, "data", None) is None:
+            return
+        # we store the data as JSON, which is also used to compute the ETag
+        body = json.dumps(response.data, cls=DjangoJSONEncoder)
+        return {"body": body, "etag": get_etag(body)}
+
+    cached, hit = get_or_set(get_request_parts(request), tags, get_value)
+    if cached is None:
+        # uncacheable response
+        return responses[0]
+    if hit:
+        response = Response(json.loads(cached["body"]))
+    else:
+        response = responses[0]
+    status = "HIT" if hit else "MISS"
+
+    if request.headers.get("If-None-Match") == cached["etag"]:
+        response = Response(status=304)
+    response["ETag"] = cached["etag"]
+    response["X-Cache"] = status
+    return response
+
+
+class ResponseCacheMixin(object):
+    """
+    Cache list and retrieve responses for anonymous requests.
+
+    Lists depend on ``response_cache_tags``, and details on
+    ``response_cache_detail_tag``, formatted with the view kwargs, if any.
+    """
+
+    response_cache_tags = []
+    response_cache_detail_tag = None
+
+    def list(self, request, *args, **kwargs):
+        parent = super().list
+        return get_response(
+            request, self.response_cache_tags, lambda: parent(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        parent = super().retrieve
+        if not self.response_cache_detail_tag:
+            return parent(request, *args, **kwargs)
+        return get_response(
+            request,
+            [self.response_cache_detail_tag.format(**kwargs)],
+            lambda: parent(request, *args, **kwargs),
+        )
@@ -1,31 +1,33 @@
 """
-Compute different sizes of image used for Album covers and User avatars
-"""
+Compute different sizes of image used for Album covers and User avatars.
 
-from versatileimagefield.image_warmer import VersatileImageFieldWarmer
+Attachments are split in batches that are rendered in parallel by Celery workers.
+"""
 
+from funkwhale_api.common import tasks
 from funkwhale_api.common.models import Attachment
 
 
-MODELS = [
-    (Attachment, "file", "attachment_square"),
-]
+BATCH_SIZE = 100
 
 
 def main(command, **kwargs):
-    for model, attribute, key_set in MODELS:
-        qs = model.objects.exclude(**{"{}__isnull".format(attribute): True})
-        qs = qs.exclude(**{attribute: ""})
-        warmer = VersatileImageFieldWarmer(
-            instance_or_queryset=qs,
-            rendition_key_set=key_set,
-            image_attr=attribute,
-            verbose=True,
-        )
-        command.stdout.write(
-            "Creating images for {} / {}".format(model.__name__, attribute)
-        )
-        num_created, failed_to_create = warmer.warm()
-        command.stdout.write(
-            "  {} created, {} in error".format(num_created, len(failed_to_create))
+    qs = Attachment.objects.exclude(file__isnull=True).exclude(file="")
+    ids = qs.order_by("pk").values_list("pk", flat=True)
+    total = 0
+    batch = []
+    for pk in ids.iterator():
+        batch.append(pk)
+        if len(batch) == BATCH_SIZE:
+            tasks.warm_attachments_thumbnails_batch.delay(attachment_ids=batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        tasks.warm_attachments_thumbnails_batch.delay(attachment_ids=batch)
+        total += len(batch)
+
+    command.stdout.write(
+        "Scheduled thumbnails creation for {} attachments, in batches of {}".format(
+            total, BATCH_SIZE
         )
+    )
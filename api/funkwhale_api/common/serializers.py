@@ -176,6 +176,48 @@ class ActionSerializer(serializers.Serializer):
         }
         return payload
 
+    def create_job(self, created_by=None):
+        """
+        Create a job to apply the action in the background, in chunks,
+        instead of calling the handler directly
+        """
+        objects = self.validated_data["objects"]
+        ids = list(objects.values_list(self.pk_field, flat=True))
+        return models.ActionJob.objects.create(
+            created_by=created_by,
+            serializer="{}.{}".format(
+                self.__class__.__module__, self.__class__.__name__
+            ),
+            action=self.validated_data["action"].name,
+            model=objects.model._meta.label,
+            object_ids=ids,
+            total=len(ids),
+        )
+
+
+class ActionJobSerializer(serializers.ModelSerializer):
+    eta = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.ActionJob
+        fields = [
+            "uuid",
+            "creation_date",
+            "start_date",
+            "finished_date",
+            "status",
+            "action",
+            "total",
+            "processed",
+            "result",
+            "error",
+            "eta",
+        ]
+
+    def get_eta(self, o):
+        eta = o.get_eta()
+        return eta.isoformat() if eta else None
+
 
 def track_fields_for_update(*fields):
     """
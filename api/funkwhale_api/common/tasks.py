@@ -1,20 +1,31 @@
+import collections
+import contextlib
 import datetime
 import logging
 import tempfile
+import time
+import urllib.parse
 
+from django.apps import apps
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files import File
 from django.db import transaction
+from django.db.models import Q
 from django.dispatch import receiver
 from django.utils import timezone
+from django.utils.module_loading import import_string
 
 from funkwhale_api.common import channels
+from funkwhale_api.common import counters
+from funkwhale_api.common import orphan_files
 from funkwhale_api.taskapp import celery
 
 from . import models
 from . import serializers
 from . import session
 from . import signals
+from . import utils
 
 logger = logging.getLogger(__name__)
 
@@ -86,6 +97,171 @@ def fetch_remote_attachment(attachment, filename=None, save=True):
             attachment.file.save(filename, File(tf), save=save)
 
 
+REMOTE_ATTACHMENT_FETCH_LOCK_CACHE_KEY = "common:remote-attachment-fetch-lock:{}"
+REMOTE_ATTACHMENT_FETCH_FAILURE_CACHE_KEY = "common:remote-attachment-fetch-failure:{}"
+REMOTE_ATTACHMENT_FETCH_DOMAIN_CACHE_KEY = "common:remote-attachment-fetch-domain:{}"
+# lock and domain counters expire by themselves if a worker dies during a download
+REMOTE_ATTACHMENT_FETCH_LOCK_TIMEOUT = 60
+
+FETCH_OK = "ok"
+FETCH_FAILED = "failed"
+FETCH_BUSY = "busy"
+
+
+@contextlib.contextmanager
+def remote_attachment_fetch_slot(domain):
+    """
+    Yield True if a download slot is available for the given domain, False otherwise,
+    to cap the number of concurrent downloads from a single domain.
+    """
+    key = REMOTE_ATTACHMENT_FETCH_DOMAIN_CACHE_KEY.format(domain)
+    cache.add(key, 0, timeout=REMOTE_ATTACHMENT_FETCH_LOCK_TIMEOUT)
+    try:
+        current = cache.incr(key)
+    except ValueError:
+        # the counter expired in the meantime
+        cache.add(key, 1, timeout=REMOTE_ATTACHMENT_FETCH_LOCK_TIMEOUT)
+        current = 1
+    else:
+        # keep the counter alive as long as downloads are started for this domain,
+        # otherwise it could expire, and be reset, while slots are still in use
+        cache.touch(key, REMOTE_ATTACHMENT_FETCH_LOCK_TIMEOUT)
+    try:
+        yield current <= settings.EXTERNAL_MEDIA_PROXY_MAX_CONCURRENCY_PER_DOMAIN
+    finally:
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+
+
+def fetch_remote_attachment_once(attachment, wait_timeout=0):
+    """
+    Download the remote file of an attachment, ensuring only one download
+    of a given attachment is running at any time, and that broken urls
+    aren't requested on every call.
+
+    When a download of the same attachment is already in progress, wait up to
+    ``wait_timeout`` seconds for it to complete.
+
+    Returns FETCH_OK if the file is available, FETCH_FAILED if the download failed
+    (now or recently), and FETCH_BUSY if the download couldn't be attempted now.
+    """
+    if attachment.file:
+        return FETCH_OK
+    failure_key = REMOTE_ATTACHMENT_FETCH_FAILURE_CACHE_KEY.format(attachment.pk)
+    if cache.get(failure_key):
+        return FETCH_FAILED
+
+    lock_key = REMOTE_ATTACHMENT_FETCH_LOCK_CACHE_KEY.format(attachment.pk)
+    if not cache.add(lock_key, True, timeout=REMOTE_ATTACHMENT_FETCH_LOCK_TIMEOUT):
+        # someone else is downloading this file, wait for the download to complete
+        deadline = time.monotonic() + wait_timeout
+        while time.monotonic() < deadline and cache.get(lock_key):
+            time.sleep(0.1)
+        attachment.refresh_from_db(fields=["file", "last_fetch_date"])
+        if attachment.file:
+            return FETCH_OK
+        if cache.get(failure_key):
+            return FETCH_FAILED
+        return FETCH_BUSY
+
+    fetched = False
+    try:
+        domain = urllib.parse.urlparse(attachment.url).hostname
+        with remote_attachment_fetch_slot(domain) as available:
+            if not available:
+                return FETCH_BUSY
+            try:
+                fetch_remote_attachment(attachment)
+            except Exception:
+                logger.exception("Error while fetching attachment %s", attachment.url)
+                cache.set(
+                    failure_key,
+                    True,
+                    timeout=settings.EXTERNAL_MEDIA_PROXY_FAILURE_CACHE_DURATION,
+                )
+                return FETCH_FAILED
+            fetched = True
+    finally:
+        if fetched:
+            # waiters read the file from the database, so the lock is only released
+            # once the attachment is committed (e.g. at the end of the request)
+            utils.on_commit(cache.delete, lock_key)
+        else:
+            cache.delete(lock_key)
+    return FETCH_OK
+
+
+@celery.app.task(name="common.fetch_remote_attachments")
+def fetch_remote_attachments(attachment_ids):
+    """
+    Download remote attachments in the background, so they are available
+    locally when clients request them through the proxy
+    """
+    queryset = models.Attachment.objects.filter(
+        Q(file=None) | Q(file=""), pk__in=attachment_ids
+    )
+    results = collections.Counter(
+        fetch_remote_attachment_once(attachment) for attachment in queryset
+    )
+    logger.info("Remote attachments fetched: %s", dict(results))
+    return dict(results)
+
+
+def prefetch_remote_attachments(attachments):
+    """
+    Enqueue the download of the given remote attachments that aren't available
+    locally yet
+    """
+    if not settings.EXTERNAL_MEDIA_PROXY_ENABLED:
+        return
+    ids = [a.pk for a in attachments if a and a.url and not a.file]
+    # skip attachments that are being downloaded or that are known to be broken
+    keys = {}
+    for pk in ids:
+        keys[REMOTE_ATTACHMENT_FETCH_LOCK_CACHE_KEY.format(pk)] = pk
+        keys[REMOTE_ATTACHMENT_FETCH_FAILURE_CACHE_KEY.format(pk)] = pk
+    skipped = {keys[key] for key in cache.get_many(list(keys))}
+    ids = [pk for pk in ids if pk not in skipped]
+    if ids:
+        utils.on_commit(fetch_remote_attachments.delay, attachment_ids=ids)
+
+
+@celery.app.task(name="common.warm_attachment_thumbnails")
+@celery.require_instance(
+    models.Attachment.objects.exclude(file=None).exclude(file=""), "attachment"
+)
+def warm_attachment_thumbnails(attachment):
+    try:
+        num_created, failed_to_create = models.warm_thumbnails(attachment)
+    finally:
+        models.Attachment.objects.filter(pk=attachment.pk).update(
+            thumbnails_pending_date=None
+        )
+    if failed_to_create:
+        logger.warning("Could not create thumbnails for attachment %s", attachment.pk)
+    return num_created
+
+
+@celery.app.task(name="common.warm_attachments_thumbnails_batch")
+def warm_attachments_thumbnails_batch(attachment_ids):
+    """
+    Render thumbnails for a batch of attachments, used to process all
+    attachments in parallel on multiple workers
+    """
+    queryset = (
+        models.Attachment.objects.filter(pk__in=attachment_ids)
+        .exclude(file=None)
+        .exclude(file="")
+    )
+    num_created, failed_to_create = models.warm_thumbnails(queryset)
+    logger.info(
+        "%s thumbnails created, %s in error", num_created, len(failed_to_create)
+    )
+    return num_created
+
+
 @celery.app.task(name="common.prune_unattached_attachments")
 def prune_unattached_attachments():
     limit = timezone.now() - datetime.timedelta(
@@ -99,3 +275,128 @@ def prune_unattached_attachments():
     logger.info("Deleting %s unattached attachments…", total)
     result = candidates.delete()
     logger.info("Deletion done: %s", result)
+
+
+@celery.app.task(name="common.reconcile_counters")
+def reconcile_counters():
+    """
+    Fix and report any drift between denormalized counters and their true value
+    """
+    report = counters.reconcile_all()
+    drifted = {name: r for name, r in report.items() if r["rows"]}
+    logger.info(
+        "Counters reconciled, %s/%s counters had drifted", len(drifted), len(report)
+    )
+    return report
+
+
+@celery.app.task(name="common.reconcile_storage")
+def reconcile_storage(prefixes=None, dry_run=False, max_duration=None):
+    """
+    Delete files from the media storage that are not referenced in the database
+    anymore, cf common.orphan_files. The given max_duration is shared between
+    prefixes, and the next run resumes the walk where it stopped.
+    """
+    max_duration = max_duration or settings.STORAGE_RECONCILE_MAX_DURATION
+    deadline = time.monotonic() + max_duration
+    report = {}
+    for prefix in orphan_files.get_prefixes(prefixes):
+        if time.monotonic() >= deadline:
+            break
+        report[prefix.path] = orphan_files.reconcile(
+            prefix, deadline=deadline, dry_run=dry_run
+        )
+    logger.info(
+        "Storage reconciled%s, %s orphaned files (%s bytes)",
+        " (dry run)" if dry_run else "",
+        sum([r["orphans"] for r in report.values()]),
+        sum([r["size"] for r in report.values()]),
+    )
+    return report
+
+
+def merge_action_results(previous, result):
+    """
+    Sum the results of an action on successive chunks, when these results are
+    counts, as returned by QuerySet.update() or QuerySet.delete()
+    """
+    if isinstance(result, int):
+        return (previous or 0) + result
+    if isinstance(result, tuple) and len(result) == 2:
+        total, counts = previous or [0, {}]
+        counts = dict(counts)
+        for label, count in result[1].items():
+            counts[label] = counts.get(label, 0) + count
+        return [total + result[0], counts]
+    return None
+
+
+def broadcast_action_job(job):
+    user = getattr(job.created_by, "user", None) if job.created_by else None
+    if not user:
+        return
+    channels.group_send(
+        "user.{}.jobs".format(user.pk),
+        {
+            "type": "event.send",
+            "text": "",
+            "data": {
+                "type": "action_job.updated",
+                "job": serializers.ActionJobSerializer(job).data,
+            },
+        },
+        key="action_job.updated.{}".format(job.uuid),
+    )
+
+
+@celery.app.task(name="common.run_action_job")
+@celery.require_instance(models.ActionJob.objects.select_related("created_by"), "job")
+def run_action_job(job, chunk_size=None):
+    """
+    Apply the action of the job on its objects, in chunks committed one by one.
+    The job can be cancelled between chunks, and resumed from the last committed
+    chunk if the worker was interrupted.
+    """
+    if job.status not in ["pending", "running"]:
+        logger.info("Skipping job %s with status %s", job.uuid, job.status)
+        return
+
+    chunk_size = chunk_size or settings.ACTION_JOBS_CHUNK_SIZE
+    serializer_class = import_string(job.serializer)
+    model = apps.get_model(job.model)
+    serializer = serializer_class(queryset=model.objects.all())
+    handler = getattr(serializer, "handle_{}".format(job.action))
+    lookup = "{}__in".format(serializer.pk_field)
+
+    job.status = "running"
+    job.start_date = job.start_date or timezone.now()
+    job.save(update_fields=["status", "start_date"])
+    broadcast_action_job(job)
+    try:
+        while job.processed < job.total:
+            if models.ActionJob.objects.filter(pk=job.pk, status="cancelled").exists():
+                logger.info("Job %s was cancelled", job.uuid)
+                job.refresh_from_db()
+                broadcast_action_job(job)
+                return
+            ids = job.object_ids[job.processed : job.processed + chunk_size]
+            with transaction.atomic():
+                result = handler(model.objects.filter(**{lookup: ids}))
+                job.result = merge_action_results(job.result, result)
+                job.processed += len(ids)
+                job.save(update_fields=["processed", "result"])
+            broadcast_action_job(job)
+    except Exception as e:
+        logger.exception("Error while running job %s", job.uuid)
+        job.status = "errored"
+        job.error = str(e)
+    else:
+        job.status = "finished"
+    job.finished_date = timezone.now()
+    # we don't override a cancellation that happened during the last chunk
+    models.ActionJob.objects.filter(pk=job.pk, status="running").update(
+        status=job.status, error=job.error, finished_date=job.finished_date
+    )
+    job.refresh_from_db()
+    broadcast_action_job(job)
+    return {"processed": job.processed, "status": job.status}
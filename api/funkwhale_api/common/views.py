@@ -164,7 +164,6 @@ class AttachmentViewSet(
     @action(
         detail=True, methods=["get"], permission_classes=[], authentication_classes=[]
     )
-    @transaction.atomic
     def proxy(self, request, *args, **kwargs):
         instance = self.get_object()
         if not settings.EXTERNAL_MEDIA_PROXY_ENABLED:
@@ -176,11 +175,15 @@ class AttachmentViewSet(
         if size not in ["original", "medium_square_crop"]:
             size = "original"
 
-        try:
-            tasks.fetch_remote_attachment(instance)
-        except Exception:
-            logger.exception("Error while fetching attachment %s", instance.url)
-            return response.Response(status=500)
+        result = tasks.fetch_remote_attachment_once(
+            instance, wait_timeout=settings.EXTERNAL_MEDIA_PROXY_WAIT_TIMEOUT
+        )
+        if result == tasks.FETCH_FAILED:
+            return response.Response(status=404)
+        if result == tasks.FETCH_BUSY:
+            r = response.Response(status=503)
+            r["Retry-After"] = "5"
+            return r
         data = self.serializer_class(instance).data
         redirect = response.Response(status=302)
         redirect["Location"] = data["urls"][size]
@@ -1,3 +1,4 @@
+from funkwhale_api.activity import models as activity_models
 from funkwhale_api.activity import record
 from funkwhale_api.common import channels
 
@@ -14,3 +15,8 @@ def broadcast_track_favorite_to_instance_activity(data, obj):
     channels.group_send(
         "instance_activity", {"type": "event.send", "text": "", "data": data}
     )
+
+
+@record.registry.register_consumer("favorites.TrackFavorite")
+def add_track_favorite_to_timeline(data, obj):
+    activity_models.TimelineEntry.append(obj)
@@ -1,3 +1,4 @@
+import collections
 import uuid
 import logging
 import urllib.parse
@@ -117,17 +118,17 @@ def should_reject(fid, actor_id=None, payload={}):
     return policies.filter(query).exists()
 
 
-@transaction.atomic
-def receive(activity, on_behalf_of, inbox_actor=None):
-    from . import models
+def prepare_incoming(activity, on_behalf_of, inbox_actor=None):
+    """
+    Ensure an incoming activity is valid and can be handled, and apply the MRF.
+
+    Returns a (serializer, payload) tuple, or None if the activity should be
+    discarded. Raises a ValidationError if the activity is invalid.
+    """
     from . import serializers
-    from . import tasks
     from .routes import inbox
     from funkwhale_api.moderation import mrf
 
-    logger.debug(
-        "[federation] Received activity from %s : %s", on_behalf_of.fid, activity
-    )
     # we ensure the activity has the bare minimum structure before storing
     # it in our database
     serializer = serializers.BaseActivitySerializer(
@@ -155,6 +156,22 @@ def receive(activity, on_behalf_of, inbox_actor=None):
         )
         return
 
+    return serializer, payload
+
+
+@transaction.atomic
+def receive(activity, on_behalf_of, inbox_actor=None):
+    from . import models
+    from . import tasks
+
+    logger.debug(
+        "[federation] Received activity from %s : %s", on_behalf_of.fid, activity
+    )
+    prepared = prepare_incoming(activity, on_behalf_of, inbox_actor)
+    if not prepared:
+        return
+    serializer, payload = prepared
+
     try:
         copy = serializer.save(payload=payload, type=payload["type"])
     except IntegrityError:
@@ -193,6 +210,103 @@ def receive(activity, on_behalf_of, inbox_actor=None):
     return copy
 
 
+INBOX_BATCH_SCHEDULED_CACHE_KEY = "federation:inbox-batch-scheduled"
+
+
+def enqueue_incoming(activity, on_behalf_of, inbox_actor=None):
+    """
+    Store an incoming activity for later processing by receive_batch, and
+    schedule the processing of the current batch if needed.
+    """
+    from . import models
+    from . import tasks
+
+    logger.debug(
+        "[federation] Queuing activity from %s : %s", on_behalf_of.fid, activity
+    )
+    incoming = models.IncomingActivity.objects.create(
+        payload=activity, on_behalf_of=on_behalf_of, inbox_actor=inbox_actor
+    )
+    delay = settings.FEDERATION_INBOX_BATCH_DELAY
+    if cache.add(INBOX_BATCH_SCHEDULED_CACHE_KEY, True, timeout=max(delay, 1)):
+        funkwhale_utils.on_commit(
+            tasks.process_incoming_activities.apply_async, countdown=delay
+        )
+    return incoming
+
+
+def receive_batch(incoming_activities):
+    """
+    Validate and store a batch of incoming activities, then dispatch them.
+
+    Activities are deduplicated by id, and local recipients for the whole
+    batch are resolved with a few queries.
+    """
+    from . import models
+    from . import tasks
+
+    fids = {
+        i.payload.get("id") for i in incoming_activities if isinstance(i.payload, dict)
+    }
+    seen = set(
+        models.Activity.objects.filter(fid__in=[f for f in fids if f]).values_list(
+            "fid", flat=True
+        )
+    )
+    received = []
+    for incoming in incoming_activities:
+        fid = incoming.payload.get("id") if isinstance(incoming.payload, dict) else None
+        if fid and fid in seen:
+            logger.info("[federation] Discarding already delivered activity %s", fid)
+            continue
+        try:
+            # validation may hit the database (e.g. to fetch remote actors), so each
+            # activity gets its own savepoint, and a failure doesn't abort the batch
+            with transaction.atomic():
+                prepared = prepare_incoming(
+                    incoming.payload, incoming.on_behalf_of, incoming.inbox_actor
+                )
+                if not prepared:
+                    continue
+                serializer, payload = prepared
+                copy = serializer.save(payload=payload, type=payload["type"])
+        except IntegrityError:
+            logger.info("[federation] Discarding already delivered activity %s", fid)
+            continue
+        except Exception:
+            logger.exception(
+                "[federation] Discarding invalid activity from %s",
+                incoming.on_behalf_of.fid,
+            )
+            continue
+        if fid:
+            seen.add(fid)
+        received.append((copy, serializer.validated_data, incoming.inbox_actor))
+
+    urls = set()
+    for _, data, _ in received:
+        urls |= set(data.get("to", [])) | set(data.get("cc", []))
+    recipients_by_url = get_local_actors_by_audience(urls)
+
+    inbox_items = []
+    for copy, data, inbox_actor in received:
+        for type in ["to", "cc"]:
+            recipients = set()
+            for url in data.get(type, []):
+                recipients |= recipients_by_url.get(url, set())
+            if type == "to" and inbox_actor:
+                recipients.add(inbox_actor.pk)
+            for r in sorted(recipients):
+                inbox_items.append(
+                    models.InboxItem(actor_id=r, type=type, activity=copy)
+                )
+    models.InboxItem.objects.bulk_create(inbox_items)
+
+    for copy, _, _ in received:
+        funkwhale_utils.on_commit(tasks.dispatch_inbox.delay, activity_id=copy.pk)
+    return [copy for copy, _, _ in received]
+
+
 class Router:
     def __init__(self):
         self.routes = []
@@ -566,3 +680,29 @@ def get_actors_from_audience(urls):
     if not final_query:
         return models.Actor.objects.none()
     return models.Actor.objects.filter(final_query)
+
+
+def get_local_actors_by_audience(urls):
+    """
+    Same as get_actors_from_audience, but for many urls at once, and restricted
+    to local actors.
+
+    Returns a dict mapping each url to the set of matching local actor ids.
+    """
+    from . import models
+
+    urls = [url for url in urls if isinstance(url, str) and url != PUBLIC_ADDRESS]
+    result = collections.defaultdict(set)
+    if not urls:
+        return result
+
+    local_actors = models.Actor.objects.local()
+    for fid, pk in local_actors.filter(fid__in=urls).values_list("fid", "pk"):
+        result[fid].add(pk)
+    for follow_model in [models.Follow, models.LibraryFollow]:
+        follows = follow_model.objects.filter(
+            target__followers_url__in=urls, approved=True, actor__in=local_actors
+        )
+        for url, pk in follows.values_list("target__followers_url", "actor_id"):
+            result[url].add(pk)
+    return result
@@ -86,6 +86,13 @@ class InboxItemAdmin(admin.ModelAdmin):
     list_select_related = True
 
 
+@admin.register(models.IncomingActivity)
+class IncomingActivityAdmin(admin.ModelAdmin):
+    list_display = ["id", "on_behalf_of", "inbox_actor", "creation_date"]
+    search_fields = ["payload", "on_behalf_of__fid"]
+    list_select_related = True
+
+
 @admin.register(models.Delivery)
 class DeliveryAdmin(admin.ModelAdmin):
     list_display = [
@@ -1,14 +1,12 @@
 import cryptography
 import logging
-import datetime
 import urllib.parse
 from django.contrib.auth.models import AnonymousUser
-from django.utils import timezone
 
 from rest_framework import authentication, exceptions as rest_exceptions
 from funkwhale_api.common import preferences
 from funkwhale_api.moderation import models as moderation_models
-from . import actors, exceptions, keys, models, signing, tasks, utils
+from . import actors, exceptions, keys, models, nodeinfo, signing, utils
 
 
 logger = logging.getLogger(__name__)
@@ -75,14 +73,8 @@ class SignatureAuthentication(authentication.BaseAuthentication):
             signing.verify_django(request, actor.public_key.encode("utf-8"))
 
         # we trigger a nodeinfo update on the actor's domain, if needed
-        fetch_delay = 24 * 3600
-        now = timezone.now()
-        last_fetch = actor.domain.nodeinfo_fetch_date
-        if not last_fetch or (
-            last_fetch < (now - datetime.timedelta(seconds=fetch_delay))
-        ):
-            tasks.update_domain_nodeinfo(domain_name=actor.domain.name)
-            actor.domain.refresh_from_db()
+        if nodeinfo.needs_refresh(actor.domain):
+            nodeinfo.schedule_refresh(actor.domain.name)
         return actor
 
     def authenticate(self, request):
@@ -224,6 +224,21 @@ class InboxItemFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
         model = "federation.InboxItem"
 
 
+@registry.register
+class IncomingActivityFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
+    on_behalf_of = factory.SubFactory(ActorFactory)
+    payload = factory.LazyAttribute(
+        lambda o: {
+            "type": "Noop",
+            "id": "{}/activities/{}".format(o.on_behalf_of.fid, uuid.uuid4()),
+            "actor": o.on_behalf_of.fid,
+        }
+    )
+
+    class Meta:
+        model = "federation.IncomingActivity"
+
+
 @registry.register
 class DeliveryFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
     activity = factory.SubFactory(ActivityFactory)
@@ -139,37 +139,9 @@ class Domain(models.Model):
         super().save(**kwargs)
 
     def get_stats(self):
-        from funkwhale_api.music import models as music_models
+        from funkwhale_api.moderation import stats
 
-        data = Domain.objects.filter(pk=self.pk).aggregate(
-            actors=models.Count("actors", distinct=True),
-            outbox_activities=models.Count("actors__outbox_activities", distinct=True),
-            libraries=models.Count("actors__libraries", distinct=True),
-            channels=models.Count("actors__owned_channels", distinct=True),
-            received_library_follows=models.Count(
-                "actors__libraries__received_follows", distinct=True
-            ),
-            emitted_library_follows=models.Count(
-                "actors__library_follows", distinct=True
-            ),
-        )
-        data["artists"] = music_models.Artist.objects.filter(
-            from_activity__actor__domain_id=self.pk
-        ).count()
-        data["albums"] = music_models.Album.objects.filter(
-            from_activity__actor__domain_id=self.pk
-        ).count()
-        data["tracks"] = music_models.Track.objects.filter(
-            from_activity__actor__domain_id=self.pk
-        ).count()
-
-        uploads = music_models.Upload.objects.filter(library__actor__domain_id=self.pk)
-        data["uploads"] = uploads.count()
-        data["media_total_size"] = uploads.aggregate(v=models.Sum("size"))["v"] or 0
-        data["media_downloaded_size"] = (
-            uploads.with_file().aggregate(v=models.Sum("size"))["v"] or 0
-        )
-        return data
+        return stats.get_domain_stats(self)
 
     @property
     def is_local(self):
@@ -269,48 +241,20 @@ class Actor(models.Model):
         return self.url or self.fid
 
     def get_current_usage(self):
-        actor = self.__class__.objects.filter(pk=self.pk).with_current_usage().get()
+        from funkwhale_api.music import models as music_models
+
+        usage = music_models.ActorUploadUsage.get_for_actor(self)
         data = {}
         for s in ["draft", "pending", "skipped", "errored", "finished"]:
-            data[s] = getattr(actor, "_usage_{}".format(s)) or 0
+            data[s] = getattr(usage, s)
 
         data["total"] = sum(data.values())
         return data
 
     def get_stats(self):
-        from funkwhale_api.music import models as music_models
-        from funkwhale_api.moderation import models as moderation_models
-
-        data = Actor.objects.filter(pk=self.pk).aggregate(
-            outbox_activities=models.Count("outbox_activities", distinct=True),
-            libraries=models.Count("libraries", distinct=True),
-            channels=models.Count("owned_channels", distinct=True),
-            received_library_follows=models.Count(
-                "libraries__received_follows", distinct=True
-            ),
-            emitted_library_follows=models.Count("library_follows", distinct=True),
-        )
-        data["artists"] = music_models.Artist.objects.filter(
-            from_activity__actor=self.pk
-        ).count()
-        data["reports"] = moderation_models.Report.objects.get_for_target(self).count()
-        data["requests"] = moderation_models.UserRequest.objects.filter(
-            submitter=self
-        ).count()
-        data["albums"] = music_models.Album.objects.filter(
-            from_activity__actor=self.pk
-        ).count()
-        data["tracks"] = music_models.Track.objects.filter(
-            from_activity__actor=self.pk
-        ).count()
-
-        uploads = music_models.Upload.objects.filter(library__actor=self.pk)
-        data["uploads"] = uploads.count()
-        data["media_total_size"] = uploads.aggregate(v=models.Sum("size"))["v"] or 0
-        data["media_downloaded_size"] = (
-            uploads.with_file().aggregate(v=models.Sum("size"))["v"] or 0
-        )
-        return data
+        from funkwhale_api.moderation import stats
+
+        return stats.get_actor_stats(self)
 
     @property
     def keys(self):
@@ -419,6 +363,21 @@ class InboxItem(models.Model):
     is_read = models.BooleanField(default=False)
 
 
+class IncomingActivity(models.Model):
+    """
+    Raw activities received in inboxes, stored as-is when FEDERATION_INBOX_ASYNC
+    is enabled, until they are validated and dispatched in batches.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    creation_date = models.DateTimeField(default=timezone.now)
+    payload = JSONField(encoder=DjangoJSONEncoder)
+    on_behalf_of = models.ForeignKey(Actor, related_name="+", on_delete=models.CASCADE)
+    inbox_actor = models.ForeignKey(
+        Actor, related_name="+", on_delete=models.CASCADE, null=True, blank=True
+    )
+
+
 class Delivery(models.Model):
     """
     Store deliveries attempt to remote inboxes
@@ -636,3 +595,6 @@ def update_denormalization_follow_deleted(sender, instance, **kwargs):
         music_models.TrackActor.objects.filter(
             actor=instance.actor, upload__in=instance.target.uploads.all()
         ).delete()
+        music_models.update_artist_album_actor_entries(
+            instance.target.uploads.values("track")
+        )
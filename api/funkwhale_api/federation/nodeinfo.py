@@ -0,0 +1,320 @@
+"""
+Refresh of the nodeinfo of known domains.
+
+Stale domains are crawled in bulk by a pool of threads, each thread reusing its own
+HTTP session, so connections to a host are kept alive between the discovery and
+nodeinfo requests. The number of concurrent requests to a given host is capped,
+cf host_slot().
+
+Once a nodeinfo document was fetched, its url and validators (ETag, Last-Modified)
+are kept in the cache, and the next refresh is a single conditional request.
+Domains that fail to answer are retried with an exponential backoff, and
+the failure count is stored with the error in Domain.nodeinfo.
+
+Network calls and database writes are kept apart: threads only fetch documents,
+and results are saved from the calling thread.
+"""
+import concurrent.futures
+import contextlib
+import datetime
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from funkwhale_api.common import session
+from funkwhale_api.common import utils as common_utils
+
+from . import actors
+from . import models
+from . import serializers
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+NODEINFO_REL = "http://nodeinfo.diaspora.software/ns/schema/2.0"
+
+VALIDATORS_CACHE_KEY = "federation:nodeinfo:validators:{}"
+HOST_CACHE_KEY = "federation:nodeinfo:host:{}"
+SCHEDULED_CACHE_KEY = "federation:nodeinfo:scheduled:{}"
+
+VALIDATORS_TIMEOUT = 3600 * 24 * 30
+HOST_LOCK_TIMEOUT = 60
+# avoid enqueuing a refresh for each incoming request while the first one is pending
+SCHEDULED_TIMEOUT = 3600
+
+NOT_MODIFIED = "not-modified"
+BUSY = "busy"
+
+FETCH_ERRORS = (
+    requests.RequestException,
+    serializers.serializers.ValidationError,
+    ValueError,
+)
+
+_local = threading.local()
+
+
+def get_thread_session():
+    """
+    Return a session bound to the current thread, so connections are reused across
+    the domains crawled by this thread
+    """
+    if getattr(_local, "session", None) is None:
+        _local.session = session.get_session()
+    return _local.session
+
+
+@contextlib.contextmanager
+def host_slot(host):
+    """
+    Yield True if a request slot is available for the given host, False otherwise,
+    to cap the number of concurrent nodeinfo requests to a single host.
+    """
+    key = HOST_CACHE_KEY.format(host)
+    cache.add(key, 0, timeout=HOST_LOCK_TIMEOUT)
+    try:
+        current = cache.incr(key)
+    except ValueError:
+        # the counter expired in the meantime
+        cache.add(key, 1, timeout=HOST_LOCK_TIMEOUT)
+        current = 1
+    try:
+        yield current <= settings.NODEINFO_REFRESH_CONCURRENCY_PER_HOST
+    finally:
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+
+
+def discover(domain_name, s):
+    """
+    Return the url of the nodeinfo document of the given domain
+    """
+    wellknown_url = "https://{}/.well-known/nodeinfo".format(domain_name)
+    response = s.get(url=wellknown_url, timeout=settings.NODEINFO_REFRESH_TIMEOUT)
+    response.raise_for_status()
+    serializer = serializers.NodeInfoSerializer(data=response.json())
+    serializer.is_valid(raise_exception=True)
+    for link in serializer.validated_data["links"]:
+        if link["rel"] == NODEINFO_REL:
+            return link["href"]
+
+    raise ValueError("No nodeinfo 2.0 link found")
+
+
+def fetch(domain_name, s=None, conditional=False):
+    """
+    Fetch the nodeinfo document of the given domain.
+
+    With conditional=True, the document url and validators stored during the previous
+    fetch are used, if any, and NOT_MODIFIED is returned if the document didn't
+    change since then.
+    """
+    s = s or session.get_session()
+    key = VALIDATORS_CACHE_KEY.format(domain_name)
+    validators = cache.get(key) if conditional else None
+    headers = {}
+    if validators:
+        nodeinfo_url = validators["url"]
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    else:
+        nodeinfo_url = discover(domain_name, s)
+
+    response = s.get(
+        url=nodeinfo_url, headers=headers, timeout=settings.NODEINFO_REFRESH_TIMEOUT
+    )
+    if response.status_code == 304:
+        return NOT_MODIFIED
+    if validators and not response.ok:
+        # the document may have moved, so we start over
+        cache.delete(key)
+        return fetch(domain_name, s)
+    response.raise_for_status()
+    payload = response.json()
+    cache.set(
+        key,
+        {
+            "url": nodeinfo_url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        },
+        timeout=VALIDATORS_TIMEOUT,
+    )
+    return payload
+
+
+def get_result(domain_name, s=None, conditional=False):
+    """
+    Fetch the nodeinfo of the given domain, and return it in the format stored in
+    Domain.nodeinfo, or NOT_MODIFIED
+    """
+    try:
+        payload = fetch(domain_name, s, conditional=conditional)
+    except FETCH_ERRORS as e:
+        cache.delete(VALIDATORS_CACHE_KEY.format(domain_name))
+        return {"status": "error", "error": str(e)}
+    if payload == NOT_MODIFIED:
+        return NOT_MODIFIED
+    return {"status": "ok", "payload": payload}
+
+
+def crawl_one(domain_name, conditional):
+    with host_slot(domain_name) as available:
+        if not available:
+            return BUSY
+        return get_result(domain_name, get_thread_session(), conditional=conditional)
+
+
+def get_failures(nodeinfo):
+    if nodeinfo.get("status") != "error":
+        return 0
+    return nodeinfo.get("failures", 1)
+
+
+def get_refresh_delay(domain):
+    """
+    Return the delay, in seconds, before the nodeinfo of the given domain should be
+    refreshed. The delay doubles after each consecutive failure.
+    """
+    failures = get_failures(domain.nodeinfo)
+    delay = settings.NODEINFO_REFRESH_DELAY
+    if failures > 1:
+        delay = max(
+            min(delay * 2 ** (failures - 1), settings.NODEINFO_REFRESH_MAX_BACKOFF),
+            delay,
+        )
+    return delay
+
+
+def needs_refresh(domain, now=None):
+    if not domain.nodeinfo_fetch_date:
+        return True
+    now = now or timezone.now()
+    delay = datetime.timedelta(seconds=get_refresh_delay(domain))
+    return domain.nodeinfo_fetch_date <= now - delay
+
+
+def get_stale_domains(now=None):
+    now = now or timezone.now()
+    limit = now - datetime.timedelta(seconds=settings.NODEINFO_REFRESH_DELAY)
+    candidates = (
+        models.Domain.objects.external()
+        .exclude(nodeinfo_fetch_date__gte=limit)
+        .select_related("service_actor")
+        .order_by(F("nodeinfo_fetch_date").asc(nulls_first=True))
+    )
+    return [domain for domain in candidates if needs_refresh(domain, now)]
+
+
+def update_service_actor(domain, nodeinfo):
+    service_actor_id = common_utils.recursive_getattr(
+        nodeinfo, "payload.metadata.actorId", permissive=True
+    )
+    if not service_actor_id:
+        domain.service_actor = None
+        return
+    if domain.service_actor and domain.service_actor.fid == service_actor_id:
+        return
+    try:
+        domain.service_actor = utils.retrieve_ap_object(
+            service_actor_id,
+            actor=actors.get_service_actor(),
+            queryset=models.Actor,
+            serializer_class=serializers.ActorSerializer,
+        )
+    except (serializers.serializers.ValidationError, requests.RequestException) as e:
+        logger.warning(
+            "Cannot fetch system actor for domain %s: %s", domain.name, str(e)
+        )
+
+
+def save(domain, result, now=None):
+    """
+    Store the result of get_result() on the given domain
+    """
+    if result == BUSY:
+        return
+    if result == NOT_MODIFIED:
+        result = {"status": "ok", "payload": domain.nodeinfo.get("payload")}
+    elif result["status"] == "error":
+        result["failures"] = get_failures(domain.nodeinfo) + 1
+    else:
+        update_service_actor(domain, result)
+    domain.nodeinfo_fetch_date = now or timezone.now()
+    domain.nodeinfo = result
+    domain.save(update_fields=["nodeinfo", "nodeinfo_fetch_date", "service_actor"])
+
+
+def refresh(domain):
+    """
+    Refresh the nodeinfo of a single domain, unconditionally
+    """
+    save(domain, get_result(domain.name))
+
+
+def is_conditional(domain):
+    return domain.nodeinfo.get("status") == "ok"
+
+
+def crawl(domains, workers=None, deadline=None):
+    """
+    Refresh the nodeinfo of the given domains concurrently.
+
+    If a deadline (as returned by time.monotonic()) is reached, pending domains
+    are skipped, and will be refreshed on the next run.
+
+    Returns a dict with the number of refreshed, unchanged, failed and skipped domains.
+    """
+    workers = workers or settings.NODEINFO_REFRESH_WORKERS
+    results = {"ok": 0, "not_modified": 0, "error": 0, "skipped": 0}
+    processed = 0
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(crawl_one, domain.name, is_conditional(domain)): domain
+            for domain in domains
+        }
+        for future in concurrent.futures.as_completed(futures):
+            # the document was already fetched, so we save it even past the deadline
+            processed += 1
+            result = future.result()
+            if result == BUSY:
+                results["skipped"] += 1
+            elif result == NOT_MODIFIED:
+                results["not_modified"] += 1
+            else:
+                results[result["status"]] += 1
+            save(futures[future], result)
+            if deadline and time.monotonic() >= deadline:
+                logger.info("[Nodeinfo] Deadline reached, stopping")
+                for pending in futures:
+                    pending.cancel()
+                results["skipped"] += len(futures) - processed
+                break
+
+    logger.info("[Nodeinfo] Refresh complete: %s", results)
+    return results
+
+
+def schedule_refresh(domain_name):
+    """
+    Refresh the nodeinfo of the given domain in the background, once the current
+    transaction is committed. Calls for a domain with a pending refresh are ignored.
+    """
+    from . import tasks
+
+    if not cache.add(
+        SCHEDULED_CACHE_KEY.format(domain_name), True, timeout=SCHEDULED_TIMEOUT
+    ):
+        return False
+    common_utils.on_commit(tasks.update_domain_nodeinfo.delay, domain_name=domain_name)
+    return True
@@ -0,0 +1,155 @@
+"""
+Pagination of federation collections (libraries, channel outboxes).
+
+Pages are fetched using a cursor on (creation_date, id) when the requesting
+party follows our ``next`` links, so that scanning a big collection doesn't
+require costly OFFSET scans. Plain ``?page=`` urls are still supported.
+Serialized pages are cached until the underlying library is updated.
+"""
+import datetime
+import math
+import uuid
+
+from django.conf import settings
+from django.core import paginator
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+COLLECTION_VERSION_CACHE_KEY = "federation:collection-version:{}"
+COLLECTION_PAGE_CACHE_KEY = "federation:collection-page:{}:{}:{}"
+COLLECTION_COUNT_CACHE_KEY = "federation:collection-count:{}:{}"
+
+ORDERING = ("-creation_date", "-id")
+
+
+def encode_cursor(obj):
+    delta = obj.creation_date - datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+    microseconds = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    return "{}-{}".format(microseconds, obj.pk)
+
+
+def decode_cursor(value):
+    """
+    Return a (creation_date, id) tuple from a cursor, or raise ValueError
+    """
+    microseconds, pk = value.split("-", 1)
+    creation_date = datetime.datetime(
+        1970, 1, 1, tzinfo=timezone.utc
+    ) + datetime.timedelta(microseconds=int(microseconds))
+    return creation_date, int(pk)
+
+
+class Paginator:
+    def __init__(self, count, page_size):
+        self.count = count
+        self.page_size = page_size
+
+    @property
+    def num_pages(self):
+        return max(1, math.ceil(self.count / self.page_size))
+
+
+class CollectionPage:
+    """
+    Exposes the same interface as Django's Page, as expected by CollectionPageSerializer
+    """
+
+    def __init__(self, object_list, number, paginator, has_next):
+        self.object_list = object_list
+        self.number = number
+        self.paginator = paginator
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self.number > 1
+
+    def next_page_number(self):
+        return self.number + 1
+
+    def previous_page_number(self):
+        return self.number - 1
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1])
+
+
+def get_page(queryset, number, page_size, count, after=None):
+    """
+    Return the requested page of the queryset, seeking after the given cursor if any,
+    or using an offset otherwise.
+
+    Raises EmptyPage if the page is out of bounds, and InvalidPage if the cursor
+    is invalid.
+    """
+    if number < 1:
+        raise paginator.EmptyPage("Invalid page number")
+    p = Paginator(count, page_size)
+    queryset = queryset.order_by(*ORDERING)
+    if after:
+        try:
+            creation_date, pk = decode_cursor(after)
+        except (TypeError, ValueError, OverflowError):
+            raise paginator.InvalidPage("Invalid cursor")
+        queryset = queryset.filter(
+            Q(creation_date__lt=creation_date)
+            | Q(creation_date=creation_date, pk__lt=pk)
+        )
+        start = 0
+    else:
+        if number > p.num_pages:
+            raise paginator.EmptyPage("Page out of bounds")
+        start = (number - 1) * page_size
+
+    # we fetch an extra item to know if there is a next page
+    items = list(queryset[start : start + page_size + 1])
+    if not items and number > 1:
+        raise paginator.EmptyPage("Page out of bounds")
+    return CollectionPage(
+        items[:page_size], number=number, paginator=p, has_next=len(items) > page_size
+    )
+
+
+def get_version(library_id):
+    key = COLLECTION_VERSION_CACHE_KEY.format(library_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex[:12], timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(library_id):
+    """
+    Invalidate cached pages and counts of collections backed by the given library
+    """
+    cache.delete(COLLECTION_VERSION_CACHE_KEY.format(library_id))
+
+
+def get_cached_data(library_id, collection_id, page_key, get_data):
+    """
+    Return cached data for the given collection page, calling get_data() to
+    compute and cache it if needed.
+    """
+    key = COLLECTION_PAGE_CACHE_KEY.format(
+        collection_id, get_version(library_id), page_key
+    )
+    data = cache.get(key)
+    if data is None:
+        data = get_data()
+        cache.set(key, data, timeout=settings.FEDERATION_COLLECTION_CACHE_DURATION)
+    return data
+
+
+def get_cached_count(library_id, collection_id, queryset):
+    key = COLLECTION_COUNT_CACHE_KEY.format(collection_id, get_version(library_id))
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout=settings.FEDERATION_COLLECTION_CACHE_DURATION)
+    return count
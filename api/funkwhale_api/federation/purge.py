@@ -0,0 +1,115 @@
+"""
+Deletion of the data associated with actors, when purging remote accounts
+or domains, or removing an account.
+
+Objects are deleted step by step, children before their parents, in batches
+ordered by primary key, each batch being committed in its own transaction.
+Django only loads objects in memory when deleting them requires it (signals
+or cascades), and then only for the current batch, otherwise a single DELETE
+query is issued per batch.
+
+The engine sleeps between batches, to leave room for foreground queries, and
+the progress of each step is stored in the cache, so an interrupted purge
+resumes where it stopped.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+
+logger = logging.getLogger(__name__)
+
+CURSOR_CACHE_KEY = "federation:purge:cursor:{}:{}"
+
+
+class Step(object):
+    def __init__(self, name, queryset):
+        self.name = name
+        self.queryset = queryset
+
+    def __repr__(self):
+        return "<Step {}>".format(self.name)
+
+
+def get_cascade_steps(model, ids, exclude=[]):
+    """
+    Return a step for each relation deleted in cascade with the given objects,
+    named after the related model and field, e.g music.Library.actor
+    """
+    steps = []
+    for related in model._meta.related_objects:
+        if getattr(related, "on_delete", None) is not models.CASCADE:
+            continue
+        related_model = related.related_model
+        name = "{}.{}".format(related_model._meta.label, related.field.name)
+        if name in exclude:
+            continue
+        queryset = related_model._base_manager.filter(
+            **{"{}__in".format(related.field.name): ids}
+        )
+        steps.append(Step(name, queryset))
+    return steps
+
+
+def delete_batch(queryset, ids):
+    with transaction.atomic():
+        result = queryset.filter(pk__in=ids).delete()
+    return result[1].get(queryset.model._meta.label, 0), sum(result[1].values())
+
+
+def run(name, steps, batch_size=None, throttle=None, deadline=None):
+    """
+    Run the given steps, in order, under the given name, used to store progress.
+
+    After each batch, the engine sleeps ``throttle`` times the duration of
+    the batch. If a deadline (as returned by time.monotonic()) is reached, the purge
+    stops and can be resumed by calling run() again with the same name.
+
+    Returns a dict with the number of objects deleted by each step (including
+    objects deleted in cascade), and whether all steps are complete.
+    """
+    batch_size = batch_size or settings.FEDERATION_PURGE_BATCH_SIZE
+    if throttle is None:
+        throttle = settings.FEDERATION_PURGE_THROTTLE
+    deleted = {}
+    for step in steps:
+        cursor_key = CURSOR_CACHE_KEY.format(name, step.name)
+        last_id = cache.get(cursor_key) or 0
+        deleted[step.name] = 0
+        while True:
+            if deadline and time.monotonic() >= deadline:
+                logger.info("[Purge %s] Deadline reached, stopping", name)
+                return {"deleted": deleted, "complete": False}
+            ids = list(
+                step.queryset.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            started = time.monotonic()
+            count, total = delete_batch(step.queryset, ids)
+            deleted[step.name] += total
+            last_id = ids[-1]
+            cache.set(cursor_key, last_id, timeout=None)
+            logger.debug(
+                "[Purge %s] Deleted %s %s objects (%s with cascades)",
+                name,
+                count,
+                step.name,
+                total,
+            )
+            if throttle:
+                time.sleep((time.monotonic() - started) * throttle)
+
+        logger.info(
+            "[Purge %s] Step %s done, %s objects deleted",
+            name,
+            step.name,
+            deleted[step.name],
+        )
+
+    cache.delete_many([CURSOR_CACHE_KEY.format(name, step.name) for step in steps])
+    return {"deleted": deleted, "complete": True}
@@ -0,0 +1,89 @@
+"""
+Retention of federation activities, inbox items and deliveries, which
+would otherwise grow forever.
+
+Past a configurable horizon, we delete deliveries, read inbox items, and activities
+that are neither referenced by remaining inbox items or deliveries, nor by other
+objects (e.g. an upload created from the activity). Deletion is done in batches,
+using the purge engine, cf federation.purge.
+"""
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import models
+from . import purge
+
+TABLES = [models.Activity, models.InboxItem, models.Delivery]
+
+TABLE_SIZES_SQL = """
+    SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+    FROM pg_class c
+    WHERE c.relname = ANY(%s)
+"""
+
+
+def get_horizon(days):
+    if not days:
+        return None
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def get_prunable_deliveries():
+    horizon = get_horizon(settings.FEDERATION_DELIVERY_RETENTION_DAYS)
+    if not horizon:
+        return None
+    # we don't retry deliveries for that long, so failed ones can go too
+    return models.Delivery.objects.filter(last_attempt_date__lt=horizon)
+
+
+def get_prunable_inbox_items():
+    horizon = get_horizon(settings.FEDERATION_INBOX_ITEM_RETENTION_DAYS)
+    if not horizon:
+        return None
+    return models.InboxItem.objects.filter(
+        is_read=True, activity__creation_date__lt=horizon
+    )
+
+
+def get_prunable_activities():
+    horizon = get_horizon(settings.FEDERATION_ACTIVITY_RETENTION_DAYS)
+    if not horizon:
+        return None
+    queryset = models.Activity.objects.filter(creation_date__lt=horizon)
+    # activities referenced by any other object (inbox items, deliveries,
+    # objects created from the activity…) are preserved
+    for related in models.Activity._meta.related_objects:
+        if related.many_to_many:
+            continue
+        references = related.related_model._base_manager.filter(
+            **{related.field.name: OuterRef("pk")}
+        )
+        queryset = queryset.filter(~Exists(references))
+    return queryset
+
+
+def get_steps():
+    # deliveries and inbox items go first, so that their activities can be pruned
+    # in the same run
+    steps = [
+        ("deliveries", get_prunable_deliveries()),
+        ("inbox_items", get_prunable_inbox_items()),
+        ("activities", get_prunable_activities()),
+    ]
+    return [purge.Step(name, qs) for name, qs in steps if qs is not None]
+
+
+def get_table_sizes():
+    """
+    Return the estimated number of rows and the size on disk, in bytes,
+    of each table subject to retention
+    """
+    tables = [model._meta.db_table for model in TABLES]
+    with connection.cursor() as cursor:
+        cursor.execute(TABLE_SIZES_SQL, [tables])
+        rows = cursor.fetchall()
+    return {name: {"rows": count, "size": size} for name, count, size in rows}
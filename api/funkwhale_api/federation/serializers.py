@@ -392,10 +392,10 @@ class ActorSerializer(jsonld.JsonLdSerializer):
         domain = urllib.parse.urlparse(kwargs["fid"]).netloc
         domain, domain_created = models.Domain.objects.get_or_create(pk=domain)
         if domain_created and not domain.is_local:
-            from . import tasks
+            from . import nodeinfo
 
             # first time we see the domain, we trigger nodeinfo fetching
-            tasks.update_domain_nodeinfo(domain_name=domain.name)
+            nodeinfo.schedule_refresh(domain.name)
 
         kwargs["domain"] = domain
         for endpoint, url in self.validated_data.get("endpoints", {}).items():
@@ -1117,9 +1117,12 @@ class CollectionPageSerializer(jsonld.JsonLdSerializer):
             )
 
         if page.has_next():
-            d["next"] = common_utils.set_query_parameter(
-                conf["id"], page=page.next_page_number()
-            )
+            next_params = {"page": page.next_page_number()}
+            next_cursor = getattr(page, "next_cursor", None)
+            if next_cursor:
+                # allow fetching the next page without an offset scan
+                next_params["after"] = next_cursor
+            d["next"] = common_utils.set_query_parameter(conf["id"], **next_params)
         d.update(get_additional_fields(conf))
         if self.context.get("include_ap_context", True):
             d["@context"] = jsonld.get_default_context()
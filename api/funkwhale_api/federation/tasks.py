@@ -1,13 +1,13 @@
 import datetime
+import hashlib
 import json
 import logging
-import os
 import requests
+import time
 
 from django.conf import settings
 from django.db import transaction
 from django.db.models import Q, F
-from django.db.models.deletion import Collector
 from django.utils import timezone
 from dynamic_preferences.registries import global_preferences_registry
 from requests.exceptions import RequestException
@@ -16,7 +16,6 @@ from funkwhale_api.audio import models as audio_models
 from funkwhale_api.common import preferences
 from funkwhale_api.common import models as common_models
 from funkwhale_api.common import session
-from funkwhale_api.common import utils as common_utils
 from funkwhale_api.moderation import mrf
 from funkwhale_api.music import models as music_models
 from funkwhale_api.taskapp import celery
@@ -26,6 +25,9 @@ from . import actors
 from . import jsonld
 from . import keys
 from . import models, signing
+from . import nodeinfo
+from . import purge
+from . import retention
 from . import serializers
 from . import routes
 from . import utils
@@ -55,30 +57,7 @@ def clean_music_cache():
     )
     for upload in candidates:
         upload.audio_file.delete()
-
-    # we also delete orphaned files, if any
-    storage = models.LibraryTrack._meta.get_field("audio_file").storage
-    files = get_files(storage, "federation_cache/tracks")
-    existing = music_models.Upload.objects.filter(audio_file__in=files)
-    missing = set(files) - set(existing.values_list("audio_file", flat=True))
-    for m in missing:
-        storage.delete(m)
-
-
-def get_files(storage, *parts):
-    """
-    This is a recursive function that return all files available
-    in a given directory using django's storage.
-    """
-    if not parts:
-        raise ValueError("Missing path")
-    try:
-        dirs, files = storage.listdir(os.path.join(*parts))
-    except FileNotFoundError:
-        return []
-    for dir in dirs:
-        files += get_files(storage, *(list(parts) + [dir]))
-    return [os.path.join(parts[-1], path) for path in files]
+    # orphaned files are deleted by common.reconcile_storage
 
 
 @celery.app.task(name="federation.dispatch_inbox")
@@ -100,6 +79,34 @@ def dispatch_inbox(activity, call_handlers=True):
     )
 
 
+@celery.app.task(name="federation.process_incoming_activities")
+def process_incoming_activities(batch_size=None):
+    """
+    Validate and dispatch activities stored by inboxes, in batches. Each batch
+    is locked, so multiple workers can process the queue concurrently.
+    """
+    batch_size = batch_size or settings.FEDERATION_INBOX_BATCH_SIZE
+    total = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                models.IncomingActivity.objects.select_for_update(
+                    skip_locked=True, of=("self",)
+                )
+                .select_related("on_behalf_of", "inbox_actor")
+                .order_by("id")[:batch_size]
+            )
+            if not batch:
+                break
+            activity.receive_batch(batch)
+            models.IncomingActivity.objects.filter(
+                pk__in=[i.pk for i in batch]
+            ).delete()
+        total += len(batch)
+    logger.info("Processed %s incoming activities", total)
+    return total
+
+
 @celery.app.task(name="federation.dispatch_outbox")
 @celery.require_instance(models.Activity.objects.select_related(), "activity")
 def dispatch_outbox(activity):
@@ -164,122 +171,170 @@ def deliver_to_remote(delivery):
         delivery.save(update_fields=["last_attempt_date", "attempts", "is_delivered"])
 
 
-def fetch_nodeinfo(domain_name):
-    s = session.get_session()
-    wellknown_url = "https://{}/.well-known/nodeinfo".format(domain_name)
-    response = s.get(url=wellknown_url)
-    response.raise_for_status()
-    serializer = serializers.NodeInfoSerializer(data=response.json())
-    serializer.is_valid(raise_exception=True)
-    nodeinfo_url = None
-    for link in serializer.validated_data["links"]:
-        if link["rel"] == "http://nodeinfo.diaspora.software/ns/schema/2.0":
-            nodeinfo_url = link["href"]
-            break
-
-    response = s.get(url=nodeinfo_url)
-    response.raise_for_status()
-    return response.json()
-
-
 @celery.app.task(name="federation.update_domain_nodeinfo")
 @celery.require_instance(
     models.Domain.objects.external(), "domain", id_kwarg_name="domain_name"
 )
 def update_domain_nodeinfo(domain):
-    now = timezone.now()
-    try:
-        nodeinfo = {"status": "ok", "payload": fetch_nodeinfo(domain.name)}
-    except (
-        requests.RequestException,
-        serializers.serializers.ValidationError,
-        ValueError,
-    ) as e:
-        nodeinfo = {"status": "error", "error": str(e)}
-
-    service_actor_id = common_utils.recursive_getattr(
-        nodeinfo, "payload.metadata.actorId", permissive=True
-    )
-    try:
-        domain.service_actor = (
-            utils.retrieve_ap_object(
-                service_actor_id,
-                actor=actors.get_service_actor(),
-                queryset=models.Actor,
-                serializer_class=serializers.ActorSerializer,
-            )
-            if service_actor_id
-            else None
-        )
-    except (serializers.serializers.ValidationError, RequestException) as e:
-        logger.warning(
-            "Cannot fetch system actor for domain %s: %s", domain.name, str(e)
-        )
-    domain.nodeinfo_fetch_date = now
-    domain.nodeinfo = nodeinfo
-    domain.save(update_fields=["nodeinfo", "nodeinfo_fetch_date", "service_actor"])
+    nodeinfo.refresh(domain)
 
 
 @celery.app.task(name="federation.refresh_nodeinfo_known_nodes")
-def refresh_nodeinfo_known_nodes():
-    """
-    Trigger a node info refresh on all nodes that weren't refreshed since
-    settings.NODEINFO_REFRESH_DELAY
+def refresh_nodeinfo_known_nodes(max_duration=None):
     """
-    limit = timezone.now() - datetime.timedelta(seconds=settings.NODEINFO_REFRESH_DELAY)
-    candidates = models.Domain.objects.external().exclude(
-        nodeinfo_fetch_date__gte=limit
-    )
-    names = candidates.values_list("name", flat=True)
-    logger.info("Launching periodic nodeinfo refresh on %s domains", len(names))
-    for domain_name in names:
-        update_domain_nodeinfo.delay(domain_name=domain_name)
+    Refresh the nodeinfo of all nodes that weren't refreshed since
+    settings.NODEINFO_REFRESH_DELAY, or longer for nodes that failed to answer.
 
+    Nodes are crawled concurrently, for at most settings.NODEINFO_REFRESH_MAX_DURATION
+    seconds. Remaining nodes are refreshed on the next run.
+    """
+    if max_duration is None:
+        max_duration = settings.NODEINFO_REFRESH_MAX_DURATION
+    deadline = time.monotonic() + max_duration if max_duration else None
+    domains = nodeinfo.get_stale_domains()
+    logger.info("Launching periodic nodeinfo refresh on %s domains", len(domains))
+    return nodeinfo.crawl(domains, deadline=deadline)
 
-def delete_qs(qs):
-    label = qs.model._meta.label
-    result = qs.delete()
-    related = sum(result[1].values())
 
-    logger.info(
-        "Purged %s %s objects (and %s related entities)", result[0], label, related
-    )
+def get_purge_name(ids, only=[]):
+    # purges of the same actors are resumed under the same name
+    digest = hashlib.sha1(json.dumps([sorted(ids), sorted(only)]).encode())
+    return "actors:{}".format(digest.hexdigest())
 
 
-def handle_purge_actors(ids, only=[]):
+def get_purge_actors_steps(ids, only=[]):
     """
     Empty only means we purge everything
     Otherwise, we purge only the requested bits: media
     """
+    steps = []
     # purge follows (received emitted)
     if not only:
-        delete_qs(models.LibraryFollow.objects.filter(target__actor_id__in=ids))
-        delete_qs(models.Follow.objects.filter(actor_id__in=ids))
-
-    # purge audio content
+        steps += [
+            purge.Step(
+                "library_follows.received",
+                models.LibraryFollow.objects.filter(target__actor_id__in=ids),
+            ),
+            purge.Step(
+                "follows.emitted", models.Follow.objects.filter(actor_id__in=ids)
+            ),
+        ]
+
+    # purge audio content. Uploads are deleted before their libraries, so that
+    # deleting a library doesn't cascade to thousands of uploads at once
     if not only or "media" in only:
-        delete_qs(common_models.Attachment.objects.filter(actor__in=ids))
-        delete_qs(models.LibraryFollow.objects.filter(actor_id__in=ids))
-        delete_qs(models.Follow.objects.filter(target_id__in=ids))
-        delete_qs(audio_models.Channel.objects.filter(attributed_to__in=ids))
-        delete_qs(audio_models.Channel.objects.filter(actor__in=ids))
-        delete_qs(music_models.Upload.objects.filter(library__actor_id__in=ids))
-        delete_qs(music_models.Library.objects.filter(actor_id__in=ids))
+        steps += [
+            purge.Step(
+                "attachments", common_models.Attachment.objects.filter(actor__in=ids)
+            ),
+            purge.Step(
+                "library_follows.emitted",
+                models.LibraryFollow.objects.filter(actor_id__in=ids),
+            ),
+            purge.Step(
+                "follows.received", models.Follow.objects.filter(target_id__in=ids)
+            ),
+            purge.Step(
+                "channels.attributed",
+                audio_models.Channel.objects.filter(attributed_to__in=ids),
+            ),
+            purge.Step("channels", audio_models.Channel.objects.filter(actor__in=ids)),
+            purge.Step(
+                "uploads",
+                music_models.Upload.objects.filter(library__actor_id__in=ids),
+            ),
+            purge.Step(
+                "libraries", music_models.Library.objects.filter(actor_id__in=ids)
+            ),
+        ]
 
     # purge remaining activities / deliveries
     if not only:
-        delete_qs(models.InboxItem.objects.filter(actor_id__in=ids))
-        delete_qs(models.Activity.objects.filter(actor_id__in=ids))
+        steps += [
+            purge.Step(
+                "inbox_items", models.InboxItem.objects.filter(actor_id__in=ids)
+            ),
+            purge.Step(
+                "activities.inbox_items",
+                models.InboxItem.objects.filter(activity__actor_id__in=ids),
+            ),
+            purge.Step(
+                "activities.deliveries",
+                models.Delivery.objects.filter(activity__actor_id__in=ids),
+            ),
+            purge.Step("activities", models.Activity.objects.filter(actor_id__in=ids)),
+        ]
+    return steps
+
+
+def handle_purge_actors(ids, only=[], deadline=None):
+    """
+    Empty only means we purge everything
+    Otherwise, we purge only the requested bits: media
+    """
+    result = purge.run(
+        get_purge_name(ids, only), get_purge_actors_steps(ids, only), deadline=deadline
+    )
+    logger.info(
+        "Purged %s objects (%s)",
+        sum(result["deleted"].values()),
+        "complete" if result["complete"] else "incomplete",
+    )
+    return result
 
 
 @celery.app.task(name="federation.purge_actors")
-def purge_actors(ids=[], domains=[], only=[]):
+def purge_actors(ids=[], domains=[], only=[], max_duration=None):
+    """
+    Purge the given actors, and actors of the given domains. If the purge isn't
+    complete after max_duration seconds, another run is scheduled to resume it.
+    """
+    max_duration = max_duration or settings.FEDERATION_PURGE_MAX_DURATION
     actors = models.Actor.objects.filter(
         Q(id__in=ids) | Q(domain_id__in=domains)
     ).order_by("id")
     found_ids = list(actors.values_list("id", flat=True))
     logger.info("Starting purging %s accounts", len(found_ids))
-    handle_purge_actors(ids=found_ids, only=only)
+    result = handle_purge_actors(
+        ids=found_ids, only=only, deadline=time.monotonic() + max_duration
+    )
+    if not result["complete"]:
+        logger.info("Scheduling another run to resume the purge")
+        purge_actors.delay(
+            ids=ids, domains=domains, only=only, max_duration=max_duration
+        )
+    return result
+
+
+@celery.app.task(name="federation.prune_activities")
+def prune_activities(max_duration=None):
+    """
+    Delete old deliveries, read inbox items and unreferenced activities,
+    cf federation.retention. If the pruning isn't complete after max_duration
+    seconds, the next run resumes it.
+    """
+    max_duration = max_duration or settings.FEDERATION_PURGE_MAX_DURATION
+    started = time.monotonic()
+    result = purge.run(
+        "retention", retention.get_steps(), deadline=started + max_duration
+    )
+    duration = time.monotonic() - started
+    deleted = sum(result["deleted"].values())
+    report = {
+        "deleted": result["deleted"],
+        "complete": result["complete"],
+        "rate": deleted / duration if duration else deleted,
+        "tables": retention.get_table_sizes(),
+    }
+    logger.info(
+        "Pruned %s federation objects (%.1f/s, %s): %s. Table sizes: %s",
+        deleted,
+        report["rate"],
+        "complete" if result["complete"] else "incomplete",
+        report["deleted"],
+        report["tables"],
+    )
+    return report
 
 
 @celery.app.task(name="federation.rotate_actor_key")
@@ -438,27 +493,7 @@ def fetch(fetch_obj):
     )
 
 
-class PreserveSomeDataCollector(Collector):
-    """
-    We need to delete everything related to an actor. Well… Almost everything.
-    But definitely not the Delete Activity we send to announce the actor is deleted.
-    """
-
-    def __init__(self, *args, **kwargs):
-        self.creation_date = timezone.now()
-        super().__init__(*args, **kwargs)
-
-    def related_objects(self, related, *args, **kwargs):
-        qs = super().related_objects(related, *args, **kwargs)
-        if related.name == "outbox_activities":
-            # exclude the delete activity can be broadcasted properly
-            qs = qs.exclude(type="Delete", creation_date__gte=self.creation_date)
-
-        return qs
-
-
 @celery.app.task(name="federation.remove_actor")
-@transaction.atomic
 @celery.require_instance(
     models.Actor.objects.all(), "actor",
 )
@@ -467,30 +502,40 @@ def remove_actor(actor):
     # associated with the actor, otherwise follows are removed and we don't know where
     # to broadcast
     logger.info("Broadcasting deletion to federation…")
-    collector = PreserveSomeDataCollector(using="default")
+    creation_date = timezone.now()
     routes.outbox.dispatch(
         {"type": "Delete", "object": {"type": actor.type}}, context={"actor": actor}
     )
+    # We need to delete everything related to an actor. Well… Almost everything.
+    # But definitely not the Delete Activity we send to announce the actor is deleted.
+    preserved = actor.outbox_activities.filter(
+        type="Delete", creation_date__gte=creation_date
+    )
 
     # then we delete any object associated with the actor object, but *not* the actor
     # itself. We keep it for auditability and sending the Delete ActivityPub message
     logger.info(
-        "Prepare deletion of objects associated with account %s…",
-        actor.preferred_username,
+        "Deleting objects associated with account %s…", actor.preferred_username
     )
-    collector.collect([actor])
-    for model, instances in collector.data.items():
-        if issubclass(model, actor.__class__):
-            # we skip deletion of the actor itself
-            continue
-
-        to_delete = model.objects.filter(pk__in=[instance.pk for instance in instances])
-        logger.info(
-            "Deleting %s objects associated with account %s…",
-            len(instances),
-            actor.preferred_username,
-        )
-        to_delete.delete()
+    steps = [
+        purge.Step("uploads", music_models.Upload.objects.filter(library__actor=actor)),
+        purge.Step(
+            "activities.inbox_items",
+            models.InboxItem.objects.filter(activity__actor=actor).exclude(
+                activity__in=preserved
+            ),
+        ),
+        purge.Step(
+            "activities.deliveries",
+            models.Delivery.objects.filter(activity__actor=actor).exclude(
+                activity__in=preserved
+            ),
+        ),
+        purge.Step("activities", actor.outbox_activities.exclude(pk__in=preserved)),
+    ] + purge.get_cascade_steps(
+        models.Actor, [actor.pk], exclude=["federation.Activity.actor"]
+    )
+    purge.run("actor:{}".format(actor.pk), steps)
 
     # Finally, we update the actor itself and mark it as removed
     logger.info("Marking actor as Tombsone…")
@@ -18,6 +18,7 @@ from . import (
     activity,
     authentication,
     models,
+    pagination,
     renderers,
     serializers,
     utils,
@@ -31,6 +32,50 @@ def redirect_to_html(public_url):
     return response
 
 
+def receive(request, inbox_actor=None):
+    kwargs = {"activity": request.data, "on_behalf_of": request.actor}
+    if inbox_actor:
+        kwargs["inbox_actor"] = inbox_actor
+    if settings.FEDERATION_INBOX_ASYNC:
+        if not isinstance(request.data, dict):
+            raise exceptions.ValidationError("Invalid activity")
+        activity.enqueue_incoming(**kwargs)
+        return response.Response({}, status=202)
+
+    activity.receive(**kwargs)
+    return response.Response({}, status=200)
+
+
+def get_collection_page_response(request, conf, library_id):
+    """
+    Return the page of the collection described by conf that is requested via
+    the ``page`` and optional ``after`` query parameters. Pages are cached until
+    the library backing the collection is updated.
+    """
+    try:
+        page_number = int(request.GET["page"])
+    except Exception:
+        return response.Response({"page": ["Invalid page number"]}, status=400)
+    after = request.GET.get("after")
+    conf["page_size"] = preferences.get("federation__collection_page_size")
+
+    def get_data():
+        count = pagination.get_cached_count(library_id, conf["id"], conf["items"])
+        try:
+            conf["page"] = pagination.get_page(
+                conf["items"], page_number, conf["page_size"], count, after=after
+            )
+        except paginator.InvalidPage:
+            return False
+        return serializers.CollectionPageSerializer(conf).data
+
+    page_key = "{}:{}:{}".format(conf["page_size"], page_number, after or "")
+    data = pagination.get_cached_data(library_id, conf["id"], page_key, get_data)
+    if data is False:
+        return response.Response(status=404)
+    return response.Response(data)
+
+
 class AuthenticatedIfAllowListEnabled(permissions.BasePermission):
     def has_permission(self, request, view):
         allow_list_enabled = preferences.get("moderation__allow_list_enabled")
@@ -63,7 +108,7 @@ class SharedViewSet(FederationMixin, viewsets.GenericViewSet):
                 "You need a valid signature to send an activity"
             )
         if request.method.lower() == "post":
-            activity.receive(activity=request.data, on_behalf_of=request.actor)
+            return receive(request)
         return response.Response({}, status=200)
 
 
@@ -104,11 +149,7 @@ class ActorViewSet(FederationMixin, mixins.RetrieveModelMixin, viewsets.GenericV
                 "You need a valid signature to send an activity"
             )
         if request.method.lower() == "post":
-            activity.receive(
-                activity=request.data,
-                on_behalf_of=request.actor,
-                inbox_actor=inbox_actor,
-            )
+            return receive(request, inbox_actor=inbox_actor)
         return response.Response({}, status=200)
 
     @action(methods=["get", "post"], detail=True)
@@ -130,24 +171,14 @@ class ActorViewSet(FederationMixin, mixins.RetrieveModelMixin, viewsets.GenericV
         }
         page = request.GET.get("page")
         if page is None:
-            serializer = serializers.ChannelOutboxSerializer(channel)
-            data = serializer.data
-        else:
-            try:
-                page_number = int(page)
-            except Exception:
-                return response.Response({"page": ["Invalid page number"]}, status=400)
-            conf["page_size"] = preferences.get("federation__collection_page_size")
-            p = paginator.Paginator(conf["items"], conf["page_size"])
-            try:
-                page = p.page(page_number)
-                conf["page"] = page
-                serializer = serializers.CollectionPageSerializer(conf)
-                data = serializer.data
-            except paginator.EmptyPage:
-                return response.Response(status=404)
-
-        return response.Response(data)
+            data = pagination.get_cached_data(
+                channel.library_id,
+                conf["id"],
+                "root",
+                lambda: serializers.ChannelOutboxSerializer(channel).data,
+            )
+            return response.Response(data)
+        return get_collection_page_response(request, conf, channel.library_id)
 
     @action(methods=["get"], detail=True)
     def followers(self, request, *args, **kwargs):
@@ -292,30 +323,20 @@ class MusicLibraryViewSet(
         }
         page = request.GET.get("page")
         if page is None:
-            serializer = serializers.LibrarySerializer(lb)
-            data = serializer.data
-        else:
-            # if actor is requesting a specific page, we ensure library is public
-            # or readable by the actor
-            if not has_library_access(request, lb):
-                raise exceptions.AuthenticationFailed(
-                    "You do not have access to this library"
-                )
-            try:
-                page_number = int(page)
-            except Exception:
-                return response.Response({"page": ["Invalid page number"]}, status=400)
-            conf["page_size"] = preferences.get("federation__collection_page_size")
-            p = paginator.Paginator(conf["items"], conf["page_size"])
-            try:
-                page = p.page(page_number)
-                conf["page"] = page
-                serializer = serializers.CollectionPageSerializer(conf)
-                data = serializer.data
-            except paginator.EmptyPage:
-                return response.Response(status=404)
-
-        return response.Response(data)
+            data = pagination.get_cached_data(
+                lb.pk,
+                conf["id"],
+                "root",
+                lambda: serializers.LibrarySerializer(lb).data,
+            )
+            return response.Response(data)
+        # if actor is requesting a specific page, we ensure library is public
+        # or readable by the actor
+        if not has_library_access(request, lb):
+            raise exceptions.AuthenticationFailed(
+                "You do not have access to this library"
+            )
+        return get_collection_page_response(request, conf, lb.pk)
 
     @action(methods=["get"], detail=True)
     def followers(self, request, *args, **kwargs):
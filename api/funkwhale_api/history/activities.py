@@ -1,3 +1,4 @@
+from funkwhale_api.activity import models as activity_models
 from funkwhale_api.activity import record
 from funkwhale_api.common import channels
 
@@ -14,3 +15,8 @@ def broadcast_listening_to_instance_activity(data, obj):
     channels.group_send(
         "instance_activity", {"type": "event.send", "text": "", "data": data}
     )
+
+
+@record.registry.register_consumer("history.Listening")
+def add_listening_to_timeline(data, obj):
+    activity_models.TimelineEntry.append(obj)
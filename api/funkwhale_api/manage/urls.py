@@ -28,6 +28,7 @@ users_router.register(r"invitations", views.ManageInvitationViewSet, "invitation
 other_router = routers.OptionalSlashRouter()
 other_router.register(r"accounts", views.ManageActorViewSet, "accounts")
 other_router.register(r"channels", views.ManageChannelViewSet, "channels")
+other_router.register(r"jobs", views.ManageActionJobViewSet, "jobs")
 other_router.register(r"tags", views.ManageTagViewSet, "tags")
 
 urlpatterns = [
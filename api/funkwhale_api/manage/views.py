@@ -1,79 +1,34 @@
-from rest_framework import mixins, response, viewsets
+from rest_framework import mixins, permissions, response, viewsets
 from rest_framework import decorators as rest_decorators
 
 from django.db import transaction
-from django.db.models import Count, Prefetch, Q, Sum, OuterRef, Subquery
+from django.db.models import Count, Prefetch, Q, OuterRef, Subquery
 from django.db.models.functions import Coalesce, Length
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 
 from funkwhale_api.audio import models as audio_models
 from funkwhale_api.common.mixins import MultipleLookupDetailMixin
 from funkwhale_api.common import models as common_models
 from funkwhale_api.common import preferences, decorators
+from funkwhale_api.common import serializers as common_serializers
 from funkwhale_api.common import utils as common_utils
-from funkwhale_api.favorites import models as favorites_models
 from funkwhale_api.federation import models as federation_models
 from funkwhale_api.federation import tasks as federation_tasks
 from funkwhale_api.federation import utils as federation_utils
-from funkwhale_api.history import models as history_models
 from funkwhale_api.music import models as music_models
 from funkwhale_api.music import views as music_views
 from funkwhale_api.moderation import models as moderation_models
+from funkwhale_api.moderation import stats as moderation_stats
 from funkwhale_api.moderation import tasks as moderation_tasks
-from funkwhale_api.playlists import models as playlists_models
 from funkwhale_api.tags import models as tags_models
 from funkwhale_api.users import models as users_models
+from funkwhale_api.users.oauth import permissions as oauth_permissions
 
 
 from . import filters, serializers
 
 
-def get_stats(tracks, target, ignore_fields=[]):
-    tracks = list(tracks.values_list("pk", flat=True))
-    uploads = music_models.Upload.objects.filter(track__in=tracks)
-    fields = {
-        "listenings": history_models.Listening.objects.filter(track__in=tracks),
-        "mutations": common_models.Mutation.objects.get_for_target(target),
-        "playlists": (
-            playlists_models.PlaylistTrack.objects.filter(track__in=tracks)
-            .values_list("playlist", flat=True)
-            .distinct()
-        ),
-        "track_favorites": (
-            favorites_models.TrackFavorite.objects.filter(track__in=tracks)
-        ),
-        "libraries": (
-            uploads.filter(library__channel=None)
-            .values_list("library", flat=True)
-            .distinct()
-        ),
-        "channels": (
-            uploads.exclude(library__channel=None)
-            .values_list("library", flat=True)
-            .distinct()
-        ),
-        "uploads": uploads,
-        "reports": moderation_models.Report.objects.get_for_target(target),
-    }
-    data = {}
-    for key, qs in fields.items():
-        if key in ignore_fields:
-            continue
-        data[key] = qs.count()
-
-    data.update(get_media_stats(uploads))
-    return data
-
-
-def get_media_stats(uploads):
-    data = {}
-    data["media_total_size"] = uploads.aggregate(v=Sum("size"))["v"] or 0
-    data["media_downloaded_size"] = (
-        uploads.with_file().aggregate(v=Sum("size"))["v"] or 0
-    )
-    return data
-
-
 class ManageArtistViewSet(
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
@@ -85,32 +40,23 @@ class ManageArtistViewSet(
         .order_by("-id")
         .select_related("attributed_to", "attachment_cover", "channel")
         .annotate(_tracks_count=Count("tracks"))
-        .annotate(_albums_count=Count("albums"))
+        .with_albums_count()
         .prefetch_related(music_views.TAG_PREFETCH)
     )
     serializer_class = serializers.ManageArtistSerializer
     filterset_class = filters.ManageArtistFilterSet
     required_scope = "instance:libraries"
     ordering_fields = ["creation_date", "name"]
+    cursor_ordering_fields = ["creation_date", "name"]
 
     @rest_decorators.action(methods=["get"], detail=True)
     def stats(self, request, *args, **kwargs):
         artist = self.get_object()
-        tracks = music_models.Track.objects.filter(
-            Q(artist=artist) | Q(album__artist=artist)
-        )
-        data = get_stats(tracks, artist)
-        return response.Response(data, status=200)
-
-    @rest_decorators.action(methods=["post"], detail=False)
-    def action(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = serializers.ManageArtistActionSerializer(
-            request.data, queryset=queryset
-        )
-        serializer.is_valid(raise_exception=True)
-        result = serializer.save()
-        return response.Response(result, status=200)
+        return response.Response(moderation_stats.get(artist), status=200)
+
+    action = decorators.action_route(
+        serializers.ManageArtistActionSerializer, background=True
+    )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -134,22 +80,16 @@ class ManageAlbumViewSet(
     filterset_class = filters.ManageAlbumFilterSet
     required_scope = "instance:libraries"
     ordering_fields = ["creation_date", "title", "release_date"]
+    cursor_ordering_fields = ["creation_date", "title"]
 
     @rest_decorators.action(methods=["get"], detail=True)
     def stats(self, request, *args, **kwargs):
         album = self.get_object()
-        data = get_stats(album.tracks.all(), album)
-        return response.Response(data, status=200)
-
-    @rest_decorators.action(methods=["post"], detail=False)
-    def action(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = serializers.ManageAlbumActionSerializer(
-            request.data, queryset=queryset
-        )
-        serializer.is_valid(raise_exception=True)
-        result = serializer.save()
-        return response.Response(result, status=200)
+        return response.Response(moderation_stats.get(album), status=200)
+
+    action = decorators.action_route(
+        serializers.ManageAlbumActionSerializer, background=True
+    )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -195,22 +135,16 @@ class ManageTrackViewSet(
         "position",
         "disc_number",
     ]
+    cursor_ordering_fields = ["creation_date", "title"]
 
     @rest_decorators.action(methods=["get"], detail=True)
     def stats(self, request, *args, **kwargs):
         track = self.get_object()
-        data = get_stats(track.__class__.objects.filter(pk=track.pk), track)
-        return response.Response(data, status=200)
-
-    @rest_decorators.action(methods=["post"], detail=False)
-    def action(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = serializers.ManageTrackActionSerializer(
-            request.data, queryset=queryset
-        )
-        serializer.is_valid(raise_exception=True)
-        result = serializer.save()
-        return response.Response(result, status=200)
+        return response.Response(moderation_stats.get(track), status=200)
+
+    action = decorators.action_route(
+        serializers.ManageTrackActionSerializer, background=True
+    )
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -260,43 +194,11 @@ class ManageLibraryViewSet(
     @rest_decorators.action(methods=["get"], detail=True)
     def stats(self, request, *args, **kwargs):
         library = self.get_object()
-        uploads = library.uploads.all()
-        tracks = uploads.values_list("track", flat=True).distinct()
-        albums = (
-            music_models.Track.objects.filter(pk__in=tracks)
-            .values_list("album", flat=True)
-            .distinct()
-        )
-        artists = set(
-            music_models.Album.objects.filter(pk__in=albums).values_list(
-                "artist", flat=True
-            )
-        ) | set(
-            music_models.Track.objects.filter(pk__in=tracks).values_list(
-                "artist", flat=True
-            )
-        )
+        return response.Response(moderation_stats.get(library), status=200)
 
-        data = {
-            "uploads": uploads.count(),
-            "followers": library.received_follows.count(),
-            "tracks": tracks.count(),
-            "albums": albums.count(),
-            "artists": len(artists),
-            "reports": moderation_models.Report.objects.get_for_target(library).count(),
-        }
-        data.update(get_media_stats(uploads.all()))
-        return response.Response(data, status=200)
-
-    @rest_decorators.action(methods=["post"], detail=False)
-    def action(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = serializers.ManageTrackActionSerializer(
-            request.data, queryset=queryset
-        )
-        serializer.is_valid(raise_exception=True)
-        result = serializer.save()
-        return response.Response(result, status=200)
+    action = decorators.action_route(
+        serializers.ManageLibraryActionSerializer, background=True
+    )
 
 
 class ManageUploadViewSet(
@@ -314,16 +216,11 @@ class ManageUploadViewSet(
     serializer_class = serializers.ManageUploadSerializer
     filterset_class = filters.ManageUploadFilterSet
     required_scope = "instance:libraries"
+    cursor_ordering_fields = ["creation_date"]
 
-    @rest_decorators.action(methods=["post"], detail=False)
-    def action(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = serializers.ManageUploadActionSerializer(
-            request.data, queryset=queryset
-        )
-        serializer.is_valid(raise_exception=True)
-        result = serializer.save()
-        return response.Response(result, status=200)
+    action = decorators.action_route(
+        serializers.ManageUploadActionSerializer, background=True
+    )
 
 
 class ManageUserViewSet(
@@ -365,15 +262,9 @@ class ManageInvitationViewSet(
     def perform_create(self, serializer):
         serializer.save(owner=self.request.user)
 
-    @rest_decorators.action(methods=["post"], detail=False)
-    def action(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = serializers.ManageInvitationActionSerializer(
-            request.data, queryset=queryset
-        )
-        serializer.is_valid(raise_exception=True)
-        result = serializer.save()
-        return response.Response(result, status=200)
+    action = decorators.action_route(
+        serializers.ManageInvitationActionSerializer, background=True
+    )
 
 
 class ManageDomainViewSet(
@@ -427,8 +318,9 @@ class ManageDomainViewSet(
     @rest_decorators.action(methods=["get"], detail=True)
     def stats(self, request, *args, **kwargs):
         domain = self.get_object()
-        return response.Response(domain.get_stats(), status=200)
+        return response.Response(moderation_stats.get(domain), status=200)
 
+    # purges only enqueue a task, so there is no need to apply them in chunks
     action = decorators.action_route(serializers.ManageDomainActionSerializer)
 
 
@@ -471,8 +363,9 @@ class ManageActorViewSet(
     @rest_decorators.action(methods=["get"], detail=True)
     def stats(self, request, *args, **kwargs):
         obj = self.get_object()
-        return response.Response(obj.get_stats(), status=200)
+        return response.Response(moderation_stats.get(obj), status=200)
 
+    # purges only enqueue a task, so there is no need to apply them in chunks
     action = decorators.action_route(serializers.ManageActorActionSerializer)
 
 
@@ -599,15 +492,9 @@ class ManageTagViewSet(
         )
         return queryset
 
-    @rest_decorators.action(methods=["post"], detail=False)
-    def action(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = serializers.ManageTagActionSerializer(
-            request.data, queryset=queryset
-        )
-        serializer.is_valid(raise_exception=True)
-        result = serializer.save()
-        return response.Response(result, status=200)
+    action = decorators.action_route(
+        serializers.ManageTagActionSerializer, background=True
+    )
 
 
 class ManageUserRequestViewSet(
@@ -695,7 +582,7 @@ class ManageChannelViewSet(
                     .order_by("-id")
                     .select_related("attributed_to", "attachment_cover", "channel")
                     .annotate(_tracks_count=Count("tracks"))
-                    .annotate(_albums_count=Count("albums"))
+                    .with_albums_count()
                     .prefetch_related(music_views.TAG_PREFETCH)
                 ),
             )
@@ -709,14 +596,44 @@ class ManageChannelViewSet(
     @rest_decorators.action(methods=["get"], detail=True)
     def stats(self, request, *args, **kwargs):
         channel = self.get_object()
-        tracks = music_models.Track.objects.filter(
-            Q(artist=channel.artist) | Q(album__artist=channel.artist)
-        )
-        data = get_stats(tracks, channel, ignore_fields=["libraries", "channels"])
-        data["follows"] = channel.actor.received_follows.count()
-        return response.Response(data, status=200)
+        return response.Response(moderation_stats.get(channel), status=200)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["description"] = self.action in ["retrieve", "create", "update"]
         return context
+
+
+class ManageActionJobViewSet(
+    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    lookup_field = "uuid"
+    queryset = common_models.ActionJob.objects.all().order_by("-creation_date")
+    serializer_class = common_serializers.ActionJobSerializer
+    # jobs are created from the various action endpoints, with their own scopes,
+    # so we only restrict access to the jobs created by the current user
+    permission_classes = [
+        permissions.IsAuthenticated,
+        oauth_permissions.ScopePermission,
+    ]
+    required_scope = "profile"
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        actor = getattr(self.request.user, "actor", None)
+        if actor is None:
+            return queryset.none()
+        return queryset.filter(created_by=actor)
+
+    @rest_decorators.action(methods=["post"], detail=True)
+    def cancel(self, request, *args, **kwargs):
+        job = self.get_object()
+        cancelled = common_models.ActionJob.objects.filter(
+            pk=job.pk, status__in=["pending", "running"]
+        ).update(status="cancelled", finished_date=timezone.now())
+        if not cancelled:
+            return response.Response(
+                {"detail": "This job cannot be cancelled anymore"}, status=400
+            )
+        job.refresh_from_db()
+        return response.Response(self.get_serializer(job).data, status=200)
@@ -5,12 +5,13 @@ from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelatio
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import JSONField
 from django.db import models
-from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 
 from funkwhale_api.common import models as common_models
+from funkwhale_api.common import response_cache
 from funkwhale_api.federation import models as federation_models
 from funkwhale_api.federation import utils as federation_utils
 
@@ -228,3 +229,32 @@ def set_handled_date(sender, instance, **kwargs):
         instance.handled_date = timezone.now()
     elif not instance.is_handled:
         instance.handled_date = None
+
+
+@receiver(post_save, sender=InstancePolicy)
+@receiver(post_delete, sender=InstancePolicy)
+def invalidate_response_cache(sender, instance, **kwargs):
+    response_cache.invalidate(response_cache.GLOBAL_TAG)
+
+
+@receiver(post_save, sender=Report)
+@receiver(post_delete, sender=Report)
+@receiver(post_save, sender=common_models.Mutation)
+@receiver(post_delete, sender=common_models.Mutation)
+def invalidate_target_stats(sender, instance, **kwargs):
+    from . import stats
+
+    if instance.target_content_type_id and instance.target_id:
+        content_type = ContentType.objects.get_for_id(instance.target_content_type_id)
+        stats.invalidate(
+            "{}.{}".format(content_type.app_label, content_type.model),
+            instance.target_id,
+        )
+
+
+@receiver(post_save, sender=UserRequest)
+@receiver(post_delete, sender=UserRequest)
+def invalidate_submitter_stats(sender, instance, **kwargs):
+    from . import stats
+
+    stats.invalidate("federation.actor", instance.submitter_id)
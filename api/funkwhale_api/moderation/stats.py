@@ -0,0 +1,268 @@
+"""
+Statistics displayed to moderators about artists, albums, tracks, libraries,
+channels, accounts and domains.
+
+All the statistics of an object are computed in a single query: the set of related
+tracks or actors is selected once, in a CTE, and each statistic is a scalar
+subquery over this CTE. Results are cached, invalidated when the object is
+reported or edited, and precomputed in the background for objects with unresolved
+reports, cf moderation.tasks.precompute_stats.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from funkwhale_api.audio import models as audio_models
+from funkwhale_api.common import models as common_models
+from funkwhale_api.favorites import models as favorites_models
+from funkwhale_api.federation import models as federation_models
+from funkwhale_api.history import models as history_models
+from funkwhale_api.music import models as music_models
+from funkwhale_api.playlists import models as playlists_models
+
+from . import models
+
+CACHE_KEY = "moderation:stats:{}:{}"
+
+
+def count(queryset):
+    return ("COUNT(*)", queryset)
+
+
+def total(queryset, field):
+    return (
+        "COALESCE(SUM({}), 0)".format(connection.ops.quote_name(field)),
+        queryset.values(field),
+    )
+
+
+def cte(name, column="id"):
+    """
+    Return an expression selecting the given column of a CTE, to be used in
+    __in lookups
+    """
+    return RawSQL("SELECT {} FROM {}".format(column, name), [])
+
+
+def query(stats, ctes=[]):
+    """
+    Compute the given statistics in a single query, and return them as a dict.
+
+    ``stats`` maps each statistic to the result of count() or total() and ``ctes``
+    is a list of (name, queryset) tuples, that querysets can reference using cte()
+    """
+    quote = connection.ops.quote_name
+    parts = []
+    params = []
+    for name, queryset in ctes:
+        sql, p = queryset.order_by().query.sql_with_params()
+        parts.append("{} AS ({})".format(name, sql))
+        params += p
+    columns = []
+    for name, (aggregate, queryset) in stats.items():
+        sql, p = queryset.order_by().query.sql_with_params()
+        columns.append(
+            "(SELECT {} FROM ({}) AS s) AS {}".format(aggregate, sql, quote(name))
+        )
+        params += p
+
+    sql = "SELECT {}".format(", ".join(columns))
+    if parts:
+        sql = "WITH {} {}".format(", ".join(parts), sql)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        row = cursor.fetchone()
+    return {name: int(value) for name, value in zip(stats.keys(), row)}
+
+
+def get_media_stats(uploads):
+    return {
+        "media_total_size": total(uploads, "size"),
+        "media_downloaded_size": total(uploads.with_file(), "size"),
+    }
+
+
+def get_tracks_stats(target, ignore_fields=[]):
+    """
+    Statistics shared by artists, albums, tracks and channels, for the tracks
+    selected in the stats_tracks CTE
+    """
+    uploads = music_models.Upload.objects.filter(track__in=cte("stats_tracks"))
+    stats = {
+        "listenings": count(
+            history_models.Listening.objects.filter(track__in=cte("stats_tracks"))
+        ),
+        "mutations": count(common_models.Mutation.objects.get_for_target(target)),
+        "playlists": count(
+            playlists_models.PlaylistTrack.objects.filter(track__in=cte("stats_tracks"))
+            .values_list("playlist", flat=True)
+            .distinct()
+        ),
+        "track_favorites": count(
+            favorites_models.TrackFavorite.objects.filter(track__in=cte("stats_tracks"))
+        ),
+        "libraries": count(
+            uploads.filter(library__channel=None)
+            .values_list("library", flat=True)
+            .distinct()
+        ),
+        "channels": count(
+            uploads.exclude(library__channel=None)
+            .values_list("library", flat=True)
+            .distinct()
+        ),
+        "uploads": count(uploads),
+        "reports": count(models.Report.objects.get_for_target(target)),
+    }
+    for field in ignore_fields:
+        del stats[field]
+    stats.update(get_media_stats(uploads))
+    return stats
+
+
+def get_artist_stats(artist):
+    tracks = music_models.Track.objects.filter(
+        Q(artist=artist) | Q(album__artist=artist)
+    )
+    return query(get_tracks_stats(artist), ctes=[("stats_tracks", tracks.values("pk"))])
+
+
+def get_album_stats(album):
+    tracks = album.tracks.all()
+    return query(get_tracks_stats(album), ctes=[("stats_tracks", tracks.values("pk"))])
+
+
+def get_track_stats(track):
+    tracks = music_models.Track.objects.filter(pk=track.pk)
+    return query(get_tracks_stats(track), ctes=[("stats_tracks", tracks.values("pk"))])
+
+
+def get_channel_stats(channel):
+    tracks = music_models.Track.objects.filter(
+        Q(artist=channel.artist_id) | Q(album__artist=channel.artist_id)
+    )
+    stats = get_tracks_stats(channel, ignore_fields=["libraries", "channels"])
+    stats["follows"] = count(channel.actor.received_follows.all())
+    return query(stats, ctes=[("stats_tracks", tracks.values("pk"))])
+
+
+def get_library_stats(library):
+    uploads = library.uploads.all()
+    tracks = music_models.Track.objects.filter(pk__in=uploads.values("track")).values(
+        "pk", "album_id", "artist_id"
+    )
+    album_artists = music_models.Album.objects.filter(
+        pk__in=cte("stats_tracks", "album_id")
+    ).values("artist_id")
+    stats = {
+        "uploads": count(uploads),
+        "followers": count(library.received_follows.all()),
+        "tracks": count(music_models.Track.objects.filter(pk__in=cte("stats_tracks"))),
+        "albums": count(
+            music_models.Album.objects.filter(pk__in=cte("stats_tracks", "album_id"))
+        ),
+        "artists": count(
+            music_models.Artist.objects.filter(
+                Q(pk__in=cte("stats_tracks", "artist_id")) | Q(pk__in=album_artists)
+            )
+        ),
+        "reports": count(models.Report.objects.get_for_target(library)),
+    }
+    stats.update(get_media_stats(uploads))
+    return query(stats, ctes=[("stats_tracks", tracks)])
+
+
+def get_actors_stats():
+    """
+    Statistics shared by accounts and domains, for the actors selected in
+    the stats_actors CTE
+    """
+    actor_ids = cte("stats_actors")
+    uploads = music_models.Upload.objects.filter(library__actor__in=actor_ids)
+    return {
+        "outbox_activities": count(
+            federation_models.Activity.objects.filter(actor__in=actor_ids)
+        ),
+        "libraries": count(music_models.Library.objects.filter(actor__in=actor_ids)),
+        "channels": count(
+            audio_models.Channel.objects.filter(attributed_to__in=actor_ids)
+        ),
+        "received_library_follows": count(
+            federation_models.LibraryFollow.objects.filter(target__actor__in=actor_ids)
+        ),
+        "emitted_library_follows": count(
+            federation_models.LibraryFollow.objects.filter(actor__in=actor_ids)
+        ),
+        "artists": count(
+            music_models.Artist.objects.filter(from_activity__actor__in=actor_ids)
+        ),
+        "albums": count(
+            music_models.Album.objects.filter(from_activity__actor__in=actor_ids)
+        ),
+        "tracks": count(
+            music_models.Track.objects.filter(from_activity__actor__in=actor_ids)
+        ),
+        "uploads": count(uploads),
+        **get_media_stats(uploads),
+    }
+
+
+def get_actor_stats(actor):
+    actors = federation_models.Actor.objects.filter(pk=actor.pk).values("pk")
+    stats = get_actors_stats()
+    stats["reports"] = count(models.Report.objects.get_for_target(actor))
+    stats["requests"] = count(models.UserRequest.objects.filter(submitter=actor))
+    return query(stats, ctes=[("stats_actors", actors)])
+
+
+def get_domain_stats(domain):
+    actors = federation_models.Actor.objects.filter(domain=domain.pk).values("pk")
+    stats = get_actors_stats()
+    stats["actors"] = count(federation_models.Actor.objects.filter(domain=domain.pk))
+    return query(stats, ctes=[("stats_actors", actors)])
+
+
+HANDLERS = {
+    "music.artist": get_artist_stats,
+    "music.album": get_album_stats,
+    "music.track": get_track_stats,
+    "music.library": get_library_stats,
+    "audio.channel": get_channel_stats,
+    "federation.actor": get_actor_stats,
+    "federation.domain": get_domain_stats,
+}
+
+
+def get_label(model):
+    return "{}.{}".format(model._meta.app_label, model._meta.model_name)
+
+
+def get_cache_key(label, pk):
+    return CACHE_KEY.format(label, pk)
+
+
+def is_supported(model):
+    return get_label(model) in HANDLERS
+
+
+def get(obj, refresh=False):
+    """
+    Return the statistics of the given object, from the cache if possible
+    """
+    label = get_label(obj)
+    key = get_cache_key(label, obj.pk)
+    if not refresh:
+        data = cache.get(key)
+        if data is not None:
+            return data
+
+    data = HANDLERS[label](obj)
+    if settings.MODERATION_STATS_CACHE_DURATION > 0:
+        cache.set(key, data, timeout=settings.MODERATION_STATS_CACHE_DURATION)
+    return data
+
+
+def invalidate(label, pk):
+    cache.delete(get_cache_key(label, pk))
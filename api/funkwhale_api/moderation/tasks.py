@@ -1,4 +1,5 @@
 import logging
+from django.contrib.contenttypes.models import ContentType
 from django.core import mail
 from django.conf import settings
 from django.db import transaction
@@ -13,6 +14,7 @@ from funkwhale_api.users import models as users_models
 
 from . import models
 from . import signals
+from . import stats
 
 logger = logging.getLogger(__name__)
 
@@ -266,3 +268,30 @@ def notify_submitter_signup_request_refused(user_request):
         recipient_list=[submitter_email],
         from_email=settings.DEFAULT_FROM_EMAIL,
     )
+
+
+@celery.app.task(name="moderation.precompute_stats")
+def precompute_stats():
+    """
+    Compute and cache the statistics of objects with unresolved reports, so
+    moderators handling these reports don't have to wait for them
+    """
+    targets = (
+        models.Report.objects.filter(is_handled=False, target_id__isnull=False)
+        .values_list("target_content_type", "target_id")
+        .order_by()
+        .distinct()
+    )
+    total = 0
+    for content_type_id, target_id in targets:
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if not model or not stats.is_supported(model):
+            continue
+        try:
+            target = model.objects.get(pk=target_id)
+        except model.DoesNotExist:
+            continue
+        stats.get(target, refresh=True)
+        total += 1
+    logger.info("Statistics of %s reported objects computed", total)
+    return total
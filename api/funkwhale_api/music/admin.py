@@ -30,6 +30,27 @@ class TrackActorAdmin(admin.ModelAdmin):
     list_select_related = ["actor", "track"]
 
 
+@admin.register(models.ArtistActor)
+class ArtistActorAdmin(admin.ModelAdmin):
+    list_display = ["actor", "artist", "internal"]
+    search_fields = ["actor__preferred_username", "artist__name"]
+    list_select_related = ["actor", "artist"]
+
+
+@admin.register(models.AlbumActor)
+class AlbumActorAdmin(admin.ModelAdmin):
+    list_display = ["actor", "album", "internal"]
+    search_fields = ["actor__preferred_username", "album__title"]
+    list_select_related = ["actor", "album"]
+
+
+@admin.register(models.SearchEntry)
+class SearchEntryAdmin(admin.ModelAdmin):
+    list_display = ["entity_type", "entity_id", "text", "weight"]
+    search_fields = ["text"]
+    list_filter = ["entity_type"]
+
+
 @admin.register(models.ImportBatch)
 class ImportBatchAdmin(admin.ModelAdmin):
     list_display = ["submitted_by", "creation_date", "import_request", "status"]
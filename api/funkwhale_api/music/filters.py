@@ -93,7 +93,7 @@ class ArtistFilter(
 
     def filter_playable(self, queryset, name, value):
         actor = utils.get_actor_from_request(self.request)
-        return queryset.playable_by(actor, value).distinct()
+        return queryset.playable_by(actor, value)
 
 
 class TrackFilter(
@@ -132,7 +132,7 @@ class TrackFilter(
 
     def filter_playable(self, queryset, name, value):
         actor = utils.get_actor_from_request(self.request)
-        return queryset.playable_by(actor, value).distinct()
+        return queryset.playable_by(actor, value)
 
 
 class UploadFilter(audio_filters.IncludeChannelsFilterSet):
@@ -3,8 +3,6 @@ from argparse import RawTextHelpFormatter
 from django.core.management.base import BaseCommand
 from django.core.management.base import CommandError
 
-from django.db import transaction
-
 from funkwhale_api.music import models, tasks
 
 
@@ -19,6 +17,10 @@ class Command(BaseCommand):
     Tracks with associated favorites, playlists or listening won't be deleted
     by default, unless you pass the corresponding --ignore-* flags.
 
+    Objects are deleted in batches, each batch being committed separately,
+    so you can interrupt the command and rerun it later: it will resume
+    where it stopped.
+
     """
 
     def create_parser(self, *args, **kwargs):
@@ -80,7 +82,14 @@ class Command(BaseCommand):
             help="Allow tracks with listening history to be pruned",
         )
 
-    @transaction.atomic
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            dest="batch_size",
+            default=None,
+            help="Number of objects deleted in a single transaction",
+        )
+
     def handle(self, *args, **options):
         if not any(
             [options["prune_albums"], options["prune_tracks"], options["prune_artists"]]
@@ -108,7 +117,7 @@ class Command(BaseCommand):
                 )
             else:
                 self.stdout.write("Deleting {}/{} tracks…".format(pruned_total, total))
-                prunable.delete()
+                self.prune(prunable, "tracks", options)
 
         if options["prune_albums"]:
             prunable = tasks.get_prunable_albums()
@@ -120,7 +129,7 @@ class Command(BaseCommand):
                 )
             else:
                 self.stdout.write("Deleting {}/{} albums…".format(pruned_total, total))
-                prunable.delete()
+                self.prune(prunable, "albums", options)
 
         if options["prune_artists"]:
             prunable = tasks.get_prunable_artists()
@@ -132,7 +141,7 @@ class Command(BaseCommand):
                 )
             else:
                 self.stdout.write("Deleting {}/{} artists…".format(pruned_total, total))
-                prunable.delete()
+                self.prune(prunable, "artists", options)
 
         self.stdout.write("")
         if options["dry_run"]:
@@ -143,3 +152,18 @@ class Command(BaseCommand):
             self.stdout.write("Pruning completed!")
 
         self.stdout.write("")
+
+    def prune(self, queryset, name, options):
+        def on_progress(progress):
+            self.stdout.write(
+                "  {} {} deleted ({:.1f}/s)".format(
+                    progress["deleted"], name, progress["rate"]
+                )
+            )
+
+        tasks.prune(
+            queryset,
+            name,
+            batch_size=options.get("batch_size"),
+            on_progress=on_progress,
+        )
@@ -6,7 +6,11 @@ from django.core.management.base import CommandError
 from django.db import transaction
 from django.db.models import Q
 
-from funkwhale_api.music.models import TrackActor, Library
+from funkwhale_api.music.models import (
+    TrackActor,
+    Library,
+    update_artist_album_actor_entries,
+)
 from funkwhale_api.federation.models import Actor
 
 
@@ -57,3 +61,5 @@ class Command(BaseCommand):
             )
         print('Commiting changes…')
         TrackActor.objects.bulk_create(objs, batch_size=5000, ignore_conflicts=True)
+        print('Populating artist and album permission tables…')
+        update_artist_album_actor_entries()
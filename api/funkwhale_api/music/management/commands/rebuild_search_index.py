@@ -0,0 +1,60 @@
+from argparse import RawTextHelpFormatter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from funkwhale_api.music import models, tasks
+
+
+class Command(BaseCommand):
+    help = """
+    Populate or refresh the search index used by the global search endpoint.
+
+    You need to run this once after enabling MUSIC_USE_SEARCH_INDEX on an existing pod.
+    Afterwards, the index is kept up-to-date automatically.
+
+    """
+
+    def create_parser(self, *args, **kwargs):
+        parser = super().create_parser(*args, **kwargs)
+        parser.formatter_class = RawTextHelpFormatter
+        return parser
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "entity_types",
+            nargs="*",
+            help="Rebuild only given entity types (artist, album, track or tag)",
+        )
+        parser.add_argument(
+            "--missing-only",
+            action="store_true",
+            dest="missing_only",
+            default=False,
+            help="Only index entities that are not indexed yet",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            dest="chunk_size",
+            default=5000,
+            help="Number of entities to index in each transaction",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.MUSIC_USE_SEARCH_INDEX:
+            raise CommandError(
+                "The search index is disabled, set MUSIC_USE_SEARCH_INDEX=true first"
+            )
+        valid_types = [t for t, _ in models.SEARCH_ENTITY_TYPES]
+        for entity_type in options["entity_types"]:
+            if entity_type not in valid_types:
+                raise CommandError("Invalid entity type {}".format(entity_type))
+        self.stdout.write("Populating search index…")
+        total = tasks.update_search_index(
+            entity_types=options["entity_types"],
+            missing_only=options["missing_only"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write("{} search entries updated".format(total))
@@ -0,0 +1,106 @@
+# Generated by Django 3.0.4 on 2020-04-02 09:12
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+
+class CustomTrigramExtension(TrigramExtension):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        check_sql = "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(check_sql)
+            result = cursor.fetchall()
+
+        if result:
+            return
+        return super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+
+# Search entries are removed by triggers, because music entities are often deleted
+# through cascades or raw deletes that don't send any signal
+TRIGGERS = {
+    "music_artist": ("music_artist_delete_search_entry", "artist"),
+    "music_album": ("music_album_delete_search_entry", "album"),
+    "music_track": ("music_track_delete_search_entry", "track"),
+    "tags_tag": ("tags_tag_delete_search_entry", "tag"),
+}
+
+
+def setup_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE OR REPLACE FUNCTION music_delete_search_entry() RETURNS trigger AS $$
+            BEGIN
+                DELETE FROM music_searchentry
+                WHERE entity_type = TG_ARGV[0] AND entity_id = OLD.id;
+                RETURN OLD;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        for table, (trigger_name, entity_type) in TRIGGERS.items():
+            cursor.execute(
+                """
+                CREATE TRIGGER {trigger_name}
+                    AFTER DELETE
+                    ON {table}
+                    FOR EACH ROW
+                    EXECUTE PROCEDURE music_delete_search_entry('{entity_type}')
+                """.format(
+                    trigger_name=trigger_name, table=table, entity_type=entity_type
+                )
+            )
+
+
+def rewind_triggers(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for table, (trigger_name, _) in TRIGGERS.items():
+            cursor.execute(
+                "DROP TRIGGER IF EXISTS {} ON {}".format(trigger_name, table)
+            )
+        cursor.execute("DROP FUNCTION IF EXISTS music_delete_search_entry()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0051_auto_20200319_1249"),
+        ("tags", "0001_initial"),
+    ]
+
+    operations = [
+        CustomTrigramExtension(),
+        migrations.CreateModel(
+            name="SearchEntry",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "entity_type",
+                    models.CharField(
+                        choices=[
+                            ("artist", "artist"),
+                            ("album", "album"),
+                            ("track", "track"),
+                            ("tag", "tag"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("entity_id", models.PositiveIntegerField()),
+                ("text", models.TextField()),
+                ("weight", models.PositiveIntegerField(default=0)),
+            ],
+            options={"unique_together": {("entity_type", "entity_id")}},
+        ),
+        migrations.AddIndex(
+            model_name="searchentry",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["text"],
+                name="music_searchentry_text_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.RunPython(setup_triggers, rewind_triggers),
+    ]
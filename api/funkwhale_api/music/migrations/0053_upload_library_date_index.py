@@ -0,0 +1,20 @@
+# Generated by Django 3.0.4 on 2020-04-09 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0052_searchentry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="upload",
+            index=models.Index(
+                fields=["library", "-creation_date", "-id"],
+                name="music_upload_library_date",
+            ),
+        ),
+    ]
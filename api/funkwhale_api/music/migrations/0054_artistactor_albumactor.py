@@ -0,0 +1,79 @@
+# Generated by Django 3.0.4 on 2020-04-10 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+POPULATE_SQL = """
+INSERT INTO music_{model}actor ({model}_id, actor_id, internal)
+SELECT DISTINCT t.{model}_id, ta.actor_id, ta.internal
+FROM music_trackactor ta
+INNER JOIN music_track t ON t.id = ta.track_id
+WHERE t.{model}_id IS NOT NULL
+ON CONFLICT DO NOTHING
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("federation", "0027_incomingactivity"),
+        ("music", "0053_upload_library_date_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArtistActor",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("internal", models.BooleanField(db_index=True, default=False)),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="artist_actor_items",
+                        to="federation.Actor",
+                    ),
+                ),
+                (
+                    "artist",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="artist_actor_items",
+                        to="music.Artist",
+                    ),
+                ),
+            ],
+            options={"unique_together": {("artist", "actor", "internal")}},
+        ),
+        migrations.CreateModel(
+            name="AlbumActor",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("internal", models.BooleanField(db_index=True, default=False)),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="album_actor_items",
+                        to="federation.Actor",
+                    ),
+                ),
+                (
+                    "album",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="album_actor_items",
+                        to="music.Album",
+                    ),
+                ),
+            ],
+            options={"unique_together": {("album", "actor", "internal")}},
+        ),
+        migrations.RunSQL(POPULATE_SQL.format(model="artist"), migrations.RunSQL.noop),
+        migrations.RunSQL(POPULATE_SQL.format(model="album"), migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.0.8 on 2026-10-19 14:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("federation", "0027_incomingactivity"),
+        ("music", "0054_artistactor_albumactor"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="album",
+            name="tracks_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="artist",
+            name="albums_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="ActorUploadUsage",
+            fields=[
+                (
+                    "actor",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="upload_usage",
+                        serialize=False,
+                        to="federation.Actor",
+                    ),
+                ),
+                ("draft", models.BigIntegerField(default=0)),
+                ("pending", models.BigIntegerField(default=0)),
+                ("skipped", models.BigIntegerField(default=0)),
+                ("errored", models.BigIntegerField(default=0)),
+                ("finished", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE music_album o
+            SET tracks_count = (SELECT count(*) FROM music_track t WHERE t.album_id = o.id)
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE music_artist o
+            SET albums_count = (SELECT count(*) FROM music_album a WHERE a.artist_id = o.id)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
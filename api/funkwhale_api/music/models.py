@@ -3,6 +3,7 @@ import logging
 import mimetypes
 import os
 import tempfile
+import threading
 import urllib.parse
 import uuid
 
@@ -16,19 +17,23 @@ from django.contrib.postgres.indexes import GinIndex
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files.base import ContentFile
 from django.core.serializers.json import DjangoJSONEncoder
-from django.db import models, transaction
-from django.db.models.signals import post_save, pre_save
+from django.db import connection, models, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from versatileimagefield.fields import VersatileImageField
 
 from funkwhale_api import musicbrainz
+from funkwhale_api.common import counters
 from funkwhale_api.common import fields
 from funkwhale_api.common import models as common_models
+from funkwhale_api.common import response_cache
+from funkwhale_api.common import search as common_search
 from funkwhale_api.common import session
 from funkwhale_api.common import utils as common_utils
 from funkwhale_api.federation import models as federation_models
+from funkwhale_api.federation import pagination as federation_pagination
 from funkwhale_api.federation import utils as federation_utils
 from funkwhale_api.tags import models as tags_models
 from . import importers, metadata, utils
@@ -177,9 +182,19 @@ class License(models.Model):
         logger.warning("%s do not match any registered license", self.code)
 
 
+def get_playable_by_actor_query(actor):
+    """
+    Return a query to filter TrackActor, AlbumActor or ArtistActor entries
+    matching content playable by the given actor
+    """
+    if actor is not None:
+        return models.Q(actor=None) | models.Q(actor=actor)
+    return models.Q(actor=None, internal=False)
+
+
 class ArtistQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
     def with_albums_count(self):
-        return self.annotate(_albums_count=models.Count("albums"))
+        return self.annotate(_albums_count=models.F("albums_count"))
 
     def with_albums(self):
         return self.prefetch_related(
@@ -192,6 +207,15 @@ class ArtistQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
         )
 
     def annotate_playable_by_actor(self, actor):
+        if settings.MUSIC_USE_DENORMALIZATION:
+            entries = (
+                ArtistActor.objects.filter(
+                    get_playable_by_actor_query(actor), artist=models.OuterRef("id")
+                )
+                .order_by()
+                .values("id")[:1]
+            )
+            return self.annotate(is_playable_by_actor=models.Subquery(entries))
         tracks = (
             Upload.objects.playable_by(actor)
             .filter(track__artist=models.OuterRef("id"))
@@ -202,6 +226,14 @@ class ArtistQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
         return self.annotate(is_playable_by_actor=subquery)
 
     def playable_by(self, actor, include=True):
+        if settings.MUSIC_USE_DENORMALIZATION:
+            matches = ArtistActor.objects.filter(
+                get_playable_by_actor_query(actor)
+            ).values("artist")
+            if include:
+                return self.filter(pk__in=matches)
+            else:
+                return self.exclude(pk__in=matches)
         tracks = Track.objects.playable_by(actor)
         matches = self.filter(pk__in=tracks.values("artist_id")).values_list("pk")
         if include:
@@ -210,7 +242,8 @@ class ArtistQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
             return self.exclude(pk__in=matches)
 
 
-class Artist(APIModelMixin):
+class Artist(common_models.DenormalizedCountersMixin, APIModelMixin):
+    counter_fields = ["albums_count"]
     name = models.CharField(max_length=MAX_LENGTHS["ARTIST_NAME"])
     federation_namespace = "artists"
     musicbrainz_model = "artist"
@@ -252,6 +285,8 @@ class Artist(APIModelMixin):
         null=True,
     )
     modification_date = models.DateTimeField(default=timezone.now, db_index=True)
+    # maintained on album creation and deletion, cf funkwhale_api.common.counters
+    albums_count = models.PositiveIntegerField(default=0)
     api = musicbrainz.api.artists
     objects = ArtistQuerySet.as_manager()
 
@@ -300,9 +335,18 @@ def import_tracks(instance, cleaned_data, raw_data):
 
 class AlbumQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
     def with_tracks_count(self):
-        return self.annotate(_tracks_count=models.Count("tracks"))
+        return self.annotate(_tracks_count=models.F("tracks_count"))
 
     def annotate_playable_by_actor(self, actor):
+        if settings.MUSIC_USE_DENORMALIZATION:
+            entries = (
+                AlbumActor.objects.filter(
+                    get_playable_by_actor_query(actor), album=models.OuterRef("id")
+                )
+                .order_by()
+                .values("id")[:1]
+            )
+            return self.annotate(is_playable_by_actor=models.Subquery(entries))
         tracks = (
             Upload.objects.playable_by(actor)
             .filter(track__album=models.OuterRef("id"))
@@ -313,6 +357,14 @@ class AlbumQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
         return self.annotate(is_playable_by_actor=subquery)
 
     def playable_by(self, actor, include=True):
+        if settings.MUSIC_USE_DENORMALIZATION:
+            matches = AlbumActor.objects.filter(
+                get_playable_by_actor_query(actor)
+            ).values("album")
+            if include:
+                return self.filter(pk__in=matches)
+            else:
+                return self.exclude(pk__in=matches)
         tracks = Track.objects.playable_by(actor)
         matches = self.filter(pk__in=tracks.values("album_id")).values_list("pk")
         if include:
@@ -325,7 +377,8 @@ class AlbumQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
         return self.prefetch_related(models.Prefetch("tracks", queryset=tracks))
 
 
-class Album(APIModelMixin):
+class Album(common_models.DenormalizedCountersMixin, APIModelMixin):
+    counter_fields = ["tracks_count"]
     title = models.CharField(max_length=MAX_LENGTHS["ALBUM_TITLE"])
     artist = models.ForeignKey(Artist, related_name="albums", on_delete=models.CASCADE)
     release_date = models.DateField(null=True, blank=True, db_index=True)
@@ -364,6 +417,8 @@ class Album(APIModelMixin):
     description = models.ForeignKey(
         "common.Content", null=True, blank=True, on_delete=models.SET_NULL
     )
+    # maintained on track creation and deletion, cf funkwhale_api.common.counters
+    tracks_count = models.PositiveIntegerField(default=0)
 
     api_includes = ["artist-credits", "recordings", "media", "release-groups"]
     api = musicbrainz.api.releases
@@ -447,10 +502,7 @@ class TrackQuerySet(common_models.LocalFromFidQuerySet, models.QuerySet):
     def playable_by(self, actor, include=True):
 
         if settings.MUSIC_USE_DENORMALIZATION:
-            if actor is not None:
-                query = models.Q(actor=None) | models.Q(actor=actor)
-            else:
-                query = models.Q(actor=None, internal=False)
+            query = get_playable_by_actor_query(actor)
             if not include:
                 query = ~query
             return self.filter(pk__in=TrackActor.objects.filter(query).values("track"))
@@ -756,6 +808,15 @@ class Upload(models.Model):
 
     objects = UploadQuerySet.as_manager()
 
+    class Meta:
+        indexes = [
+            # used to paginate library collections served to other pods
+            models.Index(
+                fields=["library", "-creation_date", "-id"],
+                name="music_upload_library_date",
+            )
+        ]
+
     @property
     def is_local(self):
         return federation_utils.is_local(self.fid)
@@ -1328,7 +1389,372 @@ class TrackActor(models.Model):
         objs = cls.get_objs(
             library, actor_ids=actor_ids, upload_and_track_ids=upload_and_track_ids
         )
-        return cls.objects.bulk_create(objs, ignore_conflicts=True, batch_size=5000)
+        result = cls.objects.bulk_create(objs, ignore_conflicts=True, batch_size=5000)
+        if upload_and_track_ids:
+            track_ids = [track_id for _, track_id in upload_and_track_ids]
+        else:
+            track_ids = library.uploads.values("track")
+        update_artist_album_actor_entries(track_ids)
+        return result
+
+
+class ArtistActor(models.Model):
+    """
+    Denormalization table to store all playable artists for a given user,
+    built from TrackActor entries. Empty user means the artist is public or internal
+    (cf internal flag too)
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    actor = models.ForeignKey(
+        "federation.Actor",
+        on_delete=models.CASCADE,
+        related_name="artist_actor_items",
+        blank=True,
+        null=True,
+    )
+    artist = models.ForeignKey(
+        Artist, on_delete=models.CASCADE, related_name="artist_actor_items"
+    )
+    internal = models.BooleanField(default=False, db_index=True)
+
+    class Meta:
+        unique_together = ("artist", "actor", "internal")
+
+
+class AlbumActor(models.Model):
+    """
+    Denormalization table to store all playable albums for a given user,
+    built from TrackActor entries. Empty user means the album is public or internal
+    (cf internal flag too)
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    actor = models.ForeignKey(
+        "federation.Actor",
+        on_delete=models.CASCADE,
+        related_name="album_actor_items",
+        blank=True,
+        null=True,
+    )
+    album = models.ForeignKey(
+        Album, on_delete=models.CASCADE, related_name="album_actor_items"
+    )
+    internal = models.BooleanField(default=False, db_index=True)
+
+    class Meta:
+        unique_together = ("album", "actor", "internal")
+
+
+DELETE_PLAYABLE_ENTRIES_SQL = "DELETE FROM {table} {where}"
+INSERT_PLAYABLE_ENTRIES_SQL = """
+    INSERT INTO {table} ({field}, actor_id, internal)
+    SELECT DISTINCT t.{field}, ta.actor_id, ta.internal
+    FROM music_trackactor ta
+    INNER JOIN music_track t ON t.id = ta.track_id
+    WHERE t.{field} IS NOT NULL {where}
+    ON CONFLICT DO NOTHING
+"""
+
+
+def update_artist_album_actor_entries(track_ids=None, artist_ids=(), album_ids=()):
+    """
+    Rebuild ArtistActor and AlbumActor entries from TrackActor for the artists and
+    albums of the given tracks, and the given artists and albums.
+    All entries are rebuilt if track_ids is None.
+    """
+    if not settings.MUSIC_USE_DENORMALIZATION:
+        return
+    targets = [(ArtistActor, "artist_id", None), (AlbumActor, "album_id", None)]
+    if track_ids is not None:
+        rows = (
+            Track.objects.filter(pk__in=track_ids)
+            .order_by()
+            .values_list("artist_id", "album_id")
+            .distinct()
+        )
+        artist_ids, album_ids = set(artist_ids), set(album_ids)
+        for artist_id, album_id in rows:
+            artist_ids.add(artist_id)
+            if album_id:
+                album_ids.add(album_id)
+        targets = [
+            (ArtistActor, "artist_id", sorted(artist_ids)),
+            (AlbumActor, "album_id", sorted(album_ids)),
+        ]
+
+    with connection.cursor() as cursor:
+        for model, field, ids in targets:
+            if ids == []:
+                continue
+            table = model._meta.db_table
+            if ids is None:
+                delete_where, insert_where, params = "", "", []
+            else:
+                delete_where = "WHERE {} = ANY(%s)".format(field)
+                insert_where = "AND t.{} = ANY(%s)".format(field)
+                params = [ids]
+            cursor.execute(
+                DELETE_PLAYABLE_ENTRIES_SQL.format(table=table, where=delete_where),
+                params,
+            )
+            cursor.execute(
+                INSERT_PLAYABLE_ENTRIES_SQL.format(
+                    table=table, field=field, where=insert_where
+                ),
+                params,
+            )
+
+
+# tracks, artists and albums whose ArtistActor and AlbumActor entries must be rebuilt
+# once the current transaction is committed
+_pending_artist_album_actor_updates = threading.local()
+
+
+def schedule_artist_album_actor_update(track_ids=(), artist_ids=(), album_ids=()):
+    """
+    Rebuild ArtistActor and AlbumActor entries once the current transaction is
+    committed, cf update_artist_album_actor_entries. Updates scheduled in the same
+    transaction are merged, so deleting many uploads results in a single rebuild.
+    """
+    pending = _pending_artist_album_actor_updates
+    if getattr(pending, "ids", None) is None:
+        pending.ids = {"track_ids": set(), "artist_ids": set(), "album_ids": set()}
+    pending.ids["track_ids"].update(track_ids)
+    pending.ids["artist_ids"].update(artist_ids)
+    pending.ids["album_ids"].update(album_ids)
+    # the first callback to run handles all the pending ids, others do nothing.
+    # Registering one per call ensures ids collected in a transaction that
+    # was rolled back are still handled on the next commit
+    common_utils.on_commit(flush_artist_album_actor_updates)
+
+
+def flush_artist_album_actor_updates():
+    pending = _pending_artist_album_actor_updates
+    ids = getattr(pending, "ids", None)
+    pending.ids = None
+    if not ids or not any(ids.values()):
+        return
+    update_artist_album_actor_entries(
+        sorted(ids["track_ids"]),
+        artist_ids=ids["artist_ids"],
+        album_ids=ids["album_ids"],
+    )
+
+
+class ActorUploadUsage(models.Model):
+    """
+    Denormalized size of the files uploaded by an actor, per import status.
+
+    Entries are created on first access, kept up-to-date on upload changes
+    and reconciled periodically (cf funkwhale_api.common.counters)
+    """
+
+    actor = models.OneToOneField(
+        "federation.Actor",
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="upload_usage",
+    )
+    draft = models.BigIntegerField(default=0)
+    pending = models.BigIntegerField(default=0)
+    skipped = models.BigIntegerField(default=0)
+    errored = models.BigIntegerField(default=0)
+    finished = models.BigIntegerField(default=0)
+
+    @classmethod
+    def get_for_actor(cls, actor):
+        try:
+            return cls.objects.get(actor=actor)
+        except cls.DoesNotExist:
+            pass
+        annotated = actor.__class__.objects.filter(pk=actor.pk).with_current_usage()
+        annotated = annotated.get()
+        values = {
+            s: getattr(annotated, "_usage_{}".format(s)) or 0
+            for s in counters.UPLOAD_USAGE_STATUSES
+        }
+        usage, _ = cls.objects.get_or_create(actor=actor, defaults=values)
+        return usage
+
+
+def get_upload_usage(upload):
+    """
+    Return a (actor_id, import_status, size) tuple describing how the upload
+    counts toward its owner quota
+    """
+    if not upload.library_id:
+        return None
+    size = (upload.size or 0) if upload.audio_file else 0
+    return (upload.library.actor_id, upload.import_status, size)
+
+
+def update_upload_usage(usage, factor):
+    if not usage:
+        return
+    actor_id, import_status, size = usage
+    if not size or import_status not in counters.UPLOAD_USAGE_STATUSES:
+        return
+    ActorUploadUsage.objects.filter(actor_id=actor_id).update(
+        **{import_status: models.F(import_status) + size * factor}
+    )
+
+
+SEARCH_ENTITY_TYPES = [
+    ("artist", "artist"),
+    ("album", "album"),
+    ("track", "track"),
+    ("tag", "tag"),
+]
+
+# For each entity type, a SELECT returning (id, normalized text, popularity weight)
+# rows that is used to fill the search index in a single statement
+SEARCH_ENTRIES_SQL = {
+    "artist": """
+        SELECT a.id, lower(unaccent(a.name)),
+            (SELECT count(*) FROM music_track t WHERE t.artist_id = a.id)
+        FROM music_artist a
+    """,
+    "album": """
+        SELECT al.id, lower(unaccent(concat_ws(' ', al.title, ar.name))),
+            (SELECT count(*) FROM music_track t WHERE t.album_id = al.id)
+        FROM music_album al
+        INNER JOIN music_artist ar ON ar.id = al.artist_id
+    """,
+    "track": """
+        SELECT t.id, lower(unaccent(concat_ws(' ', t.title, al.title, ar.name))),
+            (SELECT count(*) FROM history_listening l WHERE l.track_id = t.id)
+            + (SELECT count(*) FROM favorites_trackfavorite f WHERE f.track_id = t.id)
+        FROM music_track t
+        INNER JOIN music_artist ar ON ar.id = t.artist_id
+        LEFT OUTER JOIN music_album al ON al.id = t.album_id
+    """,
+    "tag": """
+        SELECT tag.id, lower(unaccent(tag.name)),
+            (SELECT count(*) FROM tags_taggeditem ti WHERE ti.tag_id = tag.id)
+        FROM tags_tag tag
+    """,
+}
+# Fields that contribute to the indexed text, used to skip index updates on unrelated saves
+SEARCH_INDEXED_FIELDS = {
+    "artist": ["name"],
+    "album": ["title", "artist", "artist_id"],
+    "track": ["title", "album", "album_id", "artist", "artist_id"],
+    "tag": ["name"],
+}
+SEARCH_ENTRIES_ID_COLUMN = {
+    "artist": "a.id",
+    "album": "al.id",
+    "track": "t.id",
+    "tag": "tag.id",
+}
+
+
+class SearchEntry(models.Model):
+    """
+    Denormalization table used by the global search endpoint: each artist,
+    album, track and tag gets a row with its lowercased, unaccented text
+    and a popularity weight. The text column is indexed with pg_trgm, so substring
+    lookups and similarity ranking don't need to scan and join the music tables.
+    """
+
+    id = models.BigAutoField(primary_key=True)
+    entity_type = models.CharField(max_length=10, choices=SEARCH_ENTITY_TYPES)
+    entity_id = models.PositiveIntegerField()
+    text = models.TextField()
+    weight = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("entity_type", "entity_id")
+        indexes = [
+            GinIndex(
+                fields=["text"],
+                name="music_searchentry_text_trgm",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+
+    @classmethod
+    def update_entries(
+        cls, entity_type, ids=None, where=None, params=None, missing_only=False
+    ):
+        """
+        Insert or refresh index entries for the given entity type, in a single
+        statement. Entries can be restricted to specific ids or to an
+        arbitrary SQL condition on the underlying tables (e.g ``t.album_id = %s``).
+        """
+        if not settings.MUSIC_USE_SEARCH_INDEX:
+            # skip
+            return
+        id_column = SEARCH_ENTRIES_ID_COLUMN[entity_type]
+        conditions = []
+        query_params = [entity_type]
+        if ids is not None:
+            conditions.append("{} = ANY(%s)".format(id_column))
+            query_params.append(list(ids))
+        if where:
+            conditions.append(where)
+            query_params += list(params or [])
+        if missing_only:
+            conditions.append(
+                "NOT EXISTS (SELECT 1 FROM music_searchentry e "
+                "WHERE e.entity_type = %s AND e.entity_id = {})".format(id_column)
+            )
+            query_params.append(entity_type)
+        sql = """
+            INSERT INTO music_searchentry (entity_type, entity_id, text, weight)
+            SELECT %s, entity.* FROM ({select} {where}) AS entity
+            ON CONFLICT (entity_type, entity_id)
+            DO UPDATE SET text = EXCLUDED.text, weight = EXCLUDED.weight
+        """.format(
+            select=SEARCH_ENTRIES_SQL[entity_type],
+            where="WHERE {}".format(" AND ".join(conditions)) if conditions else "",
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, query_params)
+            return cursor.rowcount
+
+    @classmethod
+    def search(cls, query, limit):
+        """
+        Return a dict mapping each entity type to the list of the ``limit``
+        best matching ids, ordered by relevance. Every term of the query must appear in
+        the indexed text; matches are ranked by trigram similarity with a bonus
+        for popular entities.
+        """
+        results = {entity_type: [] for entity_type, _ in SEARCH_ENTITY_TYPES}
+        terms = [
+            t.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            for t in common_search.normalize_query(query)
+        ]
+        if not terms:
+            return results
+        sql = """
+            SELECT entity_type, entity_id FROM (
+                SELECT entity_type, entity_id, row_number() OVER (
+                    PARTITION BY entity_type
+                    ORDER BY
+                        word_similarity(lower(unaccent(%s)), text)
+                        + ln(1 + weight) * %s DESC,
+                        length(text),
+                        entity_id
+                ) AS position
+                FROM music_searchentry
+                WHERE {conditions}
+            ) AS ranked
+            WHERE position <= %s
+            ORDER BY entity_type, position
+        """.format(
+            conditions=" AND ".join(
+                ["text LIKE '%%' || lower(unaccent(%s)) || '%%'"] * len(terms)
+            )
+        )
+        params = [query, settings.MUSIC_SEARCH_POPULARITY_FACTOR] + terms + [limit]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for entity_type, entity_id in cursor.fetchall():
+                results[entity_type].append(entity_id)
+        return results
 
 
 @receiver(post_save, sender=ImportJob)
@@ -1351,6 +1777,140 @@ def update_denormalization_track_actor(sender, instance, created, **kwargs):
         )
 
 
+@receiver(post_delete, sender=Upload)
+def update_denormalization_artist_album_actor(sender, instance, **kwargs):
+    # related TrackActor entries are deleted at this point
+    if settings.MUSIC_USE_DENORMALIZATION and instance.track_id:
+        schedule_artist_album_actor_update(track_ids=[instance.track_id])
+
+
+@receiver(pre_save, sender=Track)
+def set_track_previous_artist_album(sender, instance, update_fields, **kwargs):
+    if not settings.MUSIC_USE_DENORMALIZATION or not instance.pk:
+        return
+    if update_fields is not None and not {"artist", "album"} & set(update_fields):
+        return
+    previous = (
+        Track.objects.filter(pk=instance.pk)
+        .values_list("artist_id", "album_id")
+        .first()
+    )
+    if previous and previous != (instance.artist_id, instance.album_id):
+        setattr(instance, "_previous_artist_album", previous)
+
+
+@receiver(post_save, sender=Track)
+def update_denormalization_track_artist_album(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_artist_album", None)
+    if not previous:
+        return
+    del instance._previous_artist_album
+    artist_id, album_id = previous
+    # entries of the previous artist and album may not be valid anymore
+    schedule_artist_album_actor_update(
+        track_ids=[instance.pk],
+        artist_ids=[artist_id],
+        album_ids=[album_id] if album_id else [],
+    )
+
+
+# fields that affect the quota usage of the upload owner
+UPLOAD_USAGE_FIELDS = {"library", "import_status", "size", "audio_file"}
+# fields that affect whether the upload makes its track playable
+UPLOAD_PLAYABILITY_FIELDS = {"library", "import_status", "track"}
+# fields that affect the duration of the playlists including the upload track
+UPLOAD_DURATION_FIELDS = {"track", "duration"}
+
+
+@receiver(pre_save, sender=Upload)
+def set_upload_usage(sender, instance, update_fields, **kwargs):
+    if not instance.pk:
+        return
+    fields = UPLOAD_USAGE_FIELDS | UPLOAD_PLAYABILITY_FIELDS | UPLOAD_DURATION_FIELDS
+    if update_fields is not None and not fields & set(update_fields):
+        return
+    db_value = (
+        instance.__class__.objects.filter(pk=instance.pk)
+        .values_list(
+            "library__actor",
+            "import_status",
+            "size",
+            "audio_file",
+            "library",
+            "track",
+            "duration",
+        )
+        .first()
+    )
+    if db_value:
+        (
+            actor_id,
+            import_status,
+            size,
+            audio_file,
+            library_id,
+            track_id,
+            duration,
+        ) = db_value
+        size = (size or 0) if audio_file else 0
+        setattr(instance, "_upload_usage", (actor_id, import_status, size))
+        setattr(
+            instance,
+            "_upload_playability",
+            (import_status == "finished", library_id, track_id),
+        )
+        # cf funkwhale_api.playlists.models
+        setattr(instance, "_upload_duration", (track_id, duration))
+
+
+@receiver(post_save, sender=Upload)
+def update_upload_usage_on_save(sender, instance, created, **kwargs):
+    previous = instance.__dict__.pop("_upload_usage", None)
+    if not created and previous is None:
+        return
+    current = get_upload_usage(instance)
+    if previous == current:
+        return
+    update_upload_usage(previous, -1)
+    update_upload_usage(current, 1)
+
+
+@receiver(post_delete, sender=Upload)
+def update_upload_usage_on_delete(sender, instance, **kwargs):
+    update_upload_usage(get_upload_usage(instance), -1)
+
+
+@receiver(post_save, sender=Track)
+def increment_album_tracks_count(sender, instance, created, **kwargs):
+    if created and instance.album_id:
+        Album.objects.filter(pk=instance.album_id).update(
+            tracks_count=models.F("tracks_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Track)
+def decrement_album_tracks_count(sender, instance, **kwargs):
+    if instance.album_id:
+        Album.objects.filter(pk=instance.album_id, tracks_count__gt=0).update(
+            tracks_count=models.F("tracks_count") - 1
+        )
+
+
+@receiver(post_save, sender=Album)
+def increment_artist_albums_count(sender, instance, created, **kwargs):
+    if created:
+        Artist.objects.filter(pk=instance.artist_id).update(
+            albums_count=models.F("albums_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Album)
+def decrement_artist_albums_count(sender, instance, **kwargs):
+    Artist.objects.filter(pk=instance.artist_id, albums_count__gt=0).update(
+        albums_count=models.F("albums_count") - 1
+    )
+
+
 @receiver(pre_save, sender=Library)
 def set_privacy_level_updated(sender, instance, update_fields, **kwargs):
     if not instance.pk:
@@ -1376,6 +1936,179 @@ def update_denormalization_track_user_library_privacy_level(
         TrackActor.create_entries(instance)
 
 
+# fields that don't appear in federation collections
+UPLOAD_UNFEDERATED_FIELDS = {"accessed_date", "downloads_count"}
+
+
+@receiver(post_save, sender=Upload)
+@receiver(post_delete, sender=Upload)
+def invalidate_library_collection_upload(sender, instance, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and set(update_fields) <= UPLOAD_UNFEDERATED_FIELDS:
+        return
+    if instance.library_id:
+        federation_pagination.invalidate(instance.library_id)
+
+
+@receiver(post_save, sender=Library)
+def invalidate_library_collection(sender, instance, created, **kwargs):
+    if not created:
+        federation_pagination.invalidate(instance.pk)
+
+
+def invalidate_response_cache(artist_ids=(), album_ids=(), track_ids=(), listings=True):
+    # listings depend on the "music" tag, and should only be invalidated
+    # when the set of visible objects changes
+    tags = ["music"] if listings else []
+    tags += ["music.artist:{}".format(i) for i in artist_ids if i]
+    tags += ["music.album:{}".format(i) for i in album_ids if i]
+    tags += ["music.track:{}".format(i) for i in track_ids if i]
+    response_cache.invalidate(*tags)
+
+
+@receiver(post_save, sender=Artist)
+@receiver(post_delete, sender=Artist)
+def invalidate_response_cache_artist(sender, instance, **kwargs):
+    invalidate_response_cache(artist_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Album)
+@receiver(post_delete, sender=Album)
+def invalidate_response_cache_album(sender, instance, **kwargs):
+    invalidate_response_cache(artist_ids=[instance.artist_id], album_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Track)
+@receiver(post_delete, sender=Track)
+def invalidate_response_cache_track(sender, instance, **kwargs):
+    album_artist_id = (
+        Album.objects.filter(pk=instance.album_id)
+        .values_list("artist_id", flat=True)
+        .first()
+    )
+    invalidate_response_cache(
+        artist_ids=[instance.artist_id, album_artist_id],
+        album_ids=[instance.album_id],
+        track_ids=[instance.pk],
+    )
+
+
+def get_upload_playability(upload):
+    return (upload.import_status == "finished", upload.library_id, upload.track_id)
+
+
+@receiver(post_save, sender=Upload)
+def invalidate_response_cache_upload(sender, instance, created, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields is not None and set(update_fields) <= UPLOAD_UNFEDERATED_FIELDS:
+        return
+    current = get_upload_playability(instance)
+    previous = instance.__dict__.pop("_upload_playability", None)
+    if created or previous is None:
+        previous = (False, None, None) if created else current
+    if not previous[0] and not current[0]:
+        # the upload isn't visible in responses
+        return
+    # listings are only affected when the upload makes its track playable or not
+    # anymore, e.g. not on import status updates of pending uploads, or metadata
+    # updates of finished ones
+    invalidate_upload_track_response_cache(
+        {previous[2], current[2]}, listings=previous != current
+    )
+
+
+@receiver(post_delete, sender=Upload)
+def invalidate_response_cache_upload_delete(sender, instance, **kwargs):
+    if instance.import_status == "finished":
+        invalidate_upload_track_response_cache({instance.track_id})
+
+
+def invalidate_upload_track_response_cache(track_ids, listings=True):
+    tracks = (
+        Track.objects.filter(pk__in=[i for i in track_ids if i])
+        .order_by()
+        .values_list("pk", "artist_id", "album_id", "album__artist_id")
+    )
+    artist_ids, album_ids = set(), set()
+    for track_id, artist_id, album_id, album_artist_id in tracks:
+        artist_ids.update([artist_id, album_artist_id])
+        album_ids.add(album_id)
+    invalidate_response_cache(
+        artist_ids=artist_ids,
+        album_ids=album_ids,
+        track_ids=track_ids,
+        listings=listings,
+    )
+
+
+@receiver(post_save, sender=Library)
+def invalidate_response_cache_library(sender, instance, created, **kwargs):
+    if getattr(instance, "_privacy_level_updated", False):
+        # the visibility of any content from the library may have changed
+        response_cache.invalidate(response_cache.GLOBAL_TAG)
+
+
+@receiver(post_save, sender=tags_models.TaggedItem)
+@receiver(post_delete, sender=tags_models.TaggedItem)
+def invalidate_response_cache_tagged_item(sender, instance, **kwargs):
+    model = instance.content_type.model_class()
+    if model in [Artist, Album, Track]:
+        invalidate_response_cache(
+            **{"{}_ids".format(model._meta.model_name): [instance.object_id]}
+        )
+
+
+def should_update_search_entries(entity_type, update_fields):
+    if update_fields is None:
+        return True
+    return bool(set(SEARCH_INDEXED_FIELDS[entity_type]) & set(update_fields))
+
+
+@receiver(post_save, sender=Artist)
+def update_search_entries_artist(sender, instance, created, update_fields, **kwargs):
+    if not should_update_search_entries("artist", update_fields):
+        return
+    SearchEntry.update_entries("artist", ids=[instance.pk])
+    if not created:
+        # the artist name is part of the indexed text of its albums and tracks
+        SearchEntry.update_entries(
+            "album", where="al.artist_id = %s", params=[instance.pk]
+        )
+        SearchEntry.update_entries(
+            "track", where="t.artist_id = %s", params=[instance.pk]
+        )
+
+
+@receiver(post_save, sender=Album)
+def update_search_entries_album(sender, instance, created, update_fields, **kwargs):
+    if not should_update_search_entries("album", update_fields):
+        return
+    SearchEntry.update_entries("album", ids=[instance.pk])
+    if not created:
+        SearchEntry.update_entries(
+            "track", where="t.album_id = %s", params=[instance.pk]
+        )
+
+
+@receiver(post_save, sender=Track)
+def update_search_entries_track(sender, instance, created, update_fields, **kwargs):
+    if not should_update_search_entries("track", update_fields):
+        return
+    SearchEntry.update_entries("track", ids=[instance.pk])
+    if created:
+        # refresh the popularity of the parent entities
+        SearchEntry.update_entries("artist", ids=[instance.artist_id])
+        if instance.album_id:
+            SearchEntry.update_entries("album", ids=[instance.album_id])
+
+
+@receiver(post_save, sender=tags_models.Tag)
+def update_search_entries_tag(sender, instance, created, update_fields, **kwargs):
+    if not should_update_search_entries("tag", update_fields):
+        return
+    SearchEntry.update_entries("tag", ids=[instance.pk])
+
+
 @receiver(post_save, sender=ImportBatch)
 def update_request_status(sender, instance, created, **kwargs):
     update_fields = kwargs.get("update_fields", []) or []
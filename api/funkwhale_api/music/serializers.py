@@ -784,7 +784,7 @@ class OembedSerializer(serializers.Serializer):
             )
             playlist_tracks = playlist_tracks.select_related(
                 "track__album__attachment_cover"
-            ).order_by("index")
+            ).order_by("position", "id")
             first_playlist_track = playlist_tracks.first()
 
             if first_playlist_track:
@@ -269,7 +269,9 @@ def library_playlist(request, pk, redirect_to_ap):
     )
     # we use the first playlist track's album's cover as image
     playlist_tracks = obj.playlist_tracks.exclude(track__album__attachment_cover=None)
-    playlist_tracks = playlist_tracks.select_related("track__album").order_by("index")
+    playlist_tracks = playlist_tracks.select_related("track__album").order_by(
+        "position", "id"
+    )
     first_playlist_track = playlist_tracks.first()
     metas = [
         {"tag": "meta", "property": "og:url", "content": obj_url},
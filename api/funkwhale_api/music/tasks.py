@@ -1,14 +1,18 @@
 import collections
 import datetime
+import hashlib
 import logging
 import os
+import time
 
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import F, Q
+from django.db.models import Exists, F, Max, OuterRef, Q
 from django.dispatch import receiver
 
-from musicbrainzngs import ResponseError
+from musicbrainzngs import NetworkError, ResponseError
 from requests.exceptions import RequestException
 
 from funkwhale_api import musicbrainz
@@ -29,6 +33,10 @@ from . import signals
 logger = logging.getLogger(__name__)
 
 
+ALBUM_COVER_FETCH_CACHE_KEY = "music:album-cover-fetch:{}"
+ALBUM_COVER_FETCH_TIMEOUT = 60 * 60
+
+
 def populate_album_cover(album, source=None, replace=False):
     if album.attachment_cover and not replace:
         return
@@ -39,6 +47,30 @@ def populate_album_cover(album, source=None, replace=False):
         cover = get_cover_from_fs(path)
         return common_utils.attach_file(album, "attachment_cover", cover)
     if album.mbid:
+        # covers are fetched in the background, to avoid blocking imports on
+        # MusicBrainz rate limits. We enqueue a single fetch per album at a time
+        if cache.add(
+            ALBUM_COVER_FETCH_CACHE_KEY.format(album.pk),
+            True,
+            timeout=ALBUM_COVER_FETCH_TIMEOUT,
+        ):
+            common_utils.on_commit(
+                fetch_album_cover.delay, album_id=album.pk, replace=replace
+            )
+
+
+@celery.app.task(
+    name="music.fetch_album_cover",
+    retry_backoff=30,
+    max_retries=5,
+    autoretry_for=[musicbrainz.client.RateLimited, NetworkError],
+)
+@celery.require_instance(models.Album.objects.exclude(mbid=None), "album")
+def fetch_album_cover(album, replace=False):
+    release = True
+    try:
+        if album.attachment_cover and not replace:
+            return
         logger.info(
             "[Album %s] Fetching cover from musicbrainz release %s",
             album.pk,
@@ -48,7 +80,9 @@ def populate_album_cover(album, source=None, replace=False):
             image_data = musicbrainz.api.images.get_front(str(album.mbid))
         except ResponseError as exc:
             logger.warning(
-                "[Album %s] cannot fetch cover from musicbrainz: %s", album.pk, str(exc)
+                "[Album %s] cannot fetch cover from musicbrainz: %s",
+                album.pk,
+                str(exc),
             )
         else:
             return common_utils.attach_file(
@@ -57,6 +91,16 @@ def populate_album_cover(album, source=None, replace=False):
                 {"content": image_data, "mimetype": "image/jpeg"},
                 fetch=True,
             )
+    except (musicbrainz.client.RateLimited, NetworkError):
+        # the task is retried, so we keep the lock until the last attempt, to avoid
+        # enqueuing more fetches for this album in the meantime
+        task = fetch_album_cover
+        release = task.request.retries >= task.max_retries
+        raise
+    finally:
+        if release:
+            # allow populate_album_cover() to enqueue another fetch for this album
+            cache.delete(ALBUM_COVER_FETCH_CACHE_KEY.format(album.pk))
 
 
 IMAGE_TYPES = [("jpg", "image/jpeg"), ("jpeg", "image/jpeg"), ("png", "image/png")]
@@ -747,67 +791,197 @@ def broadcast_import_status_update_to_owner(old_status, new_status, upload, **kw
                 "new_status": new_status,
             },
         },
+        # only the last status update of an upload is relevant
+        key="import.status_updated.{}".format(upload.uuid),
     )
 
 
+CLEAN_TRANSCODING_CACHE_CHUNK_SIZE = 500
+
+
+def delete_upload_versions(candidates, ids):
+    """
+    Delete the upload versions with the given ids that still match the candidates
+    queryset, and their transcoded files. Returns the number of deleted versions.
+    """
+    with transaction.atomic():
+        # candidates are checked again, and locked, in case they were served
+        # in the meantime
+        versions = list(
+            candidates.filter(pk__in=ids)
+            .select_for_update()
+            .values_list("id", "audio_file")
+        )
+        models.UploadVersion.objects.filter(pk__in=[pk for pk, _ in versions]).delete()
+    storage = models.UploadVersion._meta.get_field("audio_file").storage
+    # deleting rows doesn't delete the transcoded files
+    for _, name in versions:
+        if name:
+            storage.delete(name)
+    return len(versions)
+
+
 @celery.app.task(name="music.clean_transcoding_cache")
 def clean_transcoding_cache():
     delay = preferences.get("music__transcoding_cache_duration")
     if delay < 1:
         return  # cache clearing disabled
     limit = timezone.now() - datetime.timedelta(minutes=delay)
-    candidates = (
-        models.UploadVersion.objects.filter(
-            (Q(accessed_date__lt=limit) | Q(accessed_date=None))
+    candidates = models.UploadVersion.objects.filter(
+        (Q(accessed_date__lt=limit) | Q(accessed_date=None))
+    ).order_by("id")
+    deleted = 0
+    last_id = 0
+    while True:
+        ids = list(
+            candidates.filter(pk__gt=last_id).values_list("id", flat=True)[
+                :CLEAN_TRANSCODING_CACHE_CHUNK_SIZE
+            ]
         )
-        .only("audio_file", "id")
-        .order_by("id")
-    )
-    return candidates.delete()
+        if not ids:
+            break
+        deleted += delete_upload_versions(candidates, ids)
+        last_id = ids[-1]
+    return deleted
 
 
-@celery.app.task(name="music.albums_set_tags_from_tracks")
-@transaction.atomic
-def albums_set_tags_from_tracks(ids=None, dry_run=False):
-    qs = models.Album.objects.filter(tagged_items__isnull=True).order_by("id")
+SET_TAGS_FROM_TRACKS_CHUNK_SIZE = 1000
+SET_TAGS_FROM_TRACKS_LAST_RUN_CACHE_KEY = "music:set-tags-from-tracks:last-run:{}"
+
+
+def get_set_tags_from_tracks_candidates(model, foreign_key_attr, since=None):
+    qs = model.objects.filter(tagged_items__isnull=True).order_by("id")
     qs = federation_utils.local_qs(qs)
-    qs = qs.values_list("id", flat=True)
+    if since:
+        # only objects created since the last run, or with tracks created or
+        # tagged since the last run
+        touched_tracks = models.Track.objects.filter(
+            **{foreign_key_attr: OuterRef("pk")}
+        ).filter(
+            Q(creation_date__gte=since) | Q(tagged_items__creation_date__gte=since)
+        )
+        qs = qs.filter(Q(creation_date__gte=since) | Exists(touched_tracks))
+    return qs.values_list("id", flat=True)
+
+
+def set_tags_from_tracks(
+    model, foreign_key_attr, ids=None, dry_run=False, incremental=False
+):
+    """
+    Tag objects without tags with the tags found on all their tracks.
+
+    Candidates are processed in chunks, each chunk being committed separately.
+    In incremental mode, only objects touched since the previous run are considered.
+    """
+    last_run_key = SET_TAGS_FROM_TRACKS_LAST_RUN_CACHE_KEY.format(
+        model._meta.label_lower
+    )
+    since = cache.get(last_run_key) if incremental else None
+    started = timezone.now()
+    qs = get_set_tags_from_tracks_candidates(model, foreign_key_attr, since=since)
     if ids is not None:
         qs = qs.filter(pk__in=ids)
-    data = tags_tasks.get_tags_from_foreign_key(
-        ids=qs, foreign_key_model=models.Track, foreign_key_attr="album",
+
+    data = {}
+    last_id = 0
+    while True:
+        chunk = list(qs.filter(pk__gt=last_id)[:SET_TAGS_FROM_TRACKS_CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1]
+        if dry_run:
+            data.update(
+                tags_tasks.get_tags_from_foreign_key(
+                    ids=chunk,
+                    foreign_key_model=models.Track,
+                    foreign_key_attr=foreign_key_attr,
+                )
+            )
+            continue
+        with transaction.atomic():
+            data.update(
+                tags_tasks.add_tags_from_foreign_key(
+                    ids=chunk,
+                    model=model,
+                    foreign_key_model=models.Track,
+                    foreign_key_attr=foreign_key_attr,
+                )
+            )
+
+    logger.info(
+        "Found automatic tags for %s %s…", len(data), model._meta.verbose_name_plural
     )
-    logger.info("Found automatic tags for %s albums…", len(data))
     if dry_run:
         logger.info("Running in dry-run mode, not commiting")
         return
+    if ids is None:
+        cache.set(last_run_key, started, timeout=None)
+    return data
+
 
-    tags_tasks.add_tags_batch(
-        data, model=models.Album,
+@celery.app.task(name="music.albums_set_tags_from_tracks")
+def albums_set_tags_from_tracks(ids=None, dry_run=False, incremental=False):
+    return set_tags_from_tracks(
+        models.Album, "album", ids=ids, dry_run=dry_run, incremental=incremental,
     )
-    return data
 
 
 @celery.app.task(name="music.artists_set_tags_from_tracks")
-@transaction.atomic
-def artists_set_tags_from_tracks(ids=None, dry_run=False):
-    qs = models.Artist.objects.filter(tagged_items__isnull=True).order_by("id")
-    qs = federation_utils.local_qs(qs)
-    qs = qs.values_list("id", flat=True)
-    if ids is not None:
-        qs = qs.filter(pk__in=ids)
-    data = tags_tasks.get_tags_from_foreign_key(
-        ids=qs, foreign_key_model=models.Track, foreign_key_attr="artist",
+def artists_set_tags_from_tracks(ids=None, dry_run=False, incremental=False):
+    return set_tags_from_tracks(
+        models.Artist, "artist", ids=ids, dry_run=dry_run, incremental=incremental,
     )
-    logger.info("Found automatic tags for %s artists…", len(data))
-    if dry_run:
-        logger.info("Running in dry-run mode, not commiting")
+
+
+@celery.app.task(name="music.update_search_index")
+def update_search_index(entity_types=None, missing_only=True, chunk_size=5000):
+    """
+    Populate the search index, by id ranges of ``chunk_size`` rows. When
+    ``missing_only`` is set, only entities that aren't indexed yet (e.g. because
+    they were bulk-created) are processed. Otherwise, every entry is refreshed,
+    including popularity weights.
+    """
+    if not settings.MUSIC_USE_SEARCH_INDEX:
         return
+    search_models = {
+        "artist": models.Artist,
+        "album": models.Album,
+        "track": models.Track,
+        "tag": tags_models.Tag,
+    }
+    entity_types = entity_types or [t for t, _ in models.SEARCH_ENTITY_TYPES]
+    total = 0
+    for entity_type in entity_types:
+        max_id = search_models[entity_type].objects.aggregate(v=Max("id"))["v"] or 0
+        where = "{} BETWEEN %s AND %s".format(
+            models.SEARCH_ENTRIES_ID_COLUMN[entity_type]
+        )
+        updated = 0
+        for start in range(0, max_id + 1, chunk_size):
+            with transaction.atomic():
+                updated += models.SearchEntry.update_entries(
+                    entity_type,
+                    where=where,
+                    params=[start, start + chunk_size - 1],
+                    missing_only=missing_only,
+                )
+        logger.info("Updated %s %s search entries", updated, entity_type)
+        total += updated
+    return total
 
-    tags_tasks.add_tags_batch(
-        data, model=models.Artist,
-    )
-    return data
+
+def exclude_related(queryset, *relations):
+    """
+    Exclude objects that have any related object through the given reverse
+    relations, using anti-joins
+    """
+    for name in relations:
+        field = queryset.model._meta.get_field(name)
+        related = field.related_model.objects.filter(
+            **{field.field.name: OuterRef("pk")}
+        )
+        queryset = queryset.filter(~Exists(related.values("pk")))
+    return queryset
 
 
 def get_prunable_tracks(
@@ -817,25 +991,118 @@ def get_prunable_tracks(
     Returns a list of tracks with no associated uploads,
     excluding the one that were listened/favorited/included in playlists.
     """
-
-    queryset = models.Track.objects.all()
-    queryset = queryset.filter(uploads__isnull=True)
+    relations = ["uploads"]
     if exclude_favorites:
-        queryset = queryset.filter(track_favorites__isnull=True)
+        relations.append("track_favorites")
     if exclude_playlists:
-        queryset = queryset.filter(playlist_tracks__isnull=True)
+        relations.append("playlist_tracks")
     if exclude_listenings:
-        queryset = queryset.filter(listenings__isnull=True)
+        relations.append("listenings")
 
-    return queryset
+    return exclude_related(models.Track.objects.all(), *relations)
 
 
 def get_prunable_albums():
-    return models.Album.objects.filter(tracks__isnull=True)
+    return exclude_related(models.Album.objects.all(), "tracks")
 
 
 def get_prunable_artists():
-    return models.Artist.objects.filter(tracks__isnull=True, albums__isnull=True)
+    return exclude_related(models.Artist.objects.all(), "tracks", "albums")
+
+
+PRUNE_CURSOR_CACHE_KEY = "music:prune:cursor:{}:{}"
+
+
+def get_prune_cursor_key(queryset, name):
+    # runs with different filters (e.g. the prune_library command with --ignore-*
+    # options, and the scheduled task) don't share the same cursor
+    digest = hashlib.sha1(str(queryset.order_by("pk").query).encode()).hexdigest()
+    return PRUNE_CURSOR_CACHE_KEY.format(name, digest)
+
+
+def prune(queryset, name, batch_size=None, deadline=None, on_progress=None):
+    """
+    Delete objects matching the queryset in batches, each batch being committed
+    in its own transaction.
+
+    The id of the last processed object is stored under the given name and
+    queryset, so an interrupted run (or one that reached its deadline, as returned
+    by time.monotonic()) with the same filters resumes where it stopped.
+
+    Returns a dict with the number of deleted objects, and whether all candidates
+    were processed.
+    """
+    batch_size = batch_size or settings.MUSIC_PRUNE_BATCH_SIZE
+    cursor_key = get_prune_cursor_key(queryset, name)
+    last_id = cache.get(cursor_key) or 0
+    started = time.monotonic()
+    deleted = 0
+    while True:
+        if deadline and time.monotonic() >= deadline:
+            return {"deleted": deleted, "complete": False}
+
+        ids = list(
+            queryset.filter(pk__gt=last_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        with transaction.atomic():
+            # candidates are checked again, in case they changed in the meantime
+            deleted += (
+                queryset.filter(pk__in=ids)
+                .delete()[1]
+                .get(queryset.model._meta.label, 0)
+            )
+        last_id = ids[-1]
+        cache.set(cursor_key, last_id, timeout=None)
+        if on_progress:
+            elapsed = time.monotonic() - started
+            on_progress(
+                {
+                    "name": name,
+                    "deleted": deleted,
+                    "rate": deleted / elapsed if elapsed else deleted,
+                }
+            )
+
+    cache.delete(cursor_key)
+    return {"deleted": deleted, "complete": True}
+
+
+def log_prune_progress(progress):
+    logger.info(
+        "[Prune %s] %s objects deleted (%.1f/s)",
+        progress["name"],
+        progress["deleted"],
+        progress["rate"],
+    )
+
+
+@celery.app.task(name="music.prune_library")
+def prune_library(max_duration=None):
+    """
+    Remove tracks without uploads (and never favorited, listened or included
+    in a playlist), then albums without tracks and artists without albums or tracks.
+
+    Stops after max_duration seconds, the next run resuming where this one stopped.
+    """
+    max_duration = max_duration or settings.MUSIC_PRUNE_MAX_DURATION
+    deadline = time.monotonic() + max_duration
+    result = {}
+    for name, queryset in [
+        ("tracks", get_prunable_tracks()),
+        ("albums", get_prunable_albums()),
+        ("artists", get_prunable_artists()),
+    ]:
+        result[name] = prune(
+            queryset, name, deadline=deadline, on_progress=log_prune_progress
+        )
+        if not result[name]["complete"]:
+            break
+    logger.info("Library pruning result: %s", result)
+    return result
 
 
 def update_library_entity(obj, data):
@@ -18,6 +18,8 @@ from rest_framework.response import Response
 from funkwhale_api.common import decorators as common_decorators
 from funkwhale_api.common import permissions as common_permissions
 from funkwhale_api.common import preferences
+from funkwhale_api.common import response_cache
+from funkwhale_api.common import tasks as common_tasks
 from funkwhale_api.common import utils as common_utils
 from funkwhale_api.common import views as common_views
 from funkwhale_api.federation.authentication import SignatureAuthentication
@@ -107,6 +109,7 @@ class HandleInvalidSearch(object):
 
 
 class ArtistViewSet(
+    response_cache.ResponseCacheMixin,
     HandleInvalidSearch,
     common_views.SkipFilterForGetObject,
     viewsets.ReadOnlyModelViewSet,
@@ -130,6 +133,9 @@ class ArtistViewSet(
     anonymous_policy = "setting"
     filterset_class = filters.ArtistFilter
     ordering_fields = ("id", "name", "creation_date", "modification_date")
+    cursor_ordering_fields = ("name", "creation_date", "modification_date")
+    response_cache_tags = ["music"]
+    response_cache_detail_tag = "music.artist:{pk}"
 
     fetches = federation_decorators.fetches_route()
     mutations = common_decorators.mutations_route(types=["update"])
@@ -171,6 +177,7 @@ class ArtistViewSet(
 
 
 class AlbumViewSet(
+    response_cache.ResponseCacheMixin,
     HandleInvalidSearch,
     common_views.SkipFilterForGetObject,
     mixins.CreateModelMixin,
@@ -192,7 +199,10 @@ class AlbumViewSet(
         "title",
         "artist__modification_date",
     )
+    cursor_ordering_fields = ("creation_date", "title")
     filterset_class = filters.AlbumFilter
+    response_cache_tags = ["music"]
+    response_cache_detail_tag = "music.album:{pk}"
 
     fetches = federation_decorators.fetches_route()
     mutations = common_decorators.mutations_route(types=["update"])
@@ -232,6 +242,15 @@ class AlbumViewSet(
         )
         return qs
 
+    def paginate_queryset(self, queryset):
+        page = super().paginate_queryset(queryset)
+        if page is not None:
+            # download remote covers in the background, before clients request them
+            common_tasks.prefetch_remote_attachments(
+                [album.attachment_cover for album in page]
+            )
+        return page
+
     libraries = action(methods=["get"], detail=True)(
         get_libraries(filter_uploads=lambda o, uploads: uploads.filter(track__album=o))
     )
@@ -319,6 +338,7 @@ class LibraryViewSet(
 
 
 class TrackViewSet(
+    response_cache.ResponseCacheMixin,
     HandleInvalidSearch,
     common_views.SkipFilterForGetObject,
     mixins.DestroyModelMixin,
@@ -350,6 +370,9 @@ class TrackViewSet(
         "artist__name",
         "artist__modification_date",
     )
+    cursor_ordering_fields = ("creation_date", "title")
+    response_cache_tags = ["music"]
+    response_cache_detail_tag = "music.track:{pk}"
     fetches = federation_decorators.fetches_route()
     mutations = common_decorators.mutations_route(types=["update"])
 
@@ -650,6 +673,7 @@ class UploadViewSet(
         "size",
         "artist__name",
     )
+    cursor_ordering_fields = ("creation_date",)
 
     def get_queryset(self):
         qs = super().get_queryset()
@@ -726,6 +750,8 @@ class Search(views.APIView):
         query = query.strip()
         if not query:
             return Response({"detail": "empty query"}, status=400)
+        if settings.MUSIC_USE_SEARCH_INDEX:
+            return Response(self.get_indexed_results(query), status=200)
         try:
             results = {
                 # 'tags': serializers.TagSerializer(self.get_tags(query), many=True).data,
@@ -748,6 +774,44 @@ class Search(views.APIView):
 
         return Response(results, status=200)
 
+    def get_indexed_results(self, query):
+        """
+        Fetch the best matching ids for every category in a single query
+        on the search index, then load the corresponding objects by primary key
+        """
+        matches = models.SearchEntry.search(query, self.max_results)
+
+        def get_objects(queryset, ids):
+            objects = queryset.in_bulk(ids)
+            return [objects[i] for i in ids if i in objects]
+
+        return {
+            "artists": serializers.ArtistWithAlbumsSerializer(
+                get_objects(self.get_artists_queryset(), matches["artist"]), many=True
+            ).data,
+            "tracks": serializers.TrackSerializer(
+                get_objects(self.get_tracks_queryset(), matches["track"]), many=True
+            ).data,
+            "albums": serializers.AlbumSerializer(
+                get_objects(self.get_albums_queryset(), matches["album"]), many=True
+            ).data,
+            "tags": TagSerializer(
+                get_objects(Tag.objects.all(), matches["tag"]), many=True
+            ).data,
+        }
+
+    def get_tracks_queryset(self):
+        return models.Track.objects.all().prefetch_related(
+            "artist",
+            "attributed_to",
+            Prefetch(
+                "album",
+                queryset=models.Album.objects.select_related(
+                    "artist", "attachment_cover", "attributed_to"
+                ),
+            ),
+        )
+
     def get_tracks(self, query):
         search_fields = [
             "mbid",
@@ -763,22 +827,16 @@ class Search(views.APIView):
             )
         else:
             query_obj = utils.get_query(query, search_fields)
-        qs = (
-            models.Track.objects.all()
-            .filter(query_obj)
-            .prefetch_related(
-                "artist",
-                "attributed_to",
-                Prefetch(
-                    "album",
-                    queryset=models.Album.objects.select_related(
-                        "artist", "attachment_cover", "attributed_to"
-                    ),
-                ),
-            )
-        )
+        qs = self.get_tracks_queryset().filter(query_obj)
         return common_utils.order_for_search(qs, "title")[: self.max_results]
 
+    def get_albums_queryset(self):
+        return (
+            models.Album.objects.all()
+            .select_related("artist", "attachment_cover", "attributed_to")
+            .prefetch_related("tracks__artist")
+        )
+
     def get_albums(self, query):
         search_fields = ["mbid", "title__unaccent", "artist__name__unaccent"]
         if settings.USE_FULL_TEXT_SEARCH:
@@ -787,27 +845,24 @@ class Search(views.APIView):
             )
         else:
             query_obj = utils.get_query(query, search_fields)
-        qs = (
-            models.Album.objects.all()
-            .filter(query_obj)
-            .select_related("artist", "attachment_cover", "attributed_to")
-            .prefetch_related("tracks__artist")
-        )
+        qs = self.get_albums_queryset().filter(query_obj)
         return common_utils.order_for_search(qs, "title")[: self.max_results]
 
+    def get_artists_queryset(self):
+        return (
+            models.Artist.objects.all()
+            .with_albums()
+            .prefetch_related("channel__actor")
+            .select_related("attributed_to")
+        )
+
     def get_artists(self, query):
         search_fields = ["mbid", "name__unaccent"]
         if settings.USE_FULL_TEXT_SEARCH:
             query_obj = utils.get_fts_query(query, model=models.Artist)
         else:
             query_obj = utils.get_query(query, search_fields)
-        qs = (
-            models.Artist.objects.all()
-            .filter(query_obj)
-            .with_albums()
-            .prefetch_related("channel__actor")
-            .select_related("attributed_to")
-        )
+        qs = self.get_artists_queryset().filter(query_obj)
         return common_utils.order_for_search(qs, "name")[: self.max_results]
 
     def get_tags(self, query):
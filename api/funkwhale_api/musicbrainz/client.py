@@ -1,16 +1,109 @@
-import memoize.djangocache
+"""
+Access to the MusicBrainz and Cover Art Archive APIs.
+
+Responses are cached for ``MUSICBRAINZ_CACHE_DURATION`` seconds, and lookups
+of missing or invalid resources for ``MUSICBRAINZ_NEGATIVE_CACHE_DURATION`` seconds,
+so repeated lookups during imports don't hit the network. Requests are throttled
+by a rate limiter stored in the cache, and thus shared by all the processes
+of the pod, to stay below ``MUSICBRAINZ_RATE_LIMIT`` requests per second.
+"""
+import functools
+import hashlib
+import json
+import time
+
 import musicbrainzngs
 from django.conf import settings
+from django.core.cache import cache
 
 from funkwhale_api import __version__
 
 _api = musicbrainzngs
 _api.set_useragent("funkwhale", str(__version__), settings.FUNKWHALE_URL)
 _api.set_hostname(settings.MUSICBRAINZ_HOSTNAME)
+# rate limiting is handled by us, for all processes
+_api.set_rate_limit(False)
+
+RESPONSE_CACHE_KEY = "musicbrainz:response:{}"
+RATE_LIMIT_CACHE_KEY = "musicbrainz:rate-limit:{}:{}"
+
+# errors returned for these HTTP status codes won't change on a retry
+NEGATIVE_STATUS_CODES = [400, 404]
+
+
+class RateLimited(Exception):
+    pass
+
+
+def acquire(service, timeout=None):
+    """
+    Wait until a request to the given service is allowed by the rate limit, or
+    raise RateLimited after ``timeout`` seconds.
+
+    Requests are counted in windows of one second shared by all processes,
+    each window allowing ``MUSICBRAINZ_RATE_LIMIT`` requests.
+    """
+    limit = settings.MUSICBRAINZ_RATE_LIMIT
+    if limit <= 0:
+        return
+    if timeout is None:
+        timeout = settings.MUSICBRAINZ_RATE_LIMIT_TIMEOUT
+    deadline = time.time() + timeout
+    while True:
+        now = time.time()
+        key = RATE_LIMIT_CACHE_KEY.format(service, int(now))
+        cache.add(key, 0, timeout=10)
+        try:
+            count = cache.incr(key)
+        except ValueError:
+            # the window expired in the meantime
+            continue
+        if count <= limit:
+            return
+        next_window = int(now) + 1
+        if next_window > deadline:
+            raise RateLimited(service)
+        time.sleep(next_window - now)
+
 
+def get_cache_key(name, args, kwargs):
+    payload = json.dumps([name, args, kwargs], sort_keys=True, default=str)
+    return RESPONSE_CACHE_KEY.format(hashlib.sha1(payload.encode()).hexdigest())
 
-store = memoize.djangocache.Cache("default")
-memo = memoize.Memoizer(store, namespace="memoize:musicbrainz")
+
+def cached(func, service="musicbrainz", cache_results=True):
+    """
+    Wrap an API call to use the response cache and rate limiter. With
+    cache_results=False, only failed lookups are cached, e.g for binary content.
+    """
+
+    @functools.wraps(func)
+    def inner(*args, **kwargs):
+        key = get_cache_key(func.__name__, args, kwargs)
+        cached_response = cache.get(key)
+        if cached_response is not None:
+            if "error" in cached_response:
+                raise _api.ResponseError(cached_response["error"])
+            return cached_response["result"]
+
+        acquire(service)
+        try:
+            result = func(*args, **kwargs)
+        except _api.ResponseError as e:
+            if getattr(e.cause, "code", None) in NEGATIVE_STATUS_CODES:
+                cache.set(
+                    key,
+                    {"error": str(e)},
+                    timeout=settings.MUSICBRAINZ_NEGATIVE_CACHE_DURATION,
+                )
+            raise
+        if cache_results:
+            cache.set(
+                key, {"result": result}, timeout=settings.MUSICBRAINZ_CACHE_DURATION
+            )
+        return result
+
+    return inner
 
 
 def clean_artist_search(query, **kwargs):
@@ -24,38 +117,28 @@ class API(object):
     _api = _api
 
     class artists(object):
-        search = memo(clean_artist_search, max_age=settings.MUSICBRAINZ_CACHE_DURATION)
-        get = memo(_api.get_artist_by_id, max_age=settings.MUSICBRAINZ_CACHE_DURATION)
+        search = cached(clean_artist_search)
+        get = cached(_api.get_artist_by_id)
 
     class images(object):
-        get_front = memo(
-            _api.get_image_front, max_age=settings.MUSICBRAINZ_CACHE_DURATION
+        get_front = cached(
+            _api.get_image_front, service="coverartarchive", cache_results=False
         )
 
     class recordings(object):
-        search = memo(
-            _api.search_recordings, max_age=settings.MUSICBRAINZ_CACHE_DURATION
-        )
-        get = memo(
-            _api.get_recording_by_id, max_age=settings.MUSICBRAINZ_CACHE_DURATION
-        )
+        search = cached(_api.search_recordings)
+        get = cached(_api.get_recording_by_id)
 
     class releases(object):
-        search = memo(_api.search_releases, max_age=settings.MUSICBRAINZ_CACHE_DURATION)
-        get = memo(_api.get_release_by_id, max_age=settings.MUSICBRAINZ_CACHE_DURATION)
-        browse = memo(_api.browse_releases, max_age=settings.MUSICBRAINZ_CACHE_DURATION)
+        search = cached(_api.search_releases)
+        get = cached(_api.get_release_by_id)
+        browse = cached(_api.browse_releases)
         # get_image_front = _api.get_image_front
 
     class release_groups(object):
-        search = memo(
-            _api.search_release_groups, max_age=settings.MUSICBRAINZ_CACHE_DURATION
-        )
-        get = memo(
-            _api.get_release_group_by_id, max_age=settings.MUSICBRAINZ_CACHE_DURATION
-        )
-        browse = memo(
-            _api.browse_release_groups, max_age=settings.MUSICBRAINZ_CACHE_DURATION
-        )
+        search = cached(_api.search_release_groups)
+        get = cached(_api.get_release_group_by_id)
+        browse = cached(_api.browse_release_groups)
         # get_image_front = _api.get_image_front
 
 
@@ -1,14 +1,29 @@
-from rest_framework import viewsets
+from rest_framework import exceptions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from funkwhale_api.common.permissions import ConditionalAuthentication
 
-from .client import api
+from .client import api, RateLimited
 
 
-class ReleaseDetail(APIView):
+class MusicBrainzUnavailable(exceptions.APIException):
+    status_code = 503
+    default_detail = "Too many requests to MusicBrainz, please retry later."
+    default_code = "musicbrainz_unavailable"
+    # sent in the Retry-After header
+    wait = 1
+
+
+class RateLimitedMixin(object):
+    def handle_exception(self, exc):
+        if isinstance(exc, RateLimited):
+            exc = MusicBrainzUnavailable()
+        return super().handle_exception(exc)
+
+
+class ReleaseDetail(RateLimitedMixin, APIView):
     permission_classes = [ConditionalAuthentication]
 
     def get(self, request, *args, **kwargs):
@@ -16,7 +31,7 @@ class ReleaseDetail(APIView):
         return Response(result)
 
 
-class ArtistDetail(APIView):
+class ArtistDetail(RateLimitedMixin, APIView):
     permission_classes = [ConditionalAuthentication]
 
     def get(self, request, *args, **kwargs):
@@ -25,7 +40,7 @@ class ArtistDetail(APIView):
         return Response(result)
 
 
-class ReleaseGroupBrowse(APIView):
+class ReleaseGroupBrowse(RateLimitedMixin, APIView):
     permission_classes = [ConditionalAuthentication]
 
     def get(self, request, *args, **kwargs):
@@ -33,7 +48,7 @@ class ReleaseGroupBrowse(APIView):
         return Response(result)
 
 
-class ReleaseBrowse(APIView):
+class ReleaseBrowse(RateLimitedMixin, APIView):
     permission_classes = [ConditionalAuthentication]
 
     def get(self, request, *args, **kwargs):
@@ -44,7 +59,7 @@ class ReleaseBrowse(APIView):
         return Response(result)
 
 
-class SearchViewSet(viewsets.ViewSet):
+class SearchViewSet(RateLimitedMixin, viewsets.ViewSet):
     permission_classes = [ConditionalAuthentication]
 
     @action(methods=["get"], detail=False)
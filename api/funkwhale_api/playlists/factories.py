@@ -4,6 +4,8 @@ from funkwhale_api.factories import registry, NoUpdateOnCreate
 from funkwhale_api.music.factories import TrackFactory
 from funkwhale_api.users.factories import UserFactory
 
+from . import models
+
 
 @registry.register
 class PlaylistFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
@@ -18,6 +20,13 @@ class PlaylistFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
 class PlaylistTrackFactory(NoUpdateOnCreate, factory.django.DjangoModelFactory):
     playlist = factory.SubFactory(PlaylistFactory)
     track = factory.SubFactory(TrackFactory)
+    position = factory.LazyAttribute(
+        lambda o: None if o.index is None else o.index * models.POSITION_GAP
+    )
 
     class Meta:
         model = "playlists.PlaylistTrack"
+
+    class Params:
+        # convenience to create tracks at a given (contiguous) index
+        index = None
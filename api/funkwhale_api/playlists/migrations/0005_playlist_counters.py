@@ -0,0 +1,40 @@
+# Generated by Django 3.0.8 on 2026-10-19 14:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("music", "0055_counters"),
+        ("playlists", "0004_auto_20180320_1713"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="playlist",
+            name="tracks_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="playlist",
+            name="tracks_duration",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE playlists_playlist o
+            SET tracks_count = (
+                SELECT count(*) FROM playlists_playlisttrack plt
+                WHERE plt.playlist_id = o.id
+            ),
+            tracks_duration = (
+                SELECT coalesce(sum(u.duration), 0)
+                FROM playlists_playlisttrack plt
+                INNER JOIN music_upload u ON u.track_id = plt.track_id
+                WHERE plt.playlist_id = o.id
+            )
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
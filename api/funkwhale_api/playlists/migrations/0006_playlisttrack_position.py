@@ -0,0 +1,45 @@
+# Generated by Django 3.0.4 on 2020-04-15 09:12
+
+from django.db import migrations, models
+
+
+POPULATE_POSITION_SQL = """
+    UPDATE playlists_playlisttrack plt
+    SET position = r.rank * 65536
+    FROM (
+        SELECT
+            id,
+            row_number() OVER (
+                PARTITION BY playlist_id ORDER BY index NULLS LAST, id
+            ) - 1 AS rank
+        FROM playlists_playlisttrack
+    ) r
+    WHERE plt.id = r.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("playlists", "0005_playlist_counters"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(name="playlisttrack", unique_together=set()),
+        migrations.AddField(
+            model_name="playlisttrack",
+            name="position",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunSQL(POPULATE_POSITION_SQL, migrations.RunSQL.noop),
+        migrations.RemoveField(model_name="playlisttrack", name="index"),
+        migrations.AlterModelOptions(
+            name="playlisttrack", options={"ordering": ("-playlist", "position", "id")}
+        ),
+        migrations.AddIndex(
+            model_name="playlisttrack",
+            index=models.Index(
+                fields=["playlist", "position"], name="playlists_p_playlis_0d8b2c_idx"
+            ),
+        ),
+    ]
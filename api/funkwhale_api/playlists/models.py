@@ -1,19 +1,37 @@
-from django.db import models, transaction
+from django.db import connection, models, transaction
+from django.db.models import functions
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 from rest_framework import exceptions
 
-from funkwhale_api.common import fields, preferences
+from funkwhale_api.common import counters, fields, preferences
+from funkwhale_api.common import models as common_models
 from funkwhale_api.music import models as music_models
 
 
+# PlaylistTrack positions are sparse, so that a track can be inserted or moved
+# without updating the position of the following tracks
+POSITION_GAP = 2 ** 16
+
+REBALANCE_SQL = """
+    UPDATE playlists_playlisttrack plt
+    SET position = r.rank * %s
+    FROM (
+        SELECT id, row_number() OVER (ORDER BY position, id) - 1 AS rank
+        FROM playlists_playlisttrack
+        WHERE playlist_id = %s AND position IS NOT NULL
+    ) r
+    WHERE plt.id = r.id
+"""
+
+
 class PlaylistQuerySet(models.QuerySet):
     def with_tracks_count(self):
-        return self.annotate(_tracks_count=models.Count("playlist_tracks"))
+        return self.annotate(_tracks_count=models.F("tracks_count"))
 
     def with_duration(self):
-        return self.annotate(
-            duration=models.Sum("playlist_tracks__track__uploads__duration")
-        )
+        return self.annotate(duration=models.F("tracks_duration"))
 
     def with_covers(self):
         album_prefetch = models.Prefetch(
@@ -31,7 +49,7 @@ class PlaylistQuerySet(models.QuerySet):
             "playlist_tracks",
             queryset=PlaylistTrack.objects.all()
             .exclude(track__album__attachment_cover=None)
-            .order_by("index")
+            .order_by("position", "id")
             .only("id", "playlist_id", "track_id")
             .prefetch_related(track_prefetch),
             to_attr="plts_for_cover",
@@ -55,7 +73,8 @@ class PlaylistQuerySet(models.QuerySet):
             return self.exclude(playlist_tracks__in=plts).distinct()
 
 
-class Playlist(models.Model):
+class Playlist(common_models.DenormalizedCountersMixin, models.Model):
+    counter_fields = ["tracks_count", "tracks_duration"]
     name = models.CharField(max_length=50)
     user = models.ForeignKey(
         "users.User", related_name="playlists", on_delete=models.CASCADE
@@ -63,6 +82,9 @@ class Playlist(models.Model):
     creation_date = models.DateTimeField(default=timezone.now)
     modification_date = models.DateTimeField(auto_now=True)
     privacy_level = fields.get_privacy_field()
+    # cf funkwhale_api.common.counters
+    tracks_count = models.PositiveIntegerField(default=0)
+    tracks_duration = models.PositiveIntegerField(default=0)
 
     objects = PlaylistQuerySet.as_manager()
 
@@ -72,25 +94,75 @@ class Playlist(models.Model):
     def get_absolute_url(self):
         return "/library/playlists/{}".format(self.pk)
 
+    def update_counters(self):
+        counters.refresh(
+            ["playlists.Playlist.tracks_count", "playlists.Playlist.tracks_duration"],
+            [self.pk],
+        )
+
+    def lock(self):
+        """
+        Lock the playlist row until the end of the current transaction,
+        to serialize concurrent edits of the same playlist
+        """
+        Playlist.objects.filter(pk=self.pk).select_for_update().values_list("pk")[0]
+
+    def rebalance(self):
+        """
+        Spread the positions of the playlist tracks evenly, to make room
+        for future inserts
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(REBALANCE_SQL, [POSITION_GAP, self.pk])
+
+    def get_position_at(self, index, existing):
+        """
+        Return a position so that a track inserted at this position ends up
+        at the given index. Only the two neighbours of the index are read
+        """
+        positions = existing.order_by("position", "id").values_list(
+            "position", flat=True
+        )
+        neighbours = list(positions[max(index - 1, 0) : index + 1])
+        if index == 0:
+            previous, following = None, neighbours[0] if neighbours else None
+        else:
+            previous = neighbours[0]
+            following = neighbours[1] if len(neighbours) > 1 else None
+
+        if previous is None and following is None:
+            return 0
+        if previous is None:
+            return following - POSITION_GAP
+        if following is None:
+            return previous + POSITION_GAP
+        if following - previous > 1:
+            return (previous + following) // 2
+        # no room left between neighbours
+        return None
+
     @transaction.atomic
     def insert(self, plt, index=None, allow_duplicates=True):
         """
-        Given a PlaylistTrack, insert it at the correct index in the playlist,
-        and update other tracks index if necessary.
+        Given a PlaylistTrack, insert it at the correct index in the playlist.
+
+        Only the inserted PlaylistTrack is written, other tracks are left
+        untouched unless the playlist needs to be rebalanced.
         """
-        old_index = plt.index
-        move = old_index is not None
-        if index is not None and index == old_index:
+        self.lock()
+        move = plt.position is not None
+        if move and index is not None and index == plt.get_index():
             # moving at same position, just skip
+            plt.index = index
             return index
 
-        existing = self.playlist_tracks.select_for_update()
+        existing = self.playlist_tracks.exclude(position=None)
         if move:
             existing = existing.exclude(pk=plt.pk)
-        total = existing.filter(index__isnull=False).count()
+        total = existing.count()
 
         if index is None:
-            # we simply increment the last track index by 1
+            # we simply add the track after the last one
             index = total
 
         if index > total:
@@ -103,41 +175,25 @@ class Playlist(models.Model):
             existing_without_current_plt = existing.exclude(pk=plt.pk)
             self._check_duplicate_add(existing_without_current_plt, [plt.track])
 
-        if move:
-            # we remove the index temporarily, to avoid integrity errors
-            plt.index = None
-            plt.save(update_fields=["index"])
-            if index > old_index:
-                # new index is higher than current, we decrement previous tracks
-                to_update = existing.filter(index__gt=old_index, index__lte=index)
-                to_update.update(index=models.F("index") - 1)
-            if index < old_index:
-                # new index is lower than current, we increment next tracks
-                to_update = existing.filter(index__lt=old_index, index__gte=index)
-                to_update.update(index=models.F("index") + 1)
-        else:
-            to_update = existing.filter(index__gte=index)
-            to_update.update(index=models.F("index") + 1)
+        position = self.get_position_at(index, existing)
+        if position is None:
+            self.rebalance()
+            position = self.get_position_at(index, existing)
 
+        plt.position = position
         plt.index = index
-        plt.save(update_fields=["index"])
+        plt.save(update_fields=["position"])
         self.save(update_fields=["modification_date"])
         return index
 
-    @transaction.atomic
-    def remove(self, index):
-        existing = self.playlist_tracks.select_for_update()
-        self.save(update_fields=["modification_date"])
-        to_update = existing.filter(index__gt=index)
-        return to_update.update(index=models.F("index") - 1)
-
     @transaction.atomic
     def insert_many(self, tracks, allow_duplicates=True):
-        existing = self.playlist_tracks.select_for_update()
+        self.lock()
+        existing = self.playlist_tracks.all()
         now = timezone.now()
-        total = existing.filter(index__isnull=False).count()
+        total = existing.count()
         max_tracks = preferences.get("playlists__max_tracks")
-        if existing.count() + len(tracks) > max_tracks:
+        if total + len(tracks) > max_tracks:
             raise exceptions.ValidationError(
                 "Playlist would reach the maximum of {} tracks".format(max_tracks)
             )
@@ -146,14 +202,23 @@ class Playlist(models.Model):
             self._check_duplicate_add(existing, tracks)
 
         self.save(update_fields=["modification_date"])
-        start = total
+        last_position = existing.aggregate(v=models.Max("position"))["v"]
+        start = 0 if last_position is None else last_position + POSITION_GAP
         plts = [
             PlaylistTrack(
-                creation_date=now, playlist=self, track=track, index=start + i
+                creation_date=now,
+                playlist=self,
+                track=track,
+                position=start + i * POSITION_GAP,
             )
             for i, track in enumerate(tracks)
         ]
-        return PlaylistTrack.objects.bulk_create(plts)
+        plts = PlaylistTrack.objects.bulk_create(plts)
+        for i, plt in enumerate(plts):
+            plt.index = total + i
+        # bulk_create doesn't send signals
+        self.update_counters()
+        return plts
 
     def _check_duplicate_add(self, existing_playlist_tracks, tracks_to_add):
         track_ids = [t.pk for t in tracks_to_add]
@@ -186,6 +251,27 @@ class PlaylistTrackQuerySet(models.QuerySet):
             models.Prefetch("track", queryset=tracks, to_attr="_prefetched_track")
         )
 
+    def with_index(self):
+        """
+        Annotate each PlaylistTrack with its (contiguous) index in the playlist.
+
+        Prefer set_indexes() when serializing a whole playlist.
+        """
+        previous = (
+            PlaylistTrack.objects.filter(playlist=models.OuterRef("playlist"))
+            .filter(
+                models.Q(position__lt=models.OuterRef("position"))
+                | models.Q(
+                    position=models.OuterRef("position"), pk__lt=models.OuterRef("pk")
+                )
+            )
+            .order_by()
+            .values("playlist")
+            .annotate(c=models.Count("id"))
+            .values("c")
+        )
+        return self.annotate(index=functions.Coalesce(models.Subquery(previous), 0))
+
     def annotate_playable_by_actor(self, actor):
         tracks = (
             music_models.Upload.objects.playable_by(actor)
@@ -208,23 +294,99 @@ class PlaylistTrack(models.Model):
     track = models.ForeignKey(
         "music.Track", related_name="playlist_tracks", on_delete=models.CASCADE
     )
-    index = models.PositiveIntegerField(null=True, blank=True)
+    # sparse ordering key, cf POSITION_GAP
+    position = models.BigIntegerField(null=True, blank=True)
     playlist = models.ForeignKey(
         Playlist, related_name="playlist_tracks", on_delete=models.CASCADE
     )
     creation_date = models.DateTimeField(default=timezone.now)
 
+    # contiguous index of the track in the playlist, which isn't stored
+    # in the database (cf PlaylistTrackQuerySet.with_index() and set_indexes())
+    index = None
+
     objects = PlaylistTrackQuerySet.as_manager()
 
     class Meta:
-        ordering = ("-playlist", "index")
-        unique_together = ("playlist", "index")
+        ordering = ("-playlist", "position", "id")
+        indexes = [models.Index(fields=["playlist", "position"])]
+
+    def get_index(self):
+        return (
+            self.__class__.objects.filter(playlist=self.playlist_id)
+            .filter(
+                models.Q(position__lt=self.position)
+                | models.Q(position=self.position, pk__lt=self.pk)
+            )
+            .count()
+        )
 
     def delete(self, *args, **kwargs):
-        playlist = self.playlist
-        index = self.index
-        update_indexes = kwargs.pop("update_indexes", False)
+        update_modification_date = kwargs.pop("update_indexes", False)
         r = super().delete(*args, **kwargs)
-        if index is not None and update_indexes:
-            playlist.remove(index)
+        if update_modification_date:
+            # following tracks indexes don't need to be updated anymore,
+            # since they are computed from sparse positions
+            self.playlist.save(update_fields=["modification_date"])
         return r
+
+
+def set_indexes(plts):
+    """
+    Set the index of the given PlaylistTrack objects, which must
+    include all the tracks of a playlist, ordered by position
+    """
+    plts = list(plts)
+    for i, plt in enumerate(plts):
+        plt.index = i
+    return plts
+
+
+@receiver(post_save, sender=PlaylistTrack)
+def update_playlist_counters_on_save(sender, instance, created, **kwargs):
+    if created:
+        instance.playlist.update_counters()
+
+
+@receiver(post_delete, sender=PlaylistTrack)
+def update_playlist_counters_on_delete(sender, instance, **kwargs):
+    Playlist(pk=instance.playlist_id).update_counters()
+
+
+def update_playlists_tracks_duration(track_ids):
+    """
+    Refresh the duration of the playlists including any of the given tracks
+    """
+    playlist_ids = (
+        PlaylistTrack.objects.filter(track_id__in=track_ids)
+        .values_list("playlist_id", flat=True)
+        .distinct()
+    )
+    playlist_ids = list(playlist_ids)
+    if playlist_ids:
+        counters.refresh(["playlists.Playlist.tracks_duration"], playlist_ids)
+
+
+@receiver(post_save, sender=music_models.Upload)
+def update_playlists_tracks_duration_on_upload_save(
+    sender, instance, created, **kwargs
+):
+    # the previous value is set in music.models.set_upload_usage
+    previous = instance.__dict__.pop("_upload_duration", None)
+    if not created and previous is None:
+        return
+    current = (instance.track_id, instance.duration)
+    if previous == current:
+        return
+    # uploads without a duration don't count in playlists durations
+    track_ids = {
+        track_id for track_id, duration in [previous, current] if track_id and duration
+    }
+    if track_ids:
+        update_playlists_tracks_duration(track_ids)
+
+
+@receiver(post_delete, sender=music_models.Upload)
+def update_playlists_tracks_duration_on_upload_delete(sender, instance, **kwargs):
+    if instance.track_id and instance.duration:
+        update_playlists_tracks_duration([instance.track_id])
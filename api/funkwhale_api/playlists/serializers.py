@@ -13,6 +13,7 @@ from . import models
 class PlaylistTrackSerializer(serializers.ModelSerializer):
     # track = TrackSerializer()
     track = serializers.SerializerMethodField()
+    index = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = models.PlaylistTrack
@@ -63,6 +64,8 @@ class PlaylistTrackWriteSerializer(serializers.ModelSerializer):
         super().update(instance, validated_data)
         if update_index:
             instance.playlist.insert(instance, index, allow_duplicates)
+        else:
+            instance.index = instance.get_index()
 
         return instance
 
@@ -111,18 +114,10 @@ class PlaylistSerializer(serializers.ModelSerializer):
             return None
 
     def get_tracks_count(self, obj):
-        try:
-            return obj.tracks_count
-        except AttributeError:
-            # no annotation?
-            return obj.playlist_tracks.count()
+        return obj.tracks_count
 
     def get_duration(self, obj):
-        try:
-            return obj.duration
-        except AttributeError:
-            # no annotation?
-            return 0
+        return obj.tracks_duration
 
     def get_album_covers(self, obj):
         try:
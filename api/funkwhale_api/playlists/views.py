@@ -1,5 +1,4 @@
 from django.db import transaction
-from django.db.models import Count
 from rest_framework import exceptions, mixins, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -24,7 +23,6 @@ class PlaylistViewSet(
     queryset = (
         models.Playlist.objects.all()
         .select_related("user__actor__attachment_icon")
-        .annotate(tracks_count=Count("playlist_tracks", distinct=True))
         .with_covers()
         .with_duration()
     )
@@ -41,8 +39,10 @@ class PlaylistViewSet(
     @action(methods=["get"], detail=True)
     def tracks(self, request, *args, **kwargs):
         playlist = self.get_object()
-        plts = playlist.playlist_tracks.all().for_nested_serialization(
-            music_utils.get_actor_from_request(request)
+        plts = models.set_indexes(
+            playlist.playlist_tracks.all().for_nested_serialization(
+                music_utils.get_actor_from_request(request)
+            )
         )
         serializer = serializers.PlaylistTrackSerializer(plts, many=True)
         data = {"count": len(plts), "results": serializer.data}
@@ -62,12 +62,14 @@ class PlaylistViewSet(
         except exceptions.ValidationError as e:
             payload = {"playlist": e.detail}
             return Response(payload, status=400)
-        ids = [p.id for p in plts]
-        plts = (
-            models.PlaylistTrack.objects.filter(pk__in=ids)
-            .order_by("index")
+        indexes = {p.id: p.index for p in plts}
+        plts = list(
+            models.PlaylistTrack.objects.filter(pk__in=indexes.keys())
+            .order_by("position", "id")
             .for_nested_serialization(music_utils.get_actor_from_request(request))
         )
+        for plt in plts:
+            plt.index = indexes[plt.id]
         serializer = serializers.PlaylistTrackSerializer(plts, many=True)
         data = {"count": len(plts), "results": serializer.data}
         return Response(data, status=201)
@@ -120,13 +122,17 @@ class PlaylistTrackViewSet(
         return self.serializer_class
 
     def get_queryset(self):
-        return self.queryset.filter(
-            fields.privacy_level_query(
-                self.request.user,
-                lookup_field="playlist__privacy_level",
-                user_field="playlist__user",
+        return (
+            self.queryset.filter(
+                fields.privacy_level_query(
+                    self.request.user,
+                    lookup_field="playlist__privacy_level",
+                    user_field="playlist__user",
+                )
             )
-        ).for_nested_serialization(music_utils.get_actor_from_request(self.request))
+            .with_index()
+            .for_nested_serialization(music_utils.get_actor_from_request(self.request))
+        )
 
     def perform_destroy(self, instance):
         instance.delete(update_indexes=True)
@@ -4,6 +4,7 @@ import hashlib
 from rest_framework import authentication, exceptions
 
 from funkwhale_api.common import authentication as common_authentication
+from funkwhale_api.users import auth_cache
 from funkwhale_api.users.models import User
 
 
@@ -19,10 +20,13 @@ def authenticate(username, password):
         if password.startswith("enc:"):
             password = password.replace("enc:", "", 1)
             password = binascii.unhexlify(password).decode("utf-8")
-        user = (
-            User.objects.all()
+        user = auth_cache.get_user(
+            ["subsonic", username.lower(), password],
+            lambda: User.objects.all()
             .for_auth()
-            .get(username__iexact=username, is_active=True, subsonic_api_token=password)
+            .get(
+                username__iexact=username, is_active=True, subsonic_api_token=password
+            ),
         )
     except (User.DoesNotExist, binascii.Error):
         raise exceptions.AuthenticationFailed("Wrong username or password.")
@@ -35,10 +39,12 @@ def authenticate(username, password):
 
 def authenticate_salt(username, salt, token):
     try:
-        user = (
-            User.objects.all()
+        # the token is checked against the cached user below
+        user = auth_cache.get_user(
+            ["subsonic-salt", username],
+            lambda: User.objects.all()
             .for_auth()
-            .get(username=username, is_active=True, subsonic_api_token__isnull=False)
+            .get(username=username, is_active=True, subsonic_api_token__isnull=False),
         )
     except User.DoesNotExist:
         raise exceptions.AuthenticationFailed("Wrong username or password.")
@@ -1,7 +1,10 @@
 import collections
+import itertools
 import xml.etree.ElementTree as ET
 
+from django.http import StreamingHttpResponse
 from rest_framework import renderers
+from rest_framework.settings import api_settings
 
 import funkwhale_api
 
@@ -44,13 +47,83 @@ def structure_payload(data):
     return collections.OrderedDict(sorted(payload.items(), key=lambda v: v[0]))
 
 
+# size of the chunks sent to the client when streaming a response
+STREAMING_CHUNK_SIZE = 16 * 1024
+
+
+def buffered(chunks, size=STREAMING_CHUNK_SIZE):
+    """
+    Group small string chunks into bigger encoded ones, to avoid
+    sending a lot of tiny writes to the client
+    """
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+
+def is_list(value):
+    # lists, generators, querysets…
+    return not isinstance(value, (str, bytes, dict)) and hasattr(value, "__iter__")
+
+
+def is_flat(value):
+    return not any(isinstance(v, (dict, list)) or is_list(v) for v in value.values())
+
+
 class SubsonicJSONRenderer(renderers.JSONRenderer):
     def render(self, data, accepted_media_type=None, renderer_context=None):
         if not data:
             # when stream view is called, we don't have any data
             return super().render(data, accepted_media_type, renderer_context)
+        return b"".join(self.stream(data))
+
+    def stream(self, data):
+        encoder = self.encoder_class(
+            ensure_ascii=self.ensure_ascii,
+            allow_nan=not self.strict,
+            separators=api_settings.COMPACT_JSON and (",", ":") or (", ", ": "),
+        )
         final = {"subsonic-response": structure_payload(data)}
-        return super().render(final, accepted_media_type, renderer_context)
+        return buffered(iter_json(final, encoder))
+
+
+def iter_json(value, encoder):
+    """
+    Serialize the given value to JSON incrementally. Lists
+    can be replaced with any iterable, including generators.
+    """
+    if isinstance(value, dict) and is_flat(value):
+        # flat objects, such as tracks or albums, are encoded in one go
+        yield encoder.encode(value)
+    elif isinstance(value, dict):
+        yield "{"
+        separator = ""
+        for key, v in value.items():
+            yield separator + encoder.encode(str(key)) + ":"
+            yield from iter_json(v, encoder)
+            separator = ","
+        yield "}"
+    elif is_list(value):
+        yield "["
+        separator = ""
+        for v in value:
+            if isinstance(v, dict) and is_flat(v):
+                yield separator + encoder.encode(v)
+            else:
+                yield separator
+                yield from iter_json(v, encoder)
+            separator = ","
+        yield "]"
+    else:
+        yield encoder.encode(value)
 
 
 class SubsonicXMLRenderer(renderers.JSONRenderer):
@@ -60,14 +133,75 @@ class SubsonicXMLRenderer(renderers.JSONRenderer):
         if not data:
             # when stream view is called, we don't have any data
             return super().render(data, accepted_media_type, renderer_context)
+        return b"".join(self.stream(data))
+
+    def stream(self, data):
         final = structure_payload(data)
         final["xmlns"] = "http://subsonic.org/restapi"
-        tree = dict_to_xml_tree("subsonic-response", final)
-        return b'<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(
-            tree, encoding="utf-8"
+        return buffered(
+            itertools.chain(
+                ['<?xml version="1.0" encoding="UTF-8"?>\n'],
+                iter_xml("subsonic-response", final),
+            )
         )
 
 
+def iter_xml(tag, value):
+    """
+    Serialize the given dict to XML incrementally, using the same conventions
+    as dict_to_xml_tree. Lists can be replaced with any iterable,
+    including generators.
+    """
+    attrs = []
+    text = None
+    children = []
+    for key, v in value.items():
+        if isinstance(v, dict) or is_list(v) or key == "cdata_value":
+            children.append((key, v))
+        elif key == "value":
+            text = str(v)
+        else:
+            attrs.append(" {}={}".format(key, escape_attrib(str(v))))
+
+    yield "<" + tag + "".join(attrs)
+    # the tag is closed only once we know it has content, since lists
+    # may be empty generators
+    opened = False
+    if text:
+        yield ">" + ET._escape_cdata(text)
+        opened = True
+    for key, v in children:
+        if key == "cdata_value":
+            chunks = ["<![CDATA[{}]]>".format(v)]
+        elif isinstance(v, dict):
+            chunks = iter_xml(key, v)
+        else:
+            chunks = (chunk for obj in v for chunk in iter_xml(key, obj))
+        for chunk in chunks:
+            if not opened:
+                yield ">"
+                opened = True
+            yield chunk
+    yield "</{}>".format(tag) if opened else " />"
+
+
+def escape_attrib(value):
+    return '"{}"'.format(ET._escape_attrib(value))
+
+
+class SubsonicStreamingResponse(StreamingHttpResponse):
+    """
+    Render a Subsonic payload incrementally, to keep memory usage and time to first
+    byte low for big responses. Lists in the payload can be replaced with
+    generators, which are consumed while the response is sent.
+    """
+
+    def __init__(self, request, data, **kwargs):
+        renderer = request.accepted_renderer
+        kwargs.setdefault("content_type", request.accepted_media_type)
+        super().__init__(renderer.stream(data), **kwargs)
+
+
 def dict_to_xml_tree(root_tag, d, parent=None):
     root = ET.Element(root_tag)
     for key, value in d.items():
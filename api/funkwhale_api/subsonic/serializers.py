@@ -1,6 +1,6 @@
-import collections
+import itertools
 
-from django.db.models import Count, functions
+from django.db.models import Count, F, Func, functions
 from rest_framework import serializers
 
 from funkwhale_api.history import models as history_models
@@ -52,23 +52,44 @@ def get_artist_data(artist_values):
     }
 
 
+def get_index_letter(artist):
+    return artist["_index_letter"]
+
+
+def iter_artists_index(queryset):
+    """
+    Yield artists grouped by first letter, as expected by getArtists and getIndexes.
+    Artists are fetched in chunks and grouped on the fly, so the whole list is never
+    held in memory. Each group must be consumed before the next one.
+    """
+    queryset = queryset.with_albums_count().exclude(name="")
+    # letters are computed, and sorted by codepoint, by the database, so that
+    # artists with the same letter are always contiguous, whatever the collation
+    queryset = queryset.annotate(
+        _index_letter=functions.Upper(functions.Substr("name", 1, 1))
+    )
+    queryset = queryset.order_by(
+        Func(F("_index_letter"), template='%(expressions)s COLLATE "C"'),
+        functions.Lower("name"),
+    )
+    values = queryset.values("id", "_albums_count", "name", "_index_letter")
+
+    for letter, artists in itertools.groupby(values.iterator(), key=get_index_letter):
+        yield {
+            "name": letter,
+            "artist": (get_artist_data(v) for v in artists),
+        }
+
+
+def get_artists_index_data(queryset):
+    return {"ignoredArticles": "", "index": iter_artists_index(queryset)}
+
+
 class GetArtistsSerializer(serializers.Serializer):
     def to_representation(self, queryset):
         payload = {"ignoredArticles": "", "index": []}
-        queryset = queryset.with_albums_count()
-        queryset = queryset.order_by(functions.Lower("name"))
-        values = queryset.values("id", "_albums_count", "name")
-
-        first_letter_mapping = collections.defaultdict(list)
-        for artist in values:
-            if artist["name"]:
-                first_letter_mapping[artist["name"][0].upper()].append(artist)
-
-        for letter, artists in sorted(first_letter_mapping.items()):
-            letter_data = {
-                "name": letter,
-                "artist": [get_artist_data(v) for v in artists],
-            }
+        for letter_data in iter_artists_index(queryset):
+            letter_data["artist"] = list(letter_data["artist"])
             payload["index"].append(letter_data)
         return payload
 
@@ -186,28 +207,43 @@ class GetSongSerializer(serializers.Serializer):
         return get_track_data(track.album, track, uploads[0])
 
 
-def get_starred_tracks_data(favorites):
+# number of starred tracks loaded at once when generating getStarred responses
+STARRED_TRACKS_CHUNK_SIZE = 500
+
+
+def iter_starred_tracks_data(favorites):
     by_track_id = {f.track_id: f for f in favorites}
-    tracks = (
-        music_models.Track.objects.filter(pk__in=by_track_id.keys())
-        .select_related("album__artist")
-        .prefetch_related("uploads")
-    )
-    tracks = tracks.order_by("-creation_date")
-    data = []
-    for t in tracks:
-        try:
-            uploads = [upload for upload in t.uploads.all()][0]
-        except IndexError:
-            continue
-        td = get_track_data(t.album, t, uploads)
-        td["starred"] = to_subsonic_date(by_track_id[t.pk].creation_date)
-        data.append(td)
-    return data
+    tracks = music_models.Track.objects.filter(pk__in=by_track_id.keys())
+    track_ids = list(tracks.order_by("-creation_date").values_list("pk", flat=True))
+    for i in range(0, len(track_ids), STARRED_TRACKS_CHUNK_SIZE):
+        chunk = track_ids[i : i + STARRED_TRACKS_CHUNK_SIZE]
+        tracks = (
+            music_models.Track.objects.select_related("album__artist")
+            .prefetch_related("uploads")
+            .in_bulk(chunk)
+        )
+        for pk in chunk:
+            t = tracks[pk]
+            try:
+                uploads = [upload for upload in t.uploads.all()][0]
+            except IndexError:
+                continue
+            td = get_track_data(t.album, t, uploads)
+            td["starred"] = to_subsonic_date(by_track_id[t.pk].creation_date)
+            yield td
+
+
+def get_starred_tracks_data(favorites):
+    return list(iter_starred_tracks_data(favorites))
+
+
+def iter_album_list2_data(albums):
+    for a in albums:
+        yield get_album2_data(a)
 
 
 def get_album_list2_data(albums):
-    return [get_album2_data(a) for a in albums]
+    return list(iter_album_list2_data(albums))
 
 
 def get_playlist_data(playlist):
@@ -227,7 +263,7 @@ def get_playlist_detail_data(playlist):
     qs = (
         playlist.playlist_tracks.select_related("track__album__artist")
         .prefetch_related("track__uploads")
-        .order_by("index")
+        .order_by("position", "id")
     )
     data["entry"] = []
     for plt in qs:
@@ -39,6 +39,7 @@ from funkwhale_api.tags import models as tags_models
 from funkwhale_api.users import models as users_models
 
 from . import authentication, filters, negotiation, serializers
+from . import renderers as subsonic_renderers
 
 
 def find_object(
@@ -197,10 +198,9 @@ class SubsonicViewSet(viewsets.GenericViewSet):
             )
             .playable_by(utils.get_actor_from_request(request))
         )
-        data = serializers.GetArtistsSerializer(artists).data
-        payload = {"artists": data}
+        payload = {"artists": serializers.get_artists_index_data(artists)}
 
-        return response.Response(payload, status=200)
+        return subsonic_renderers.SubsonicStreamingResponse(request, payload)
 
     @action(
         detail=False,
@@ -218,10 +218,9 @@ class SubsonicViewSet(viewsets.GenericViewSet):
             )
             .playable_by(utils.get_actor_from_request(request))
         )
-        data = serializers.GetArtistsSerializer(artists).data
-        payload = {"indexes": data}
+        payload = {"indexes": serializers.get_artists_index_data(artists)}
 
-        return response.Response(payload, status=200)
+        return subsonic_renderers.SubsonicStreamingResponse(request, payload)
 
     @action(
         detail=False,
@@ -336,8 +335,8 @@ class SubsonicViewSet(viewsets.GenericViewSet):
     )
     def get_starred2(self, request, *args, **kwargs):
         favorites = request.user.track_favorites.all()
-        data = {"starred2": {"song": serializers.get_starred_tracks_data(favorites)}}
-        return response.Response(data)
+        data = {"starred2": {"song": serializers.iter_starred_tracks_data(favorites)}}
+        return subsonic_renderers.SubsonicStreamingResponse(request, data)
 
     @action(
         detail=False,
@@ -425,8 +424,8 @@ class SubsonicViewSet(viewsets.GenericViewSet):
     )
     def get_starred(self, request, *args, **kwargs):
         favorites = request.user.track_favorites.all()
-        data = {"starred": {"song": serializers.get_starred_tracks_data(favorites)}}
-        return response.Response(data)
+        data = {"starred": {"song": serializers.iter_starred_tracks_data(favorites)}}
+        return subsonic_renderers.SubsonicStreamingResponse(request, data)
 
     @action(
         detail=False,
@@ -509,8 +508,8 @@ class SubsonicViewSet(viewsets.GenericViewSet):
 
         size = min(size, 500)
         queryset = queryset[offset : offset + size]
-        data = {"albumList2": {"album": serializers.get_album_list2_data(queryset)}}
-        return response.Response(data)
+        data = {"albumList2": {"album": serializers.iter_album_list2_data(queryset)}}
+        return subsonic_renderers.SubsonicStreamingResponse(request, data)
 
     @action(
         detail=False, methods=["get", "post"], url_name="search3", url_path="search3"
@@ -618,10 +617,12 @@ class SubsonicViewSet(viewsets.GenericViewSet):
             playlist.save(update_fields=["name", "modification_date"])
         try:
             to_remove = int(data["songIndexToRemove"])
-            plt = playlist.playlist_tracks.get(index=to_remove)
+            if to_remove < 0:
+                raise ValueError()
+            plt = playlist.playlist_tracks.order_by("position", "id")[to_remove]
         except (TypeError, ValueError, KeyError):
             pass
-        except playlists_models.PlaylistTrack.DoesNotExist:
+        except IndexError:
             pass
         else:
             plt.delete(update_indexes=True)
@@ -1,46 +1,77 @@
 import collections
 
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 
 from . import models
 
 
-def get_tags_from_foreign_key(
-    ids, foreign_key_model, foreign_key_attr, tagged_items_attr="tagged_items"
-):
+# tags that are present on all the children (e.g tracks) of each parent (e.g album)
+TAGS_FROM_FOREIGN_KEY_SQL = """
+    SELECT child.{column} AS object_id, ti.tag_id
+    FROM {table} child
+    INNER JOIN tags_taggeditem ti
+        ON ti.object_id = child.id AND ti.content_type_id = %(child_content_type)s
+    WHERE child.{column} = ANY(%(ids)s)
+    GROUP BY child.{column}, ti.tag_id
+    HAVING count(*) = (
+        SELECT count(*) FROM {table} c WHERE c.{column} = child.{column}
+    )
+"""
+
+ADD_TAGS_FROM_FOREIGN_KEY_SQL = """
+    INSERT INTO tags_taggeditem (creation_date, tag_id, content_type_id, object_id)
+    SELECT now(), t.tag_id, %(content_type)s, t.object_id
+    FROM ({}) t
+    ON CONFLICT DO NOTHING
+    RETURNING object_id, tag_id
+"""
+
+
+def get_tags_from_foreign_key_sql(foreign_key_model, foreign_key_attr, ids):
+    sql = TAGS_FROM_FOREIGN_KEY_SQL.format(
+        table=foreign_key_model._meta.db_table,
+        column=foreign_key_model._meta.get_field(foreign_key_attr).column,
+    )
+    params = {
+        "ids": list(ids),
+        "child_content_type": ContentType.objects.get_for_model(foreign_key_model).pk,
+    }
+    return sql, params
+
+
+def group_rows(rows):
+    data = collections.defaultdict(list)
+    for object_id, tag_id in rows:
+        data[object_id].append(tag_id)
+    return {object_id: sorted(tag_ids) for object_id, tag_ids in data.items()}
+
+
+def get_tags_from_foreign_key(ids, foreign_key_model, foreign_key_attr):
     """
     Cf #988, this is useful to tag an artist with #Rock if all its tracks are tagged with
     #Rock, for instance.
     """
-    data = {}
-    objs = foreign_key_model.objects.filter(
-        **{"{}__pk__in".format(foreign_key_attr): ids}
-    ).order_by("-id")
-    objs = objs.only("id", "{}_id".format(foreign_key_attr)).prefetch_related(
-        tagged_items_attr
+    sql, params = get_tags_from_foreign_key_sql(
+        foreign_key_model, foreign_key_attr, ids
     )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return group_rows(cursor.fetchall())
+
 
-    for obj in objs.iterator():
-        # loop on all objects, store the objs tags + counter on the corresponding foreign key
-        row_data = data.setdefault(
-            getattr(obj, "{}_id".format(foreign_key_attr)),
-            {"total_objs": 0, "tags": []},
-        )
-        row_data["total_objs"] += 1
-        for ti in getattr(obj, tagged_items_attr).all():
-            row_data["tags"].append(ti.tag_id)
-
-    # now, keep only tags that are present on all objects, i.e tags where the count
-    # matches total_objs
-    final_data = {}
-    for key, row_data in data.items():
-        counter = collections.Counter(row_data["tags"])
-        tags_to_keep = sorted(
-            [t for t, c in counter.items() if c >= row_data["total_objs"]]
-        )
-        if tags_to_keep:
-            final_data[key] = tags_to_keep
-    return final_data
+def add_tags_from_foreign_key(ids, model, foreign_key_model, foreign_key_attr):
+    """
+    Same as get_tags_from_foreign_key, but tags are directly inserted on
+    the matching objects, in a single query. Returns the inserted tags.
+    """
+    sql, params = get_tags_from_foreign_key_sql(
+        foreign_key_model, foreign_key_attr, ids
+    )
+    params["content_type"] = ContentType.objects.get_for_model(model).pk
+    with connection.cursor() as cursor:
+        cursor.execute(ADD_TAGS_FROM_FOREIGN_KEY_SQL.format(sql), params)
+        return group_rows(cursor.fetchall())
 
 
 def add_tags_batch(data, model, tagged_items_attr="tagged_items"):
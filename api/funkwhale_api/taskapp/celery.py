@@ -26,6 +26,16 @@ def process_failure(sender, task_id, exception, args, kwargs, traceback, einfo,
     tb.print_exc()
 
 
+@celery.signals.worker_process_init.connect
+def preload_preferences(**kwargs):
+    from funkwhale_api.common import preferences
+
+    try:
+        preferences.get_snapshot()
+    except Exception:
+        logger.exception("[celery] Could not preload preferences")
+
+
 class CeleryConfig(AppConfig):
     name = "funkwhale_api.taskapp"
     verbose_name = "Celery Config"
@@ -0,0 +1,77 @@
+"""
+Short-lived cache of authenticated users, to avoid querying the database on
+every authenticated request (JWT, Subsonic and OAuth clients tend to send lots
+of them).
+
+Entries are keyed by a digest of the credentials, and store the user
+as returned by ``User.objects.for_auth()``, e.g with their permissions, tokens
+and email verification status. Each user has a version stored in the cache:
+an entry is only valid for the version it was cached with, and any change to
+the user (password, tokens, permissions, deactivation…) invalidates the version.
+Versions are read before loading users, so entries for new credentials are
+only used once their user is known, from the second lookup on.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from funkwhale_api.common import utils as common_utils
+
+PRINCIPAL_CACHE_KEY = "users:auth-principal:{}"
+VERSION_CACHE_KEY = "users:auth-version:{}"
+
+
+def get_digest(*parts):
+    return hashlib.sha256(":".join([str(p) for p in parts]).encode()).hexdigest()
+
+
+def get_version(user_id):
+    key = VERSION_CACHE_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex[:12], timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate(*user_ids):
+    cache.delete_many([VERSION_CACHE_KEY.format(pk) for pk in user_ids])
+
+
+def invalidate_on_commit(*user_ids):
+    """
+    Invalidate cached entries now, and once the current transaction is committed,
+    to discard entries cached by concurrent requests from not yet committed data
+    """
+    invalidate(*user_ids)
+    common_utils.on_commit(invalidate, *user_ids)
+
+
+def get_user(credentials, get_user):
+    """
+    Return the user matching the given credentials (a list of strings), from
+    the cache if possible, or by calling get_user(). get_user() should raise
+    if the credentials are invalid, failures are never cached.
+    """
+    if settings.AUTH_CACHE_DURATION <= 0:
+        return get_user()
+
+    key = PRINCIPAL_CACHE_KEY.format(get_digest(*credentials))
+    cached = cache.get(key)
+    # the version is read before querying the user, so that an invalidation
+    # happening during the query makes the new entry stale
+    version = get_version(cached["user"].pk) if cached else None
+    if cached and version is not None and cached["version"] == version:
+        return cached["user"]
+
+    user = get_user()
+    if not cached or cached["user"].pk != user.pk:
+        # the version of this user wasn't read before the query, so the entry
+        # is stored as stale, and will be used from the next query on
+        version = None
+    cache.set(
+        key, {"user": user, "version": version}, timeout=settings.AUTH_CACHE_DURATION,
+    )
+    return user
@@ -0,0 +1,76 @@
+"""
+Buffered updates of ``User.last_activity``.
+
+Instead of saving the user during authenticated requests, activity is recorded
+in a process-local buffer, which is written to the database in a single query,
+at most once every ``delay`` seconds.
+"""
+import atexit
+import logging
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, models
+
+logger = logging.getLogger(__name__)
+
+
+class Recorder(object):
+    def __init__(self, delay):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.timer = None
+        # user id -> date of last activity
+        self.buffer = {}
+
+    def record(self, user_id, date):
+        if self.delay <= 0:
+            return update({user_id: date})
+
+        with self.lock:
+            self.buffer[user_id] = date
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush_from_timer)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            buffer, self.buffer = self.buffer, {}
+            if self.timer:
+                self.timer.cancel()
+            self.timer = None
+
+        if not buffer:
+            return
+        try:
+            update(buffer)
+        except Exception:
+            logger.exception("Error while recording activity of %s users", len(buffer))
+
+    def flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            # each timer runs in its own thread, with its own database connection
+            connection.close()
+
+
+def update(dates):
+    """
+    Set the last_activity of each user in the given {user_id: date} dict,
+    in a single query
+    """
+    User = apps.get_model("users", "User")
+    value = models.Case(
+        *[models.When(pk=pk, then=models.Value(date)) for pk, date in dates.items()],
+        output_field=models.DateTimeField()
+    )
+    # the update bypasses signals, and doesn't invalidate the cached users
+    return User.objects.filter(pk__in=list(dates.keys())).update(last_activity=value)
+
+
+recorder = Recorder(delay=settings.USERS_LAST_ACTIVITY_FLUSH_DELAY)
+# ensure buffered activity is saved before the process exits
+atexit.register(recorder.flush)
@@ -29,6 +29,8 @@ from funkwhale_api.federation import keys
 from funkwhale_api.federation import models as federation_models
 from funkwhale_api.federation import utils as federation_utils
 
+from . import auth_cache, last_activity
+
 
 def get_token():
     return binascii.b2a_hex(os.urandom(15)).decode("utf-8")
@@ -250,7 +252,8 @@ class User(AbstractUser):
 
         if current is None or current < now - datetime.timedelta(seconds=delay):
             self.last_activity = now
-            self.save(update_fields=["last_activity"])
+            # saved in the background, cf last_activity.Recorder
+            last_activity.recorder.record(self.pk, now)
 
     def create_actor(self, **kwargs):
         self.actor = create_actor(self, **kwargs)
@@ -279,7 +282,7 @@ class User(AbstractUser):
         }
 
     def get_channels_groups(self):
-        groups = ["imports", "inbox"]
+        groups = ["imports", "inbox", "jobs"]
         groups = ["user.{}.{}".format(self.pk, g) for g in groups]
 
         for permission, value in self.all_permissions.items():
@@ -435,3 +438,27 @@ def create_actor(user, **kwargs):
 def init_ldap_user(sender, user, ldap_user, **kwargs):
     if not user.actor:
         user.actor = create_actor(user)
+
+
+@receiver(models.signals.post_save, sender=User)
+@receiver(models.signals.post_delete, sender=User)
+def invalidate_auth_cache(sender, instance, **kwargs):
+    # any change to the user (password, tokens, permissions, deactivation…)
+    # may change the outcome of authentication
+    auth_cache.invalidate_on_commit(instance.pk)
+
+
+@receiver(models.signals.post_save, sender=EmailAddress)
+@receiver(models.signals.post_delete, sender=EmailAddress)
+def invalidate_auth_cache_on_email_change(sender, instance, **kwargs):
+    auth_cache.invalidate_on_commit(instance.user_id)
+
+
+@receiver(models.signals.post_save, sender=federation_models.Actor)
+def invalidate_auth_cache_on_actor_change(sender, instance, **kwargs):
+    # cached users include their actor
+    if instance.domain_id != settings.FEDERATION_HOSTNAME:
+        return
+    user_ids = list(User.objects.filter(actor=instance).values_list("pk", flat=True))
+    if user_ids:
+        auth_cache.invalidate_on_commit(*user_ids)
@@ -2,11 +2,15 @@ import urllib.parse
 import oauthlib.oauth2
 
 from funkwhale_api.common import authentication
+from funkwhale_api.users import auth_cache
 
 
 def check(request):
     user = request.user
-    request.user = user.__class__.objects.all().for_auth().get(pk=user.pk)
+    request.user = auth_cache.get_user(
+        ["oauth", user.pk],
+        lambda: user.__class__.objects.all().for_auth().get(pk=user.pk),
+    )
     if authentication.should_verify_email(request.user):
         raise authentication.UnverifiedEmail(user)
     return True
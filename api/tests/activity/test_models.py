@@ -0,0 +1,34 @@
+import pytest
+
+from funkwhale_api.activity import models
+
+
+def test_timeline_entry_append_is_idempotent(factories):
+    favorite = factories["favorites.TrackFavorite"]()
+
+    first = models.TimelineEntry.append(favorite)
+    second = models.TimelineEntry.append(favorite)
+
+    assert first == second
+    assert models.TimelineEntry.objects.count() == 1
+
+
+def test_timeline_entries_privacy_level_follows_user(factories):
+    listening = factories["history.Listening"](user__privacy_level="everyone")
+    models.TimelineEntry.append(listening)
+    user = listening.user
+
+    user.privacy_level = "me"
+    user.save(update_fields=["privacy_level"])
+
+    assert user.timeline_entries.get().privacy_level == "me"
+
+
+@pytest.mark.parametrize("factory", ["favorites.TrackFavorite", "history.Listening"])
+def test_timeline_entry_deleted_with_object(factory, factories):
+    obj = factories[factory]()
+    models.TimelineEntry.append(obj)
+
+    obj.delete()
+
+    assert models.TimelineEntry.objects.count() == 0
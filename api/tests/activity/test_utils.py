@@ -1,19 +1,33 @@
-from funkwhale_api.activity import utils
+from funkwhale_api.activity import models, utils
 
 
-def test_get_activity(factories):
+def test_get_timeline(factories):
     user = factories["users.User"]()
     listening = factories["history.Listening"]()
     favorite = factories["favorites.TrackFavorite"]()
+    models.TimelineEntry.append(listening)
+    models.TimelineEntry.append(favorite)
 
-    objects = list(utils.get_activity(user))
-    assert objects == [favorite, listening]
+    assert utils.get_timeline(user) == [favorite, listening]
 
 
-def test_get_activity_honors_privacy_level(factories, anonymous_user):
-    factories["history.Listening"](user__privacy_level="me")
+def test_get_timeline_honors_privacy_level(factories, anonymous_user):
+    listening = factories["history.Listening"](user__privacy_level="me")
     favorite1 = factories["favorites.TrackFavorite"](user__privacy_level="everyone")
-    factories["favorites.TrackFavorite"](user__privacy_level="instance")
+    favorite2 = factories["favorites.TrackFavorite"](user__privacy_level="instance")
+    for obj in [listening, favorite1, favorite2]:
+        models.TimelineEntry.append(obj)
 
-    objects = list(utils.get_activity(anonymous_user))
-    assert objects == [favorite1]
+    assert utils.get_timeline(anonymous_user) == [favorite1]
+    assert utils.get_timeline(listening.user) == [favorite2, favorite1, listening]
+
+
+def test_get_timeline_skips_deleted_objects(factories):
+    user = factories["users.User"]()
+    listening = factories["history.Listening"]()
+    favorite = factories["favorites.TrackFavorite"]()
+    models.TimelineEntry.append(listening)
+    models.TimelineEntry.append(favorite)
+    favorite.delete()
+
+    assert utils.get_timeline(user) == [listening]
@@ -1,16 +1,67 @@
 from django.urls import reverse
 
-from funkwhale_api.activity import serializers, utils
+from funkwhale_api.activity import models, serializers, utils
 
 
 def test_activity_view(factories, api_client, preferences, anonymous_user):
     preferences["common__api_authentication_required"] = False
-    factories["favorites.TrackFavorite"](user__privacy_level="everyone")
-    factories["history.Listening"]()
+    favorite = factories["favorites.TrackFavorite"](user__privacy_level="everyone")
+    listening = factories["history.Listening"]()
+    models.TimelineEntry.append(favorite)
+    models.TimelineEntry.append(listening)
     url = reverse("api:v1:activity-list")
-    objects = utils.get_activity(anonymous_user)
+    objects = utils.get_timeline(anonymous_user)
     serializer = serializers.AutoSerializer(objects, many=True)
     response = api_client.get(url)
 
     assert response.status_code == 200
     assert response.data["results"] == serializer.data
+    assert response.data["next"] is None
+
+
+def test_activity_view_cursor_pagination(
+    factories, api_client, preferences, anonymous_user
+):
+    preferences["common__api_authentication_required"] = False
+    favorites = factories["favorites.TrackFavorite"].create_batch(
+        size=3, user__privacy_level="everyone"
+    )
+    for favorite in favorites:
+        models.TimelineEntry.append(favorite)
+    url = reverse("api:v1:activity-list")
+
+    response = api_client.get(url, {"page_size": 2})
+    assert response.status_code == 200
+    assert (
+        response.data["results"]
+        == serializers.AutoSerializer([favorites[2], favorites[1]], many=True).data
+    )
+
+    response = api_client.get(response.data["next"])
+    assert response.status_code == 200
+    assert (
+        response.data["results"]
+        == serializers.AutoSerializer([favorites[0]], many=True).data
+    )
+    assert response.data["next"] is None
+
+
+def test_activity_view_page_not_shortened_by_deleted_objects(
+    factories, api_client, preferences
+):
+    preferences["common__api_authentication_required"] = False
+    favorites = factories["favorites.TrackFavorite"].create_batch(
+        size=3, user__privacy_level="everyone"
+    )
+    for favorite in favorites:
+        models.TimelineEntry.append(favorite)
+    favorites[2].delete()
+    url = reverse("api:v1:activity-list")
+
+    response = api_client.get(url, {"page_size": 2})
+
+    assert response.status_code == 200
+    assert (
+        response.data["results"]
+        == serializers.AutoSerializer([favorites[1], favorites[0]], many=True).data
+    )
@@ -113,6 +113,17 @@ from funkwhale_api.cli import users
             tuple(),
             [(library, "handler_add_tags_from_tracks", {"artists": True})],
         ),
+        (
+            ("media", "prune-orphans"),
+            ("--prefix", "tracks", "--prefix", "transcoded", "--dry-run"),
+            [
+                (
+                    library,
+                    "handler_prune_orphaned_files",
+                    {"prefixes": ("tracks", "transcoded"), "dry_run": True},
+                )
+            ],
+        ),
     ],
 )
 def test_cli(cmd, args, handlers, mocker):
@@ -0,0 +1,82 @@
+from funkwhale_api.common import channels
+
+
+def event(type, **kwargs):
+    return {"type": "event.send", "text": "", "data": {"type": type, **kwargs}}
+
+
+def test_broadcaster_sends_immediately_without_delay(mocker):
+    send_batch = mocker.patch.object(channels, "send_batch")
+    broadcaster = channels.Broadcaster(delay=0, max_batch_size=10)
+
+    broadcaster.send("group", event("hello"))
+
+    send_batch.assert_called_once_with("group", [event("hello")])
+
+
+def test_broadcaster_buffers_events_per_group(mocker):
+    send_batch = mocker.patch.object(channels, "send_batch")
+    timer = mocker.patch("threading.Timer")
+    broadcaster = channels.Broadcaster(delay=1, max_batch_size=10)
+
+    broadcaster.send("group1", event("a"))
+    broadcaster.send("group2", event("b"))
+    broadcaster.send("group1", event("c"))
+
+    send_batch.assert_not_called()
+    timer.assert_called_once_with(1, broadcaster.flush)
+
+    broadcaster.flush()
+
+    send_batch.assert_any_call("group1", [event("a"), event("c")])
+    send_batch.assert_any_call("group2", [event("b")])
+    assert send_batch.call_count == 2
+    assert broadcaster.buffer == {}
+
+
+def test_broadcaster_replaces_events_with_same_key(mocker):
+    send_batch = mocker.patch.object(channels, "send_batch")
+    mocker.patch("threading.Timer")
+    broadcaster = channels.Broadcaster(delay=1, max_batch_size=10)
+
+    broadcaster.send("group", event("status", status="pending"), key="upload1")
+    broadcaster.send("group", event("other"))
+    broadcaster.send("group", event("status", status="finished"), key="upload1")
+    broadcaster.flush()
+
+    send_batch.assert_called_once_with(
+        "group", [event("status", status="finished"), event("other")]
+    )
+
+
+def test_broadcaster_sends_when_batch_is_full(mocker):
+    send_batch = mocker.patch.object(channels, "send_batch")
+    mocker.patch("threading.Timer")
+    broadcaster = channels.Broadcaster(delay=1, max_batch_size=2)
+
+    broadcaster.send("group", event("a"))
+    broadcaster.send("group", event("b"))
+
+    send_batch.assert_called_once_with("group", [event("a"), event("b")])
+    assert broadcaster.buffer == {}
+
+
+def test_send_batch(mocker):
+    async_to_sync = mocker.patch.object(channels, "async_to_sync")
+    group_send = async_to_sync.return_value
+
+    channels.send_batch("group", [event("a"), event("b")])
+
+    async_to_sync.assert_called_once_with(channels.channel_layer.group_send)
+    group_send.assert_called_once_with(
+        "group", {"type": "event.send_batch", "events": [event("a"), event("b")]}
+    )
+
+
+def test_send_batch_single_event(mocker):
+    async_to_sync = mocker.patch.object(channels, "async_to_sync")
+    group_send = async_to_sync.return_value
+
+    channels.send_batch("group", [event("a")])
+
+    group_send.assert_called_once_with("group", event("a"))
@@ -0,0 +1,42 @@
+from funkwhale_api.common import counters
+from funkwhale_api.music import models as music_models
+
+
+def test_refresh(factories):
+    album = factories["music.Album"]()
+    factories["music.Track"].create_batch(size=2, album=album)
+    music_models.Album.objects.filter(pk=album.pk).update(tracks_count=42)
+
+    counters.refresh(["music.Album.tracks_count"], [album.pk])
+
+    album.refresh_from_db()
+    assert album.tracks_count == 2
+
+
+def test_reconcile(factories):
+    album1 = factories["music.Album"]()
+    album2 = factories["music.Album"]()
+    album3 = factories["music.Album"]()
+    factories["music.Track"].create_batch(size=2, album=album1)
+    factories["music.Track"].create_batch(size=3, album=album2)
+    music_models.Album.objects.filter(pk=album1.pk).update(tracks_count=5)
+    music_models.Album.objects.filter(pk=album3.pk).update(tracks_count=1)
+
+    result = counters.reconcile("music.Album.tracks_count", chunk_size=2)
+
+    assert result == {"rows": 2, "drift": 4}
+    for album, expected in [(album1, 2), (album2, 3), (album3, 0)]:
+        album.refresh_from_db()
+        assert album.tracks_count == expected
+
+
+def test_reconcile_upload_usage(factories):
+    upload = factories["music.Upload"](import_status="finished", size=42)
+    actor = upload.library.actor
+    music_models.ActorUploadUsage.get_for_actor(actor)
+    music_models.ActorUploadUsage.objects.filter(actor=actor).update(finished=0)
+
+    result = counters.reconcile("music.ActorUploadUsage.finished")
+
+    assert result == {"rows": 1, "drift": 42}
+    assert actor.get_current_usage()["finished"] == 42
@@ -15,6 +15,7 @@ def test_spa_fallback_middleware_no_404(mocker):
     get_response = mocker.Mock()
     get_response.return_value = mocker.Mock(status_code=200)
     request = mocker.Mock(path="/")
+    mocker.patch.object(middleware, "is_spa_path", return_value=False)
     m = middleware.SPAFallbackMiddleware(get_response)
 
     assert m(request) == get_response.return_value
@@ -26,6 +27,7 @@ def test_spa_middleware_calls_should_fallback_false(mocker):
     should_falback = mocker.patch.object(
         middleware, "should_fallback_to_spa", return_value=False
     )
+    mocker.patch.object(middleware, "is_spa_path", return_value=False)
     request = mocker.Mock(path="/")
 
     m = middleware.SPAFallbackMiddleware(get_response)
@@ -39,6 +41,7 @@ def test_spa_middleware_should_fallback_true(mocker):
     get_response.return_value = mocker.Mock(status_code=404)
     request = mocker.Mock(path="/")
     mocker.patch.object(middleware, "should_fallback_to_spa", return_value=True)
+    mocker.patch.object(middleware, "is_spa_path", return_value=False)
     serve_spa = mocker.patch.object(middleware, "serve_spa")
     m = middleware.SPAFallbackMiddleware(get_response)
 
@@ -46,6 +49,42 @@ def test_spa_middleware_should_fallback_true(mocker):
     serve_spa.assert_called_once_with(request)
 
 
+def test_spa_middleware_serves_spa_paths_without_view_stack(mocker, fake_request):
+    get_response = mocker.Mock()
+    request = fake_request.get("/library/albums/42", HTTP_ACCEPT="text/html")
+    serve_spa = mocker.patch.object(middleware, "serve_spa")
+    m = middleware.SPAFallbackMiddleware(get_response)
+
+    assert m(request) == serve_spa.return_value
+    serve_spa.assert_called_once_with(request)
+    get_response.assert_not_called()
+
+
+def test_spa_middleware_runs_view_stack_for_activitypub_requests(mocker, fake_request):
+    get_response = mocker.Mock(return_value=mocker.Mock(status_code=200))
+    request = fake_request.get(
+        "/library/albums/42", HTTP_ACCEPT="application/activity+json"
+    )
+    m = middleware.SPAFallbackMiddleware(get_response)
+
+    assert m(request) == get_response.return_value
+
+
+@pytest.mark.parametrize(
+    "path,expected",
+    [
+        ("/", True),
+        ("/library/albums/42", True),
+        ("/api/v1/tracks/", False),
+        ("/.well-known/nodeinfo", False),
+        # redirected to /accounts/login/ by CommonMiddleware
+        ("/accounts/login", False),
+    ],
+)
+def test_is_spa_path(path, expected):
+    assert middleware.is_spa_path(path) is expected
+
+
 @pytest.mark.parametrize(
     "path,expected",
     [("/", True), ("/federation", False), ("/api", False), ("/an/spa/path/", True)],
@@ -134,6 +173,23 @@ def test_get_spa_html_from_http(local_cache, r_mock, mocker, settings):
     )
 
 
+def test_get_spa_shell_from_disk(tmp_path, mocker, settings):
+    settings.FUNKWHALE_SPA_REWRITE_MANIFEST = False
+    index = tmp_path / "index.html"
+    index.write_bytes(b"<html><head></head><body></body></html>")
+    get_spa_html = mocker.spy(middleware, "get_spa_html")
+
+    assert middleware.get_spa_shell(str(index)) == (
+        "<html><head>",
+        "<body></body></html>",
+    )
+    assert middleware.get_spa_shell(str(index)) == (
+        "<html><head>",
+        "<body></body></html>",
+    )
+    get_spa_html.assert_called_once_with(str(index))
+
+
 def test_get_spa_html_from_disk(tmp_path):
     index = tmp_path / "index.html"
     index.write_bytes(b"hello world")
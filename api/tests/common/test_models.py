@@ -1,7 +1,9 @@
+import datetime
 import pytest
 
 from django.urls import reverse
 
+from funkwhale_api.common import tasks
 from funkwhale_api.federation import utils as federation_utils
 
 
@@ -61,6 +63,41 @@ def test_attachment(factories, now):
     assert attachment.size > 0
 
 
+def test_attachment_thumbnails_rendering_is_scheduled_once(factories, settings, mocker):
+    settings.CREATE_IMAGE_THUMBNAILS = True
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    attachment = factories["common.Attachment"]()
+
+    attachment.save()
+
+    on_commit.assert_called_once_with(
+        tasks.warm_attachment_thumbnails.delay, attachment_id=attachment.pk
+    )
+
+
+def test_attachment_medium_square_crop_url_pending_thumbnails(
+    factories, settings, mocker
+):
+    settings.CREATE_IMAGE_THUMBNAILS = True
+    mocker.patch("funkwhale_api.common.utils.on_commit")
+    attachment = factories["common.Attachment"]()
+
+    assert attachment.thumbnails_pending is True
+    assert (
+        attachment.download_url_medium_square_crop == attachment.download_url_original
+    )
+
+
+def test_attachment_thumbnails_pending_expires(factories, settings, now):
+    settings.CREATE_IMAGE_THUMBNAILS = True
+    settings.ATTACHMENTS_THUMBNAILS_PENDING_TIMEOUT = 60
+    attachment = factories["common.Attachment"].build(
+        thumbnails_pending_date=now - datetime.timedelta(seconds=61)
+    )
+
+    assert attachment.thumbnails_pending is False
+
+
 @pytest.mark.parametrize("args, expected", [([], [0]), ([True], [0]), ([False], [1])])
 def test_attachment_queryset_attached(args, expected, factories, queryset_equal_list):
     attachments = [
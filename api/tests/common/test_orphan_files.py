@@ -0,0 +1,112 @@
+import datetime
+import os
+import pathlib
+
+from django.core.files.storage import default_storage
+
+from funkwhale_api.common import orphan_files
+
+
+def touch(root, *parts):
+    path = os.path.join(root, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pathlib.Path(path).touch()
+    return path
+
+
+def test_walk(media_root):
+    touch(media_root, "tracks", "root.ogg")
+    touch(media_root, "tracks", "b2", "c3", "2.ogg")
+    touch(media_root, "tracks", "b2", "c3", "1.ogg")
+    touch(media_root, "tracks", "a1", "b2", "1.ogg")
+
+    assert list(orphan_files.walk(default_storage, "tracks")) == [
+        ("tracks", ["tracks/root.ogg"]),
+        ("tracks/a1", []),
+        ("tracks/a1/b2", ["tracks/a1/b2/1.ogg"]),
+        ("tracks/b2", []),
+        ("tracks/b2/c3", ["tracks/b2/c3/1.ogg", "tracks/b2/c3/2.ogg"]),
+    ]
+
+
+def test_walk_cursor(media_root):
+    touch(media_root, "tracks", "a1", "b2", "1.ogg")
+    touch(media_root, "tracks", "a1", "c3", "1.ogg")
+    touch(media_root, "tracks", "b2", "c3", "1.ogg")
+
+    assert list(orphan_files.walk(default_storage, "tracks", "tracks/a1/b2")) == [
+        ("tracks/a1/c3", ["tracks/a1/c3/1.ogg"]),
+        ("tracks/b2", []),
+        ("tracks/b2/c3", ["tracks/b2/c3/1.ogg"]),
+    ]
+
+
+def test_walk_missing_prefix(media_root):
+    assert list(orphan_files.walk(default_storage, "tracks")) == []
+
+
+def test_reconcile(media_root, factories, cache):
+    prefix = orphan_files.get_prefixes(["federation_cache/tracks"])[0]
+    keep_path = touch(media_root, "federation_cache", "tracks", "1a", "b2", "keep.ogg")
+    remove_path = touch(
+        media_root, "federation_cache", "tracks", "c3", "d4", "remove.ogg"
+    )
+    with open(remove_path, "wb") as f:
+        f.write(b"hello")
+    factories["music.Upload"](audio_file="federation_cache/tracks/1a/b2/keep.ogg")
+
+    result = orphan_files.reconcile(prefix, min_age=0)
+
+    assert result == {"checked": 2, "orphans": 1, "size": 5, "complete": True}
+    assert os.path.exists(keep_path) is True
+    assert os.path.exists(remove_path) is False
+    assert cache.get(orphan_files.CURSOR_CACHE_KEY.format(prefix.path)) is None
+
+
+def test_reconcile_dry_run(media_root, cache):
+    prefix = orphan_files.get_prefixes(["transcoded"])[0]
+    path = touch(media_root, "transcoded", "1a", "b2", "remove.mp3")
+
+    result = orphan_files.reconcile(prefix, min_age=0, dry_run=True)
+
+    assert result == {"checked": 1, "orphans": 1, "size": 0, "complete": True}
+    assert os.path.exists(path) is True
+
+
+def test_reconcile_keeps_recent_files(media_root):
+    prefix = orphan_files.get_prefixes(["attachments"])[0]
+    path = touch(media_root, "attachments", "1a", "b2", "recent.png")
+
+    result = orphan_files.reconcile(prefix, min_age=3600)
+
+    assert result["orphans"] == 0
+    assert os.path.exists(path) is True
+
+
+def test_reconcile_resumes_after_deadline(media_root, cache, mocker):
+    prefix = orphan_files.get_prefixes(["tracks"])[0]
+    first = touch(media_root, "tracks", "1a", "first.ogg")
+    second = touch(media_root, "tracks", "2b", "second.ogg")
+    mocker.patch.object(orphan_files.time, "monotonic", return_value=10)
+
+    result = orphan_files.reconcile(prefix, batch_size=1, min_age=0, deadline=5)
+
+    assert result["complete"] is False
+    assert os.path.exists(first) is False
+    assert os.path.exists(second) is True
+    assert cache.get(orphan_files.CURSOR_CACHE_KEY.format(prefix.path)) == "tracks/1a"
+
+    result = orphan_files.reconcile(prefix, batch_size=1, min_age=0)
+
+    assert result == {"checked": 1, "orphans": 1, "size": 0, "complete": True}
+    assert os.path.exists(second) is False
+
+
+def test_is_recent(media_root):
+    path = touch(media_root, "tracks", "file.ogg")
+    limit = datetime.datetime.fromtimestamp(
+        os.path.getmtime(path), tz=datetime.timezone.utc
+    )
+
+    assert orphan_files.is_recent(default_storage, "tracks/file.ogg", limit) is False
+    assert orphan_files.is_recent(default_storage, "tracks/missing.ogg", limit) is True
@@ -1,6 +1,8 @@
 import pytest
+from django.urls import reverse
 
 from funkwhale_api.common import pagination
+from funkwhale_api.music import models as music_models
 
 
 @pytest.mark.parametrize(
@@ -27,3 +29,66 @@ def test_funkwhale_pagination_uses_view_page_size(
         query["page_size"] = request_page_size
     request = mocker.Mock(query_params=query)
     assert p.get_page_size(request) == expected
+
+
+def test_get_count_exact_when_estimate_is_small(factories, mocker, settings):
+    settings.PAGINATION_EXACT_COUNT_THRESHOLD = 10
+    factories["music.Artist"].create_batch(size=3)
+    mocker.patch.object(pagination, "get_estimated_count", return_value=5)
+    queryset = music_models.Artist.objects.all()
+
+    assert pagination.get_count(queryset) == (3, False)
+
+    # cached
+    factories["music.Artist"]()
+    assert pagination.get_count(queryset) == (3, False)
+
+
+@pytest.mark.parametrize("estimate, allow_exact", [(11, True), (5, False)])
+def test_get_count_estimate(estimate, allow_exact, factories, mocker, settings):
+    settings.PAGINATION_EXACT_COUNT_THRESHOLD = 10
+    factories["music.Artist"].create_batch(size=3)
+    mocker.patch.object(pagination, "get_estimated_count", return_value=estimate)
+    queryset = music_models.Artist.objects.all()
+    count = mocker.spy(queryset, "count")
+
+    assert pagination.get_count(queryset, allow_exact=allow_exact) == (estimate, True)
+    count.assert_not_called()
+
+
+def test_get_estimated_count(factories):
+    factories["music.Artist"].create_batch(size=3)
+
+    assert pagination.get_estimated_count(music_models.Artist.objects.all()) >= 0
+
+
+def test_cursor_pagination(factories, logged_in_api_client, mocker, settings):
+    settings.PAGINATION_EXACT_COUNT_THRESHOLD = 10
+    mocker.patch.object(pagination, "get_estimated_count", return_value=3)
+    artists = factories["music.Artist"].create_batch(size=3)
+    url = reverse("api:v1:artists-list")
+
+    response = logged_in_api_client.get(
+        url, {"cursor": "", "page_size": 2, "ordering": "creation_date"}
+    )
+
+    assert response.status_code == 200
+    assert response.data["count"] == 3
+    assert response.data["count_is_estimate"] is False
+    assert [a["id"] for a in response.data["results"]] == [a.pk for a in artists[:2]]
+    assert response.data["previous"] is None
+
+    response = logged_in_api_client.get(response.data["next"])
+
+    assert response.status_code == 200
+    assert response.data["count"] == 3
+    assert [a["id"] for a in response.data["results"]] == [artists[2].pk]
+    assert response.data["next"] is None
+
+
+def test_cursor_pagination_unsupported_ordering(logged_in_api_client):
+    url = reverse("api:v1:tracks-list")
+
+    response = logged_in_api_client.get(url, {"cursor": "", "ordering": "artist__name"})
+
+    assert response.status_code == 400
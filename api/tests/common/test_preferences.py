@@ -88,3 +88,52 @@ def test_get_serialized_preference_error(value, preferences, serialized_preferen
 
     with pytest.raises(common_preferences.JSONSerializer.exception):
         preferences[pref_id] = value
+
+
+def test_get_uses_snapshot(preferences, mocker, settings):
+    settings.PREFERENCES_SNAPSHOT_CHECK_INTERVAL = 60
+    preferences["instance__name"] = "Hello"
+    manager = mocker.spy(global_preferences_registry, "manager")
+
+    assert common_preferences.get("instance__name") == "Hello"
+    assert common_preferences.get("instance__name") == "Hello"
+
+    assert manager.call_count == 1
+
+
+def test_snapshot_reloaded_when_preference_changes(preferences, settings):
+    settings.PREFERENCES_SNAPSHOT_CHECK_INTERVAL = 60
+    preferences["instance__name"] = "Hello"
+    assert common_preferences.get("instance__name") == "Hello"
+
+    preferences["instance__name"] = "World"
+
+    assert common_preferences.get("instance__name") == "World"
+
+
+def test_snapshot_reloaded_when_version_changes(preferences, settings, cache):
+    settings.PREFERENCES_SNAPSHOT_CHECK_INTERVAL = 0
+    preferences["instance__name"] = "Hello"
+    assert common_preferences.get("instance__name") == "Hello"
+    snapshot = common_preferences.get_snapshot()
+
+    assert common_preferences.get_snapshot() is snapshot
+
+    # another process changed a preference
+    cache.delete(common_preferences.SNAPSHOT_VERSION_CACHE_KEY)
+
+    assert common_preferences.get_snapshot() is not snapshot
+
+
+def test_snapshot_invalidated_again_on_commit(preferences, mocker, cache):
+    on_commit = mocker.patch.object(common_preferences.transaction, "on_commit")
+    preferences["instance__name"] = "Hello"
+    common_preferences.get_snapshot()
+
+    # a concurrent process reloads the snapshot before the change is committed
+    version = common_preferences.get_version()
+    on_commit.assert_called_with(common_preferences.invalidate_snapshot)
+    on_commit.call_args[0][0]()
+
+    assert common_preferences.get_version() != version
+    assert common_preferences._snapshot is None
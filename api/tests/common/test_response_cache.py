@@ -0,0 +1,198 @@
+import pytest
+
+from django.urls import reverse
+
+from funkwhale_api.common import middleware, response_cache
+
+
+@pytest.fixture
+def response_cache_enabled(settings, no_api_auth):
+    settings.API_RESPONSE_CACHE_DURATION = 60
+
+
+def test_anonymous_list_is_cached(factories, api_client, response_cache_enabled):
+    factories["music.Artist"]()
+    url = reverse("api:v1:artists-list")
+
+    first = api_client.get(url, {"ordering": "name", "page_size": 5})
+    second = api_client.get(url, {"page_size": 5, "ordering": "name"})
+
+    assert first["X-Cache"] == "MISS"
+    assert second["X-Cache"] == "HIT"
+    assert first.data == second.data
+    assert first["ETag"] == second["ETag"]
+    assert response_cache.get_stats() == {"hits": 1, "misses": 1}
+
+
+def test_anonymous_list_cache_invalidated_on_save(
+    factories, api_client, response_cache_enabled
+):
+    artist = factories["music.Artist"]()
+    url = reverse("api:v1:artists-list")
+    api_client.get(url)
+
+    artist.name = "New name"
+    artist.save()
+    response = api_client.get(url)
+
+    assert response["X-Cache"] == "MISS"
+    assert response.data["results"][0]["name"] == "New name"
+
+
+def test_anonymous_detail_cache_invalidated_by_track(
+    factories, api_client, response_cache_enabled
+):
+    album = factories["music.Album"]()
+    other_album = factories["music.Album"]()
+    url = reverse("api:v1:albums-detail", kwargs={"pk": album.pk})
+    other_url = reverse("api:v1:albums-detail", kwargs={"pk": other_album.pk})
+    api_client.get(url)
+    api_client.get(other_url)
+
+    factories["music.Track"](album=album)
+
+    assert api_client.get(url)["X-Cache"] == "MISS"
+    assert api_client.get(other_url)["X-Cache"] == "HIT"
+
+
+def test_anonymous_response_not_modified(factories, api_client, response_cache_enabled):
+    factories["music.Artist"]()
+    url = reverse("api:v1:artists-list")
+    etag = api_client.get(url)["ETag"]
+
+    response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+    assert response["ETag"] == etag
+
+
+def test_authenticated_response_not_cached(
+    factories, logged_in_api_client, response_cache_enabled
+):
+    url = reverse("api:v1:artists-list")
+
+    response = logged_in_api_client.get(url)
+
+    assert response.status_code == 200
+    assert "X-Cache" not in response
+
+
+def test_global_invalidation(factories, api_client, response_cache_enabled):
+    factories["music.Artist"]()
+    url = reverse("api:v1:artists-list")
+    api_client.get(url)
+
+    factories["moderation.InstancePolicy"](for_domain=True)
+
+    assert api_client.get(url)["X-Cache"] == "MISS"
+
+
+def test_invalidation_repeated_on_commit(
+    factories, api_client, response_cache_enabled, mocker
+):
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    artist = factories["music.Artist"]()
+    url = reverse("api:v1:artists-list")
+    api_client.get(url)
+
+    artist.name = "New name"
+    artist.save()
+    # a concurrent request caches the response before the change is committed
+    assert api_client.get(url)["X-Cache"] == "MISS"
+    assert api_client.get(url)["X-Cache"] == "HIT"
+
+    on_commit.assert_any_call(
+        response_cache.delete_tag_versions, "music", "music.artist:{}".format(artist.pk)
+    )
+    for call in on_commit.call_args_list:
+        if call[0][0] == response_cache.delete_tag_versions:
+            call[0][0](*call[0][1:])
+
+    assert api_client.get(url)["X-Cache"] == "MISS"
+
+
+def test_spa_head_tags_cached(mocker, fake_request, settings):
+    settings.API_RESPONSE_CACHE_DURATION = 60
+    view = mocker.Mock(return_value=[{"tag": "meta", "content": "hello"}])
+    match = mocker.Mock(
+        args=[], kwargs={"pk": "42"}, func=view, url_name="library_track"
+    )
+    mocker.patch.object(middleware.urls, "resolve", return_value=match)
+    request = fake_request.get("/library/tracks/42")
+
+    assert middleware.get_request_head_tags(request) == view.return_value
+    assert middleware.get_request_head_tags(request) == view.return_value
+    view.assert_called_once()
+
+    response_cache.invalidate("music.track:42")
+
+    assert middleware.get_request_head_tags(request) == view.return_value
+    assert view.call_count == 2
+
+
+def test_spa_head_tags_cached_by_modification_date(
+    factories, mocker, fake_request, settings
+):
+    settings.API_RESPONSE_CACHE_DURATION = 60
+    playlist = factories["playlists.Playlist"]()
+    view = mocker.Mock(return_value=[{"tag": "meta", "content": "hello"}])
+    match = mocker.Mock(
+        args=[], kwargs={"pk": str(playlist.pk)}, func=view, url_name="library_playlist"
+    )
+    mocker.patch.object(middleware.urls, "resolve", return_value=match)
+    request = fake_request.get("/library/playlists/{}".format(playlist.pk))
+
+    middleware.get_request_head_tags(request)
+    middleware.get_request_head_tags(request)
+    view.assert_called_once()
+
+    playlist.save()
+
+    middleware.get_request_head_tags(request)
+    assert view.call_count == 2
+
+
+def test_upload_import_status_update_keeps_listings_cached(
+    factories, api_client, response_cache_enabled
+):
+    upload = factories["music.Upload"](import_status="pending")
+    url = reverse("api:v1:artists-list")
+    api_client.get(url)
+
+    upload.import_status = "errored"
+    upload.save(update_fields=["import_status"])
+
+    assert api_client.get(url)["X-Cache"] == "HIT"
+
+
+def test_finished_upload_invalidates_listings(
+    factories, api_client, response_cache_enabled
+):
+    upload = factories["music.Upload"](
+        import_status="pending", library__privacy_level="everyone"
+    )
+    url = reverse("api:v1:tracks-list")
+    api_client.get(url)
+
+    upload.import_status = "finished"
+    upload.save(update_fields=["import_status"])
+
+    assert api_client.get(url)["X-Cache"] == "MISS"
+
+
+def test_finished_upload_update_only_invalidates_its_track(
+    factories, api_client, response_cache_enabled
+):
+    upload = factories["music.Upload"](
+        import_status="finished", library__privacy_level="everyone"
+    )
+    list_url = reverse("api:v1:tracks-list")
+    detail_url = reverse("api:v1:tracks-detail", kwargs={"pk": upload.track.pk})
+    api_client.get(list_url)
+    api_client.get(detail_url)
+
+    upload.bitrate = 320000
+    upload.save(update_fields=["bitrate"])
+
+    assert api_client.get(list_url)["X-Cache"] == "HIT"
+    assert api_client.get(detail_url)["X-Cache"] == "MISS"
@@ -93,3 +93,263 @@ def test_prune_unattached_attachments(factories, settings, now):
     attachments[3].refresh_from_db()
     with pytest.raises(attachments[2].DoesNotExist):
         attachments[2].refresh_from_db()
+
+
+def test_warm_attachment_thumbnails(factories, mocker, now):
+    attachment = factories["common.Attachment"](thumbnails_pending_date=now)
+    warm_thumbnails = mocker.patch.object(
+        models, "warm_thumbnails", return_value=(2, [])
+    )
+
+    assert tasks.warm_attachment_thumbnails(attachment_id=attachment.pk) == 2
+
+    warm_thumbnails.assert_called_once_with(attachment)
+    attachment.refresh_from_db()
+    assert attachment.thumbnails_pending_date is None
+
+
+def test_warm_attachments_thumbnails_batch(factories, mocker, queryset_equal_list):
+    attachments = factories["common.Attachment"].create_batch(size=2)
+    factories["common.Attachment"]()
+    warm_thumbnails = mocker.patch.object(
+        models, "warm_thumbnails", return_value=(4, [])
+    )
+
+    tasks.warm_attachments_thumbnails_batch(attachment_ids=[a.pk for a in attachments])
+
+    warm_thumbnails.assert_called_once_with(attachments)
+
+
+def test_fetch_remote_attachment_once_caches_failures(factories, cache, mocker):
+    attachment = factories["common.Attachment"](file=None)
+    fetch_remote_attachment = mocker.patch.object(
+        tasks, "fetch_remote_attachment", side_effect=Exception("Boom")
+    )
+
+    assert tasks.fetch_remote_attachment_once(attachment) == tasks.FETCH_FAILED
+    assert tasks.fetch_remote_attachment_once(attachment) == tasks.FETCH_FAILED
+
+    fetch_remote_attachment.assert_called_once_with(attachment)
+    lock_key = tasks.REMOTE_ATTACHMENT_FETCH_LOCK_CACHE_KEY.format(attachment.pk)
+    assert cache.get(lock_key) is None
+
+
+def test_fetch_remote_attachment_once_skips_download_in_progress(
+    factories, cache, mocker
+):
+    attachment = factories["common.Attachment"](file=None)
+    cache.set(tasks.REMOTE_ATTACHMENT_FETCH_LOCK_CACHE_KEY.format(attachment.pk), True)
+    fetch_remote_attachment = mocker.patch.object(tasks, "fetch_remote_attachment")
+
+    assert tasks.fetch_remote_attachment_once(attachment) == tasks.FETCH_BUSY
+
+    fetch_remote_attachment.assert_not_called()
+
+
+def test_fetch_remote_attachment_once_limits_concurrency_per_domain(
+    factories, cache, mocker, settings
+):
+    settings.EXTERNAL_MEDIA_PROXY_MAX_CONCURRENCY_PER_DOMAIN = 1
+    attachment = factories["common.Attachment"](
+        file=None, url="https://domain.test/cover.jpg"
+    )
+    fetch_remote_attachment = mocker.patch.object(tasks, "fetch_remote_attachment")
+    key = tasks.REMOTE_ATTACHMENT_FETCH_DOMAIN_CACHE_KEY.format("domain.test")
+
+    with tasks.remote_attachment_fetch_slot("domain.test") as available:
+        assert available is True
+        assert tasks.fetch_remote_attachment_once(attachment) == tasks.FETCH_BUSY
+
+    fetch_remote_attachment.assert_not_called()
+    assert cache.get(key) == 0
+    assert tasks.fetch_remote_attachment_once(attachment) == tasks.FETCH_OK
+    fetch_remote_attachment.assert_called_once_with(attachment)
+
+
+def test_fetch_remote_attachment_once_waiter_gets_committed_file(
+    factories, cache, mocker
+):
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    attachment = factories["common.Attachment"](file=None)
+    waiting_attachment = models.Attachment.objects.get(pk=attachment.pk)
+    lock_key = tasks.REMOTE_ATTACHMENT_FETCH_LOCK_CACHE_KEY.format(attachment.pk)
+
+    def fetch(attachment):
+        models.Attachment.objects.filter(pk=attachment.pk).update(
+            file="attachments/cover.jpg"
+        )
+
+    fetch_remote_attachment = mocker.patch.object(
+        tasks, "fetch_remote_attachment", side_effect=fetch
+    )
+
+    assert tasks.fetch_remote_attachment_once(attachment) == tasks.FETCH_OK
+    # the download isn't committed yet, so the lock is kept
+    assert cache.get(lock_key) is True
+    on_commit.assert_called_once_with(cache.delete, lock_key)
+
+    def commit(delay):
+        # the downloading request is committed while the other one is waiting
+        on_commit.call_args[0][0](*on_commit.call_args[0][1:])
+
+    sleep = mocker.patch.object(tasks.time, "sleep", side_effect=commit)
+
+    assert (
+        tasks.fetch_remote_attachment_once(waiting_attachment, wait_timeout=5)
+        == tasks.FETCH_OK
+    )
+    sleep.assert_called_once_with(0.1)
+    fetch_remote_attachment.assert_called_once_with(attachment)
+    assert waiting_attachment.file.name == "attachments/cover.jpg"
+
+
+def test_remote_attachment_fetch_slot_refreshes_counter_expiry(cache, mocker):
+    key = tasks.REMOTE_ATTACHMENT_FETCH_DOMAIN_CACHE_KEY.format("domain.test")
+    cache.set(key, 1, timeout=1)
+    touch = mocker.spy(cache, "touch")
+
+    with tasks.remote_attachment_fetch_slot("domain.test"):
+        assert cache.get(key) == 2
+
+    touch.assert_called_once_with(key, tasks.REMOTE_ATTACHMENT_FETCH_LOCK_TIMEOUT)
+
+
+def test_fetch_remote_attachments(factories, mocker):
+    attachment = factories["common.Attachment"](file=None)
+    factories["common.Attachment"](file=None)
+    fetch_remote_attachment_once = mocker.patch.object(
+        tasks, "fetch_remote_attachment_once", return_value=tasks.FETCH_OK
+    )
+
+    assert tasks.fetch_remote_attachments(attachment_ids=[attachment.pk]) == {
+        tasks.FETCH_OK: 1
+    }
+
+    fetch_remote_attachment_once.assert_called_once_with(attachment)
+
+
+def test_prefetch_remote_attachments(factories, cache, mocker):
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    local = factories["common.Attachment"]()
+    remote = factories["common.Attachment"](file=None)
+    broken = factories["common.Attachment"](file=None)
+    cache.set(tasks.REMOTE_ATTACHMENT_FETCH_FAILURE_CACHE_KEY.format(broken.pk), True)
+
+    tasks.prefetch_remote_attachments([local, None, remote, broken])
+
+    on_commit.assert_called_once_with(
+        tasks.fetch_remote_attachments.delay, attachment_ids=[remote.pk]
+    )
+
+
+def test_reconcile_counters(mocker):
+    reconcile_all = mocker.patch.object(
+        tasks.counters,
+        "reconcile_all",
+        return_value={"music.Album.tracks_count": {"rows": 1, "drift": 2}},
+    )
+
+    assert tasks.reconcile_counters() == reconcile_all.return_value
+    reconcile_all.assert_called_once_with()
+
+
+def test_reconcile_storage(mocker):
+    reconcile = mocker.patch.object(
+        tasks.orphan_files,
+        "reconcile",
+        return_value={"checked": 3, "orphans": 1, "size": 42, "complete": True},
+    )
+
+    report = tasks.reconcile_storage(prefixes=["tracks", "transcoded"], dry_run=True)
+
+    assert report == {
+        "tracks": reconcile.return_value,
+        "transcoded": reconcile.return_value,
+    }
+    assert [c[0][0].path for c in reconcile.call_args_list] == ["tracks", "transcoded"]
+    reconcile.assert_called_with(mocker.ANY, deadline=mocker.ANY, dry_run=True)
+
+
+def test_run_action_job(factories, mocker):
+    tracks = factories["music.Track"].create_batch(size=5)
+    kept = factories["music.Track"]()
+    job = factories["common.ActionJob"](
+        object_ids=[t.pk for t in tracks], total=len(tracks)
+    )
+    broadcast = mocker.patch.object(tasks, "broadcast_action_job")
+
+    tasks.run_action_job(job_id=job.pk, chunk_size=2)
+
+    job.refresh_from_db()
+    assert job.status == "finished"
+    assert job.processed == 5
+    assert job.result[0] >= 5
+    assert job.result[1]["music.Track"] == 5
+    assert job.start_date is not None
+    assert job.finished_date is not None
+    assert list(tracks[0].__class__.objects.all()) == [kept]
+    # start, 3 chunks, end
+    assert broadcast.call_count == 5
+
+
+def test_run_action_job_resumes(factories, mocker):
+    tracks = factories["music.Track"].create_batch(size=3)
+    job = factories["common.ActionJob"](
+        object_ids=[t.pk for t in tracks], total=3, processed=1, status="running"
+    )
+    mocker.patch.object(tasks, "broadcast_action_job")
+
+    tasks.run_action_job(job_id=job.pk)
+
+    job.refresh_from_db()
+    assert job.status == "finished"
+    assert job.processed == 3
+    assert list(tracks[0].__class__.objects.all()) == [tracks[0]]
+
+
+def test_run_action_job_cancelled(factories, mocker):
+    track = factories["music.Track"]()
+    job = factories["common.ActionJob"](
+        object_ids=[track.pk], total=1, status="cancelled"
+    )
+
+    tasks.run_action_job(job_id=job.pk)
+
+    job.refresh_from_db()
+    assert job.processed == 0
+    track.refresh_from_db()
+
+
+def test_run_action_job_errored(factories, mocker):
+    track = factories["music.Track"]()
+    job = factories["common.ActionJob"](object_ids=[track.pk], total=1)
+    mocker.patch.object(tasks, "broadcast_action_job")
+    mocker.patch(
+        "funkwhale_api.manage.serializers.ManageTrackActionSerializer.handle_delete",
+        side_effect=Exception("Boom"),
+    )
+
+    tasks.run_action_job(job_id=job.pk)
+
+    job.refresh_from_db()
+    assert job.status == "errored"
+    assert job.error == "Boom"
+    assert job.processed == 0
+
+
+@pytest.mark.parametrize(
+    "previous, result, expected",
+    [
+        (None, 3, 3),
+        (3, 2, 5),
+        (None, (2, {"music.Track": 2}), [2, {"music.Track": 2}]),
+        (
+            [2, {"music.Track": 2}],
+            (3, {"music.Track": 1, "music.Upload": 2}),
+            [5, {"music.Track": 3, "music.Upload": 2}],
+        ),
+        (None, None, None),
+    ],
+)
+def test_merge_action_results(previous, result, expected):
+    assert tasks.merge_action_results(previous, result) == expected
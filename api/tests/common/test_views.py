@@ -238,6 +238,36 @@ def test_attachment_proxy_dont_crash_on_long_filename(
     assert attachment.last_fetch_date == now
 
 
+def test_attachment_proxy_uses_cached_failure(
+    factories, logged_in_api_client, r_mock, cache
+):
+    attachment = factories["common.Attachment"](file=None)
+    m = r_mock.get(attachment.url, status_code=404)
+    proxy_url = reverse("api:v1:attachments-proxy", kwargs={"uuid": attachment.uuid})
+
+    response = logged_in_api_client.get(proxy_url)
+    assert response.status_code == 404
+    response = logged_in_api_client.get(proxy_url)
+    assert response.status_code == 404
+
+    assert len(m.request_history) == 1
+
+
+def test_attachment_proxy_download_in_progress(
+    factories, logged_in_api_client, cache, mocker, settings
+):
+    settings.EXTERNAL_MEDIA_PROXY_WAIT_TIMEOUT = 0
+    attachment = factories["common.Attachment"](file=None)
+    cache.set(tasks.REMOTE_ATTACHMENT_FETCH_LOCK_CACHE_KEY.format(attachment.pk), True)
+    fetch_remote_attachment = mocker.patch.object(tasks, "fetch_remote_attachment")
+    proxy_url = reverse("api:v1:attachments-proxy", kwargs={"uuid": attachment.uuid})
+
+    response = logged_in_api_client.get(proxy_url)
+
+    assert response.status_code == 503
+    fetch_remote_attachment.assert_not_called()
+
+
 def test_attachment_create(logged_in_api_client, avatar):
     actor = logged_in_api_client.user.create_actor()
     url = reverse("api:v1:attachments-list")
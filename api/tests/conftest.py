@@ -25,6 +25,7 @@ from dynamic_preferences.registries import global_preferences_registry
 from rest_framework.test import APIClient, APIRequestFactory
 
 from funkwhale_api.activity import record
+from funkwhale_api.common import preferences as common_preferences
 from funkwhale_api.federation import actors
 from funkwhale_api.moderation import mrf
 from funkwhale_api.music import licenses
@@ -87,6 +88,7 @@ def cache():
     """
     yield django_cache
     django_cache.clear()
+    common_preferences.clear_snapshot()
     if "service_actor" in actors._CACHE:
         del actors._CACHE["service_actor"]
 
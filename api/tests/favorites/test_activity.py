@@ -57,3 +57,9 @@ def test_broadcast_track_favorite_to_instance_activity_private(factories, mocker
     consumer = activities.broadcast_track_favorite_to_instance_activity
     consumer(data=data, obj=favorite)
     p.assert_not_called()
+
+
+def test_track_favorite_timeline_consumer(activity_registry):
+    conf = activity_registry["favorites.TrackFavorite"]
+    consumer = activities.add_track_favorite_to_timeline
+    assert consumer in conf["consumers"]
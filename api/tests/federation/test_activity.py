@@ -1,6 +1,7 @@
 import pytest
 import uuid
 
+from django.db import connection
 from django.db.models import Q
 from django.urls import reverse
 
@@ -277,6 +278,156 @@ def test_get_actors_from_audience_urls(settings, db):
     assert str(activity.get_actors_from_audience(urls).query) == str(expected.query)
 
 
+def test_get_local_actors_by_audience(factories):
+    local_actor = factories["users.User"]().create_actor()
+    follower = factories["users.User"]().create_actor()
+    library_follower = factories["users.User"]().create_actor()
+    remote_actor = factories["federation.Actor"]()
+    follow = factories["federation.Follow"](actor=follower, approved=True)
+    library_follow = factories["federation.LibraryFollow"](
+        actor=library_follower, approved=True
+    )
+    factories["federation.Follow"](target=follow.target, approved=False)
+    urls = [
+        local_actor.fid,
+        remote_actor.fid,
+        follow.target.followers_url,
+        library_follow.target.followers_url,
+        activity.PUBLIC_ADDRESS,
+    ]
+
+    assert activity.get_local_actors_by_audience(urls) == {
+        local_actor.fid: {local_actor.pk},
+        follow.target.followers_url: {follower.pk},
+        library_follow.target.followers_url: {library_follower.pk},
+    }
+
+
+def test_enqueue_incoming(factories, cache, mocker, settings):
+    settings.FEDERATION_INBOX_BATCH_DELAY = 3
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    remote_actor = factories["federation.Actor"]()
+    inbox_actor = factories["users.User"]().create_actor()
+    payload = {"type": "Noop", "actor": remote_actor.fid}
+
+    incoming = activity.enqueue_incoming(
+        activity=payload, on_behalf_of=remote_actor, inbox_actor=inbox_actor
+    )
+    activity.enqueue_incoming(activity=payload, on_behalf_of=remote_actor)
+
+    assert incoming.payload == payload
+    assert incoming.on_behalf_of == remote_actor
+    assert incoming.inbox_actor == inbox_actor
+    assert models.IncomingActivity.objects.count() == 2
+    # only one batch is scheduled
+    on_commit.assert_called_once_with(
+        tasks.process_incoming_activities.apply_async, countdown=3
+    )
+
+
+def test_receive_batch(factories, mocker):
+    mocker.patch.object(
+        activity.InboxRouter, "get_matching_handlers", return_value=True
+    )
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    remote_actor = factories["federation.Actor"]()
+    inbox_actor = factories["users.User"]().create_actor()
+    local_to_actor = factories["users.User"]().create_actor()
+    follower = factories["users.User"]().create_actor()
+    factories["federation.Follow"](actor=follower, target=remote_actor, approved=True)
+    existing = factories["federation.Activity"](fid="https://test.activity/existing")
+    payloads = [
+        {
+            "type": "Noop",
+            "id": "https://test.activity/1",
+            "actor": remote_actor.fid,
+            "to": [local_to_actor.fid],
+            "cc": [remote_actor.followers_url, activity.PUBLIC_ADDRESS],
+        },
+        # duplicate
+        {
+            "type": "Noop",
+            "id": "https://test.activity/1",
+            "actor": remote_actor.fid,
+            "to": [local_to_actor.fid],
+        },
+        # already received
+        {
+            "type": "Noop",
+            "id": existing.fid,
+            "actor": remote_actor.fid,
+            "to": [local_to_actor.fid],
+        },
+        # invalid
+        {"id": "https://test.activity/2", "actor": remote_actor.fid},
+        # posted to a specific inbox
+        {
+            "type": "Noop",
+            "id": "https://test.activity/3",
+            "actor": remote_actor.fid,
+            "cc": [activity.PUBLIC_ADDRESS],
+        },
+    ]
+    incoming_activities = [
+        factories["federation.IncomingActivity"](
+            payload=payload, on_behalf_of=remote_actor
+        )
+        for payload in payloads
+    ]
+    incoming_activities[-1].inbox_actor = inbox_actor
+
+    received = activity.receive_batch(incoming_activities)
+
+    assert [a.fid for a in received] == [
+        "https://test.activity/1",
+        "https://test.activity/3",
+    ]
+    first, second = received
+    assert sorted(
+        first.inbox_items.values_list("actor", "type"), key=lambda v: v[0]
+    ) == [(local_to_actor.pk, "to"), (follower.pk, "cc")]
+    assert list(second.inbox_items.values_list("actor", "type")) == [
+        (inbox_actor.pk, "to")
+    ]
+    assert on_commit.call_count == 2
+    on_commit.assert_any_call(tasks.dispatch_inbox.delay, activity_id=first.pk)
+    on_commit.assert_any_call(tasks.dispatch_inbox.delay, activity_id=second.pk)
+
+
+def test_receive_batch_database_error_does_not_abort_batch(factories, mocker):
+    mocker.patch.object(
+        activity.InboxRouter, "get_matching_handlers", return_value=True
+    )
+    mocker.patch("funkwhale_api.common.utils.on_commit")
+    remote_actor = factories["federation.Actor"]()
+    prepare_incoming = activity.prepare_incoming
+
+    def failing_prepare_incoming(payload, *args, **kwargs):
+        if payload["id"] == "https://test.activity/1":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT * FROM nonexistent_table")
+        return prepare_incoming(payload, *args, **kwargs)
+
+    mocker.patch.object(
+        activity, "prepare_incoming", side_effect=failing_prepare_incoming
+    )
+    incoming_activities = [
+        factories["federation.IncomingActivity"](
+            payload={
+                "type": "Noop",
+                "id": "https://test.activity/{}".format(i),
+                "actor": remote_actor.fid,
+            },
+            on_behalf_of=remote_actor,
+        )
+        for i in [1, 2]
+    ]
+
+    received = activity.receive_batch(incoming_activities)
+
+    assert [a.fid for a in received] == ["https://test.activity/2"]
+
+
 def test_receive_invalid_data(factories):
     remote_actor = factories["federation.Actor"]()
     a = {"@context": [], "actor": remote_actor.fid, "id": "https://test.activity"}
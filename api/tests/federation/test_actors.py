@@ -15,8 +15,8 @@ def test_actor_fetching(r_mock):
 
 
 def test_get_actor(factories, r_mock, mocker):
-    update_domain_nodeinfo = mocker.patch(
-        "funkwhale_api.federation.tasks.update_domain_nodeinfo"
+    schedule_refresh = mocker.patch(
+        "funkwhale_api.federation.nodeinfo.schedule_refresh"
     )
     actor = factories["federation.Actor"].build()
     payload = serializers.ActorSerializer(actor).data
@@ -25,7 +25,7 @@ def test_get_actor(factories, r_mock, mocker):
 
     assert new_actor.pk is not None
     assert serializers.ActorSerializer(new_actor).data == payload
-    update_domain_nodeinfo.assert_called_once_with(domain_name=new_actor.domain_id)
+    schedule_refresh.assert_called_once_with(new_actor.domain_id)
 
 
 def test_get_actor_use_existing(factories, preferences, mocker):
@@ -24,8 +24,8 @@ def test_authenticate(factories, mocker, api_request):
             },
         },
     )
-    update_domain_nodeinfo = mocker.patch(
-        "funkwhale_api.federation.tasks.update_domain_nodeinfo"
+    schedule_refresh = mocker.patch(
+        "funkwhale_api.federation.nodeinfo.schedule_refresh"
     )
 
     signed_request = factories["federation.SignedRequest"](
@@ -46,7 +46,7 @@ def test_authenticate(factories, mocker, api_request):
     assert user.is_anonymous is True
     assert actor.public_key == public.decode("utf-8")
     assert actor.fid == actor_url
-    update_domain_nodeinfo.assert_called_once_with(domain_name="test.federation")
+    schedule_refresh.assert_called_once_with("test.federation")
 
 
 def test_authenticate_skips_blocked_domain(factories, api_request):
@@ -0,0 +1,196 @@
+import datetime
+
+import pytest
+
+from funkwhale_api.federation import nodeinfo
+from funkwhale_api.federation import tasks
+
+
+def mock_wellknown(r_mock, domain_name, nodeinfo_url):
+    return r_mock.get(
+        "https://{}/.well-known/nodeinfo".format(domain_name),
+        json={"links": [{"rel": nodeinfo.NODEINFO_REL, "href": nodeinfo_url}]},
+    )
+
+
+def test_fetch(r_mock, cache):
+    nodeinfo_url = "https://test.test/nodeinfo"
+    mock_wellknown(r_mock, "test.test", nodeinfo_url)
+    r_mock.get(nodeinfo_url, json={"hello": "world"}, headers={"ETag": '"v1"'})
+
+    assert nodeinfo.fetch("test.test") == {"hello": "world"}
+    assert cache.get(nodeinfo.VALIDATORS_CACHE_KEY.format("test.test")) == {
+        "url": nodeinfo_url,
+        "etag": '"v1"',
+        "last_modified": None,
+    }
+
+
+def test_fetch_conditional_not_modified(r_mock, cache):
+    nodeinfo_url = "https://test.test/nodeinfo"
+    cache.set(
+        nodeinfo.VALIDATORS_CACHE_KEY.format("test.test"),
+        {"url": nodeinfo_url, "etag": '"v1"', "last_modified": "yesterday"},
+    )
+    wellknown = mock_wellknown(r_mock, "test.test", nodeinfo_url)
+    document = r_mock.get(nodeinfo_url, status_code=304)
+
+    assert nodeinfo.fetch("test.test", conditional=True) == nodeinfo.NOT_MODIFIED
+    assert wellknown.called is False
+    assert document.last_request.headers["If-None-Match"] == '"v1"'
+    assert document.last_request.headers["If-Modified-Since"] == "yesterday"
+
+
+def test_fetch_conditional_document_moved(r_mock, cache):
+    cache.set(
+        nodeinfo.VALIDATORS_CACHE_KEY.format("test.test"),
+        {"url": "https://test.test/old", "etag": '"v1"', "last_modified": None},
+    )
+    r_mock.get("https://test.test/old", status_code=404)
+    mock_wellknown(r_mock, "test.test", "https://test.test/new")
+    r_mock.get("https://test.test/new", json={"hello": "world"})
+
+    assert nodeinfo.fetch("test.test", conditional=True) == {"hello": "world"}
+    assert (
+        cache.get(nodeinfo.VALIDATORS_CACHE_KEY.format("test.test"))["url"]
+        == "https://test.test/new"
+    )
+
+
+@pytest.mark.parametrize(
+    "nodeinfo_data, expected",
+    [
+        ({}, 10),
+        ({"status": "ok"}, 10),
+        ({"status": "error"}, 10),
+        ({"status": "error", "failures": 2}, 20),
+        ({"status": "error", "failures": 3}, 40),
+        ({"status": "error", "failures": 10}, 100),
+    ],
+)
+def test_get_refresh_delay(nodeinfo_data, expected, factories, settings):
+    settings.NODEINFO_REFRESH_DELAY = 10
+    settings.NODEINFO_REFRESH_MAX_BACKOFF = 100
+    domain = factories["federation.Domain"].build(nodeinfo=nodeinfo_data)
+
+    assert nodeinfo.get_refresh_delay(domain) == expected
+
+
+def test_get_stale_domains_skips_backed_off_domains(factories, settings, now):
+    settings.NODEINFO_REFRESH_DELAY = 10
+    settings.NODEINFO_REFRESH_MAX_BACKOFF = 100
+    fetch_date = now - datetime.timedelta(seconds=30)
+    stale = [
+        factories["federation.Domain"](nodeinfo_fetch_date=None),
+        factories["federation.Domain"](
+            nodeinfo_fetch_date=fetch_date, nodeinfo={"status": "ok"}
+        ),
+        factories["federation.Domain"](
+            nodeinfo_fetch_date=fetch_date, nodeinfo={"status": "error", "failures": 2},
+        ),
+    ]
+    factories["federation.Domain"](
+        nodeinfo_fetch_date=fetch_date, nodeinfo={"status": "error", "failures": 3}
+    )
+
+    assert {d.pk for d in nodeinfo.get_stale_domains()} == {d.pk for d in stale}
+
+
+def test_save_not_modified_keeps_payload(factories, mocker, now):
+    domain = factories["federation.Domain"](
+        nodeinfo={"status": "ok", "payload": {"hello": "world"}},
+        nodeinfo_fetch_date=None,
+    )
+    retrieve_ap_object = mocker.patch(
+        "funkwhale_api.federation.utils.retrieve_ap_object"
+    )
+
+    nodeinfo.save(domain, nodeinfo.NOT_MODIFIED)
+    domain.refresh_from_db()
+
+    assert domain.nodeinfo == {"status": "ok", "payload": {"hello": "world"}}
+    assert domain.nodeinfo_fetch_date == now
+    retrieve_ap_object.assert_not_called()
+
+
+def test_save_error_increments_failures(factories, now):
+    domain = factories["federation.Domain"](
+        nodeinfo={"status": "error", "error": "nope", "failures": 2}
+    )
+
+    nodeinfo.save(domain, {"status": "error", "error": "still nope"})
+    domain.refresh_from_db()
+
+    assert domain.nodeinfo == {"status": "error", "error": "still nope", "failures": 3}
+
+
+def test_save_keeps_known_service_actor(factories, mocker):
+    actor = factories["federation.Actor"](fid="https://actor.id")
+    domain = factories["federation.Domain"](service_actor=actor)
+    retrieve_ap_object = mocker.patch(
+        "funkwhale_api.federation.utils.retrieve_ap_object"
+    )
+
+    nodeinfo.save(
+        domain,
+        {"status": "ok", "payload": {"metadata": {"actorId": "https://actor.id"}}},
+    )
+
+    assert domain.service_actor == actor
+    retrieve_ap_object.assert_not_called()
+
+
+def test_crawl(factories, r_mock, now):
+    ok = factories["federation.Domain"](nodeinfo_fetch_date=None)
+    error = factories["federation.Domain"](nodeinfo_fetch_date=None)
+    nodeinfo_url = "https://{}/nodeinfo".format(ok.name)
+    mock_wellknown(r_mock, ok.name, nodeinfo_url)
+    r_mock.get(nodeinfo_url, json={"hello": "world"})
+    r_mock.get("https://{}/.well-known/nodeinfo".format(error.name), status_code=500)
+
+    result = nodeinfo.crawl([ok, error], workers=2)
+
+    assert result == {"ok": 1, "not_modified": 0, "error": 1, "skipped": 0}
+    ok.refresh_from_db()
+    error.refresh_from_db()
+    assert ok.nodeinfo == {"status": "ok", "payload": {"hello": "world"}}
+    assert error.nodeinfo["status"] == "error"
+    assert error.nodeinfo["failures"] == 1
+    assert error.nodeinfo_fetch_date == now
+
+
+def test_crawl_saves_result_completed_after_deadline(factories, r_mock, mocker):
+    domain = factories["federation.Domain"](nodeinfo_fetch_date=None)
+    nodeinfo_url = "https://{}/nodeinfo".format(domain.name)
+    mock_wellknown(r_mock, domain.name, nodeinfo_url)
+    r_mock.get(nodeinfo_url, json={"hello": "world"})
+    mocker.patch.object(nodeinfo.time, "monotonic", return_value=10)
+
+    result = nodeinfo.crawl([domain], workers=1, deadline=5)
+
+    assert result == {"ok": 1, "not_modified": 0, "error": 0, "skipped": 0}
+    domain.refresh_from_db()
+    assert domain.nodeinfo == {"status": "ok", "payload": {"hello": "world"}}
+
+
+def test_crawl_skips_busy_hosts(factories, r_mock, settings):
+    settings.NODEINFO_REFRESH_CONCURRENCY_PER_HOST = 0
+    domain = factories["federation.Domain"](nodeinfo_fetch_date=None)
+
+    result = nodeinfo.crawl([domain], workers=1)
+
+    assert result["skipped"] == 1
+    assert r_mock.called is False
+    domain.refresh_from_db()
+    assert domain.nodeinfo_fetch_date is None
+
+
+def test_schedule_refresh(mocker, cache):
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+
+    assert nodeinfo.schedule_refresh("test.test") is True
+    assert nodeinfo.schedule_refresh("test.test") is False
+
+    on_commit.assert_called_once_with(
+        tasks.update_domain_nodeinfo.delay, domain_name="test.test"
+    )
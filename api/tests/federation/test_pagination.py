@@ -0,0 +1,88 @@
+import datetime
+
+import pytest
+from django.core import paginator
+from django.utils import timezone
+
+from funkwhale_api.federation import pagination
+from funkwhale_api.music import models as music_models
+
+
+def test_encode_decode_cursor(factories):
+    creation_date = datetime.datetime(2020, 4, 1, 12, 30, 15, 123456, timezone.utc)
+    upload = factories["music.Upload"](creation_date=creation_date)
+    cursor = pagination.encode_cursor(upload)
+
+    assert pagination.decode_cursor(cursor) == (creation_date, upload.pk)
+
+
+def test_get_page_with_offset(factories):
+    library = factories["music.Library"]()
+    uploads = factories["music.Upload"].create_batch(size=5, library=library)
+    uploads = sorted(uploads, key=lambda u: (u.creation_date, u.pk), reverse=True)
+    queryset = music_models.Upload.objects.filter(library=library)
+
+    page = pagination.get_page(queryset, 2, 2, count=5)
+
+    assert page.object_list == uploads[2:4]
+    assert page.paginator.num_pages == 3
+    assert page.paginator.count == 5
+    assert page.has_previous() is True
+    assert page.has_next() is True
+    assert page.next_cursor == pagination.encode_cursor(uploads[3])
+
+
+def test_get_page_with_cursor(factories):
+    library = factories["music.Library"]()
+    now = timezone.now()
+    # same creation date, to ensure ids are used as a tie-breaker
+    uploads = factories["music.Upload"].create_batch(
+        size=5, library=library, creation_date=now
+    )
+    uploads = sorted(uploads, key=lambda u: u.pk, reverse=True)
+    queryset = music_models.Upload.objects.filter(library=library)
+    cursor = pagination.encode_cursor(uploads[2])
+
+    page = pagination.get_page(queryset, 2, 2, count=5, after=cursor)
+
+    assert page.object_list == uploads[3:5]
+    assert page.has_next() is False
+    assert page.next_cursor is None
+
+
+@pytest.mark.parametrize("number, after", [(4, None), (0, None), (2, "noop")])
+def test_get_page_invalid(number, after, factories):
+    library = factories["music.Library"]()
+    factories["music.Upload"].create_batch(size=5, library=library)
+    queryset = music_models.Upload.objects.filter(library=library)
+
+    with pytest.raises(paginator.InvalidPage):
+        pagination.get_page(queryset, number, 2, count=5, after=after)
+
+
+def test_get_cached_data(mocker):
+    get_data = mocker.Mock(return_value={"hello": "world"})
+
+    assert pagination.get_cached_data(1, "https://test", "root", get_data) == {
+        "hello": "world"
+    }
+    assert pagination.get_cached_data(1, "https://test", "root", get_data) == {
+        "hello": "world"
+    }
+    get_data.assert_called_once_with()
+
+    pagination.invalidate(1)
+    pagination.get_cached_data(1, "https://test", "root", get_data)
+
+    assert get_data.call_count == 2
+
+
+def test_upload_save_invalidates_library_collection(factories, mocker):
+    upload = factories["music.Upload"]()
+    invalidate = mocker.patch.object(pagination, "invalidate")
+
+    upload.save(update_fields=["accessed_date"])
+    invalidate.assert_not_called()
+
+    upload.save()
+    invalidate.assert_called_once_with(upload.library_id)
@@ -0,0 +1,72 @@
+from funkwhale_api.federation import models
+from funkwhale_api.federation import purge
+from funkwhale_api.music import models as music_models
+
+
+def test_run_deletes_in_batches(factories, mocker):
+    library = factories["music.Library"]()
+    uploads = factories["music.Upload"].create_batch(size=5, library=library)
+    kept = factories["music.Upload"]()
+    delete_batch = mocker.spy(purge, "delete_batch")
+    steps = [
+        purge.Step("uploads", music_models.Upload.objects.filter(library=library)),
+        purge.Step("libraries", music_models.Library.objects.filter(pk=library.pk)),
+    ]
+
+    result = purge.run("test", steps, batch_size=2)
+
+    assert result["complete"] is True
+    assert result["deleted"]["uploads"] == len(uploads)
+    assert result["deleted"]["libraries"] == 1
+    # 3 batches of uploads, one of libraries
+    assert delete_batch.call_count == 4
+    assert list(music_models.Upload.objects.all()) == [kept]
+
+
+def test_run_resumes_after_deadline(factories, mocker, cache):
+    actors = factories["federation.Actor"].create_batch(size=3)
+    steps = [
+        purge.Step("actors", models.Actor.objects.filter(pk__in=[a.pk for a in actors]))
+    ]
+    mocker.patch("time.monotonic", side_effect=[0, 0, 10])
+
+    result = purge.run("test", steps, batch_size=1, deadline=5)
+
+    assert result == {"deleted": {"actors": 1}, "complete": False}
+    assert cache.get(purge.CURSOR_CACHE_KEY.format("test", "actors")) == actors[0].pk
+    assert models.Actor.objects.filter(pk__in=[a.pk for a in actors]).count() == 2
+
+    mocker.patch("time.monotonic", return_value=0)
+    result = purge.run("test", steps, batch_size=1)
+
+    assert result == {"deleted": {"actors": 2}, "complete": True}
+    assert cache.get(purge.CURSOR_CACHE_KEY.format("test", "actors")) is None
+
+
+def test_run_throttles(factories, settings, mocker):
+    factories["federation.Actor"]()
+    sleep = mocker.patch("time.sleep")
+    mocker.patch("time.monotonic", side_effect=[0, 2])
+    steps = [purge.Step("actors", models.Actor.objects.all())]
+
+    purge.run("test", steps, throttle=0.5)
+
+    sleep.assert_called_once_with(1)
+
+
+def test_get_cascade_steps(factories):
+    actor = factories["federation.Actor"]()
+    library = factories["music.Library"](actor=actor)
+    factories["music.Library"]()
+
+    steps = {
+        step.name: step
+        for step in purge.get_cascade_steps(
+            models.Actor, [actor.pk], exclude=["federation.Follow.actor"]
+        )
+    }
+
+    assert list(steps["music.Library.actor"].queryset) == [library]
+    assert "federation.Follow.actor" not in steps
+    # set null relations are not deleted
+    assert "users.User.actor" not in steps
@@ -0,0 +1,77 @@
+import datetime
+
+from funkwhale_api.federation import models
+from funkwhale_api.federation import retention
+from funkwhale_api.federation import tasks
+
+
+def test_get_prunable_deliveries(factories, settings, now):
+    settings.FEDERATION_DELIVERY_RETENTION_DAYS = 30
+    old = now - datetime.timedelta(days=31)
+    prunable = factories["federation.Delivery"](
+        last_attempt_date=old, is_delivered=True
+    )
+    failed = factories["federation.Delivery"](last_attempt_date=old)
+    factories["federation.Delivery"](last_attempt_date=now)
+    factories["federation.Delivery"]()
+
+    assert sorted(retention.get_prunable_deliveries(), key=lambda d: d.pk) == [
+        prunable,
+        failed,
+    ]
+
+
+def test_get_prunable_inbox_items(factories, settings, now):
+    settings.FEDERATION_INBOX_ITEM_RETENTION_DAYS = 30
+    old = now - datetime.timedelta(days=31)
+    prunable = factories["federation.InboxItem"](
+        is_read=True, activity__creation_date=old
+    )
+    factories["federation.InboxItem"](is_read=False, activity__creation_date=old)
+    factories["federation.InboxItem"](is_read=True, activity__creation_date=now)
+
+    assert list(retention.get_prunable_inbox_items()) == [prunable]
+
+
+def test_get_prunable_activities(factories, settings, now):
+    settings.FEDERATION_ACTIVITY_RETENTION_DAYS = 30
+    old = now - datetime.timedelta(days=31)
+    prunable = factories["federation.Activity"](creation_date=old)
+    factories["federation.Activity"](creation_date=now)
+    factories["federation.InboxItem"](activity__creation_date=old)
+    factories["federation.Delivery"](activity__creation_date=old)
+    referenced = factories["federation.Activity"](creation_date=old)
+    factories["music.Upload"](from_activity=referenced)
+
+    assert list(retention.get_prunable_activities()) == [prunable]
+
+
+def test_get_steps_retention_disabled(settings):
+    settings.FEDERATION_DELIVERY_RETENTION_DAYS = 0
+    settings.FEDERATION_INBOX_ITEM_RETENTION_DAYS = 0
+    settings.FEDERATION_ACTIVITY_RETENTION_DAYS = 30
+
+    assert [s.name for s in retention.get_steps()] == ["activities"]
+
+
+def test_prune_activities(factories, settings, now):
+    settings.FEDERATION_DELIVERY_RETENTION_DAYS = 30
+    settings.FEDERATION_INBOX_ITEM_RETENTION_DAYS = 30
+    settings.FEDERATION_ACTIVITY_RETENTION_DAYS = 30
+    old = now - datetime.timedelta(days=31)
+    activity = factories["federation.Activity"](creation_date=old)
+    factories["federation.Delivery"](activity=activity, last_attempt_date=old)
+    factories["federation.InboxItem"](activity=activity, is_read=True)
+    kept = factories["federation.InboxItem"](activity__creation_date=old, is_read=False)
+
+    report = tasks.prune_activities()
+
+    assert report["complete"] is True
+    assert report["deleted"] == {"deliveries": 1, "inbox_items": 1, "activities": 1}
+    assert set(report["tables"].keys()) == {
+        "federation_activity",
+        "federation_inboxitem",
+        "federation_delivery",
+    }
+    assert list(models.Activity.objects.all()) == [kept.activity]
+    assert list(models.InboxItem.objects.all()) == [kept]
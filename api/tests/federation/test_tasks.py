@@ -1,12 +1,12 @@
 import datetime
 import os
-import pathlib
 import pytest
 
 from django.utils import timezone
 
 from funkwhale_api.federation import jsonld
 from funkwhale_api.federation import models
+from funkwhale_api.federation import nodeinfo
 from funkwhale_api.federation import serializers
 from funkwhale_api.federation import tasks
 from funkwhale_api.federation import utils
@@ -48,28 +48,6 @@ def test_clean_federation_music_cache_if_no_listen(preferences, factories):
     assert os.path.exists(path4) is True
 
 
-def test_clean_federation_music_cache_orphaned(settings, preferences, factories):
-    preferences["federation__music_cache_duration"] = 60
-    path = os.path.join(settings.MEDIA_ROOT, "federation_cache", "tracks")
-    keep_path = os.path.join(os.path.join(path, "1a", "b2"), "keep.ogg")
-    remove_path = os.path.join(os.path.join(path, "c3", "d4"), "remove.ogg")
-    os.makedirs(os.path.dirname(keep_path), exist_ok=True)
-    os.makedirs(os.path.dirname(remove_path), exist_ok=True)
-    pathlib.Path(keep_path).touch()
-    pathlib.Path(remove_path).touch()
-    upload = factories["music.Upload"](
-        accessed_date=timezone.now(), audio_file__path=keep_path
-    )
-
-    tasks.clean_music_cache()
-
-    upload.refresh_from_db()
-
-    assert bool(upload.audio_file) is True
-    assert os.path.exists(upload.audio_file_path) is True
-    assert os.path.exists(remove_path) is False
-
-
 def test_handle_in(factories, mocker, now, queryset_equal_list):
     mocked_dispatch = mocker.patch("funkwhale_api.federation.routes.inbox.dispatch")
 
@@ -151,34 +129,14 @@ def test_deliver_to_remote_error(factories, r_mock, now):
     assert delivery.last_attempt_date == now
 
 
-def test_fetch_nodeinfo(factories, r_mock, now):
-    wellknown_url = "https://test.test/.well-known/nodeinfo"
-    nodeinfo_url = "https://test.test/nodeinfo"
-
-    r_mock.get(
-        wellknown_url,
-        json={
-            "links": [
-                {
-                    "rel": "http://nodeinfo.diaspora.software/ns/schema/2.0",
-                    "href": "https://test.test/nodeinfo",
-                }
-            ]
-        },
-    )
-    r_mock.get(nodeinfo_url, json={"hello": "world"})
-
-    assert tasks.fetch_nodeinfo("test.test") == {"hello": "world"}
-
-
 def test_update_domain_nodeinfo(factories, mocker, now, service_actor):
     domain = factories["federation.Domain"](nodeinfo_fetch_date=None)
     actor = factories["federation.Actor"](fid="https://actor.id")
     retrieve_ap_object = mocker.spy(utils, "retrieve_ap_object")
 
     mocker.patch.object(
-        tasks,
-        "fetch_nodeinfo",
+        nodeinfo,
+        "fetch",
         return_value={"hello": "world", "metadata": {"actorId": "https://actor.id"}},
     )
 
@@ -219,6 +177,7 @@ def test_update_domain_nodeinfo_error(factories, r_mock, now):
     assert domain.nodeinfo == {
         "status": "error",
         "error": "500 Server Error: None for url: {}".format(wellknown_url),
+        "failures": 1,
     }
 
 
@@ -237,14 +196,11 @@ def test_refresh_nodeinfo_known_nodes(settings, factories, mocker, now):
         - datetime.timedelta(seconds=settings.NODEINFO_REFRESH_DELAY - 1)
     )
 
-    update_domain_nodeinfo = mocker.patch.object(tasks.update_domain_nodeinfo, "delay")
+    crawl = mocker.patch.object(nodeinfo, "crawl", return_value={"ok": 2})
 
-    tasks.refresh_nodeinfo_known_nodes()
+    assert tasks.refresh_nodeinfo_known_nodes(max_duration=0) == {"ok": 2}
 
-    assert update_domain_nodeinfo.call_count == len(refreshed)
-
-    for d in refreshed:
-        update_domain_nodeinfo.assert_any_call(domain_name=d.name)
+    crawl.assert_called_once_with(refreshed, deadline=None)
 
 
 def test_handle_purge_actors(factories, mocker):
@@ -319,8 +275,35 @@ def test_purge_actors(factories, mocker):
     )
 
     handle_purge_actors.assert_called_once_with(
-        ids=[to_delete.pk, to_delete_domain.pk], only=["hello"]
+        ids=[to_delete.pk, to_delete_domain.pk], only=["hello"], deadline=mocker.ANY
+    )
+
+
+def test_purge_actors_throttled(factories, settings, mocker):
+    settings.FEDERATION_PURGE_THROTTLE = 0.5
+    settings.FEDERATION_PURGE_BATCH_SIZE = 1
+    sleep = mocker.patch("time.sleep")
+    library = factories["music.Library"]()
+    factories["music.Upload"].create_batch(size=2, library=library)
+
+    result = tasks.purge_actors(ids=[library.actor.pk])
+
+    assert result["complete"] is True
+    assert not models.Actor.objects.filter(pk=library.actor.pk).exists()
+    # at least one pause per deleted batch
+    assert sleep.call_count >= 3
+
+
+def test_purge_actors_incomplete_schedules_another_run(factories, mocker):
+    actor = factories["federation.Actor"]()
+    mocker.patch.object(
+        tasks, "handle_purge_actors", return_value={"deleted": {}, "complete": False},
     )
+    delay = mocker.patch.object(tasks.purge_actors, "delay")
+
+    tasks.purge_actors(ids=[actor.pk], max_duration=10)
+
+    delay.assert_called_once_with(ids=[actor.pk], domains=[], only=[], max_duration=10)
 
 
 def test_rotate_actor_key(factories, settings, mocker):
@@ -654,3 +637,15 @@ def test_fetch_collection(mocker, r_mock):
     assert result["seen"] == 7
     assert result["total"] == 27094
     assert result["next_page"] == payloads["page2"]["next"]
+
+
+def test_process_incoming_activities(factories, mocker):
+    incoming_activities = factories["federation.IncomingActivity"].create_batch(size=3)
+    receive_batch = mocker.patch.object(tasks.activity, "receive_batch")
+
+    assert tasks.process_incoming_activities(batch_size=2) == 3
+
+    assert receive_batch.call_count == 2
+    assert receive_batch.call_args_list[0][0][0] == incoming_activities[:2]
+    assert receive_batch.call_args_list[1][0][0] == incoming_activities[2:]
+    assert models.IncomingActivity.objects.count() == 0
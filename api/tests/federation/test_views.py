@@ -6,6 +6,7 @@ from funkwhale_api.common import utils
 
 from funkwhale_api.federation import (
     actors,
+    pagination,
     serializers,
     webfinger,
     utils as federation_utils,
@@ -149,6 +150,24 @@ def test_shared_inbox_post(factories, api_client, mocker, authenticated_actor):
     )
 
 
+def test_shared_inbox_post_async(
+    factories, api_client, mocker, authenticated_actor, settings
+):
+    settings.FEDERATION_INBOX_ASYNC = True
+    patched_receive = mocker.patch("funkwhale_api.federation.activity.receive")
+    enqueue_incoming = mocker.patch(
+        "funkwhale_api.federation.activity.enqueue_incoming"
+    )
+    url = reverse("federation:shared-inbox")
+    response = api_client.post(url, {"hello": "world"}, format="json")
+
+    assert response.status_code == 202
+    enqueue_incoming.assert_called_once_with(
+        activity={"hello": "world"}, on_behalf_of=authenticated_actor
+    )
+    patched_receive.assert_not_called()
+
+
 def test_wellknown_webfinger_local(factories, api_client, settings, mocker):
     user = factories["users.User"](with_actor=True)
     url = reverse("federation:well-known-webfinger")
@@ -220,6 +239,49 @@ def test_music_library_retrieve_page_public(factories, api_client):
     assert response.data == expected
 
 
+def test_music_library_retrieve_page_next_cursor(factories, api_client, preferences):
+    preferences["federation__collection_page_size"] = 1
+    library = factories["music.Library"](privacy_level="everyone", actor__local=True)
+    upload1 = factories["music.Upload"](library=library, import_status="finished")
+    upload2 = factories["music.Upload"](library=library, import_status="finished")
+    url = reverse("federation:music:libraries-detail", kwargs={"uuid": library.uuid})
+
+    response = api_client.get(url, {"page": 1})
+
+    assert response.status_code == 200
+    assert response.data["items"][0]["id"] == upload2.fid
+    assert response.data["totalItems"] == 2
+    expected_next = utils.set_query_parameter(
+        library.get_federation_id(), page=2, after=pagination.encode_cursor(upload2)
+    )
+    assert response.data["next"] == expected_next
+
+    response = api_client.get(response.data["next"])
+
+    assert response.status_code == 200
+    assert response.data["items"][0]["id"] == upload1.fid
+    assert "next" not in response.data
+
+
+def test_music_library_retrieve_page_cached(factories, api_client, mocker):
+    library = factories["music.Library"](privacy_level="everyone", actor__local=True)
+    factories["music.Upload"](library=library, import_status="finished")
+    url = reverse("federation:music:libraries-detail", kwargs={"uuid": library.uuid})
+    response = api_client.get(url, {"page": 1})
+    serializer = mocker.spy(serializers.CollectionPageSerializer, "to_representation")
+
+    cached_response = api_client.get(url, {"page": 1})
+
+    assert cached_response.data == response.data
+    serializer.assert_not_called()
+
+    factories["music.Upload"](library=library, import_status="finished")
+    response = api_client.get(url, {"page": 1})
+
+    assert response.data["totalItems"] == 2
+    serializer.assert_called_once()
+
+
 def test_channel_outbox_retrieve(factories, api_client):
     channel = factories["audio.Channel"](actor__local=True)
     expected = serializers.ChannelOutboxSerializer(channel).data
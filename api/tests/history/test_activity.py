@@ -57,3 +57,22 @@ def test_broadcast_listening_to_instance_activity_private(factories, mocker):
     consumer = activities.broadcast_listening_to_instance_activity
     consumer(data=data, obj=listening)
     p.assert_not_called()
+
+
+def test_track_listening_timeline_consumer(activity_registry):
+    conf = activity_registry["history.Listening"]
+    consumer = activities.add_listening_to_timeline
+    assert consumer in conf["consumers"]
+
+
+def test_add_listening_to_timeline(factories):
+    listening = factories["history.Listening"](user__privacy_level="everyone")
+    data = serializers.ListeningActivitySerializer(listening).data
+
+    activities.add_listening_to_timeline(data=data, obj=listening)
+
+    entry = listening.user.timeline_entries.get()
+    assert entry.object_type == "history.Listening"
+    assert entry.object_id == listening.pk
+    assert entry.privacy_level == "everyone"
+    assert entry.creation_date == listening.creation_date
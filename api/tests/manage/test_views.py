@@ -1,8 +1,12 @@
+import pytest
 from django.urls import reverse
 
+from funkwhale_api.common import models as common_models
+from funkwhale_api.common import tasks as common_tasks
 from funkwhale_api.federation import models as federation_models
 from funkwhale_api.federation import tasks as federation_tasks
 from funkwhale_api.manage import serializers
+from funkwhale_api.moderation import stats as moderation_stats
 from funkwhale_api.moderation import tasks as moderation_tasks
 
 
@@ -104,8 +108,8 @@ def test_domain_nodeinfo(factories, superuser_api_client, mocker):
     url = reverse(
         "api:v1:manage:federation:domains-nodeinfo", kwargs={"pk": domain.name}
     )
-    mocker.patch.object(
-        federation_tasks, "fetch_nodeinfo", return_value={"hello": "world"}
+    mocker.patch(
+        "funkwhale_api.federation.nodeinfo.fetch", return_value={"hello": "world"}
     )
     update_domain_nodeinfo = mocker.spy(federation_tasks, "update_domain_nodeinfo")
     response = superuser_api_client.get(url)
@@ -117,13 +121,32 @@ def test_domain_nodeinfo(factories, superuser_api_client, mocker):
 
 def test_domain_stats(factories, superuser_api_client, mocker):
     domain = factories["federation.Domain"]()
-    mocker.patch.object(domain.__class__, "get_stats", return_value={"hello": "world"})
+    mocker.patch.dict(
+        moderation_stats.HANDLERS, {"federation.domain": lambda d: {"hello": "world"}}
+    )
     url = reverse("api:v1:manage:federation:domains-stats", kwargs={"pk": domain.name})
     response = superuser_api_client.get(url)
     assert response.status_code == 200
     assert response.data == {"hello": "world"}
 
 
+def test_artist_stats_cached_until_reported(factories, superuser_api_client, settings):
+    settings.MODERATION_STATS_CACHE_DURATION = 60
+    artist = factories["music.Artist"]()
+    url = reverse("api:v1:manage:library:artists-stats", kwargs={"pk": artist.pk})
+
+    assert superuser_api_client.get(url).data["uploads"] == 0
+    factories["music.Upload"](track__artist=artist)
+    # stats are served from the cache
+    assert superuser_api_client.get(url).data["uploads"] == 0
+
+    factories["moderation.Report"](target=artist)
+    data = superuser_api_client.get(url).data
+
+    assert data["reports"] == 1
+    assert data["uploads"] == 1
+
+
 def test_actor_list(factories, superuser_api_client, settings):
     actor = factories["federation.Actor"]()
     url = reverse("api:v1:manage:accounts-list")
@@ -646,3 +669,89 @@ def test_channel_detail_stats(factories, superuser_api_client):
     }
     assert response.status_code == 200
     assert response.data == expected
+
+
+def test_action_creates_job_above_threshold(
+    factories, superuser_api_client, settings, mocker
+):
+    settings.ACTION_JOBS_THRESHOLD = 1
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    tracks = factories["music.Track"].create_batch(size=2)
+    url = reverse("api:v1:manage:library:tracks-action")
+
+    response = superuser_api_client.post(
+        url, {"action": "delete", "objects": [t.pk for t in tracks]}, format="json"
+    )
+
+    assert response.status_code == 202
+    job = common_models.ActionJob.objects.get(uuid=response.data["job"]["uuid"])
+    assert job.created_by == superuser_api_client.user.actor
+    assert job.model == "music.Track"
+    assert job.action == "delete"
+    assert job.object_ids == sorted([t.pk for t in tracks])
+    assert job.total == 2
+    assert response.data["updated"] == 2
+    on_commit.assert_called_once_with(common_tasks.run_action_job.delay, job_id=job.pk)
+    # nothing deleted yet
+    assert tracks[0].__class__.objects.count() == 2
+
+
+def test_action_jobs_list(factories, superuser_api_client):
+    job = factories["common.ActionJob"](created_by=superuser_api_client.user.actor)
+    factories["common.ActionJob"]()
+    url = reverse("api:v1:manage:jobs-list")
+
+    response = superuser_api_client.get(url)
+
+    assert response.status_code == 200
+    assert response.data["count"] == 1
+    assert response.data["results"][0]["uuid"] == str(job.uuid)
+
+
+def test_action_jobs_list_requires_authentication(factories, api_client, db):
+    factories["common.ActionJob"]()
+    url = reverse("api:v1:manage:jobs-list")
+
+    response = api_client.get(url)
+
+    assert response.status_code == 401
+
+
+def test_domain_purge_not_run_as_job(factories, superuser_api_client, settings, mocker):
+    settings.ACTION_JOBS_THRESHOLD = 1
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    domains = factories["federation.Domain"].create_batch(size=2)
+    url = reverse("api:v1:manage:federation:domains-action")
+
+    response = superuser_api_client.post(
+        url, {"action": "purge", "objects": [d.name for d in domains]}, format="json"
+    )
+
+    assert response.status_code == 200
+    assert common_models.ActionJob.objects.count() == 0
+    on_commit.assert_called_once_with(
+        federation_tasks.purge_actors.delay, domains=sorted(d.name for d in domains)
+    )
+
+
+@pytest.mark.parametrize(
+    "status, expected_status_code, expected_job_status",
+    [
+        ("pending", 200, "cancelled"),
+        ("running", 200, "cancelled"),
+        ("finished", 400, "finished"),
+    ],
+)
+def test_action_job_cancel(
+    status, expected_status_code, expected_job_status, factories, superuser_api_client
+):
+    job = factories["common.ActionJob"](
+        created_by=superuser_api_client.user.actor, status=status
+    )
+    url = reverse("api:v1:manage:jobs-cancel", kwargs={"uuid": job.uuid})
+
+    response = superuser_api_client.post(url)
+
+    assert response.status_code == expected_status_code
+    job.refresh_from_db()
+    assert job.status == expected_job_status
@@ -0,0 +1,85 @@
+from funkwhale_api.moderation import stats
+
+
+def test_artist_stats(factories, django_assert_num_queries):
+    artist = factories["music.Artist"]()
+    track = factories["music.Track"](artist=artist)
+    album_track = factories["music.Track"](album__artist=artist)
+    factories["music.Track"]()
+    factories["music.Upload"](track=track, size=10)
+    factories["music.Upload"](track=album_track, size=20, audio_file=None)
+    factories["history.Listening"].create_batch(size=2, track=track)
+    factories["favorites.TrackFavorite"](track=album_track)
+    factories["playlists.PlaylistTrack"].create_batch(size=2, track=track)
+    factories["moderation.Report"](target=artist)
+
+    with django_assert_num_queries(1):
+        data = stats.get_artist_stats(artist)
+
+    assert data == {
+        "libraries": 2,
+        "channels": 0,
+        "uploads": 2,
+        "listenings": 2,
+        "playlists": 2,
+        "mutations": 0,
+        "reports": 1,
+        "track_favorites": 1,
+        "media_total_size": 30,
+        "media_downloaded_size": 10,
+    }
+
+
+def test_library_stats(factories):
+    library = factories["music.Library"]()
+    album = factories["music.Album"]()
+    factories["music.Upload"].create_batch(
+        size=2, library=library, track__album=album, track__artist=album.artist
+    )
+    factories["music.Upload"](library=library, track__album=None)
+    factories["music.Upload"]()
+
+    data = stats.get_library_stats(library)
+
+    assert data["uploads"] == 3
+    assert data["tracks"] == 3
+    assert data["albums"] == 1
+    assert data["artists"] == 2
+
+
+def test_get_caches_stats(factories, settings, mocker):
+    settings.MODERATION_STATS_CACHE_DURATION = 60
+    artist = factories["music.Artist"]()
+    handler = mocker.patch.dict(
+        stats.HANDLERS, {"music.artist": mocker.Mock(return_value={"uploads": 1})}
+    )["music.artist"]
+
+    assert stats.get(artist) == {"uploads": 1}
+    assert stats.get(artist) == {"uploads": 1}
+    handler.assert_called_once_with(artist)
+
+    stats.get(artist, refresh=True)
+    assert handler.call_count == 2
+
+
+def test_report_invalidates_target_stats(factories, settings, cache):
+    settings.MODERATION_STATS_CACHE_DURATION = 60
+    artist = factories["music.Artist"]()
+
+    assert stats.get(artist)["reports"] == 0
+
+    factories["moderation.Report"](target=artist)
+
+    assert cache.get(stats.get_cache_key("music.artist", artist.pk)) is None
+    assert stats.get(artist)["reports"] == 1
+
+
+def test_user_request_invalidates_submitter_stats(factories, settings, cache):
+    settings.MODERATION_STATS_CACHE_DURATION = 60
+    actor = factories["federation.Actor"]()
+
+    assert stats.get(actor)["requests"] == 0
+
+    factories["moderation.UserRequest"](submitter=actor)
+
+    assert stats.get(actor)["requests"] == 1
@@ -120,3 +120,14 @@ def test_refused_request_sends_email_to_submitter(
     )
     assert "test@pod.example" in m.body
     assert list(m.to) == [user.email]
+
+
+def test_precompute_stats(factories, mocker):
+    artist = factories["music.Artist"]()
+    factories["moderation.Report"].create_batch(size=2, target=artist)
+    factories["moderation.Report"](target=factories["music.Album"](), is_handled=True)
+    factories["moderation.Report"](target=factories["playlists.Playlist"]())
+    get = mocker.patch.object(tasks.stats, "get")
+
+    assert tasks.precompute_stats() == 1
+    get.assert_called_once_with(artist, refresh=True)
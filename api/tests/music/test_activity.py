@@ -35,4 +35,5 @@ def test_upload_import_status_updated_broadcast(factories, mocker):
                 "upload": serializers.UploadForOwnerSerializer(upload).data,
             },
         },
+        key="import.status_updated.{}".format(upload.uuid),
     )
@@ -692,3 +692,233 @@ def test_update_library_privacy_level_create_entries(
         actor = actors[actor_name]
         expected_tracks = [tracks[i] for i in expected]
         assert list(models.Track.objects.playable_by(actor)) == expected_tracks
+
+
+def test_create_entries_updates_artist_and_album_actor(factories):
+    actor = factories["federation.Actor"](local=True)
+    library = factories["music.Library"](privacy_level="me", actor=actor)
+    upload = factories["music.Upload"](import_status="finished", library=library)
+    artist, album = upload.track.artist, upload.track.album
+
+    assert list(models.Artist.objects.playable_by(actor)) == [artist]
+    assert list(models.Album.objects.playable_by(actor)) == [album]
+    assert list(models.Artist.objects.playable_by(None)) == []
+    assert list(models.Album.objects.playable_by(None)) == []
+
+    library.privacy_level = "everyone"
+    models.TrackActor.create_entries(library)
+
+    assert list(models.Artist.objects.playable_by(None)) == [artist]
+    assert list(models.Album.objects.playable_by(None)) == [album]
+    assert models.ArtistActor.objects.filter(artist=artist).count() == 1
+    assert models.AlbumActor.objects.filter(album=album).count() == 1
+
+
+def test_upload_delete_updates_artist_and_album_actor(factories, mocker):
+    mocker.patch(
+        "funkwhale_api.common.utils.on_commit",
+        side_effect=lambda f, *a, **k: f(*a, **k),
+    )
+    upload = factories["music.Upload"](playable=True)
+    other_upload = factories["music.Upload"](
+        playable=True, track__artist=upload.track.artist, track__album=None
+    )
+    artist = upload.track.artist
+
+    upload.delete()
+
+    assert list(models.Artist.objects.playable_by(None)) == [artist]
+    assert list(models.Album.objects.playable_by(None)) == []
+
+    other_upload.delete()
+
+    assert list(models.Artist.objects.playable_by(None)) == []
+
+
+def test_uploads_delete_updates_artist_and_album_actor_once(factories, mocker):
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    update = mocker.spy(models, "update_artist_album_actor_entries")
+    uploads = factories["music.Upload"].create_batch(size=3, playable=True)
+
+    models.Upload.objects.filter(pk__in=[u.pk for u in uploads]).delete()
+
+    update.assert_not_called()
+    flushes = [
+        c
+        for c in on_commit.call_args_list
+        if c[0][0] == models.flush_artist_album_actor_updates
+    ]
+    assert len(flushes) == 3
+    for call in flushes:
+        call[0][0]()
+
+    update.assert_called_once_with(
+        sorted(u.track_id for u in uploads), artist_ids=set(), album_ids=set()
+    )
+    assert list(models.Artist.objects.playable_by(None)) == []
+    assert list(models.Album.objects.playable_by(None)) == []
+
+
+def test_track_artist_change_updates_artist_and_album_actor(factories, mocker):
+    mocker.patch(
+        "funkwhale_api.common.utils.on_commit",
+        side_effect=lambda f, *a, **k: f(*a, **k),
+    )
+    upload = factories["music.Upload"](playable=True)
+    track = upload.track
+    previous_artist, previous_album = track.artist, track.album
+    new_artist = factories["music.Artist"]()
+    new_album = factories["music.Album"](artist=new_artist)
+
+    track.artist = new_artist
+    track.album = new_album
+    track.save()
+
+    assert list(models.Artist.objects.playable_by(None)) == [new_artist]
+    assert list(models.Album.objects.playable_by(None)) == [new_album]
+    assert not models.ArtistActor.objects.filter(artist=previous_artist).exists()
+    assert not models.AlbumActor.objects.filter(album=previous_album).exists()
+
+
+def test_update_artist_album_actor_entries_rebuild_all(factories):
+    upload = factories["music.Upload"](playable=True)
+    models.ArtistActor.objects.all().delete()
+    models.AlbumActor.objects.all().delete()
+
+    models.update_artist_album_actor_entries()
+
+    assert list(models.Artist.objects.playable_by(None)) == [upload.track.artist]
+    assert list(models.Album.objects.playable_by(None)) == [upload.track.album]
+
+
+def test_search_entries_created_on_save(settings, factories):
+    settings.MUSIC_USE_SEARCH_INDEX = True
+    track = factories["music.Track"](
+        title="Héllo", album__title="World", artist__name="Fôo"
+    )
+    tag = factories["tags.Tag"](name="Jazz")
+
+    entries = {
+        (e.entity_type, e.entity_id): e for e in models.SearchEntry.objects.all()
+    }
+
+    assert entries[("track", track.pk)].text == "hello world foo"
+    assert entries[("album", track.album.pk)].text == "world {}".format(
+        track.album.artist.name.lower()
+    )
+    assert entries[("artist", track.artist.pk)].text == "foo"
+    assert entries[("artist", track.artist.pk)].weight == 1
+    assert entries[("tag", tag.pk)].text == "jazz"
+
+
+def test_search_entries_updated_on_artist_rename(settings, factories):
+    settings.MUSIC_USE_SEARCH_INDEX = True
+    artist = factories["music.Artist"](name="Foo")
+    track = factories["music.Track"](title="Hello", artist=artist, album=None)
+
+    artist.name = "Bar"
+    artist.save(update_fields=["name"])
+
+    entry = models.SearchEntry.objects.get(entity_type="track", entity_id=track.pk)
+    assert entry.text == "hello bar"
+
+
+def test_search_entries_not_updated_on_unrelated_save(settings, factories, mocker):
+    settings.MUSIC_USE_SEARCH_INDEX = True
+    track = factories["music.Track"]()
+    update_entries = mocker.patch.object(models.SearchEntry, "update_entries")
+
+    track.downloads_count = 42
+    track.save(update_fields=["downloads_count"])
+
+    update_entries.assert_not_called()
+
+
+def test_search_entries_deleted_with_entity(settings, factories):
+    settings.MUSIC_USE_SEARCH_INDEX = True
+    track = factories["music.Track"]()
+
+    track.artist.delete()
+
+    assert models.SearchEntry.objects.filter(entity_type="track").count() == 0
+    assert models.SearchEntry.objects.filter(entity_type="artist").count() == 0
+
+
+def test_search_entries_search(settings, factories):
+    settings.MUSIC_USE_SEARCH_INDEX = True
+    artist1 = factories["music.Artist"](name="Foo Fighters")
+    artist2 = factories["music.Artist"](name="Foo")
+    factories["music.Artist"](name="Bar")
+    tag = factories["tags.Tag"](name="foo_bar")
+    factories["tags.Tag"](name="foobar")
+
+    results = models.SearchEntry.search("fóo", limit=5)
+
+    assert results["artist"] == [artist2.pk, artist1.pk]
+    assert results["album"] == []
+    assert models.SearchEntry.search("foo_", limit=5)["tag"] == [tag.pk]
+
+
+def test_album_tracks_count_maintained(factories):
+    album = factories["music.Album"]()
+    track1, track2 = factories["music.Track"].create_batch(size=2, album=album)
+
+    album.refresh_from_db()
+    album.artist.refresh_from_db()
+    assert album.tracks_count == 2
+    assert album.artist.albums_count == 1
+
+    track1.delete()
+
+    album.refresh_from_db()
+    assert album.tracks_count == 1
+
+    album.delete()
+    album.artist.refresh_from_db()
+    assert album.artist.albums_count == 0
+
+
+def test_saving_stale_instance_keeps_counters(factories):
+    album = factories["music.Album"]()
+    factories["music.Track"](album=album)
+
+    album.title = "Updated"
+    album.save()
+
+    album.refresh_from_db()
+    assert album.title == "Updated"
+    assert album.tracks_count == 1
+
+
+def test_saving_stale_instance_with_positional_arguments_keeps_counters(factories):
+    album = factories["music.Album"]()
+    factories["music.Track"](album=album)
+
+    album.title = "Updated"
+    album.save(False, False, None)
+
+    album.refresh_from_db()
+    assert album.title == "Updated"
+    assert album.tracks_count == 1
+
+
+def test_upload_usage_maintained(factories):
+    library = factories["music.Library"]()
+    actor = library.actor
+    factories["music.Upload"](library=library, import_status="finished", size=10)
+    # initialize the counters
+    assert actor.get_current_usage()["finished"] == 10
+
+    upload = factories["music.Upload"](library=library, import_status="pending", size=5)
+    factories["music.Upload"](library=library, import_status="pending", in_place=True)
+    assert actor.get_current_usage()["pending"] == 5
+
+    upload.import_status = "finished"
+    upload.save(update_fields=["import_status"])
+    usage = actor.get_current_usage()
+    assert usage["pending"] == 0
+    assert usage["finished"] == 15
+    assert usage["total"] == 15
+
+    upload.delete()
+    assert actor.get_current_usage()["finished"] == 10
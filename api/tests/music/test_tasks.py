@@ -3,14 +3,17 @@ import os
 import pytest
 import uuid
 
+import musicbrainzngs
+
 from django.core.paginator import Paginator
 from django.utils import timezone
 
 from funkwhale_api.common import utils as common_utils
 from funkwhale_api.federation import serializers as federation_serializers
 from funkwhale_api.federation import jsonld
-from funkwhale_api.federation import utils as federation_utils
 from funkwhale_api.music import licenses, metadata, models, signals, tasks
+from funkwhale_api.musicbrainz import client as musicbrainz_client
+from funkwhale_api.tags import models as tags_models
 
 DATA_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -857,6 +860,9 @@ def test_clean_transcoding_cache(preferences, now, factories):
         accessed_date=now - datetime.timedelta(minutes=59)
     )
 
+    path1 = u1.audio_file.path
+    path2 = u2.audio_file.path
+
     tasks.clean_transcoding_cache()
 
     u2.refresh_from_db()
@@ -864,6 +870,30 @@ def test_clean_transcoding_cache(preferences, now, factories):
     with pytest.raises(u1.__class__.DoesNotExist):
         u1.refresh_from_db()
 
+    assert os.path.exists(path1) is False
+    assert os.path.exists(path2) is True
+
+
+def test_delete_upload_versions_checks_candidates_again(now, factories):
+    old = factories["music.UploadVersion"](
+        accessed_date=now - datetime.timedelta(minutes=61)
+    )
+    # served after the candidates were selected
+    served = factories["music.UploadVersion"](accessed_date=now)
+    candidates = old.__class__.objects.filter(
+        accessed_date__lt=now - datetime.timedelta(minutes=60)
+    )
+    old_path = old.audio_file.path
+    served_path = served.audio_file.path
+
+    assert tasks.delete_upload_versions(candidates, [old.pk, served.pk]) == 1
+
+    served.refresh_from_db()
+    with pytest.raises(old.__class__.DoesNotExist):
+        old.refresh_from_db()
+    assert os.path.exists(old_path) is False
+    assert os.path.exists(served_path) is True
+
 
 def test_get_prunable_tracks(factories):
     prunable_track = factories["music.Track"]()
@@ -934,6 +964,72 @@ def test_get_prunable_artists(factories):
     assert list(tasks.get_prunable_artists()) == [prunable_artist]
 
 
+def test_prune_deletes_in_batches(factories, mocker, cache):
+    artists = factories["music.Artist"].create_batch(size=5)
+    on_progress = mocker.Mock()
+    atomic = mocker.spy(tasks.transaction, "atomic")
+
+    queryset = models.Artist.objects.filter(pk__in=[a.pk for a in artists[:4]])
+    result = tasks.prune(queryset, "test", batch_size=2, on_progress=on_progress)
+
+    assert result == {"deleted": 4, "complete": True}
+    assert list(models.Artist.objects.all()) == [artists[4]]
+    assert atomic.call_count == 2
+    assert [c[0][0]["deleted"] for c in on_progress.call_args_list] == [2, 4]
+    assert cache.get(tasks.get_prune_cursor_key(queryset, "test")) is None
+
+
+def test_prune_resumes_from_cursor(factories, cache):
+    first, second = factories["music.Artist"].create_batch(size=2)
+    queryset = models.Artist.objects.all()
+    cache.set(tasks.get_prune_cursor_key(queryset, "test"), first.pk)
+
+    result = tasks.prune(queryset, "test")
+
+    assert result == {"deleted": 1, "complete": True}
+    assert list(models.Artist.objects.all()) == [first]
+
+
+def test_prune_stops_at_deadline(factories, mocker, cache):
+    artists = factories["music.Artist"].create_batch(size=3)
+    mocker.patch.object(tasks.time, "monotonic", side_effect=[0, 0, 10])
+
+    queryset = models.Artist.objects.all()
+    result = tasks.prune(queryset, "test", batch_size=1, deadline=5)
+
+    assert result == {"deleted": 1, "complete": False}
+    assert cache.get(tasks.get_prune_cursor_key(queryset, "test")) == artists[0].pk
+
+
+def test_prune_cursor_depends_on_filters(factories, cache):
+    first, second = factories["music.Artist"].create_batch(size=2)
+    cache.set(
+        tasks.get_prune_cursor_key(models.Artist.objects.all(), "test"), second.pk
+    )
+
+    # another run, with different filters, doesn't resume from the same cursor
+    result = tasks.prune(models.Artist.objects.filter(pk=first.pk), "test")
+
+    assert result == {"deleted": 1, "complete": True}
+    assert list(models.Artist.objects.all()) == [second]
+
+
+def test_prune_library_task(factories, mocker, settings):
+    settings.MUSIC_PRUNE_MAX_DURATION = 60
+    prune = mocker.patch.object(
+        tasks, "prune", return_value={"deleted": 0, "complete": True}
+    )
+
+    result = tasks.prune_library()
+
+    assert [c[0][1] for c in prune.call_args_list] == ["tracks", "albums", "artists"]
+    assert result == {
+        "tracks": {"deleted": 0, "complete": True},
+        "albums": {"deleted": 0, "complete": True},
+        "artists": {"deleted": 0, "complete": True},
+    }
+
+
 def test_update_library_entity(factories, mocker):
     artist = factories["music.Artist"]()
     save = mocker.spy(artist, "save")
@@ -1138,55 +1234,69 @@ def test_process_upload_skips_import_metadata_if_invalid(factories, mocker):
     )
 
 
-def test_tag_albums_from_tracks(queryset_equal_queries, factories, mocker):
-    get_tags_from_foreign_key = mocker.patch(
-        "funkwhale_api.tags.tasks.get_tags_from_foreign_key"
-    )
-    add_tags_batch = mocker.patch("funkwhale_api.tags.tasks.add_tags_batch")
+def test_tag_albums_from_tracks(factories, mocker):
+    mocker.patch.object(tasks, "SET_TAGS_FROM_TRACKS_CHUNK_SIZE", 1)
+    album = factories["music.Album"](local=True)
+    factories["music.Track"].create_batch(2, album=album, set_tags=["rock", "rap"])
+    factories["music.Track"](album=album, set_tags=["rock"])
+    other_album = factories["music.Album"](local=True)
+    factories["music.Track"](album=other_album, set_tags=["jazz"])
+    remote_album = factories["music.Album"]()
+    factories["music.Track"](album=remote_album, set_tags=["rock"])
 
-    expected_queryset = (
-        federation_utils.local_qs(
-            models.Album.objects.filter(tagged_items__isnull=True)
-        )
-        .values_list("id", flat=True)
-        .order_by("id")
-    )
-    tasks.albums_set_tags_from_tracks(ids=[1, 2])
-    get_tags_from_foreign_key.assert_called_once_with(
-        ids=expected_queryset.filter(pk__in=[1, 2]),
-        foreign_key_model=models.Track,
-        foreign_key_attr="album",
-    )
+    result = tasks.albums_set_tags_from_tracks()
 
-    add_tags_batch.assert_called_once_with(
-        get_tags_from_foreign_key.return_value, model=models.Album,
-    )
+    assert album.get_tags() == ["rock"]
+    assert other_album.get_tags() == ["jazz"]
+    assert remote_album.get_tags() == []
+    assert set(result.keys()) == {album.pk, other_album.pk}
 
 
-def test_tag_artists_from_tracks(queryset_equal_queries, factories, mocker):
-    get_tags_from_foreign_key = mocker.patch(
-        "funkwhale_api.tags.tasks.get_tags_from_foreign_key"
-    )
-    add_tags_batch = mocker.patch("funkwhale_api.tags.tasks.add_tags_batch")
+def test_tag_albums_from_tracks_dry_run(factories):
+    album = factories["music.Album"](local=True)
+    factories["music.Track"](album=album, set_tags=["rock"])
 
-    expected_queryset = (
-        federation_utils.local_qs(
-            models.Artist.objects.filter(tagged_items__isnull=True)
-        )
-        .values_list("id", flat=True)
-        .order_by("id")
+    assert tasks.albums_set_tags_from_tracks(dry_run=True) is None
+    assert album.get_tags() == []
+
+
+def test_tag_artists_from_tracks(factories):
+    artist = factories["music.Artist"](local=True)
+    factories["music.Track"].create_batch(2, artist=artist, set_tags=["rock"])
+    other_artist = factories["music.Artist"](local=True)
+    factories["music.Track"](artist=other_artist, set_tags=["rock"])
+
+    tasks.artists_set_tags_from_tracks(ids=[artist.pk])
+
+    assert artist.get_tags() == ["rock"]
+    assert other_artist.get_tags() == []
+
+
+def test_tag_artists_from_tracks_incremental(factories, cache, now):
+    old_artist = factories["music.Artist"](
+        local=True, creation_date=now - datetime.timedelta(days=10)
     )
-    tasks.artists_set_tags_from_tracks(ids=[1, 2])
-    get_tags_from_foreign_key.assert_called_once_with(
-        ids=expected_queryset.filter(pk__in=[1, 2]),
-        foreign_key_model=models.Track,
-        foreign_key_attr="artist",
+    factories["music.Track"](
+        artist=old_artist,
+        set_tags=["rock"],
+        creation_date=now - datetime.timedelta(days=10),
     )
-
-    add_tags_batch.assert_called_once_with(
-        get_tags_from_foreign_key.return_value, model=models.Artist,
+    tags_models.TaggedItem.objects.update(
+        creation_date=now - datetime.timedelta(days=10)
+    )
+    new_artist = factories["music.Artist"](local=True)
+    factories["music.Track"](artist=new_artist, set_tags=["rock"])
+    cache.set(
+        tasks.SET_TAGS_FROM_TRACKS_LAST_RUN_CACHE_KEY.format("music.artist"),
+        now - datetime.timedelta(days=1),
     )
 
+    tasks.artists_set_tags_from_tracks(incremental=True)
+
+    assert new_artist.get_tags() == ["rock"]
+    # not touched since the last run
+    assert old_artist.get_tags() == []
+
 
 def test_can_download_image_file_for_album_mbid(binary_cover, mocker, factories):
     mocker.patch(
@@ -1194,12 +1304,55 @@ def test_can_download_image_file_for_album_mbid(binary_cover, mocker, factories)
     )
     # client._api.get_image_front('55ea4f82-b42b-423e-a0e5-290ccdf443ed')
     album = factories["music.Album"](mbid="55ea4f82-b42b-423e-a0e5-290ccdf443ed")
-    tasks.populate_album_cover(album, replace=True)
+    tasks.fetch_album_cover(album_id=album.pk, replace=True)
 
+    album.refresh_from_db()
     assert album.attachment_cover.file.read() == binary_cover
     assert album.attachment_cover.mimetype == "image/jpeg"
 
 
+def test_populate_album_cover_mbid_queues_fetch_once(factories, mocker):
+    on_commit = mocker.patch("funkwhale_api.common.utils.on_commit")
+    album = factories["music.Album"](attachment_cover=None)
+
+    tasks.populate_album_cover(album)
+    tasks.populate_album_cover(album)
+
+    on_commit.assert_called_once_with(
+        tasks.fetch_album_cover.delay, album_id=album.pk, replace=False
+    )
+
+
+@pytest.mark.parametrize(
+    "get_front_kwargs, max_retries, released",
+    [
+        ({"return_value": b"cover"}, 5, True),
+        ({"side_effect": musicbrainzngs.ResponseError("nope")}, 5, True),
+        # the task will be retried
+        ({"side_effect": musicbrainz_client.RateLimited("slow down")}, 5, False),
+        ({"side_effect": musicbrainzngs.NetworkError("nope")}, 5, False),
+        # last attempt
+        ({"side_effect": musicbrainz_client.RateLimited("slow down")}, 0, True),
+    ],
+)
+def test_fetch_album_cover_releases_lock(
+    get_front_kwargs, max_retries, released, factories, mocker, cache
+):
+    mocker.patch("funkwhale_api.musicbrainz.api.images.get_front", **get_front_kwargs)
+    mocker.patch("funkwhale_api.common.utils.attach_file")
+    mocker.patch.object(tasks.fetch_album_cover, "max_retries", max_retries)
+    album = factories["music.Album"](attachment_cover=None)
+    key = tasks.ALBUM_COVER_FETCH_CACHE_KEY.format(album.pk)
+    cache.set(key, True)
+
+    try:
+        tasks.fetch_album_cover(album_id=album.pk)
+    except (musicbrainz_client.RateLimited, musicbrainzngs.NetworkError):
+        pass
+
+    assert (cache.get(key) is None) is released
+
+
 def test_can_import_track_with_same_mbid_in_different_albums(factories, mocker):
     artist = factories["music.Artist"]()
     upload = factories["music.Upload"](
@@ -1329,3 +1482,19 @@ def test_can_import_track_with_same_position_in_same_discs_skipped(factories, mo
     new_upload.refresh_from_db()
 
     assert new_upload.import_status == "skipped"
+
+
+def test_update_search_index_missing_only(settings, factories):
+    settings.MUSIC_USE_SEARCH_INDEX = False
+    tracks = factories["music.Track"].create_batch(size=3)
+    settings.MUSIC_USE_SEARCH_INDEX = True
+
+    total = tasks.update_search_index(entity_types=["track"], chunk_size=2)
+
+    assert total == 3
+    assert sorted(
+        models.SearchEntry.objects.filter(entity_type="track").values_list(
+            "entity_id", flat=True
+        )
+    ) == sorted([t.pk for t in tracks])
+    assert tasks.update_search_index(entity_types=["track"]) == 0
@@ -70,6 +70,20 @@ def test_album_list_serializer(api_request, factories, logged_in_api_client):
     assert response.data["results"][0] == expected["results"][0]
 
 
+def test_album_list_prefetches_remote_covers(factories, logged_in_api_client, mocker):
+    prefetch_remote_attachments = mocker.patch(
+        "funkwhale_api.common.tasks.prefetch_remote_attachments"
+    )
+    cover = factories["common.Attachment"](file=None)
+    album = factories["music.Album"](attachment_cover=cover)
+    url = reverse("api:v1:albums-list")
+    response = logged_in_api_client.get(url)
+
+    assert response.status_code == 200
+    prefetch_remote_attachments.assert_called_once_with([cover])
+    assert album.attachment_cover == cover
+
+
 def test_track_list_serializer(api_request, factories, logged_in_api_client):
     tags = ["tag1", "tag2"]
     track = factories["music.Upload"](
@@ -1316,6 +1330,30 @@ def test_search_get(use_fts, settings, logged_in_api_client, factories):
     assert response.data == expected
 
 
+def test_search_get_search_index(settings, logged_in_api_client, factories):
+    settings.MUSIC_USE_SEARCH_INDEX = True
+    artist = factories["music.Artist"](name="Foo Fighters")
+    album = factories["music.Album"](title="Foo Bar")
+    track = factories["music.Track"](title="Foo Baz")
+    tag = factories["tags.Tag"](name="Foo")
+
+    factories["music.Track"]()
+    factories["tags.Tag"]()
+
+    url = reverse("api:v1:search")
+    expected = {
+        "artists": [serializers.ArtistWithAlbumsSerializer(artist).data],
+        "albums": [serializers.AlbumSerializer(album).data],
+        "tracks": [serializers.TrackSerializer(track).data],
+        "tags": [views.TagSerializer(tag).data],
+    }
+
+    response = logged_in_api_client.get(url, {"q": "foo"})
+
+    assert response.status_code == 200
+    assert response.data == expected
+
+
 def test_search_get_fts_advanced(settings, logged_in_api_client, factories):
     settings.USE_FULL_TEXT_SEARCH = True
     artist1 = factories["music.Artist"](name="Foo Bighters")
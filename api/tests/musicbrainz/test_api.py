@@ -1,5 +1,8 @@
+import pytest
 from django.urls import reverse
 
+from funkwhale_api.musicbrainz import client
+
 
 def test_can_search_recording_in_musicbrainz_api(
     recordings, db, mocker, logged_in_api_client
@@ -93,3 +96,41 @@ def test_can_broswe_releases_using_musicbrainz_api(
     expected = releases["browse"]["Lost in the 80s"]
 
     assert expected == response.data
+
+
+def test_musicbrainz_api_rate_limited(
+    artists, db, mocker, settings, logged_in_api_client
+):
+    settings.MUSICBRAINZ_RATE_LIMIT = 1
+    clock = {"now": 10.2}
+
+    def sleep(duration):
+        clock["now"] += duration
+
+    time = mocker.patch.object(client, "time")
+    time.time.side_effect = lambda: clock["now"]
+    time.sleep.side_effect = sleep
+    search = mocker.patch.object(
+        client._api, "search_artists", return_value=artists["search"]["lost fingers"]
+    )
+    url = reverse("api:v1:providers:musicbrainz:search-artists")
+
+    for query in ["lost fingers", "other"]:
+        response = logged_in_api_client.get(url, data={"query": query})
+        assert response.status_code == 200
+
+    assert search.call_count == 2
+    # the second request waits for the next window
+    time.sleep.assert_called_once_with(pytest.approx(0.8))
+
+
+def test_musicbrainz_api_rate_limited_returns_503(db, mocker, logged_in_api_client):
+    mocker.patch.object(
+        client, "acquire", side_effect=client.RateLimited("musicbrainz")
+    )
+    url = reverse("api:v1:providers:musicbrainz:search-artists")
+
+    response = logged_in_api_client.get(url, data={"query": "nothing cached"})
+
+    assert response.status_code == 503
+    assert response["Retry-After"] == "1"
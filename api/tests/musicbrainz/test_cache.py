@@ -1,3 +1,5 @@
+import pytest
+
 from funkwhale_api.musicbrainz import client
 
 
@@ -11,3 +13,48 @@ def test_can_search_recording_in_musicbrainz_api(mocker):
     assert client.api.artists.search("test") == r
     assert client.api.artists.search("test") == r
     assert m.call_count == 1
+
+
+def test_missing_resources_are_cached(mocker):
+    error = client._api.ResponseError(cause=mocker.Mock(code=404))
+    m = mocker.Mock(side_effect=error, __name__="get_image_front")
+    get_front = client.cached(m, service="coverartarchive", cache_results=False)
+
+    for i in range(2):
+        with pytest.raises(client._api.ResponseError):
+            get_front("mbid")
+
+    assert m.call_count == 1
+
+
+def test_server_errors_are_not_cached(mocker):
+    error = client._api.ResponseError(cause=mocker.Mock(code=503))
+    m = mocker.Mock(side_effect=error, __name__="get_release_by_id")
+    get = client.cached(m)
+
+    for i in range(2):
+        with pytest.raises(client._api.ResponseError):
+            get("mbid")
+
+    assert m.call_count == 2
+
+
+def test_acquire_waits_for_next_window(settings, mocker):
+    settings.MUSICBRAINZ_RATE_LIMIT = 1
+    mocker.patch.object(client.time, "time", side_effect=[10.2, 10.2, 10.3, 10.3, 11.1])
+    sleep = mocker.patch.object(client.time, "sleep")
+
+    client.acquire("musicbrainz", timeout=5)
+    client.acquire("musicbrainz", timeout=5)
+
+    sleep.assert_called_once_with(pytest.approx(0.7))
+
+
+def test_acquire_timeout(settings, mocker):
+    settings.MUSICBRAINZ_RATE_LIMIT = 1
+    mocker.patch.object(client.time, "time", return_value=10.2)
+    mocker.patch.object(client.time, "sleep")
+
+    client.acquire("musicbrainz", timeout=0.5)
+    with pytest.raises(client.RateLimited):
+        client.acquire("musicbrainz", timeout=0.5)
@@ -1,6 +1,8 @@
 import pytest
 from rest_framework import exceptions
 
+from funkwhale_api.playlists import models
+
 
 def test_can_insert_plt(factories):
     plt = factories["playlists.PlaylistTrack"]()
@@ -11,7 +13,7 @@ def test_can_insert_plt(factories):
     plt.playlist.insert(plt)
     plt.refresh_from_db()
 
-    assert plt.index == 0
+    assert plt.get_index() == 0
     assert plt.playlist.modification_date > modification_date
 
 
@@ -24,7 +26,7 @@ def test_insert_use_last_idx_by_default(factories):
         plt.refresh_from_db()
 
         assert index == i
-        assert plt.index == i
+        assert plt.get_index() == i
 
 
 def test_can_insert_at_index(factories):
@@ -37,8 +39,8 @@ def test_can_insert_at_index(factories):
     new_first.refresh_from_db()
 
     assert index == 0
-    assert first.index == 1
-    assert new_first.index == 0
+    assert first.get_index() == 1
+    assert new_first.get_index() == 0
 
 
 def test_can_insert_and_move(factories):
@@ -53,9 +55,9 @@ def test_can_insert_and_move(factories):
     second.refresh_from_db()
     third.refresh_from_db()
 
-    assert third.index == 2
-    assert second.index == 0
-    assert first.index == 1
+    assert third.get_index() == 2
+    assert second.get_index() == 0
+    assert first.get_index() == 1
 
 
 def test_can_insert_and_move_last_to_0(factories):
@@ -70,9 +72,9 @@ def test_can_insert_and_move_last_to_0(factories):
     second.refresh_from_db()
     third.refresh_from_db()
 
-    assert third.index == 0
-    assert first.index == 1
-    assert second.index == 2
+    assert third.get_index() == 0
+    assert first.get_index() == 1
+    assert second.get_index() == 2
 
 
 def test_cannot_insert_at_wrong_index(factories):
@@ -100,8 +102,56 @@ def test_remove_update_indexes(factories):
     first.refresh_from_db()
     third.refresh_from_db()
 
-    assert first.index == 0
-    assert third.index == 1
+    assert first.get_index() == 0
+    assert third.get_index() == 1
+
+
+def test_insert_only_updates_inserted_plt(factories):
+    playlist = factories["playlists.Playlist"]()
+    plts = [
+        factories["playlists.PlaylistTrack"](playlist=playlist, index=i)
+        for i in range(3)
+    ]
+
+    playlist.insert(plts[2], index=1)
+
+    positions = [plt.position for plt in plts[:2]]
+    for plt in plts:
+        plt.refresh_from_db()
+    assert [plt.position for plt in plts[:2]] == positions
+    assert plts[2].position == models.POSITION_GAP // 2
+    assert [plt.get_index() for plt in plts] == [0, 2, 1]
+
+
+def test_insert_rebalances_when_no_gap_left(factories):
+    playlist = factories["playlists.Playlist"]()
+    first = factories["playlists.PlaylistTrack"](playlist=playlist, position=0)
+    second = factories["playlists.PlaylistTrack"](playlist=playlist, position=1)
+    new = factories["playlists.PlaylistTrack"](playlist=playlist)
+
+    playlist.insert(new, index=1)
+
+    for plt in [first, second, new]:
+        plt.refresh_from_db()
+    assert first.get_index() == 0
+    assert new.get_index() == 1
+    assert second.get_index() == 2
+    assert first.position < new.position < second.position
+
+
+def test_with_index(factories):
+    playlist = factories["playlists.Playlist"]()
+    plts = [
+        factories["playlists.PlaylistTrack"](playlist=playlist, index=i)
+        for i in range(3)
+    ]
+    factories["playlists.PlaylistTrack"](index=0)
+
+    qs = models.PlaylistTrack.objects.filter(playlist=playlist).with_index()
+
+    assert {plt.pk: plt.index for plt in qs} == {
+        plt.pk: i for i, plt in enumerate(plts)
+    }
 
 
 def test_can_insert_many(factories):
@@ -110,7 +160,7 @@ def test_can_insert_many(factories):
     tracks = factories["music.Track"].create_batch(size=3)
     plts = playlist.insert_many(tracks)
     for i, plt in enumerate(plts):
-        assert plt.index == i + 1
+        assert plt.get_index() == i + 1
         assert plt.track == tracks[i]
         assert plt.playlist == playlist
 
@@ -133,7 +183,7 @@ def test_can_insert_duplicate_by_default(factories):
     playlist.insert(new)
 
     new.refresh_from_db()
-    assert new.index == 1
+    assert new.get_index() == 1
 
 
 def test_cannot_insert_duplicate(factories):
@@ -188,7 +238,7 @@ def test_can_insert_duplicate_with_override(factories):
     playlist.insert(new, allow_duplicates=True)
 
     new.refresh_from_db()
-    assert new.index == 1
+    assert new.get_index() == 1
 
 
 def test_can_insert_many_duplicates_by_default(factories):
@@ -286,3 +336,45 @@ def test_playlist_playable_by_anonymous(privacy_level, expected, factories):
     queryset = playlist.__class__.objects.playable_by(None).with_playable_plts(None)
     match = playlist in list(queryset)
     assert match is expected
+
+
+def test_playlist_counters_maintained(factories):
+    playlist = factories["playlists.Playlist"]()
+    upload1 = factories["music.Upload"](duration=15)
+    upload2 = factories["music.Upload"](duration=30)
+    plt = factories["playlists.PlaylistTrack"](playlist=playlist, track=upload1.track)
+    playlist.insert_many([upload2.track])
+
+    playlist.refresh_from_db()
+    assert playlist.tracks_count == 2
+    assert playlist.tracks_duration == 45
+
+    plt.delete()
+
+    playlist.refresh_from_db()
+    assert playlist.tracks_count == 1
+    assert playlist.tracks_duration == 30
+
+
+def test_playlist_duration_maintained_on_upload_changes(factories):
+    playlist = factories["playlists.Playlist"]()
+    upload = factories["music.Upload"](duration=15)
+    factories["playlists.PlaylistTrack"](playlist=playlist, track=upload.track)
+
+    other_upload = factories["music.Upload"](track=upload.track, duration=30)
+    playlist.refresh_from_db()
+    assert playlist.tracks_duration == 45
+
+    upload.duration = 20
+    upload.save(update_fields=["duration"])
+    playlist.refresh_from_db()
+    assert playlist.tracks_duration == 50
+
+    upload.track = factories["music.Track"]()
+    upload.save()
+    playlist.refresh_from_db()
+    assert playlist.tracks_duration == 30
+
+    other_upload.delete()
+    playlist.refresh_from_db()
+    assert playlist.tracks_duration == 0
@@ -27,7 +27,7 @@ def test_create_insert_is_called_when_index_is_None(factories, mocker):
 
     plt = serializer.save()
     insert.assert_called_once_with(playlist, plt, None, True)
-    assert plt.index == 0
+    assert plt.get_index() == 0
 
 
 def test_create_insert_is_called_when_index_is_provided(factories, mocker):
@@ -44,8 +44,8 @@ def test_create_insert_is_called_when_index_is_provided(factories, mocker):
     plt = serializer.save()
     first.refresh_from_db()
     insert.assert_called_once_with(playlist, plt, 0, True)
-    assert plt.index == 0
-    assert first.index == 1
+    assert plt.get_index() == 0
+    assert first.get_index() == 1
 
 
 def test_update_insert_is_called_when_index_is_provided(factories, mocker):
@@ -63,8 +63,8 @@ def test_update_insert_is_called_when_index_is_provided(factories, mocker):
     plt = serializer.save()
     first.refresh_from_db()
     insert.assert_called_once_with(playlist, plt, 0, True)
-    assert plt.index == 0
-    assert first.index == 1
+    assert plt.get_index() == 0
+    assert first.get_index() == 1
 
 
 def test_update_insert_is_called_with_duplicate_override_when_duplicates_allowed(
@@ -1,7 +1,7 @@
 import pytest
 from django.urls import reverse
 
-from funkwhale_api.playlists import models, serializers
+from funkwhale_api.playlists import serializers
 
 
 def test_can_create_playlist_via_api(logged_in_api_client):
@@ -95,18 +95,28 @@ def test_only_can_add_track_on_own_playlist_via_api(factories, logged_in_api_cli
     assert playlist.playlist_tracks.count() == 0
 
 
-def test_deleting_plt_updates_indexes(mocker, factories, logged_in_api_client):
-    remove = mocker.spy(models.Playlist, "remove")
-    factories["music.Track"]()
-    plt = factories["playlists.PlaylistTrack"](
-        index=0, playlist__user=logged_in_api_client.user
-    )
-    url = reverse("api:v1:playlist-tracks-detail", kwargs={"pk": plt.pk})
+def test_deleting_plt_updates_indexes(factories, logged_in_api_client):
+    playlist = factories["playlists.Playlist"](user=logged_in_api_client.user)
+    first = factories["playlists.PlaylistTrack"](index=0, playlist=playlist)
+    second = factories["playlists.PlaylistTrack"](index=1, playlist=playlist)
+    url = reverse("api:v1:playlist-tracks-detail", kwargs={"pk": first.pk})
 
     response = logged_in_api_client.delete(url)
 
     assert response.status_code == 204
-    remove.assert_called_once_with(plt.playlist, 0)
+    assert second.get_index() == 0
+
+
+def test_retrieve_plt_includes_index(factories, logged_in_api_client):
+    playlist = factories["playlists.Playlist"](user=logged_in_api_client.user)
+    factories["playlists.PlaylistTrack"](index=0, playlist=playlist)
+    plt = factories["playlists.PlaylistTrack"](index=1, playlist=playlist)
+    url = reverse("api:v1:playlist-tracks-detail", kwargs={"pk": plt.pk})
+
+    response = logged_in_api_client.get(url)
+
+    assert response.status_code == 200
+    assert response.data["index"] == 1
 
 
 @pytest.mark.parametrize("level", ["instance", "me", "followers"])
@@ -175,9 +185,10 @@ def test_can_add_multiple_tracks_at_once_via_api(
     assert response.status_code == 201
     assert playlist.playlist_tracks.count() == len(track_ids)
 
-    for plt in playlist.playlist_tracks.order_by("index"):
-        assert response.data["results"][plt.index]["id"] == plt.id
-        assert plt.track == tracks[plt.index]
+    for i, plt in enumerate(playlist.playlist_tracks.order_by("position")):
+        assert response.data["results"][i]["id"] == plt.id
+        assert response.data["results"][i]["index"] == i
+        assert plt.track == tracks[i]
 
 
 def test_can_clear_playlist_from_api(factories, mocker, logged_in_api_client):
@@ -75,3 +75,20 @@ def test_auth_case_insensitive(api_request, factories):
     u, _ = authenticator.authenticate(request)
 
     assert user == u
+
+
+def test_auth_with_salt_cached_user_token_changed(api_request, factories, settings):
+    settings.AUTH_CACHE_DURATION = 60
+    salt = "salt"
+    user = factories["users.User"](subsonic_api_token="password")
+    authentication.authenticate_salt(
+        user.username, salt, authentication.get_token(salt, "password")
+    )
+
+    user.subsonic_api_token = "newpassword"
+    user.save(update_fields=["subsonic_api_token"])
+
+    with pytest.raises(exceptions.AuthenticationFailed):
+        authentication.authenticate_salt(
+            user.username, salt, authentication.get_token(salt, "password")
+        )
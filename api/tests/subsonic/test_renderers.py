@@ -87,3 +87,34 @@ def test_xml_renderer():
     rendered = renderer.render(payload)
 
     assert rendered == expected
+
+
+@pytest.mark.parametrize(
+    "renderer_class", [renderers.SubsonicJSONRenderer, renderers.SubsonicXMLRenderer]
+)
+def test_renderer_stream_generators(renderer_class):
+    items = [{"id": 1, "value": "text"}, {"id": 2, "name": "<Hello & goodbye>"}]
+    payload = {"list": {"empty": [], "item": items}}
+    renderer = renderer_class()
+    expected = renderer.render(payload)
+    lazy_payload = {"list": {"empty": (i for i in []), "item": (i for i in items)}}
+
+    assert b"".join(renderer.stream(lazy_payload)) == expected
+
+
+def test_xml_renderer_stream_matches_dict_to_xml_tree():
+    payload = {
+        "hello": "world\n",
+        "item": [{"this": 1, "value": "text"}, {"some": "node"}],
+        "nested": {"cdata_value": "<p>Hello</p>", "empty": []},
+    }
+
+    result = "".join(renderers.iter_xml("key", payload))
+
+    assert result.encode() == ET.tostring(renderers.dict_to_xml_tree("key", payload))
+
+
+def test_buffered():
+    chunks = ["a" * 3, "b" * 3, "c"]
+
+    assert list(renderers.buffered(chunks, size=5)) == [b"aaabbb", b"c"]
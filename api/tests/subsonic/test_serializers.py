@@ -99,6 +99,41 @@ def test_get_artists_serializer(factories):
     assert serializers.GetArtistsSerializer(queryset).data == expected
 
 
+def test_iter_artists_index_groups_artists_on_the_fly(
+    factories, django_assert_num_queries
+):
+    bob = factories["music.Artist"](name="bob")
+    alice = factories["music.Artist"](name="Alice")
+    ann = factories["music.Artist"](name="ann")
+    ben = factories["music.Artist"](name="Ben")
+    queryset = bob.__class__.objects.all()
+
+    with django_assert_num_queries(1):
+        index = [
+            (group["name"], [a["id"] for a in group["artist"]])
+            for group in serializers.iter_artists_index(queryset)
+        ]
+
+    assert index == [("A", [alice.pk, ann.pk]), ("B", [ben.pk, bob.pk])]
+
+
+def test_iter_artists_index_groups_accented_names_once(factories):
+    names = ["éric", "Zoe", "Émile", "alice", "Élodie", "eve"]
+    artists = [factories["music.Artist"](name=name) for name in names]
+    queryset = artists[0].__class__.objects.all()
+
+    index = [
+        (group["name"], [a["name"] for a in group["artist"]])
+        for group in serializers.iter_artists_index(queryset)
+    ]
+    letters = [letter for letter, _ in index]
+
+    # each letter appears once, and letters are sorted by codepoint
+    assert letters == sorted(set(letters))
+    assert sorted(name for _, group in index for name in group) == sorted(names)
+    assert index[:3] == [("A", ["alice"]), ("E", ["eve"]), ("Z", ["Zoe"])]
+
+
 def test_get_artist_serializer(factories):
     artist = factories["music.Artist"]()
     album = factories["music.Album"](artist=artist, with_cover=True)
@@ -10,13 +10,22 @@ import funkwhale_api
 from funkwhale_api.moderation import filters as moderation_filters
 from funkwhale_api.music import models as music_models
 from funkwhale_api.music import views as music_views
-from funkwhale_api.subsonic import renderers, serializers
+from funkwhale_api.subsonic import negotiation, renderers, serializers
 
 
 def render_json(data):
     return json.loads(renderers.SubsonicJSONRenderer().render(data))
 
 
+def render(data, f="xml"):
+    renderer, _ = negotiation.MAPPING[f]
+    return renderer.render(data)
+
+
+def get_streamed_content(response):
+    return b"".join(response.streaming_content)
+
+
 def test_render_content_json(db, api_client):
     url = reverse("api:subsonic-ping")
     response = api_client.get(url, {"f": "json"})
@@ -97,7 +106,7 @@ def test_ping(f, db, api_client):
     assert response.data == expected
 
 
-@pytest.mark.parametrize("f", ["json"])
+@pytest.mark.parametrize("f", ["json", "xml"])
 def test_get_artists(
     f, db, logged_in_api_client, factories, mocker, queryset_equal_queries
 ):
@@ -121,7 +130,7 @@ def test_get_artists(
     response = logged_in_api_client.get(url, {"f": f})
 
     assert response.status_code == 200
-    assert response.data == expected
+    assert get_streamed_content(response) == render(expected, f)
     playable_by.assert_called_once_with(
         music_models.Artist.objects.all().exclude(exclude_query),
         logged_in_api_client.user.actor,
@@ -350,9 +359,8 @@ def test_get_starred2(f, db, logged_in_api_client, factories):
     response = logged_in_api_client.get(url, {"f": f, "id": track.pk})
 
     assert response.status_code == 200
-    assert response.data == {
-        "starred2": {"song": serializers.get_starred_tracks_data([favorite])}
-    }
+    expected = {"starred2": {"song": serializers.get_starred_tracks_data([favorite])}}
+    assert get_streamed_content(response) == render(expected, f)
 
 
 @pytest.mark.parametrize("f", ["json"])
@@ -411,9 +419,8 @@ def test_get_starred(f, db, logged_in_api_client, factories):
     response = logged_in_api_client.get(url, {"f": f, "id": track.pk})
 
     assert response.status_code == 200
-    assert response.data == {
-        "starred": {"song": serializers.get_starred_tracks_data([favorite])}
-    }
+    expected = {"starred": {"song": serializers.get_starred_tracks_data([favorite])}}
+    assert get_streamed_content(response) == render(expected, f)
 
 
 @pytest.mark.parametrize("f", ["json"])
@@ -429,9 +436,10 @@ def test_get_album_list2(
     response = logged_in_api_client.get(url, {"f": f, "type": "newest"})
 
     assert response.status_code == 200
-    assert response.data == {
+    expected = {
         "albumList2": {"album": serializers.get_album_list2_data([album2, album1])}
     }
+    assert get_streamed_content(response) == render(expected, f)
     playable_by.assert_called_once()
 
 
@@ -446,9 +454,8 @@ def test_get_album_list2_pagination(f, db, logged_in_api_client, factories):
     )
 
     assert response.status_code == 200
-    assert response.data == {
-        "albumList2": {"album": serializers.get_album_list2_data([album1])}
-    }
+    expected = {"albumList2": {"album": serializers.get_album_list2_data([album1])}}
+    assert get_streamed_content(response) == render(expected, f)
 
 
 @pytest.mark.parametrize("f", ["json"])
@@ -467,9 +474,10 @@ def test_get_album_list2_by_genre(f, db, logged_in_api_client, factories):
     )
 
     assert response.status_code == 200
-    assert response.data == {
+    expected = {
         "albumList2": {"album": serializers.get_album_list2_data([album1, album2])}
     }
+    assert get_streamed_content(response) == render(expected, f)
 
 
 @pytest.mark.parametrize(
@@ -494,11 +502,12 @@ def test_get_album_list2_by_year(params, expected, db, logged_in_api_client, fac
     response = logged_in_api_client.get(url, base_params)
 
     assert response.status_code == 200
-    assert response.data == {
+    expected = {
         "albumList2": {
             "album": serializers.get_album_list2_data([albums[i] for i in expected])
         }
     }
+    assert get_streamed_content(response) == render(expected, "json")
 
 
 @pytest.mark.parametrize("f", ["json"])
@@ -667,7 +676,7 @@ def test_create_playlist(f, db, logged_in_api_client, factories):
     assert playlist.playlist_tracks.count() == 2
     for i, t in enumerate([track1, track2]):
         plt = playlist.playlist_tracks.get(track=t)
-        assert plt.index == i
+        assert plt.get_index() == i
     assert playlist.name == "hello"
     qs = playlist.__class__.objects.with_tracks_count()
     assert response.data == {
@@ -710,7 +719,7 @@ def test_get_indexes(
     response = logged_in_api_client.get(url)
 
     assert response.status_code == 200
-    assert response.data == expected
+    assert get_streamed_content(response) == render(expected)
 
     playable_by.assert_called_once_with(
         music_models.Artist.objects.all().exclude(exclude_query),
@@ -20,6 +20,26 @@ def test_get_tags_from_foreign_key(factories):
     assert result == {artist.pk: [rock_tag.pk, rap_tag.pk]}
 
 
+def test_add_tags_from_foreign_key(factories):
+    factories["tags.Tag"](name="rock")
+    artist = factories["music.Artist"]()
+    other_artist = factories["music.Artist"]()
+    factories["music.Track"].create_batch(2, artist=artist, set_tags=["rock", "rap"])
+    factories["music.Track"](artist=artist, set_tags=["rock"])
+    factories["music.Track"](artist=other_artist, set_tags=["rock"])
+
+    result = tasks.add_tags_from_foreign_key(
+        ids=[artist.pk],
+        model=music_models.Artist,
+        foreign_key_model=music_models.Track,
+        foreign_key_attr="artist",
+    )
+
+    assert list(result.keys()) == [artist.pk]
+    assert artist.get_tags() == ["rock"]
+    assert other_artist.get_tags() == []
+
+
 def test_add_tags_batch(factories):
     rock_tag = factories["tags.Tag"](name="Rock")
     rap_tag = factories["tags.Tag"](name="Rap")
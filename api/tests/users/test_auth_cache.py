@@ -0,0 +1,187 @@
+import pytest
+
+from django.urls import reverse
+from rest_framework_jwt.settings import api_settings as jwt_settings
+
+from funkwhale_api.users import auth_cache
+from funkwhale_api.users import last_activity
+from funkwhale_api.users import models
+
+
+@pytest.fixture
+def auth_cache_enabled(settings):
+    settings.AUTH_CACHE_DURATION = 60
+
+
+def test_get_user_caches_user(factories, auth_cache_enabled, mocker):
+    user = factories["users.User"]()
+    get_user = mocker.Mock(return_value=user)
+
+    # the first entry is stored without version, since the user wasn't known
+    # before the query
+    for i in range(3):
+        assert auth_cache.get_user(["test", "key"], get_user) == user
+
+    assert get_user.call_count == 2
+
+
+def test_get_user_invalidation_during_query(factories, auth_cache_enabled, mocker):
+    user = factories["users.User"]()
+    get_user = mocker.Mock(return_value=user)
+    auth_cache.get_user(["test", "key"], get_user)
+
+    def invalidating_get_user():
+        # the user is updated while the previous value is being loaded
+        auth_cache.invalidate(user.pk)
+        return user
+
+    get_user.side_effect = invalidating_get_user
+    auth_cache.get_user(["test", "key"], get_user)
+    get_user.side_effect = None
+    auth_cache.get_user(["test", "key"], get_user)
+
+    assert get_user.call_count == 3
+
+
+def test_get_user_cache_disabled(factories, settings, mocker):
+    settings.AUTH_CACHE_DURATION = 0
+    user = factories["users.User"]()
+    get_user = mocker.Mock(return_value=user)
+
+    auth_cache.get_user(["test", "key"], get_user)
+    auth_cache.get_user(["test", "key"], get_user)
+
+    assert get_user.call_count == 2
+
+
+def test_get_user_failures_are_not_cached(auth_cache_enabled, mocker):
+    get_user = mocker.Mock(side_effect=models.User.DoesNotExist)
+
+    for i in range(2):
+        with pytest.raises(models.User.DoesNotExist):
+            auth_cache.get_user(["test", "key"], get_user)
+
+    assert get_user.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "update",
+    [
+        lambda u: u.set_password("newpassword"),
+        lambda u: setattr(u, "is_active", False),
+        lambda u: setattr(u, "permission_library", True),
+        lambda u: u.update_subsonic_api_token(),
+    ],
+)
+def test_user_change_invalidates_cache(update, factories, auth_cache_enabled, mocker):
+    user = factories["users.User"]()
+    get_user = mocker.Mock(return_value=user)
+    for i in range(2):
+        auth_cache.get_user(["test", "key"], get_user)
+
+    update(user)
+    user.save()
+    auth_cache.get_user(["test", "key"], get_user)
+
+    assert get_user.call_count == 3
+
+
+def test_email_verification_invalidates_cache(factories, auth_cache_enabled, mocker):
+    user = factories["users.User"]()
+    get_user = mocker.Mock(return_value=user)
+    for i in range(2):
+        auth_cache.get_user(["test", "key"], get_user)
+
+    factories["account.EmailAddress"](user=user, primary=True, verified=True)
+    auth_cache.get_user(["test", "key"], get_user)
+
+    assert get_user.call_count == 3
+
+
+def test_record_activity_is_buffered(factories, now, mocker):
+    user = factories["users.User"]()
+    recorder = last_activity.Recorder(delay=10)
+    mocker.patch.object(last_activity, "recorder", recorder)
+    mocker.patch("threading.Timer")
+
+    user.record_activity()
+    user.refresh_from_db()
+    assert user.last_activity is None
+
+    recorder.flush()
+    user.refresh_from_db()
+    assert user.last_activity == now
+
+
+def test_record_activity_timer_closes_connection(mocker):
+    recorder = last_activity.Recorder(delay=10)
+    flush = mocker.patch.object(recorder, "flush")
+    connection = mocker.patch.object(last_activity, "connection")
+
+    recorder.flush_from_timer()
+
+    flush.assert_called_once_with()
+    connection.close.assert_called_once_with()
+
+
+def test_last_activity_update(factories, now):
+    user1 = factories["users.User"]()
+    user2 = factories["users.User"]()
+    other = factories["users.User"]()
+
+    last_activity.update({user1.pk: now, user2.pk: now})
+
+    for user in [user1, user2, other]:
+        user.refresh_from_db()
+    assert user1.last_activity == now
+    assert user2.last_activity == now
+    assert other.last_activity is None
+
+
+def get_jwt_header(user):
+    token = jwt_settings.JWT_ENCODE_HANDLER(jwt_settings.JWT_PAYLOAD_HANDLER(user))
+    return {"HTTP_AUTHORIZATION": "JWT {}".format(token)}
+
+
+def test_authenticated_requests_use_auth_cache(
+    factories, api_client, auth_cache_enabled, mocker
+):
+    user = factories["users.User"]()
+    get_by_natural_key = mocker.spy(models.User.objects, "get_by_natural_key")
+    url = reverse("api:v1:users:users-me")
+
+    for i in range(3):
+        response = api_client.get(url, **get_jwt_header(user))
+        assert response.status_code == 200
+
+    # the first entry is only used from the second query on
+    assert get_by_natural_key.call_count == 2
+
+    user.is_active = False
+    user.save()
+    response = api_client.get(url, **get_jwt_header(user))
+
+    assert response.status_code == 401
+
+
+def test_authenticated_requests_record_activity_in_background(
+    factories, api_client, settings, now, mocker
+):
+    settings.USERS_LAST_ACTIVITY_FLUSH_DELAY = 10
+    recorder = last_activity.Recorder(delay=settings.USERS_LAST_ACTIVITY_FLUSH_DELAY)
+    mocker.patch.object(last_activity, "recorder", recorder)
+    timer = mocker.patch("threading.Timer")
+    user = factories["users.User"]()
+    url = reverse("api:v1:users:users-me")
+
+    response = api_client.get(url, **get_jwt_header(user))
+    user.refresh_from_db()
+
+    assert response.status_code == 200
+    assert user.last_activity is None
+    timer.assert_called_once_with(10, recorder.flush_from_timer)
+
+    recorder.flush()
+    user.refresh_from_db()
+
+    assert user.last_activity == now
@@ -181,6 +181,7 @@ def test_get_channels_groups(factories):
     assert user.get_channels_groups() == [
         "user.{}.imports".format(user.pk),
         "user.{}.inbox".format(user.pk),
+        "user.{}.jobs".format(user.pk),
         "admin.library",
     ]
 
@@ -0,0 +1,140 @@
+"""
+Compare the legacy, in-memory Subsonic rendering of getArtists with the streaming
+one, on the artists of an existing database.
+
+The legacy path groups all artists in memory, as GetArtistsSerializer used to,
+then renders the whole payload. The streaming path is the one used by the API:
+artists are fetched in chunks by iter_artists_index and rendered as they come.
+Both outputs are compared at the end.
+
+Usage, from the api directory, with the usual environment of the pod:
+
+    python ../scripts/benchmark-subsonic-renderers.py [--limit 50000]
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "api"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings.production")
+
+import django  # noqa
+
+django.setup()
+
+from django.db.models import functions  # noqa
+from rest_framework import renderers as rest_renderers  # noqa
+
+from funkwhale_api.music import models as music_models  # noqa
+from funkwhale_api.subsonic import renderers  # noqa
+from funkwhale_api.subsonic import serializers  # noqa
+
+
+def legacy_render_xml(data):
+    final = renderers.structure_payload(data)
+    final["xmlns"] = "http://subsonic.org/restapi"
+    tree = renderers.dict_to_xml_tree("subsonic-response", final)
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(
+        tree, encoding="utf-8"
+    )
+
+
+def legacy_render_json(data):
+    final = {"subsonic-response": renderers.structure_payload(data)}
+    return rest_renderers.JSONRenderer().render(final)
+
+
+def get_queryset(limit):
+    queryset = music_models.Artist.objects.all()
+    if limit:
+        ids = queryset.order_by("pk").values_list("pk", flat=True)[:limit]
+        queryset = queryset.filter(pk__in=list(ids))
+    return queryset
+
+
+def get_legacy_payload(queryset):
+    # the previous implementation of GetArtistsSerializer, which grouped all
+    # artists in memory
+    queryset = queryset.with_albums_count().order_by(functions.Lower("name"))
+    first_letter_mapping = collections.defaultdict(list)
+    for artist in queryset.values("id", "_albums_count", "name"):
+        if artist["name"]:
+            first_letter_mapping[artist["name"][0].upper()].append(artist)
+    index = [
+        {"name": letter, "artist": [serializers.get_artist_data(v) for v in artists]}
+        for letter, artists in sorted(first_letter_mapping.items())
+    ]
+    return {"artists": {"ignoredArticles": "", "index": index}}
+
+
+def get_streaming_payload(queryset):
+    return {"artists": serializers.get_artists_index_data(queryset)}
+
+
+def render_payload(queryset, get_payload, render):
+    # querying and building the payload is included in measurements, since the
+    # legacy renderers need the full payload in memory before rendering anything
+    start = time.perf_counter()
+    first_chunk = None
+    content = []
+    for chunk in render(get_payload(queryset)):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        content.append(chunk)
+    return b"".join(content), time.perf_counter() - start, first_chunk
+
+
+def measure(name, queryset, get_payload, render):
+    content, total, first_chunk = render_payload(queryset, get_payload, render)
+    # memory is measured in a separate run, because tracing slows down execution
+    tracemalloc.start()
+    render_payload(queryset, get_payload, render)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        "{:<16} total: {:>7.3f}s  first byte: {:>7.3f}s  peak memory: {:>7.1f}MB".format(
+            name, total, first_chunk, (peak - len(content)) / 1024 / 1024
+        )
+    )
+    return content
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--limit", type=int, default=0, help="Only include the first N artists"
+    )
+    args = parser.parse_args()
+    queryset = get_queryset(args.limit)
+
+    print("Rendering {} artists".format(queryset.count()))
+    legacy_xml = measure(
+        "legacy xml", queryset, get_legacy_payload, lambda p: [legacy_render_xml(p)]
+    )
+    streaming_xml = measure(
+        "streaming xml",
+        queryset,
+        get_streaming_payload,
+        renderers.SubsonicXMLRenderer().stream,
+    )
+    legacy_json = measure(
+        "legacy json", queryset, get_legacy_payload, lambda p: [legacy_render_json(p)]
+    )
+    streaming_json = measure(
+        "streaming json",
+        queryset,
+        get_streaming_payload,
+        renderers.SubsonicJSONRenderer().stream,
+    )
+
+    assert legacy_xml == streaming_xml, "XML outputs differ"
+    assert json.loads(legacy_json) == json.loads(streaming_json), "JSON outputs differ"
+
+
+if __name__ == "__main__":
+    main()